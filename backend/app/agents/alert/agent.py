@@ -6,6 +6,8 @@ from typing import Any
 
 from app.agents.base import AgentResult, BaseAgent
 from app.agents.database.agent import DatabaseAgent
+from app.agents.database.limits import query_profile_context
+from app.agents.database.schemas import query_result_of
 from app.core.llm.base import BaseLLM
 from app.core.llm.schemas import GenerateConfig
 from app.modules.admin.service import resolve_prompt
@@ -47,28 +49,6 @@ class AlertAgent(BaseAgent):
         cleaned = re.sub(r"<think>.*?</think>", "", raw_text, flags=re.DOTALL)
         return cleaned.strip()
 
-    @staticmethod
-    def _parse_table(output: str) -> tuple[list[str], list[list[str]]]:
-        if "(no rows returned)" in output:
-            return [], []
-        parts = output.split("\n\n")
-        if len(parts) < 2:
-            return [], []
-        table_block = parts[-1].strip()
-        if not table_block or table_block.startswith("Error:"):
-            return [], []
-        lines = [line for line in table_block.splitlines() if line.strip()]
-        if len(lines) < 2:
-            return [], []
-        columns = [c.strip() for c in lines[0].split(" | ")]
-        rows: list[list[str]] = []
-        for line in lines[2:]:
-            row = [c.strip() for c in line.split(" | ")]
-            if len(row) != len(columns):
-                continue
-            rows.append(row)
-        return columns, rows
-
     @staticmethod
     def _table_to_text(columns: list[str], rows: list[list[str]]) -> str:
         if not columns:
@@ -80,6 +60,18 @@ class AlertAgent(BaseAgent):
             lines.append(" | ".join(row))
         return "\n".join(lines)
 
+    @classmethod
+    def _check_data(cls, db_result: AgentResult) -> dict[str, Any]:
+        table = query_result_of(db_result)
+        columns = table.columns if table else []
+        rows = table.string_rows(MAX_ROWS) if table else []
+        return {
+            "columns": columns,
+            "rows": rows,
+            "row_count": table.row_count if table else 0,
+            "data_text": cls._table_to_text(columns, rows),
+        }
+
     # ------------------------------------------------------------------
     # Prompt builders
     # ------------------------------------------------------------------
@@ -150,7 +142,7 @@ class AlertAgent(BaseAgent):
                 check_results.append({"title": title, "error": "Instruksi kosong."})
                 continue
 
-            db_result = self.database_agent.execute(instruction)
+            db_result = self.database_agent.execute(instruction, context=query_profile_context(context, "alert"))
             if db_result.metadata.get("error") or str(db_result.output).startswith("Error:"):
                 check_results.append({
                     "title": title,
@@ -160,15 +152,11 @@ class AlertAgent(BaseAgent):
                 })
                 continue
 
-            columns, rows = self._parse_table(db_result.output)
             check_results.append({
                 "title": title,
                 "instruction": instruction,
                 "threshold": threshold,
-                "columns": columns,
-                "rows": rows[:MAX_ROWS],
-                "row_count": len(rows),
-                "data_text": self._table_to_text(columns, rows),
+                **self._check_data(db_result),
             })
 
         # Step 3: LLM evaluates all data against thresholds
@@ -226,7 +214,7 @@ class AlertAgent(BaseAgent):
                 check_results.append({"title": title, "error": "Instruksi kosong."})
                 continue
 
-            db_result = self.database_agent.execute(instruction)
+            db_result = self.database_agent.execute(instruction, context=query_profile_context(context, "alert"))
             if db_result.metadata.get("error") or str(db_result.output).startswith("Error:"):
                 check_results.append({
                     "title": title,
@@ -236,15 +224,11 @@ class AlertAgent(BaseAgent):
                 })
                 continue
 
-            columns, rows = self._parse_table(db_result.output)
             check_results.append({
                 "title": title,
                 "instruction": instruction,
                 "threshold": threshold,
-                "columns": columns,
-                "rows": rows[:MAX_ROWS],
-                "row_count": len(rows),
-                "data_text": self._table_to_text(columns, rows),
+                **self._check_data(db_result),
             })
 
         # Step 3: Evaluate — stream the interpretation
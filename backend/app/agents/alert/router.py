@@ -1,8 +1,10 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from fastapi.responses import StreamingResponse
 
 from app.agents.alert.api_schemas import AlertRequest, AlertResponse
 from app.agents.alert.service import check_alerts, check_alerts_stream
+from app.core.cancellation import CancellationToken
+from app.core.streaming import disconnect_aware
 
 router = APIRouter(tags=["Alert"], prefix="/v1/alert")
 
@@ -13,8 +15,9 @@ async def alert_check_endpoint(request: AlertRequest):
 
 
 @router.post("/check/stream")
-async def alert_check_stream_endpoint(request: AlertRequest):
+async def alert_check_stream_endpoint(request: AlertRequest, http_request: Request):
+    token = CancellationToken()
     return StreamingResponse(
-        check_alerts_stream(request),
+        disconnect_aware(http_request, check_alerts_stream(request, cancel_token=token), token),
         media_type="text/event-stream",
     )
@@ -3,6 +3,7 @@ from collections.abc import Generator
 
 from app.agents.alert import create_alert_agent
 from app.agents.alert.api_schemas import AlertRequest, AlertResponse
+from app.core.cancellation import CancellationToken, OperationCancelled
 
 
 def check_alerts(request: AlertRequest) -> AlertResponse:
@@ -16,12 +17,19 @@ def check_alerts(request: AlertRequest) -> AlertResponse:
     )
 
 
-def check_alerts_stream(request: AlertRequest) -> Generator[str, None, None]:
+def check_alerts_stream(
+    request: AlertRequest,
+    cancel_token: CancellationToken | None = None,
+) -> Generator[str, None, None]:
     agent = create_alert_agent()
-
-    for event in agent.execute_stream(request.question):
-        if event.get("type") == "_result":
-            continue
-        yield f"data: {json.dumps(event)}\n\n"
+    context = {"cancel_token": cancel_token} if cancel_token else None
+
+    try:
+        for event in agent.execute_stream(request.question, context=context):
+            if event.get("type") == "_result":
+                continue
+            yield f"data: {json.dumps(event)}\n\n"
+    except OperationCancelled:
+        return
 
     yield f"data: {json.dumps({'type': 'done'})}\n\n"
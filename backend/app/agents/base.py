@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 from collections.abc import Generator
 from dataclasses import dataclass, field
+from typing import Any
 
 from app.core.llm.base import BaseLLM
 
@@ -9,6 +10,8 @@ from app.core.llm.base import BaseLLM
 class AgentResult:
     output: str
     metadata: dict = field(default_factory=dict)
+    # Structured payload for other agents (e.g. a QueryResult); never serialized.
+    data: Any = None
 
 
 class BaseAgent(ABC):
@@ -1,6 +1,7 @@
 ﻿import json
 import logging
 import re
+import time
 from collections.abc import Generator
 from typing import Any
 
@@ -10,6 +11,8 @@ from app.agents.base import AgentResult, BaseAgent
 from app.core.config import settings
 from app.core.llm.base import BaseLLM
 from app.core.llm.schemas import GenerateConfig
+from app.core.metrics import WEB_FETCH_DURATION
+from app.core.tracing import span
 from app.core.websearch import create_websearch
 from app.core.websearch.base import SearchResult
 from app.modules.admin.service import resolve_prompt
@@ -40,8 +43,17 @@ class BrowserAgent(BaseAgent):
     def _fetch_url(self, url: str) -> str:
         headers = {"User-Agent": settings.WEB_BROWSE_USER_AGENT}
         timeout = settings.WEB_BROWSE_TIMEOUT
-        with httpx.Client(timeout=timeout, follow_redirects=True) as client:
-            response = client.get(url, headers=headers)
+        with span("web.fetch", url=url) as current:
+            started = time.perf_counter()
+            try:
+                with httpx.Client(timeout=timeout, follow_redirects=True) as client:
+                    response = client.get(url, headers=headers)
+            except Exception:
+                WEB_FETCH_DURATION.labels(outcome="error").observe(time.perf_counter() - started)
+                raise
+            outcome = "ok" if response.is_success else "http_error"
+            WEB_FETCH_DURATION.labels(outcome=outcome).observe(time.perf_counter() - started)
+            current.set(status_code=response.status_code, bytes=len(response.content))
             response.raise_for_status()
             content_type = response.headers.get("content-type", "")
             if "text" not in content_type and "html" not in content_type:
@@ -104,7 +116,8 @@ class BrowserAgent(BaseAgent):
                 ),
             },
         ]
-        response = self.llm.generate(messages=messages, config=GenerateConfig(temperature=0.2))
+        config = GenerateConfig(temperature=0.2, prompt_slug="browser_summarize_system")
+        response = self.llm.generate(messages=messages, config=config)
         return response.text
 
     def execute(self, input_text: str, context: dict | None = None) -> AgentResult:
@@ -1,8 +1,10 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from fastapi.responses import StreamingResponse
 
 from app.agents.browser.api_schemas import BrowseRequest, BrowseResponse
 from app.agents.browser.service import browse, browse_stream
+from app.core.cancellation import CancellationToken
+from app.core.streaming import disconnect_aware
 
 router = APIRouter(tags=["Browser"], prefix="/v1/browser")
 
@@ -13,8 +15,9 @@ async def browse_endpoint(request: BrowseRequest):
 
 
 @router.post("/browse/stream")
-async def browse_stream_endpoint(request: BrowseRequest):
+async def browse_stream_endpoint(request: BrowseRequest, http_request: Request):
+    token = CancellationToken()
     return StreamingResponse(
-        browse_stream(request),
+        disconnect_aware(http_request, browse_stream(request, cancel_token=token), token),
         media_type="text/event-stream",
     )
@@ -3,6 +3,7 @@ from collections.abc import Generator
 
 from app.agents.browser import create_browser_agent
 from app.agents.browser.api_schemas import BrowseRequest, BrowseResponse, BrowseSource
+from app.core.cancellation import CancellationToken, OperationCancelled
 
 
 def _build_context(request: BrowseRequest) -> dict:
@@ -28,16 +29,24 @@ def browse(request: BrowseRequest) -> BrowseResponse:
     )
 
 
-def browse_stream(request: BrowseRequest) -> Generator[str, None, None]:
+def browse_stream(
+    request: BrowseRequest,
+    cancel_token: CancellationToken | None = None,
+) -> Generator[str, None, None]:
     agent = create_browser_agent()
     context = _build_context(request)
+    if cancel_token:
+        context["cancel_token"] = cancel_token
 
     browser_result = None
-    for event in agent.execute_stream(request.query, context=context):
-        if event.get("type") == "_result":
-            browser_result = event["data"]
-        else:
-            yield f"data: {json.dumps(event)}\n\n"
+    try:
+        for event in agent.execute_stream(request.query, context=context):
+            if event.get("type") == "_result":
+                browser_result = event["data"]
+            else:
+                yield f"data: {json.dumps(event)}\n\n"
+    except OperationCancelled:
+        return
 
     if browser_result is None:
         yield (
@@ -6,12 +6,16 @@ from typing import Any
 
 from app.agents.base import AgentResult, BaseAgent
 from app.agents.database import DatabaseAgent
+from app.agents.database.limits import query_profile_context
+from app.agents.database.schemas import query_result_of
 from app.core.llm.base import BaseLLM
 from app.core.llm.schemas import GenerateConfig
 from app.modules.admin.service import resolve_prompt
 
 logger = logging.getLogger(__name__)
 
+MAX_ROWS = 50
+
 
 class ChartAgent(BaseAgent):
     def __init__(self, llm: BaseLLM, database_agent: DatabaseAgent):
@@ -53,35 +57,18 @@ class ChartAgent(BaseAgent):
         ]
 
     @staticmethod
-    def _parse_table(output: str) -> tuple[list[str], list[list[str]], str]:
-        """Parse pipe-delimited table from DatabaseAgent output.
+    def _table_data(db_result: AgentResult) -> tuple[list[str], list[list[str]], int, str]:
+        """Columns and display rows from the DatabaseAgent's typed result.
 
-        Returns (columns, rows, parse_hint) where parse_hint explains
-        why parsing failed (empty string on success).
+        Returns (columns, rows, row_count, parse_hint) where parse_hint
+        explains why there is nothing to chart (empty string on success).
         """
-        if "(no rows returned)" in output:
-            return [], [], "Database returned no rows for this query."
-        parts = output.split("\n\n")
-        if len(parts) < 2:
-            return [], [], f"Unexpected DB output format (no table section). Raw: {output[:200]}"
-        table_block = parts[-1].strip()
-        if not table_block:
-            return [], [], "Table section is empty."
-        if table_block.startswith("Error:"):
-            return [], [], f"DB error: {table_block[:200]}"
-        lines = [line for line in table_block.splitlines() if line.strip()]
-        if len(lines) < 2:
-            return [], [], f"Table has fewer than 2 lines. Got: {table_block[:200]}"
-        columns = [c.strip() for c in lines[0].split(" | ")]
-        rows: list[list[str]] = []
-        for line in lines[2:]:
-            row = [c.strip() for c in line.split(" | ")]
-            if len(row) != len(columns):
-                continue
-            rows.append(row)
-        if not rows:
-            return columns, [], f"Parsed header ({', '.join(columns)}) but no valid data rows."
-        return columns, rows, ""
+        table = query_result_of(db_result)
+        if table is None:
+            return [], [], 0, f"Unexpected DB result (no table data). Raw: {str(db_result.output)[:200]}"
+        if not table.rows:
+            return table.columns, [], 0, "Database returned no rows for this query."
+        return table.columns, table.string_rows(MAX_ROWS), table.row_count, ""
 
     @staticmethod
     def _rows_to_objects(columns: list[str], rows: list[list[str]]) -> list[dict[str, Any]]:
@@ -170,7 +157,7 @@ class ChartAgent(BaseAgent):
         command_response = self.llm.generate(messages=command_messages, config=GenerateConfig(temperature=0))
         db_instruction = self._strip_think_tags(command_response.text)
 
-        db_result = self.database_agent.execute(db_instruction)
+        db_result = self.database_agent.execute(db_instruction, context=query_profile_context(context, "chart"))
         if db_result.metadata.get("error") or str(db_result.output).startswith("Error:"):
             return AgentResult(
                 output=f"Error: {db_result.output}",
@@ -181,7 +168,7 @@ class ChartAgent(BaseAgent):
                 },
             )
 
-        columns, rows, parse_hint = self._parse_table(db_result.output)
+        columns, rows, row_count, parse_hint = self._table_data(db_result)
         if not columns or not rows:
             error_msg = parse_hint or "No data available to build chart."
             payload = {"error": error_msg}
@@ -198,7 +185,7 @@ class ChartAgent(BaseAgent):
                 "chart": chart_payload.get("chart"),
                 "db_instruction": db_instruction,
                 "columns": columns,
-                "row_count": len(rows),
+                "row_count": row_count,
             },
         )
 
@@ -215,7 +202,7 @@ class ChartAgent(BaseAgent):
         yield {"type": "thinking", "content": f"Instruksi DB: {db_instruction}\n\n"}
 
         yield {"type": "thinking", "content": "Menarik data dari database...\n"}
-        db_result = self.database_agent.execute(db_instruction)
+        db_result = self.database_agent.execute(db_instruction, context=query_profile_context(context, "chart"))
 
         if db_result.metadata.get("error") or str(db_result.output).startswith("Error:"):
             yield {"type": "thinking", "content": f"Error dari database: {str(db_result.output)[:300]}\n\n"}
@@ -230,10 +217,10 @@ class ChartAgent(BaseAgent):
         table_part = parts[1][:400] if len(parts) > 1 else "(no table section)"
         yield {"type": "thinking", "content": f"DB output header:\n{header_part}\n\nDB output table:\n{table_part}\n\n"}
 
-        columns, rows, parse_hint = self._parse_table(db_result.output)
+        columns, rows, row_count, parse_hint = self._table_data(db_result)
         if not columns or not rows:
             error_msg = parse_hint or "No data available to build chart."
-            yield {"type": "thinking", "content": f"Parse gagal: {error_msg}\n\n"}
+            yield {"type": "thinking", "content": f"Data kosong: {error_msg}\n\n"}
             payload = {"error": error_msg}
             result = AgentResult(
                 output=json.dumps(payload, ensure_ascii=False),
@@ -242,7 +229,7 @@ class ChartAgent(BaseAgent):
             yield {"type": "_result", "data": result}
             return
 
-        yield {"type": "thinking", "content": f"Data parsed: {len(rows)} baris, kolom: {', '.join(columns)}\n\n"}
+        yield {"type": "thinking", "content": f"Data: {row_count} baris, kolom: {', '.join(columns)}\n\n"}
         yield {"type": "thinking", "content": "Menyusun spesifikasi chart...\n"}
         chart_payload = self._build_chart_spec(question, columns, rows)
         output = json.dumps(chart_payload, ensure_ascii=False)
@@ -252,7 +239,7 @@ class ChartAgent(BaseAgent):
                 "chart": chart_payload.get("chart"),
                 "db_instruction": db_instruction,
                 "columns": columns,
-                "row_count": len(rows),
+                "row_count": row_count,
             },
         )
         yield {"type": "_result", "data": result}
@@ -1,8 +1,10 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from fastapi.responses import StreamingResponse
 
 from app.agents.chart.api_schemas import ChartRequest, ChartResponse
 from app.agents.chart.service import generate_chart, generate_chart_stream
+from app.core.cancellation import CancellationToken
+from app.core.streaming import disconnect_aware
 
 router = APIRouter(tags=["Chart"], prefix="/v1/chart")
 
@@ -13,8 +15,9 @@ async def generate_chart_endpoint(request: ChartRequest):
 
 
 @router.post("/generate/stream")
-async def generate_chart_stream_endpoint(request: ChartRequest):
+async def generate_chart_stream_endpoint(request: ChartRequest, http_request: Request):
+    token = CancellationToken()
     return StreamingResponse(
-        generate_chart_stream(request),
+        disconnect_aware(http_request, generate_chart_stream(request, cancel_token=token), token),
         media_type="text/event-stream",
     )
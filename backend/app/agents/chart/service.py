@@ -3,6 +3,7 @@ from collections.abc import Generator
 
 from app.agents.chart import create_chart_agent
 from app.agents.chart.api_schemas import ChartRequest, ChartResponse
+from app.core.cancellation import CancellationToken, OperationCancelled
 
 
 def _parse_chart_output(raw: str) -> tuple[dict | None, str | None]:
@@ -26,14 +27,21 @@ def generate_chart(request: ChartRequest) -> ChartResponse:
     return ChartResponse(status=status, chart=chart, error=error)
 
 
-def generate_chart_stream(request: ChartRequest) -> Generator[str, None, None]:
+def generate_chart_stream(
+    request: ChartRequest,
+    cancel_token: CancellationToken | None = None,
+) -> Generator[str, None, None]:
     agent = create_chart_agent()
+    context = {"cancel_token": cancel_token} if cancel_token else None
     chart_result = None
-    for event in agent.execute_stream(request.query):
-        if event.get("type") == "_result":
-            chart_result = event["data"]
-        else:
-            yield f"data: {json.dumps(event)}\n\n"
+    try:
+        for event in agent.execute_stream(request.query, context=context):
+            if event.get("type") == "_result":
+                chart_result = event["data"]
+            else:
+                yield f"data: {json.dumps(event)}\n\n"
+    except OperationCancelled:
+        return
 
     if chart_result is None:
         yield f"data: {json.dumps({'type': 'content', 'content': 'Error: Chart agent returned no result.'})}\n\n"
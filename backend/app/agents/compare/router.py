@@ -1,8 +1,10 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from fastapi.responses import StreamingResponse
 
 from app.agents.compare.api_schemas import CompareRequest, CompareResponse
 from app.agents.compare.service import compare, compare_stream
+from app.core.cancellation import CancellationToken
+from app.core.streaming import disconnect_aware
 
 router = APIRouter(tags=["Compare"], prefix="/v1/compare")
 
@@ -13,8 +15,9 @@ async def compare_endpoint(request: CompareRequest):
 
 
 @router.post("/analyze/stream")
-async def compare_stream_endpoint(request: CompareRequest):
+async def compare_stream_endpoint(request: CompareRequest, http_request: Request):
+    token = CancellationToken()
     return StreamingResponse(
-        compare_stream(request),
+        disconnect_aware(http_request, compare_stream(request, cancel_token=token), token),
         media_type="text/event-stream",
     )
@@ -3,6 +3,7 @@ from collections.abc import Generator
 
 from app.agents.compare import create_compare_agent
 from app.agents.compare.api_schemas import CompareRequest, CompareResponse
+from app.core.cancellation import CancellationToken, OperationCancelled
 
 
 def compare(request: CompareRequest) -> CompareResponse:
@@ -17,12 +18,19 @@ def compare(request: CompareRequest) -> CompareResponse:
     )
 
 
-def compare_stream(request: CompareRequest) -> Generator[str, None, None]:
+def compare_stream(
+    request: CompareRequest,
+    cancel_token: CancellationToken | None = None,
+) -> Generator[str, None, None]:
     agent = create_compare_agent()
-
-    for event in agent.execute_stream(request.question):
-        if event.get("type") == "_result":
-            continue
-        yield f"data: {json.dumps(event)}\n\n"
+    context = {"cancel_token": cancel_token} if cancel_token else None
+
+    try:
+        for event in agent.execute_stream(request.question, context=context):
+            if event.get("type") == "_result":
+                continue
+            yield f"data: {json.dumps(event)}\n\n"
+    except OperationCancelled:
+        return
 
     yield f"data: {json.dumps({'type': 'done'})}\n\n"
@@ -1,176 +1,680 @@
 import json
 import logging
 import re
+import uuid
 from collections.abc import Generator
 
 from sqlmodel import text
 
 from app.agents.base import AgentResult, BaseAgent
-from app.agents.database.introspect import get_schema_info
+from app.agents.database.candidates import SqlCandidate, race_candidates
+from app.agents.database.candidates import describe as describe_candidate
+from app.agents.database.column_stats import get_column_stats_snippet
+from app.agents.database.columnar import columnar_requested, fetch_columnar
+from app.agents.database.introspect import SchemaSnapshot, TableInfo, get_schema_snapshot
+from app.agents.database.limits import (
+    DEFAULT_PROFILE,
+    QueryLimitExceeded,
+    QueryLimits,
+    limit_exceeded,
+    limits_for,
+    query_profile,
+    truncation_notice,
+)
+from app.agents.database.preflight import PreflightError, QueryEstimate, check_estimate, explain_estimate
+from app.agents.database.result_cache import result_cache
+from app.agents.database.retrieval import get_retriever, is_schema_miss, relevant_schema
+from app.agents.database.schema_encoding import estimate_tokens
 from app.agents.database.schemas import QueryResult
+from app.agents.database.semantic import (
+    QuerySpec,
+    SemanticQueryError,
+    compile_spec,
+    render_catalog,
+    semantic_requested,
+)
+from app.agents.database.sql_guard import GuardedQuery, guard_sql
+from app.agents.database.sql_repair import repair_sql
+from app.core.cancellation import OperationCancelled, check_cancelled, get_cancel_token
+from app.core.config import settings
 from app.core.database import clickhouse_engine
+from app.core.deadline import budget_attempts, clickhouse_settings, get_deadline, is_budget_tight, llm_config
 from app.core.llm.base import BaseLLM
-from app.core.llm.schemas import GenerateConfig
+from app.core.metrics import DATABASE_AGENT_RUNS
+from app.core.timing import Stopwatch, timing_event, timings_enabled
+from app.core.tracing import span
 from app.modules.admin.service import resolve_prompt
 
 logger = logging.getLogger(__name__)
 
 MAX_RETRIES = 3
+# Local (no-LLM) fixes tried on a failed query before the next LLM attempt.
+MAX_LOCAL_REPAIRS = 2
 
-FORBIDDEN_KEYWORDS = re.compile(
-    r"\b(INSERT|UPDATE|DELETE|DROP|ALTER|CREATE|TRUNCATE|GRANT|REVOKE|EXEC|EXECUTE)\b",
-    re.IGNORECASE,
-)
+# Ready-made SQL sources for ``execute_sql``: (thinking title, result explanation).
+_SQL_SOURCES = {
+    "question_cache": ("Menggunakan query tersimpan", "Query dari template pertanyaan serupa."),
+    "kpi_template": ("Menggunakan template query KPI", "Query dari template KPI terkurasi."),
+}
 
 
 class DatabaseAgent(BaseAgent):
     def __init__(self, llm: BaseLLM):
         super().__init__(llm)
 
-    def _get_schema(self) -> str:
-        return get_schema_info(clickhouse_engine)
-
-    def _parse_llm_response(self, raw: str) -> tuple[str, str]:
+    def _get_schema(self) -> SchemaSnapshot:
+        return get_schema_snapshot(clickhouse_engine)
+
+    @staticmethod
+    def _select_schema(snapshot: SchemaSnapshot, question: str) -> tuple[str, list[TableInfo], bool]:
+        """Return (schema_text, tables, narrowed) for the NL->SQL prompt."""
+        top_k = settings.SCHEMA_RETRIEVAL_TOP_K
+        if top_k <= 0 or len(snapshot.tables) <= top_k:
+            return snapshot.rendered, snapshot.tables, False
+        schema, tables = relevant_schema(snapshot, question, top_k)
+        return schema, tables, len(tables) < len(snapshot.tables)
+
+    @staticmethod
+    def _column_stats(snapshot: SchemaSnapshot, question: str, tables: list[TableInfo], narrowed: bool) -> str:
+        """Known values/ranges for the tables the question most likely uses."""
+        if not narrowed:
+            tables, _ = get_retriever(snapshot).select(question, settings.COLUMN_STATS_MAX_TABLES)
+        return get_column_stats_snippet(clickhouse_engine, snapshot.tables, tables)
+
+    @staticmethod
+    def _with_stats(schema: str, stats: str) -> str:
+        return f"{schema}\n\n{stats}" if stats else schema
+
+    @staticmethod
+    def _strip_code_fence(raw: str) -> str:
         raw = raw.strip()
         if raw.startswith("```"):
             raw = re.sub(r"^```(?:json)?\s*", "", raw)
             raw = re.sub(r"\s*```$", "", raw)
-        parsed = json.loads(raw)
+        return raw
+
+    def _parse_llm_response(self, raw: str) -> tuple[str, str]:
+        parsed = json.loads(self._strip_code_fence(raw))
         return parsed["sql"], parsed.get("explanation", "")
 
-    def _validate_sql(self, sql: str) -> None:
-        stripped = sql.strip().rstrip(";").strip()
-        if not stripped.upper().startswith("SELECT"):
-            raise ValueError("Only SELECT queries are allowed.")
-        if FORBIDDEN_KEYWORDS.search(stripped):
-            raise ValueError("Query contains forbidden keywords.")
-
-    def _execute_sql(self, sql: str) -> QueryResult:
-        
-        with clickhouse_engine.connect() as conn:
-            result = conn.execute(text(sql))
-            columns = list(result.keys())
-            rows = [list(row) for row in result.fetchall()]
+    def _validate_sql(self, sql: str, context: dict | None = None) -> GuardedQuery:
+        """Parse and check ``sql`` (raises ``ValueError``) and apply the safe rewrites."""
+        return guard_sql(
+            sql,
+            self._get_schema().tables,
+            default_limit=limits_for(context).default_limit,
+            auto_final=settings.SQL_GUARD_AUTO_FINAL,
+            soft_delete=settings.SQL_GUARD_SOFT_DELETE,
+        )
+
+    @staticmethod
+    def _rewrite_note(query: GuardedQuery) -> str:
+        return f"Query disesuaikan: {', '.join(query.rewrites)}\n"
+
+    def _preflight(self, query: GuardedQuery, context: dict | None = None) -> QueryEstimate | None:
+        """EXPLAIN ESTIMATE ``query``; None when skipped.
+
+        Raises ``PreflightError`` for a wrong query and ``QueryLimitExceeded``
+        when the estimate is over the caller's caps.
+        """
+        if not settings.SQL_PREFLIGHT_ENABLED:
+            return None
+        if settings.RESULT_CACHE_ENABLED and result_cache.has(query.sql, self._cache_variant(context)):
+            return None
+        timeout = settings.SQL_PREFLIGHT_TIMEOUT
+        budget_seconds = clickhouse_settings(context).get("max_execution_time")
+        if budget_seconds is not None:
+            timeout = min(timeout, budget_seconds)
+
+        with span("database.preflight") as current:
+            try:
+                estimate = explain_estimate(clickhouse_engine, query.sql, timeout)
+            except PreflightError as e:
+                current.set(outcome="query_error", error_code=e.code, error=str(e)[:500])
+                raise
+            except Exception as e:
+                logger.warning("EXPLAIN ESTIMATE failed, running without pre-flight: %s", e)
+                current.set(outcome="skipped", error=str(e)[:500])
+                return None
+            current.set(
+                estimated_parts=estimate.parts,
+                estimated_rows=estimate.rows,
+                estimated_marks=estimate.marks,
+                estimated_tables=",".join(table["table"] for table in estimate.tables),
+            )
+            try:
+                check_estimate(estimate, limits_for(context))
+            except QueryLimitExceeded as e:
+                current.set(outcome="over_limit", limit=e.limit)
+                raise
+        return estimate
+
+    @staticmethod
+    def _kill_query(query_id: str) -> None:
+        """Ask ClickHouse to stop a running query (used on cancellation)."""
+        try:
+            with clickhouse_engine.connect() as conn:
+                conn.execute(
+                    text("KILL QUERY WHERE query_id = :query_id ASYNC"),
+                    {"query_id": query_id},
+                )
+            logger.info("Killed ClickHouse query %s", query_id)
+        except Exception as exc:
+            logger.warning("Failed to kill ClickHouse query %s: %s", query_id, exc)
+
+    @staticmethod
+    def _cache_variant(context: dict | None, limits: QueryLimits | None = None) -> str:
+        """Result cache variant: the fetch path plus the row cap the result was cut at.
+
+        Query profiles can have different ``max_result_rows``; a result
+        truncated under a small cap must not be served to a larger one.
+        """
+        limits = limits or limits_for(context)
+        return f"{'columnar' if columnar_requested(context) else 'rows'}:{limits.max_result_rows}"
+
+    def _execute_sql(self, query: GuardedQuery, context: dict | None = None) -> QueryResult:
+        limits = limits_for(context)
+        sql = query.sql
+        if not settings.RESULT_CACHE_ENABLED:
+            result = self._run_sql(sql, context, limits)
+        else:
+            result = result_cache.execute(
+                clickhouse_engine,
+                sql,
+                self._get_schema().tables,
+                lambda: self._run_sql(sql, context, limits),
+                variant=self._cache_variant(context, limits),
+                referenced=query.tables,
+            )
+        if query.limit_injected and result.row_count >= limits.default_limit:
+            result.truncated = True
+        return result
+
+    def _run_sql(self, sql: str, context: dict | None = None, limits: QueryLimits | None = None) -> QueryResult:
+        limits = limits or limits_for(context)
+        statement = text(sql)
+        query_settings = limits.settings()
+        budget_seconds = clickhouse_settings(context).get("max_execution_time")
+        if budget_seconds is not None:
+            query_settings["max_execution_time"] = min(
+                query_settings.get("max_execution_time", budget_seconds), budget_seconds
+            )
+
+        # Tag the query so a cancelled request can KILL it server-side.
+        token = get_cancel_token(context)
+        unregister = None
+        if token is not None:
+            query_id = f"agentic-{uuid.uuid4().hex}"
+            query_settings["query_id"] = query_id
+            unregister = token.register(lambda: self._kill_query(query_id))
+
+        if query_settings:
+            statement = statement.execution_options(settings=query_settings)
+
+        try:
+            if columnar_requested(context):
+                return fetch_columnar(clickhouse_engine, sql, query_settings, max_rows=limits.max_result_rows)
+            with clickhouse_engine.connect() as conn:
+                result = conn.execute(statement)
+                columns = list(result.keys())
+                rows = [list(row) for row in result.fetchall()]
+            # "break" stops at a block boundary, so the server may overshoot.
+            truncated = len(rows) >= limits.max_result_rows
+            rows = rows[:limits.max_result_rows]
             return QueryResult(
                 columns=columns,
                 rows=rows,
                 row_count=len(rows),
                 sql=sql,
+                types=self._column_types(result),
+                truncated=truncated,
             )
+        except Exception as exc:
+            # A killed query surfaces as a ClickHouse error; report it as a
+            # cancellation so it is not retried.
+            if token is not None:
+                token.raise_if_cancelled()
+            exceeded = limit_exceeded(exc, limits)
+            if exceeded is not None:
+                raise exceeded from exc
+            raise
+        finally:
+            if unregister is not None:
+                unregister()
+
+    def _repair_stream(
+        self, query: GuardedQuery, error: Exception, context: dict | None = None
+    ) -> Generator[dict, None, tuple[GuardedQuery, QueryResult, list[str]] | None]:
+        """Fix a mechanical error from the cached schema and re-run; None when that fails."""
+        if not settings.SQL_LOCAL_REPAIR_ENABLED:
+            return None
+        tables = self._get_schema().tables
+        applied: list[str] = []
+        for _ in range(MAX_LOCAL_REPAIRS):
+            repair = repair_sql(query.sql, error, tables)
+            if repair is None:
+                return None
+            applied.extend(repair.fixes)
+            yield {
+                "type": "thinking",
+                "content": f"Perbaikan lokal ({repair.error_class}): {', '.join(repair.fixes)}\nSQL: {repair.sql}\n",
+            }
+            with span("database.repair", error_class=repair.error_class, fixes=len(repair.fixes)) as current:
+                try:
+                    query = self._validate_sql(repair.sql, context)
+                    self._preflight(query, context)
+                    result = self._execute_sql(query, context=context)
+                except OperationCancelled:
+                    raise
+                except Exception as e:
+                    logger.info("Local repair (%s) failed: %s", repair.error_class, e)
+                    current.set(outcome="error", error=str(e)[:500])
+                    yield {"type": "thinking", "content": f"Perbaikan lokal gagal: {e}\n"}
+                    error = e
+                    continue
+                current.set(outcome="success", rows=result.row_count)
+            return query, result, applied
+        return None
+
+    @staticmethod
+    def _column_types(result) -> list[str]:
+        """ClickHouse type names from the DB-API cursor description."""
+        description = getattr(result.cursor, "description", None) or []
+        return [str(column[1]) for column in description]
+
+    @staticmethod
+    def _retry_error(error: Exception, sql: str) -> str:
+        """Retry-prompt text for a failed query; limit errors are passed on as JSON."""
+        if isinstance(error, QueryLimitExceeded):
+            return f"Query stopped by a resource limit: {error.to_prompt()}. SQL: {sql}"
+        if isinstance(error, PreflightError):
+            return f"{error}. SQL: {sql}"
+        return f"ClickHouse execution error: {error}. SQL: {sql}"
 
     def _format_result(self, result: QueryResult, explanation: str) -> str:
-        if result.rows:
-            header = " | ".join(result.columns)
-            separator = "-+-".join("-" * len(c) for c in result.columns)
-            lines = [header, separator]
-            for row in result.rows[:50]:
-                lines.append(" | ".join(str(v) for v in row))
-            formatted_rows = "\n".join(lines)
-        else:
-            formatted_rows = "(no rows returned)"
-
+        warning = f"Warning: {truncation_notice(result.row_count)}\n" if result.truncated else ""
         return (
             f"SQL: {result.sql}\n"
             f"Explanation: {explanation}\n"
-            f"Rows: {result.row_count}\n\n"
-            f"{formatted_rows}"
+            f"Rows: {result.row_count}\n"
+            f"{warning}\n"
+            f"{result.to_text()}"
         )
 
-    def execute(self, input_text: str, context: dict | None = None) -> AgentResult:
-        schema = self._get_schema()
-        config = GenerateConfig(temperature=0)
-
-        messages = [
-            {"role": "system", "content": resolve_prompt("nl_to_sql_system").format(schema=schema)},
-            {"role": "user", "content": resolve_prompt("nl_to_sql_user").format(question=input_text)},
-        ]
-
-        attempts = []
-        retry_tpl = resolve_prompt("nl_to_sql_retry")
-
-        for attempt in range(1, MAX_RETRIES + 1):
-            try:
-                response = self.llm.generate(messages=messages, config=config)
-                sql, explanation = self._parse_llm_response(response.text)
-            except (json.JSONDecodeError, KeyError) as e:
-                error_msg = f"Failed to parse your response as JSON: {e}. Raw output: {response.text[:200]}"
-                logger.warning("Attempt %d — parse error: %s", attempt, error_msg)
-                attempts.append({"attempt": attempt, "error": error_msg})
-                messages.append({"role": "assistant", "content": response.text})
-                messages.append({"role": "user", "content": retry_tpl.format(error=error_msg)})
-                continue
-
-            try:
-                self._validate_sql(sql)
-            except ValueError as e:
-                error_msg = f"SQL validation error: {e}. Generated SQL: {sql}"
-                logger.warning("Attempt %d — validation error: %s", attempt, error_msg)
-                attempts.append({"attempt": attempt, "sql": sql, "error": str(e)})
-                messages.append({"role": "assistant", "content": response.text})
-                messages.append({"role": "user", "content": retry_tpl.format(error=error_msg)})
-                continue
-
+    def execute_sql(self, sql: str, context: dict | None = None, source: str = "question_cache") -> AgentResult:
+        final_result = None
+        for event in self.execute_sql_stream(sql, context=context, source=source):
+            if event.get("type") == "_result":
+                final_result = event["data"]
+        return final_result
+
+    def execute_sql_stream(
+        self,
+        sql: str,
+        context: dict | None = None,
+        source: str = "question_cache",
+    ) -> Generator[dict, None, None]:
+        """Validate and run known-good SQL without generation. Yields a final _result event.
+
+        ``source`` is "question_cache" (a learned template) or "kpi_template"
+        (a curated KPI query).
+        """
+        title, explanation = _SQL_SOURCES[source]
+        yield {"type": "thinking", "content": f"{title}\nSQL: {sql}\n\n"}
+        stopwatch = Stopwatch()
+        with span("database.execute", attempt=0, cached_sql=True, sql_source=source) as current:
             try:
-                result = self._execute_sql(sql)
+                query = self._validate_sql(sql, context)
+                if query.rewrites:
+                    yield {"type": "thinking", "content": self._rewrite_note(query)}
+                self._preflight(query, context)
+                result = self._execute_sql(query, context=context)
+                current.set(rows=result.row_count, columns=len(result.columns))
+            except OperationCancelled:
+                raise
             except Exception as e:
-                error_msg = f"ClickHouse execution error: {e}. SQL: {sql}"
-                logger.warning("Attempt %d — execution error: %s", attempt, error_msg)
-                attempts.append({"attempt": attempt, "sql": sql, "error": str(e)})
-                messages.append({"role": "assistant", "content": response.text})
-                messages.append({"role": "user", "content": retry_tpl.format(error=error_msg)})
-                continue
-
-            output = self._format_result(result, explanation)
-            return AgentResult(
-                output=output,
+                logger.warning("Cached SQL failed: %s", e)
+                current.set(outcome="error", error=str(e)[:500])
+                yield {"type": "thinking", "content": f"Query tersimpan gagal: {e}\n"}
+                yield {
+                    "type": "_result",
+                    "data": AgentResult(output=f"Error: {e}", metadata={"error": str(e), "sql": sql}),
+                }
+                return
+        if timings_enabled(context):
+            yield timing_event("clickhouse_execution", stopwatch.elapsed_ms(), attempt=0, rows=result.row_count)
+        yield {"type": "thinking", "content": f"Hasil query: {result.row_count} baris.\n"}
+        yield {
+            "type": "_result",
+            "data": AgentResult(
+                output=self._format_result(result, explanation),
                 metadata={
                     "sql": result.sql,
                     "row_count": result.row_count,
-                    "attempts": attempt,
+                    "attempts": 0,
+                    "sql_source": source,
+                    **({"sql_cache": "hit"} if source == "question_cache" else {}),
                 },
-            )
+                data=result,
+            ),
+        }
+
+    @staticmethod
+    def _semantic_layer_applies(context: dict | None) -> bool:
+        """Whether to try the semantic metric layer before raw SQL generation.
+
+        Only when the planner's plan marked the question as a metric query
+        (``semantic_context``); otherwise the spec call would be one more LLM
+        round-trip on every question. Compiled specs are aggregated, windowed
+        (30 days by default) and capped, so columnar fetches and sub-agent
+        queries (a query profile) skip it too, and so does a tight budget.
+        """
+        if not settings.SEMANTIC_LAYER_ENABLED or not semantic_requested(context) or is_budget_tight(context):
+            return False
+        return not columnar_requested(context) and query_profile(context) == DEFAULT_PROFILE
+
+    def _semantic_stream(
+        self, input_text: str, context: dict | None = None
+    ) -> Generator[dict, None, AgentResult | None]:
+        """Answer through the semantic metric layer; returns None to fall back to raw SQL."""
+        yield {"type": "thinking", "content": "Menyusun spesifikasi metrik...\n"}
+        stopwatch = Stopwatch()
+        with span("database.semantic") as current:
+            messages = [
+                {
+                    "role": "system",
+                    "content": resolve_prompt("semantic_query_system").format(catalog=render_catalog()),
+                },
+                {"role": "user", "content": resolve_prompt("semantic_query_user").format(question=input_text)},
+            ]
+            config = llm_config(context, temperature=0, prompt_slug="semantic_query_system")
+            try:
+                response = self.llm.generate(messages=messages, config=config)
+            except OperationCancelled:
+                raise
+            except Exception as e:
+                # The spec call is optional: a provider error falls back to raw SQL.
+                logger.warning("Semantic spec generation failed: %s", e)
+                current.set(outcome="llm_error", error=str(e)[:500])
+                yield {"type": "thinking", "content": f"Spesifikasi metrik gagal ({e}), beralih ke pembuatan SQL.\n\n"}
+                return None
+            if timings_enabled(context):
+                yield timing_event("semantic_spec", stopwatch.elapsed_ms(), response.usage)
 
-        last_error = attempts[-1]["error"] if attempts else "Unknown error"
-        logger.error("All %d attempts failed for question: %s", MAX_RETRIES, input_text)
+            try:
+                payload = json.loads(self._strip_code_fence(response.text))
+                if isinstance(payload, dict) and payload.get("unsupported"):
+                    current.set(outcome="unsupported")
+                    yield {"type": "thinking", "content": "Di luar katalog metrik, beralih ke pembuatan SQL.\n\n"}
+                    return None
+                spec = QuerySpec.from_payload(payload)
+                sql = compile_spec(spec, self._get_schema().tables)
+            except (json.JSONDecodeError, SemanticQueryError) as e:
+                current.set(outcome="invalid_spec", error=str(e)[:500])
+                yield {"type": "thinking", "content": f"Spesifikasi metrik tidak valid ({e}), beralih ke pembuatan SQL.\n\n"}
+                return None
+
+            yield {"type": "thinking", "content": f"Spesifikasi metrik dikompilasi\nSQL: {sql}\n\n"}
+            stopwatch = Stopwatch()
+            query = None
+            repairs: list[str] = []
+            try:
+                query = self._validate_sql(sql, context)
+                if query.rewrites:
+                    yield {"type": "thinking", "content": self._rewrite_note(query)}
+                self._preflight(query, context)
+                result = self._execute_sql(query, context=context)
+            except OperationCancelled:
+                raise
+            except Exception as e:
+                logger.warning("Semantic layer SQL failed: %s", e)
+                current.set(outcome="error", error=str(e)[:500])
+                yield {"type": "thinking", "content": f"Eksekusi gagal: {e}\n"}
+                repaired = None
+                if query is not None:
+                    repaired = yield from self._repair_stream(query, e, context)
+                if repaired is None:
+                    yield {"type": "thinking", "content": "Beralih ke pembuatan SQL.\n\n"}
+                    return None
+                query, result, repairs = repaired
+            if result.row_count >= spec.limit:
+                # The spec's LIMIT is part of the compiled SQL, not injected by the guard.
+                result.truncated = True
+            current.set(outcome="success", rows=result.row_count, metrics=len(spec.metrics), repairs=len(repairs))
+
+        if timings_enabled(context):
+            yield timing_event("clickhouse_execution", stopwatch.elapsed_ms(), attempt=1, rows=result.row_count)
+        yield {"type": "thinking", "content": f"Hasil query: {result.row_count} baris.\n"}
+        metadata = {
+            "sql": result.sql,
+            "row_count": result.row_count,
+            "attempts": 1,
+            "sql_source": "semantic",
+            "semantic_spec": payload,
+        }
+        if repairs:
+            metadata["repairs"] = repairs
         return AgentResult(
-            output=f"Error: Failed after {MAX_RETRIES} attempts. Last error: {last_error}",
-            metadata={"error": last_error, "attempts": attempts},
+            output=self._format_result(result, "Query dari spesifikasi metrik semantik."),
+            metadata=metadata,
+            data=result,
+        )
+
+    def _build_candidate(
+        self, messages: list[dict], context: dict | None, index: int, temperature: float
+    ) -> SqlCandidate:
+        """Generate one SQL candidate and run it through the guard and pre-flight."""
+        candidate = SqlCandidate(index, temperature)
+        stopwatch = Stopwatch()
+        config = llm_config(context, temperature=temperature, prompt_slug="nl_to_sql_system")
+        response = self.llm.generate(messages=messages, config=config)
+        candidate.response_text = response.text
+        candidate.usage = response.usage
+        candidate.elapsed_ms = stopwatch.elapsed_ms()
+        try:
+            candidate.sql, candidate.explanation = self._parse_llm_response(response.text)
+        except (json.JSONDecodeError, KeyError) as e:
+            candidate.error = f"Failed to parse your response as JSON: {e}. Raw output: {response.text[:200]}"
+            return candidate
+        try:
+            candidate.query = self._validate_sql(candidate.sql, context)
+            candidate.estimate = self._preflight(candidate.query, context)
+        except (QueryLimitExceeded, PreflightError) as e:
+            candidate.error = self._retry_error(e, candidate.sql)
+        except ValueError as e:
+            candidate.error = f"SQL validation error: {e}. Generated SQL: {candidate.sql}"
+        return candidate
+
+    def _candidates_stream(
+        self, messages: list[dict], context: dict | None, count: int
+    ) -> Generator[dict, None, tuple[AgentResult | None, list[SqlCandidate]]]:
+        """Race ``count`` candidates; execute valid ones in completion order until one succeeds."""
+        yield {"type": "thinking", "content": f"Menyusun {count} kandidat query SQL secara paralel...\n"}
+        timed = timings_enabled(context)
+        failed: list[SqlCandidate] = []
+        candidates = race_candidates(
+            count, lambda index, temperature: self._build_candidate(messages, context, index, temperature)
+        )
+        try:
+            with span("database.candidates", candidates=count) as current:
+                for candidate in candidates:
+                    label = f"Kandidat {candidate.index + 1}/{count}"
+                    if timed and candidate.response_text:
+                        yield timing_event(
+                            "sql_generation",
+                            candidate.elapsed_ms,
+                            candidate.usage,
+                            attempt=1,
+                            candidate=candidate.index,
+                        )
+                    if not candidate.valid:
+                        failed.append(candidate)
+                        yield {"type": "thinking", "content": f"{label} tidak valid: {candidate.error[:300]}\n"}
+                        continue
+
+                    yield {
+                        "type": "thinking",
+                        "content": (
+                            f"{label} valid (temperature {candidate.temperature})\n"
+                            f"SQL: {candidate.query.sql}\n"
+                            f"Alasan: {candidate.explanation}\n\n"
+                        ),
+                    }
+                    stopwatch = Stopwatch()
+                    repairs: list[str] = []
+                    with span("database.execute", attempt=1, candidate=candidate.index) as execute_span:
+                        try:
+                            result = self._execute_sql(candidate.query, context=context)
+                            execute_span.set(rows=result.row_count, columns=len(result.columns))
+                        except OperationCancelled:
+                            raise
+                        except Exception as e:
+                            execute_span.set(outcome="error", error=str(e)[:500])
+                            yield {"type": "thinking", "content": f"{label} gagal dieksekusi: {e}\n"}
+                            repaired = yield from self._repair_stream(candidate.query, e, context)
+                            if repaired is None:
+                                candidate.error = self._retry_error(e, candidate.sql)
+                                failed.append(candidate)
+                                continue
+                            candidate.query, result, repairs = repaired
+                            execute_span.set(outcome="repaired", rows=result.row_count, repairs=len(repairs))
+                    if timed:
+                        yield timing_event(
+                            "clickhouse_execution", stopwatch.elapsed_ms(), attempt=1, rows=result.row_count
+                        )
+
+                    current.set(outcome="success", winner=candidate.index, failed=len(failed))
+                    yield {"type": "thinking", "content": f"Hasil query: {result.row_count} baris.\n"}
+                    metadata = {
+                        "sql": result.sql,
+                        "row_count": result.row_count,
+                        "attempts": 1,
+                        "candidates": count,
+                        "candidate": candidate.index,
+                    }
+                    if repairs:
+                        metadata["repairs"] = repairs
+                    return AgentResult(
+                        output=self._format_result(result, candidate.explanation),
+                        metadata=metadata,
+                        data=result,
+                    ), failed
+                current.set(outcome="no_valid_candidate", failed=len(failed))
+        finally:
+            candidates.close()
+        yield {"type": "thinking", "content": "Tidak ada kandidat yang berhasil, lanjut percobaan berurutan.\n"}
+        return None, failed
+
+    def execute(self, input_text: str, context: dict | None = None) -> AgentResult:
+        final_result = None
+        for event in self.execute_stream(input_text, context=context):
+            if event.get("type") == "_result":
+                final_result = event["data"]
+        return final_result or AgentResult(
+            output="Error: Database agent returned no result.",
+            metadata={"error": "no result"},
         )
 
     def execute_stream(self, input_text: str, context: dict | None = None) -> Generator[dict, None, None]:
         """Step-by-step streaming with thinking events. Yields a final _result event."""
 
+        timed = timings_enabled(context)
+        if self._semantic_layer_applies(context):
+            semantic_result = yield from self._semantic_stream(input_text, context)
+            if semantic_result is not None:
+                DATABASE_AGENT_RUNS.labels(outcome="success").observe(1)
+                yield {"type": "_result", "data": semantic_result}
+                return
+
         yield {"type": "thinking", "content": "Memeriksa skema database...\n"}
-        schema = self._get_schema()
-        table_count = schema.count("TABLE ")
-        yield {"type": "thinking", "content": f"Skema tersedia: {table_count} tabel.\n\n"}
+        with span("database.schema") as current:
+            snapshot = self._get_schema()
+            schema, tables, narrowed = self._select_schema(snapshot, input_text)
+            table_count = len(tables)
+            stats = self._column_stats(snapshot, input_text, tables, narrowed)
+            current.set(
+                schema_chars=len(schema),
+                schema_tokens=estimate_tokens(schema),
+                encoding=snapshot.encoding,
+                tables=table_count,
+                narrowed=narrowed,
+                stats_chars=len(stats),
+            )
+        if narrowed:
+            yield {
+                "type": "thinking",
+                "content": f"Skema relevan: {table_count} dari {len(snapshot.tables)} tabel.\n\n",
+            }
+        else:
+            yield {"type": "thinking", "content": f"Skema tersedia: {table_count} tabel.\n\n"}
 
-        config = GenerateConfig(temperature=0)
+        system_tpl = resolve_prompt("nl_to_sql_system")
         messages = [
-            {"role": "system", "content": resolve_prompt("nl_to_sql_system").format(schema=schema)},
+            {"role": "system", "content": system_tpl.format(schema=self._with_stats(schema, stats))},
             {"role": "user", "content": resolve_prompt("nl_to_sql_user").format(question=input_text)},
         ]
 
         final_result = None
+        attempts: list[dict] = []
+        # Failed race candidates: one concurrent round, not one attempt each.
+        candidate_failures: list[dict] = []
         retry_tpl = resolve_prompt("nl_to_sql_retry")
+        max_attempts = budget_attempts(context, MAX_RETRIES)
+        if max_attempts < MAX_RETRIES:
+            yield {
+                "type": "thinking",
+                "content": f"Sisa waktu terbatas: maksimal {max_attempts} percobaan.\n",
+            }
+
+        attempt = 0
+        if settings.SQL_CANDIDATES > 1 and not is_budget_tight(context):
+            # First attempt: N candidates generated and pre-flighted concurrently.
+            attempt = 1
+            final_result, failed = yield from self._candidates_stream(messages, context, settings.SQL_CANDIDATES)
+            candidate_failures.extend(describe_candidate(candidate) for candidate in failed)
+            retry_from = next((candidate for candidate in failed if candidate.response_text), None)
+            if final_result is None and retry_from is not None:
+                if narrowed and any(is_schema_miss(candidate.error) for candidate in failed):
+                    narrowed = False
+                    max_attempts += 1
+                    full_schema = self._with_stats(snapshot.rendered, stats)
+                    messages[0] = {"role": "system", "content": system_tpl.format(schema=full_schema)}
+                    yield {"type": "thinking", "content": "Mencoba ulang dengan skema lengkap.\n"}
+                messages.append({"role": "assistant", "content": retry_from.response_text})
+                messages.append({"role": "user", "content": retry_tpl.format(error=retry_from.error)})
+
+        while final_result is None and attempt < max_attempts:
+            attempt += 1
+            check_cancelled(context)
+            deadline = get_deadline(context)
+            if deadline is not None and deadline.expired:
+                attempts.append({"attempt": attempt, "error": "request deadline exceeded"})
+                yield {"type": "thinking", "content": "Batas waktu permintaan habis.\n"}
+                break
 
-        for attempt in range(1, MAX_RETRIES + 1):
             if attempt > 1:
-                yield {"type": "thinking", "content": f"Mencoba ulang... (percobaan {attempt}/{MAX_RETRIES})\n"}
+                yield {"type": "thinking", "content": f"Mencoba ulang... (percobaan {attempt}/{max_attempts})\n"}
 
             yield {"type": "thinking", "content": "Menyusun query SQL dari instruksi...\n"}
 
             # Step 1: Generate
-            try:
-                response = self.llm.generate(messages=messages, config=config)
-                sql, explanation = self._parse_llm_response(response.text)
-            except (json.JSONDecodeError, KeyError) as e:
-                error_msg = f"Failed to parse your response as JSON: {e}. Raw output: {response.text[:200]}"
-                logger.warning("Attempt %d — parse error: %s", attempt, error_msg)
-                yield {"type": "thinking", "content": f"Kesalahan parsing: {e}\n"}
-                messages.append({"role": "assistant", "content": response.text})
-                messages.append({"role": "user", "content": retry_tpl.format(error=error_msg)})
-                continue
+            stopwatch = Stopwatch()
+            with span("database.generate_sql", attempt=attempt) as current:
+                config = llm_config(context, temperature=0, prompt_slug="nl_to_sql_system")
+                try:
+                    response = self.llm.generate(messages=messages, config=config)
+                    if timed:
+                        yield timing_event("sql_generation", stopwatch.elapsed_ms(), response.usage, attempt=attempt)
+                    sql, explanation = self._parse_llm_response(response.text)
+                except (json.JSONDecodeError, KeyError) as e:
+                    error_msg = f"Failed to parse your response as JSON: {e}. Raw output: {response.text[:200]}"
+                    logger.warning("Attempt %d — parse error: %s", attempt, error_msg)
+                    attempts.append({"attempt": attempt, "error": error_msg})
+                    current.set(outcome="parse_error")
+                    yield {"type": "thinking", "content": f"Kesalahan parsing: {e}\n"}
+                    messages.append({"role": "assistant", "content": response.text})
+                    messages.append({"role": "user", "content": retry_tpl.format(error=error_msg)})
+                    continue
 
             yield {
                 "type": "thinking",
@@ -182,43 +686,91 @@ class DatabaseAgent(BaseAgent):
             }
 
             # Step 2: Validate
-            yield {"type": "thinking", "content": "Validasi query (hanya SELECT + cek kata terlarang)...\n"}
+            yield {"type": "thinking", "content": "Validasi query (satu SELECT read-only)...\n"}
             try:
-                self._validate_sql(sql)
+                query = self._validate_sql(sql, context)
             except ValueError as e:
                 error_msg = f"SQL validation error: {e}. Generated SQL: {sql}"
                 logger.warning("Attempt %d — validation error: %s", attempt, error_msg)
+                attempts.append({"attempt": attempt, "sql": sql, "error": str(e)})
                 yield {"type": "thinking", "content": f"Validasi gagal: {e}\n"}
                 messages.append({"role": "assistant", "content": response.text})
                 messages.append({"role": "user", "content": retry_tpl.format(error=error_msg)})
                 continue
-
-            # Step 3: Execute
-            yield {"type": "thinking", "content": "Menjalankan query di ClickHouse...\n"}
-            try:
-                result = self._execute_sql(sql)
-            except Exception as e:
-                error_msg = f"ClickHouse execution error: {e}. SQL: {sql}"
-                logger.warning("Attempt %d — execution error: %s", attempt, error_msg)
-                yield {"type": "thinking", "content": f"Eksekusi gagal: {e}\n"}
-                messages.append({"role": "assistant", "content": response.text})
-                messages.append({"role": "user", "content": retry_tpl.format(error=error_msg)})
-                continue
+            if query.rewrites:
+                yield {"type": "thinking", "content": self._rewrite_note(query)}
+
+            # Step 3: Pre-flight (EXPLAIN ESTIMATE) and execute
+            stopwatch = Stopwatch()
+            repairs: list[str] = []
+            with span("database.execute", attempt=attempt) as current:
+                try:
+                    estimate = self._preflight(query, context)
+                    if estimate is not None:
+                        current.set(estimated_rows=estimate.rows, estimated_marks=estimate.marks)
+                        yield {
+                            "type": "thinking",
+                            "content": f"Estimasi baca: {estimate.rows} baris, {estimate.marks} marks.\n",
+                        }
+                    yield {"type": "thinking", "content": "Menjalankan query di ClickHouse...\n"}
+                    result = self._execute_sql(query, context=context)
+                    current.set(rows=result.row_count, columns=len(result.columns))
+                    if timed:
+                        yield timing_event(
+                            "clickhouse_execution", stopwatch.elapsed_ms(), attempt=attempt, rows=result.row_count
+                        )
+                except OperationCancelled:
+                    raise
+                except Exception as e:
+                    if timed:
+                        yield timing_event("clickhouse_execution", stopwatch.elapsed_ms(), attempt=attempt, error=True)
+                    error_msg = self._retry_error(e, sql)
+                    if isinstance(e, QueryLimitExceeded):
+                        current.set(limit=e.limit)
+                    logger.warning("Attempt %d — execution error: %s", attempt, error_msg)
+                    attempts.append({"attempt": attempt, "sql": sql, "error": str(e)})
+                    current.set(outcome="error", error=str(e)[:500])
+                    yield {"type": "thinking", "content": f"Eksekusi gagal: {e}\n"}
+                    repaired = yield from self._repair_stream(query, e, context)
+                    if repaired is None:
+                        if narrowed and is_schema_miss(str(e)):
+                            # The narrowed schema may have hidden the right table or
+                            # column: retry once with the full schema (extra attempt).
+                            narrowed = False
+                            max_attempts += 1
+                            full_schema = self._with_stats(snapshot.rendered, stats)
+                            messages[0] = {"role": "system", "content": system_tpl.format(schema=full_schema)}
+                            yield {"type": "thinking", "content": "Mencoba ulang dengan skema lengkap.\n"}
+                        messages.append({"role": "assistant", "content": response.text})
+                        messages.append({"role": "user", "content": retry_tpl.format(error=error_msg)})
+                        continue
+                    query, result, repairs = repaired
+                    current.set(outcome="repaired", rows=result.row_count, repairs=len(repairs))
 
             # Success
             yield {"type": "thinking", "content": f"Hasil query: {result.row_count} baris.\n"}
 
             output = self._format_result(result, explanation)
-            final_result = AgentResult(
-                output=output,
-                metadata={"sql": result.sql, "row_count": result.row_count, "attempts": attempt},
-            )
+            metadata = {"sql": result.sql, "row_count": result.row_count, "attempts": attempt}
+            if repairs:
+                metadata["repairs"] = repairs
+            final_result = AgentResult(output=output, metadata=metadata, data=result)
             break
 
-        if final_result is None:
+        if final_result is not None:
+            DATABASE_AGENT_RUNS.labels(outcome="success").observe(final_result.metadata["attempts"])
+        else:
+            # ``attempt`` counts sequential rounds; the candidate race is one.
+            DATABASE_AGENT_RUNS.labels(outcome="failure").observe(attempt)
+            failures = attempts or candidate_failures
+            last_error = failures[-1]["error"] if failures else "Unknown error"
+            logger.error("All %d attempts failed for question: %s", attempt, input_text)
+            metadata = {"error": last_error, "attempts": attempts}
+            if candidate_failures:
+                metadata["candidates"] = candidate_failures
             final_result = AgentResult(
-                output=f"Error: Failed after {MAX_RETRIES} attempts.",
-                metadata={"error": "max retries exceeded"},
+                output=f"Error: Failed after {attempt} attempts. Last error: {last_error}",
+                metadata=metadata,
             )
 
         # Internal marker for PlannerAgent to capture the result
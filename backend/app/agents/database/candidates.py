@@ -0,0 +1,101 @@
+"""Concurrent SQL candidates for the first NL->SQL attempt.
+
+The normal loop is strictly sequential: generate, validate, execute, and on
+error regenerate with the error appended, so a hard question pays several
+LLM round-trips back to back. With ``SQL_CANDIDATES`` > 1 the first attempt
+instead asks for N candidates at once, each at its own temperature from
+``SQL_CANDIDATE_TEMPERATURES``. Every candidate is parsed, guarded and
+pre-flighted (EXPLAIN ESTIMATE) in its own worker, and the agent executes
+candidates in the order they become valid, stopping at the first that
+returns rows. This spends up to N times the generation tokens to cut tail
+latency. The sequential loop takes over, with the errors seen so far, when
+no candidate survives.
+
+Workers run on a copy of the request context with a forked trace, like DAG
+branches, so their spans and profiles stay attached to the request.
+"""
+
+import contextvars
+import logging
+from collections.abc import Callable, Generator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any
+
+from app.agents.database.preflight import QueryEstimate
+from app.agents.database.sql_guard import GuardedQuery
+from app.core.cancellation import OperationCancelled
+from app.core.config import settings
+from app.core.profiling import attach_thread
+from app.core.tracing import Trace, activate_trace, fork_trace, span
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SqlCandidate:
+    index: int
+    temperature: float
+    response_text: str = ""
+    sql: str = ""
+    explanation: str = ""
+    query: GuardedQuery | None = None
+    estimate: QueryEstimate | None = None
+    usage: dict | None = None
+    elapsed_ms: float = 0.0
+    error: str = ""
+
+    @property
+    def valid(self) -> bool:
+        return not self.error and self.query is not None
+
+
+CandidateBuilder = Callable[[int, float], SqlCandidate]
+
+
+def candidate_temperatures(count: int) -> list[float]:
+    """``count`` temperatures, cycling through ``SQL_CANDIDATE_TEMPERATURES``."""
+    temperatures = settings.SQL_CANDIDATE_TEMPERATURES or [0.0]
+    return [temperatures[index % len(temperatures)] for index in range(count)]
+
+
+def race_candidates(count: int, build: CandidateBuilder) -> Generator[SqlCandidate, None, None]:
+    """Build ``count`` candidates concurrently and yield each as soon as it is done.
+
+    ``build(index, temperature)`` generates and checks one candidate; an
+    exception other than a cancellation becomes the candidate's ``error``.
+    """
+
+    def _worker(index: int, temperature: float, trace: Trace | None) -> SqlCandidate:
+        activate_trace(trace)
+        with attach_thread(), span("database.candidate", candidate=index, temperature=temperature) as current:
+            try:
+                candidate = build(index, temperature)
+            except OperationCancelled:
+                raise
+            except Exception as exc:
+                logger.warning("SQL candidate %d failed: %s", index, exc)
+                candidate = SqlCandidate(index, temperature, error=str(exc))
+            current.set(outcome="valid" if candidate.valid else "invalid", error=candidate.error[:500] or None)
+            return candidate
+
+    executor = ThreadPoolExecutor(max_workers=max(1, count), thread_name_prefix="sql-candidate")
+    try:
+        futures = [
+            # Each worker gets its own copy of the request context.
+            executor.submit(contextvars.copy_context().run, _worker, index, temperature, fork_trace())
+            for index, temperature in enumerate(candidate_temperatures(count))
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def describe(candidate: SqlCandidate) -> dict[str, Any]:
+    """Attempt record for the agent's failure metadata."""
+    record: dict[str, Any] = {"attempt": 1, "candidate": candidate.index, "temperature": candidate.temperature}
+    if candidate.sql:
+        record["sql"] = candidate.sql
+    record["error"] = candidate.error
+    return record
@@ -0,0 +1,237 @@
+"""Column value statistics injected into the NL->SQL prompt.
+
+Most literal-value retries come from guessing: status codes, site-name
+casing, parameter codes. A background refresh collects, per table, the row
+count, the distinct values of low-cardinality columns and the min/max of
+date and numeric columns. Prompts get a short snippet for the tables in use.
+
+Refreshes run on a background thread, so the request path only ever reads
+what is already collected.
+"""
+
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlmodel import text
+
+from app.agents.database.introspect import TableInfo
+from app.agents.database.sql_guard import SOFT_DELETE_COLUMN
+from app.core.config import settings
+from app.core.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on columns profiled per table (one aggregate query per table).
+MAX_STATS_COLUMNS = 40
+# Longer values are cut in the prompt snippet.
+MAX_VALUE_CHARS = 40
+# Per-table statistics query budget (seconds).
+STATS_QUERY_TIMEOUT = 30
+
+_STRING_TYPES = re.compile(r"^(String|FixedString\(\d+\)|Enum(8|16)\(.*\))$")
+_INTEGER_TYPES = re.compile(r"^U?Int(8|16|32|64|128|256)$")
+_NUMERIC_TYPES = re.compile(r"^(Float(32|64)|Decimal\d*\(.*\))$")
+_DATE_TYPES = re.compile(r"^(Date|Date32|DateTime|DateTime64\(.*\)|DateTime\(.*\))$")
+
+# Free text and identifiers: distinct values would be noise or sensitive.
+_SKIPPED_NAME_HINTS = (
+    "description", "deskripsi", "note", "catatan", "keterangan", "message", "comment",
+    "url", "image", "photo", "foto", "file", "path", "address", "alamat", "email",
+    "phone", "telp", "password", "token", "uuid",
+)
+_HOUSEKEEPING_COLUMNS = frozenset(
+    {"created_at", "updated_at", "deleted_at", "created_by", "updated_by", SOFT_DELETE_COLUMN}
+)
+
+
+def _base_type(column_type: str) -> str:
+    base = column_type
+    for wrapper in ("Nullable(", "LowCardinality("):
+        while base.startswith(wrapper) and base.endswith(")"):
+            base = base[len(wrapper):-1]
+    return base
+
+
+def _column_kind(name: str, column_type: str) -> str | None:
+    """Return "values", "int" (values or range), "range", or None to skip."""
+    lowered = name.lower()
+    if lowered == "id" or lowered.endswith("_id") or lowered in _HOUSEKEEPING_COLUMNS:
+        return None
+    if any(hint in lowered for hint in _SKIPPED_NAME_HINTS):
+        return None
+    base = _base_type(column_type)
+    if _STRING_TYPES.match(base):
+        return "values"
+    if _INTEGER_TYPES.match(base):
+        return "int"
+    if _NUMERIC_TYPES.match(base) or _DATE_TYPES.match(base):
+        return "range"
+    return None
+
+
+@dataclass
+class ColumnStats:
+    name: str
+    distinct: int | None = None
+    values: list[Any] | None = None
+    min: Any = None
+    max: Any = None
+
+    def render(self) -> str | None:
+        if self.values is not None:
+            shown = []
+            for value in sorted(self.values, key=str):
+                text_value = str(value)[:MAX_VALUE_CHARS]
+                shown.append(f"'{text_value}'" if isinstance(value, str) else text_value)
+            return f"{self.name}: {'|'.join(shown)}" if shown else None
+        if self.min is not None and self.max is not None:
+            return f"{self.name}: {self.min} .. {self.max}"
+        return None
+
+
+@dataclass
+class TableStats:
+    table: str
+    row_count: int
+    columns: list[ColumnStats] = field(default_factory=list)
+    collected_at: float = 0.0
+
+    def render(self) -> str:
+        parts = [f"~{self.row_count} rows"]
+        parts.extend(line for column in self.columns if (line := column.render()))
+        return f"{self.table}: " + "; ".join(parts)
+
+
+def _quote(identifier: str) -> str:
+    return "`" + identifier.replace("`", "\\`") + "`"
+
+
+def collect_table_stats(engine: Any, table: TableInfo, max_distinct: int) -> TableStats:
+    profiled = []
+    for column in table.columns:
+        kind = _column_kind(column.name, column.type)
+        if kind:
+            profiled.append((column.name, kind))
+        if len(profiled) >= MAX_STATS_COLUMNS:
+            break
+
+    selects = ["count() AS row_count"]
+    for index, (name, kind) in enumerate(profiled):
+        column = _quote(name)
+        if kind in ("values", "int"):
+            selects.append(f"uniq({column}) AS c{index}_distinct")
+            selects.append(f"groupUniqArray({max_distinct + 1})({column}) AS c{index}_values")
+        if kind in ("int", "range"):
+            selects.append(f"min({column}) AS c{index}_min")
+            selects.append(f"max({column}) AS c{index}_max")
+
+    # CDC rows keep a deleted_at timestamp; deleted_by = 0 marks live rows.
+    where = ""
+    if SOFT_DELETE_COLUMN in table.column_names():
+        where = f" WHERE {_quote(SOFT_DELETE_COLUMN)} = 0"
+    query = text(
+        f"SELECT {', '.join(selects)} FROM {_quote(table.database)}.{_quote(table.name)}{where}"
+    ).execution_options(settings={"readonly": 1, "max_execution_time": STATS_QUERY_TIMEOUT})
+
+    with engine.connect() as conn:
+        row = conn.execute(query).mappings().one()
+
+    stats = TableStats(table=table.full_name, row_count=int(row["row_count"]), collected_at=time.time())
+    for index, (name, kind) in enumerate(profiled):
+        column_stats = ColumnStats(name=name)
+        if kind in ("values", "int"):
+            column_stats.distinct = int(row[f"c{index}_distinct"])
+            if column_stats.distinct <= max_distinct:
+                column_stats.values = [value for value in row[f"c{index}_values"] if value not in (None, "")]
+        if kind in ("int", "range") and column_stats.values is None:
+            column_stats.min = row[f"c{index}_min"]
+            column_stats.max = row[f"c{index}_max"]
+        if kind == "values" and column_stats.values is None:
+            continue  # high-cardinality text: nothing useful to show
+        stats.columns.append(column_stats)
+    return stats
+
+
+class ColumnStatsStore:
+    """Per-process statistics, refreshed in the background every ``refresh_seconds``."""
+
+    def __init__(self, refresh_seconds: float, max_distinct: int):
+        self.refresh_seconds = refresh_seconds
+        self.max_distinct = max_distinct
+        self._lock = threading.Lock()
+        self._stats: dict[str, TableStats] = {}
+        self._refreshed_at = 0.0
+        self._refreshing = False
+
+    def get(self, table: str) -> TableStats | None:
+        with self._lock:
+            return self._stats.get(table)
+
+    def _is_stale(self) -> bool:
+        return time.monotonic() - self._refreshed_at >= self.refresh_seconds
+
+    def ensure_fresh(self, engine: Any, tables: list[TableInfo]) -> None:
+        """Start a background refresh when stale; never blocks the caller."""
+        with self._lock:
+            if self._refreshing or not self._is_stale():
+                return
+            self._refreshing = True
+        threading.Thread(
+            target=self.refresh,
+            args=(engine, list(tables)),
+            name="column-stats-refresh",
+            daemon=True,
+        ).start()
+
+    def refresh(self, engine: Any, tables: list[TableInfo]) -> None:
+        started = time.monotonic()
+        collected = 0
+        try:
+            for table in tables:
+                try:
+                    stats = collect_table_stats(engine, table, self.max_distinct)
+                except Exception as exc:
+                    logger.warning("Column stats for %s failed: %s", table.full_name, exc)
+                    continue
+                with self._lock:
+                    self._stats[table.full_name] = stats
+                collected += 1
+        finally:
+            with self._lock:
+                self._refreshed_at = time.monotonic()
+                self._refreshing = False
+        logger.info(
+            "Column stats refreshed for %d/%d tables in %.1fs.",
+            collected,
+            len(tables),
+            time.monotonic() - started,
+        )
+
+    def snippet(self, tables: list[TableInfo]) -> str:
+        lines = []
+        for table in tables:
+            stats = self.get(table.full_name)
+            record_cache_lookup("column_stats", hit=stats is not None)
+            if stats is not None:
+                lines.append(stats.render())
+        if not lines:
+            return ""
+        return "COLUMN STATS (known values and ranges; use these exact literals):\n" + "\n".join(lines)
+
+
+column_stats_store = ColumnStatsStore(
+    refresh_seconds=settings.COLUMN_STATS_REFRESH_SECONDS,
+    max_distinct=settings.COLUMN_STATS_MAX_DISTINCT,
+)
+
+
+def get_column_stats_snippet(engine: Any, all_tables: list[TableInfo], tables: list[TableInfo]) -> str:
+    """Stats snippet for ``tables``; schedules a refresh of ``all_tables`` if stale."""
+    if not settings.COLUMN_STATS_ENABLED:
+        return ""
+    column_stats_store.ensure_fresh(engine, all_tables)
+    return column_stats_store.snippet(tables)
@@ -0,0 +1,83 @@
+"""Columnar fetch path: ClickHouse results straight into a pandas DataFrame.
+
+Agents that analyse whole result sets (timeseries, compare) ask for it by
+setting the "columnar" key in the agent context (``columnar_context``).
+The query then goes through clickhouse-connect's native ``query_df`` on the
+pooled connection: columns arrive as typed NumPy buffers with the server's
+dtypes instead of Python row tuples, and up to ``COLUMNAR_MAX_ROWS`` rows are
+kept. The ``QueryResult`` carries the frame plus a short row preview for
+prompts.
+"""
+
+import time
+from typing import Any
+
+import pandas as pd
+
+from app.agents.database.schemas import MAX_TEXT_ROWS, QueryResult
+from app.core.config import settings
+from app.core.database import MAX_TRACED_STATEMENT_CHARS
+from app.core.metrics import DB_QUERY_DURATION, DB_QUERY_ROWS
+from app.core.tracing import span
+
+COLUMNAR_KEY = "columnar"
+
+
+def columnar_context(context: dict | None) -> dict:
+    return {**(context or {}), COLUMNAR_KEY: True}
+
+
+def columnar_requested(context: dict | None) -> bool:
+    return bool(context and context.get(COLUMNAR_KEY))
+
+
+def _preview_rows(frame: pd.DataFrame) -> list[list]:
+    preview = frame.head(MAX_TEXT_ROWS).astype(object)
+    return preview.where(preview.notna(), None).values.tolist()
+
+
+def fetch_columnar(
+    engine: Any,
+    sql: str,
+    query_settings: dict | None = None,
+    max_rows: int | None = None,
+) -> QueryResult:
+    max_rows = max_rows or settings.COLUMNAR_MAX_ROWS
+    fetch_settings = {
+        "max_result_rows": max_rows,
+        "result_overflow_mode": "break",
+        **(query_settings or {}),
+    }
+    with span(
+        "clickhouse.query",
+        db_system="clickhouse",
+        statement=sql[:MAX_TRACED_STATEMENT_CHARS],
+        fetch="columnar",
+    ) as current:
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            with engine.connect() as conn:
+                client = conn.connection.dbapi_connection.client
+                frame = client.query_df(sql, settings=fetch_settings)
+            outcome = "ok"
+        finally:
+            DB_QUERY_DURATION.labels(system="clickhouse", outcome=outcome).observe(
+                time.perf_counter() - started
+            )
+        # "break" stops at a block boundary, so the server may overshoot.
+        truncated = len(frame) >= max_rows
+        if len(frame) > max_rows:
+            frame = frame.iloc[:max_rows]
+        DB_QUERY_ROWS.labels(system="clickhouse").observe(len(frame))
+        current.set(rows=len(frame), truncated=truncated)
+
+    return QueryResult(
+        columns=[str(column) for column in frame.columns],
+        rows=_preview_rows(frame),
+        row_count=len(frame),
+        sql=sql,
+        types=[str(dtype) for dtype in frame.dtypes],
+        frame=frame,
+        truncated=truncated,
+    )
@@ -0,0 +1,343 @@
+"""In-memory catalog of sites, ponds and running cultivation cycles.
+
+The planner used to read the full active-site list from ClickHouse on every
+chat and paste all of it into the routing and command prompts, which grows
+with the customer base. The catalog is loaded once per process and refreshed
+in the background every ``refresh_seconds``; mentions in a question are
+resolved locally and only the matched entities (with their ids) reach the
+prompts.
+
+Site names are matched fuzzily: character-trigram similarity against the
+whole name, or a run of words that each match a word of the name within a
+small edit distance ("teluk tomni" -> ARONA TELUK TOMINI). Pond names are
+short codes (F1, A3) and only match exactly, ignoring case and spaces.
+
+Scoring every site against every word window is too slow for thousands of
+sites, so a snapshot indexes site names by trigram and by word: only sites
+that share enough trigrams with the question, or contain a word close to a
+question word, are scored.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any
+
+from sqlmodel import text
+
+from app.core.config import settings
+from app.core.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# Minimum score for a site mention; scores are in [0, 1].
+SITE_MATCH_THRESHOLD = 0.6
+# Per-word similarity (1 - edit distance / length) for partial site mentions.
+WORD_MATCH_RATIO = 0.8
+# Partial mentions shorter than this (in characters) are ignored.
+MIN_PARTIAL_CHARS = 4
+MAX_SITE_MATCHES = 5
+MAX_POND_MATCHES = 10
+
+# Words that appear in many site names and never identify one on their own.
+_GENERIC_WORDS = frozenset({"kolam", "pond", "site", "tambak", "lokasi", "farm", "blok", "block"})
+
+_WORD_RE = re.compile(r"[0-9a-z]+")
+
+
+@dataclass(frozen=True)
+class Site:
+    id: int
+    name: str
+
+
+@dataclass(frozen=True)
+class Pond:
+    id: int
+    name: str
+    site_id: int
+
+
+@dataclass(frozen=True)
+class Cultivation:
+    id: int
+    pond_id: int
+    periode_siklus: int
+
+
+def _words(value: str) -> list[str]:
+    return _WORD_RE.findall(value.lower())
+
+
+def _trigrams(value: str) -> set[str]:
+    padded = f"  {value} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def trigram_similarity(a: str, b: str) -> float:
+    left, right = _trigrams(a), _trigrams(b)
+    return len(left & right) / len(left | right) if left and right else 0.0
+
+
+@lru_cache(maxsize=65536)
+def edit_ratio(a: str, b: str) -> float:
+    """1 - Levenshtein distance / length of the longer string."""
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return 1 - previous[-1] / max(len(a), len(b))
+
+
+def _site_score(window: list[str], name_words: list[str]) -> float:
+    whole = trigram_similarity(" ".join(window), " ".join(name_words))
+    if sum(len(word) for word in window) < MIN_PARTIAL_CHARS:
+        return whole
+    if len(window) == 1 and window[0] in _GENERIC_WORDS:
+        return whole
+    remaining = list(name_words)
+    matched_chars = 0
+    for word in window:
+        best = max(remaining, key=lambda candidate: edit_ratio(word, candidate), default=None)
+        if best is None or edit_ratio(word, best) < WORD_MATCH_RATIO:
+            return whole
+        remaining.remove(best)
+        matched_chars += len(best)
+    coverage = matched_chars / sum(len(word) for word in name_words)
+    return max(whole, SITE_MATCH_THRESHOLD + (1 - SITE_MATCH_THRESHOLD) * coverage)
+
+
+@dataclass
+class EntityMatches:
+    sites: list[Site] = field(default_factory=list)
+    ponds: list[Pond] = field(default_factory=list)
+    # pond id -> running cycle
+    cultivations: dict[int, Cultivation] = field(default_factory=dict)
+    site_names: dict[int, str] = field(default_factory=dict)
+
+    def __bool__(self) -> bool:
+        return bool(self.sites or self.ponds)
+
+    def render(self) -> str:
+        """Prompt snippet listing only the matched entities; empty when nothing matched."""
+        if not self:
+            return ""
+        lines = ["ENTITAS YANG DISEBUT (nama persis di database):"]
+        for site in self.sites:
+            lines.append(f"- Site: {site.name} (site_id {site.id})")
+        for pond in self.ponds:
+            line = f"- Kolam: {pond.name} (pond_id {pond.id}) di site {self.site_names.get(pond.site_id, pond.site_id)}"
+            cultivation = self.cultivations.get(pond.id)
+            if cultivation is not None:
+                line += f"; siklus aktif periode {cultivation.periode_siklus} (cultivation_id {cultivation.id})"
+            lines.append(line)
+        lines.append("Gunakan nama PERSIS di atas di routed_input, walaupun user menyebutnya sebagian atau salah eja.")
+        return "\n".join(lines)
+
+
+@dataclass
+class CatalogSnapshot:
+    sites: list[Site] = field(default_factory=list)
+    ponds: list[Pond] = field(default_factory=list)
+    cultivations: list[Cultivation] = field(default_factory=list)
+    loaded_at: float = 0.0
+
+    def __post_init__(self) -> None:
+        self._site_words = [(site, _words(site.name)) for site in self.sites]
+        # Indexes into _site_words: by trigram of the full name (with the
+        # trigram count of each name) and by name word.
+        self._sites_by_trigram: dict[str, list[int]] = {}
+        self._trigram_counts: list[int] = []
+        self._sites_by_word: dict[str, list[int]] = {}
+        for index, (_, name_words) in enumerate(self._site_words):
+            trigrams = _trigrams(" ".join(name_words))
+            self._trigram_counts.append(len(trigrams))
+            for trigram in trigrams:
+                self._sites_by_trigram.setdefault(trigram, []).append(index)
+            for word in set(name_words):
+                self._sites_by_word.setdefault(word, []).append(index)
+        # Trigram -> name words containing it, to find words near a typo.
+        self._vocabulary_by_trigram: dict[str, list[str]] = {}
+        for word in self._sites_by_word:
+            for trigram in _trigrams(word):
+                self._vocabulary_by_trigram.setdefault(trigram, []).append(word)
+        self._ponds_by_key: dict[str, list[Pond]] = {}
+        for pond in self.ponds:
+            self._ponds_by_key.setdefault("".join(_words(pond.name)), []).append(pond)
+        self._cultivation_by_pond = {cultivation.pond_id: cultivation for cultivation in self.cultivations}
+
+    @property
+    def site_names(self) -> list[str]:
+        return [site.name for site in self.sites]
+
+    def _candidate_sites(self, words: list[str]) -> list[int]:
+        """Sites that can reach SITE_MATCH_THRESHOLD for some window of ``words``.
+
+        A whole-name score of 0.6 needs at least 60% of the name's trigrams in
+        the window, and every window trigram is a trigram of the question or
+        of one of its words. A partial match needs each window word within
+        WORD_MATCH_RATIO of a name word, which leaves them a trigram in common.
+        """
+        if not words:
+            return []
+        pool = _trigrams(" ".join(words)).union(*(_trigrams(word) for word in words))
+        shared = Counter(index for trigram in pool for index in self._sites_by_trigram.get(trigram, ()))
+        candidates = {
+            index for index, count in shared.items()
+            if count >= SITE_MATCH_THRESHOLD * self._trigram_counts[index]
+        }
+        for word in set(words):
+            near = {
+                name_word
+                for trigram in _trigrams(word)
+                for name_word in self._vocabulary_by_trigram.get(trigram, ())
+            }
+            for name_word in near:
+                if edit_ratio(word, name_word) >= WORD_MATCH_RATIO:
+                    candidates.update(self._sites_by_word[name_word])
+        return sorted(candidates)
+
+    def match_sites(self, question: str) -> list[tuple[Site, float]]:
+        words = _words(question)
+        # site -> (words covered, score, first word) of its best mention
+        best: dict[Site, tuple[int, float, int]] = {}
+        for index in self._candidate_sites(words):
+            site, name_words = self._site_words[index]
+            for size in range(1, len(name_words) + 1):
+                for start in range(len(words) - size + 1):
+                    score = _site_score(words[start:start + size], name_words)
+                    if score >= SITE_MATCH_THRESHOLD:
+                        best[site] = max(best.get(site, (0, 0.0, 0)), (size, score, start))
+
+        def shadowed(size: int, start: int) -> bool:
+            # "teluk" inside a longer "teluk tomini" mention of another site.
+            return any(
+                other_size > size and other_start <= start and start + size <= other_start + other_size
+                for other_size, _, other_start in best.values()
+            )
+
+        matches = [(site, score) for site, (size, score, start) in best.items() if not shadowed(size, start)]
+        matches.sort(key=lambda item: item[1], reverse=True)
+        return matches[:MAX_SITE_MATCHES]
+
+    def match_ponds(self, question: str, site_ids: set[int]) -> list[Pond]:
+        words = _words(question)
+        found: dict[int, Pond] = {}
+        for size in (1, 2):
+            for start in range(len(words) - size + 1):
+                for pond in self._ponds_by_key.get("".join(words[start:start + size]), []):
+                    found[pond.id] = pond
+        ponds = list(found.values())
+        in_sites = [pond for pond in ponds if pond.site_id in site_ids]
+        return (in_sites or ponds)[:MAX_POND_MATCHES]
+
+    def resolve(self, question: str) -> EntityMatches:
+        sites = [site for site, _ in self.match_sites(question)]
+        ponds = self.match_ponds(question, {site.id for site in sites})
+        return EntityMatches(
+            sites=sites,
+            ponds=ponds,
+            cultivations={
+                pond.id: self._cultivation_by_pond[pond.id]
+                for pond in ponds
+                if pond.id in self._cultivation_by_pond
+            },
+            site_names={site.id: site.name for site in self.sites},
+        )
+
+
+def load_catalog(engine: Any) -> CatalogSnapshot:
+    """Active sites, their ponds and the running cycle of each pond."""
+    query_settings = {"readonly": 1, "max_execution_time": 30}
+    with engine.connect() as conn:
+        sites = conn.execute(text(
+            "SELECT id, name FROM cultivation.sites FINAL "
+            "WHERE deleted_by = 0 AND status = 1 ORDER BY name"
+        ).execution_options(settings=query_settings)).fetchall()
+        ponds = conn.execute(text(
+            "SELECT id, name, site_id FROM cultivation.ponds FINAL "
+            "WHERE deleted_by = 0 AND site_id IN "
+            "(SELECT id FROM cultivation.sites FINAL WHERE deleted_by = 0 AND status = 1)"
+        ).execution_options(settings=query_settings)).fetchall()
+        cultivations = conn.execute(text(
+            "SELECT id, pond_id, periode_siklus FROM cultivation.cultivation FINAL "
+            "WHERE deleted_by = 0 AND status = 1"
+        ).execution_options(settings=query_settings)).fetchall()
+    return CatalogSnapshot(
+        sites=[Site(int(row[0]), str(row[1])) for row in sites if row[1]],
+        ponds=[Pond(int(row[0]), str(row[1]), int(row[2])) for row in ponds if row[1]],
+        cultivations=[Cultivation(int(row[0]), int(row[1]), int(row[2] or 0)) for row in cultivations],
+        loaded_at=time.time(),
+    )
+
+
+class EntityCatalog:
+    """Per-process catalog; the first load blocks, later refreshes run in the background."""
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._snapshot: CatalogSnapshot | None = None
+        self._refreshed_at = 0.0
+        self._refreshing = False
+
+    def snapshot(self, engine: Any) -> CatalogSnapshot:
+        with self._lock:
+            cached = self._snapshot
+            stale = time.monotonic() - self._refreshed_at >= self.refresh_seconds
+            start_refresh = cached is not None and stale and not self._refreshing
+            if start_refresh:
+                self._refreshing = True
+        record_cache_lookup("entity_catalog", hit=cached is not None)
+        if cached is None:
+            return self.refresh(engine)
+        if start_refresh:
+            threading.Thread(
+                target=self.refresh,
+                args=(engine,),
+                name="entity-catalog-refresh",
+                daemon=True,
+            ).start()
+        return cached
+
+    def refresh(self, engine: Any) -> CatalogSnapshot:
+        try:
+            snapshot = load_catalog(engine)
+        except Exception as exc:
+            logger.warning("Entity catalog refresh failed: %s", exc)
+            with self._lock:
+                self._refreshing = False
+                return self._snapshot or CatalogSnapshot()
+        with self._lock:
+            self._snapshot = snapshot
+            self._refreshed_at = time.monotonic()
+            self._refreshing = False
+        logger.info(
+            "Entity catalog loaded: %d sites, %d ponds, %d running cycles.",
+            len(snapshot.sites),
+            len(snapshot.ponds),
+            len(snapshot.cultivations),
+        )
+        return snapshot
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._snapshot = None
+            self._refreshed_at = 0.0
+
+
+entity_catalog = EntityCatalog(refresh_seconds=settings.ENTITY_CATALOG_REFRESH_SECONDS)
+
+
+def get_entity_catalog(engine: Any) -> CatalogSnapshot:
+    return entity_catalog.snapshot(engine)
@@ -1,7 +1,17 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
 from typing import Any
 
 from sqlmodel import text
 
+from app.agents.database.schema_encoding import estimate_tokens, render_compact
+from app.core.config import settings
+from app.core.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
 # Columns injected by Kafka CDC pipeline — never useful for analytical queries.
 _INTERNAL_COLUMNS = frozenset({
     "op", "db", "schema", "table", "lsn", "ts_ms", "txId",
@@ -9,6 +19,9 @@ _INTERNAL_COLUMNS = frozenset({
     "_kafka_offset", "_kafka_timestamp", "_ingestion_time",
 })
 
+# CDC ingestion timestamps, in order of preference, used as freshness watermarks.
+WATERMARK_COLUMNS = ("_ingestion_time", "_kafka_timestamp")
+
 # Databases that contain actual queryable data.
 _ALLOWED_DATABASES = ("cultivation", "transformed_cultivation")
 
@@ -23,51 +36,229 @@ _EXCLUDED_TABLES = frozenset({
 })
 
 
-def get_schema_info(engine: Any) -> str:
-    """Query ClickHouse system.columns and return a clean, LLM-friendly schema string.
+@dataclass
+class ColumnInfo:
+    name: str
+    type: str
+    comment: str = ""
+
+
+@dataclass
+class TableInfo:
+    database: str
+    name: str
+    columns: list[ColumnInfo] = field(default_factory=list)
+    # CDC timestamp column (hidden from the prompt) whose max() moves on ingestion.
+    watermark_column: str = ""
+    # Table engine from ``system.tables`` (empty when unknown).
+    engine: str = ""
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.database}.{self.name}"
+
+    def column_names(self) -> list[str]:
+        return [column.name for column in self.columns]
+
+
+def get_schema_tables(engine: Any) -> list[TableInfo]:
+    """Read the queryable tables and columns from ClickHouse ``system.columns``.
+
+    The table engine comes from ``system.tables``.
 
-    Improvements over the raw dump:
     - Only includes `cultivation` and `transformed_cultivation` databases.
     - Excludes internal Kafka CDC columns (op, db, schema, table, lsn, …).
     - Excludes non-operational tables (auth, content, logging).
-    - Marks soft-delete columns clearly.
     """
     db_filter = ", ".join(f"'{d}'" for d in _ALLOWED_DATABASES)
     query = text(f"""
         SELECT
-            database,
-            table,
-            name,
-            type,
-            comment
-        FROM system.columns
-        WHERE database IN ({db_filter})
-        ORDER BY database, table, position
+            c.database,
+            c.table,
+            c.name,
+            c.type,
+            c.comment,
+            t.engine
+        FROM system.columns AS c
+        LEFT JOIN system.tables AS t ON t.database = c.database AND t.name = c.table
+        WHERE c.database IN ({db_filter})
+        ORDER BY c.database, c.table, c.position
     """)
 
     with engine.connect() as conn:
         rows = conn.execute(query).fetchall()
 
-    if not rows:
-        return "No tables found in the database."
-
-    tables: dict[str, list[str]] = {}
-    for database, table, col_name, col_type, comment in rows:
+    tables: dict[str, TableInfo] = {}
+    for database, table, col_name, col_type, comment, engine in rows:
         if table in _EXCLUDED_TABLES:
             continue
+        full_name = f"{database}.{table}"
+        if full_name not in tables:
+            tables[full_name] = TableInfo(database=database, name=table, engine=engine or "")
+        info = tables[full_name]
         if col_name in _INTERNAL_COLUMNS:
+            if col_name in WATERMARK_COLUMNS and (
+                not info.watermark_column
+                or WATERMARK_COLUMNS.index(col_name) < WATERMARK_COLUMNS.index(info.watermark_column)
+            ):
+                info.watermark_column = col_name
             continue
+        info.columns.append(ColumnInfo(col_name, col_type, comment or ""))
+
+    return [info for info in tables.values() if info.columns]
 
-        full_name = f"{database}.{table}"
-        if full_name not in tables:
-            tables[full_name] = []
 
-        comment_str = f"  -- {comment}" if comment else ""
-        tables[full_name].append(f"  {col_name} {col_type}{comment_str}")
+SCHEMA_ENCODINGS = ("full", "compact")
+
+
+def render_schema(tables: list[TableInfo], encoding: str = "full") -> str:
+    """Render tables as the LLM-friendly ``TABLE db.name:`` block format.
+
+    ``encoding="compact"`` uses the shorter format from ``schema_encoding``.
+    """
+    if encoding == "compact":
+        return render_compact(tables)
+    if not tables:
+        return "No tables found in the database."
 
     parts = []
-    for table_name, columns in tables.items():
+    for table in tables:
+        columns = []
+        for column in table.columns:
+            comment_str = f"  -- {column.comment}" if column.comment else ""
+            columns.append(f"  {column.name} {column.type}{comment_str}")
         cols = "\n".join(columns)
-        parts.append(f"TABLE {table_name}:\n{cols}")
+        parts.append(f"TABLE {table.full_name}:\n{cols}")
 
     return "\n\n".join(parts)
+
+
+def get_schema_info(engine: Any) -> str:
+    """Query ClickHouse system.columns and return a clean, LLM-friendly schema string."""
+    return render_schema(get_schema_tables(engine))
+
+
+def get_schema_fingerprint(engine: Any) -> str:
+    """Cheap change marker for the allowed databases.
+
+    ``metadata_modification_time`` moves on CREATE/ALTER/comment changes, and
+    the table count catches drops; hashing both costs one ``system.tables`` scan
+    instead of the full ``system.columns`` read.
+    """
+    db_filter = ", ".join(f"'{d}'" for d in _ALLOWED_DATABASES)
+    query = text(f"""
+        SELECT
+            count(),
+            toString(max(metadata_modification_time)),
+            toString(groupBitXor(cityHash64(database, name, metadata_modification_time)))
+        FROM system.tables
+        WHERE database IN ({db_filter})
+    """)
+    with engine.connect() as conn:
+        count, latest, digest = conn.execute(query).one()
+    return f"{count}:{latest}:{digest}"
+
+
+@dataclass
+class SchemaSnapshot:
+    """One loaded version of the schema; replaced wholesale on change."""
+
+    tables: list[TableInfo]
+    rendered: str
+    fingerprint: str
+    encoding: str = "full"
+
+
+class SchemaCache:
+    """Per-process cache of the schema.
+
+    Within ``min_refresh_seconds`` of the last check the cached snapshot is
+    returned as-is; after that a fingerprint query decides whether the full
+    ``system.columns`` read is needed.
+    """
+
+    def __init__(self, min_refresh_seconds: float, encoding: str = "full"):
+        if encoding not in SCHEMA_ENCODINGS:
+            logger.warning("Unknown schema encoding '%s', using 'full'.", encoding)
+            encoding = "full"
+        self.min_refresh_seconds = min_refresh_seconds
+        self.encoding = encoding
+        self._lock = threading.Lock()
+        self._snapshot: SchemaSnapshot | None = None
+        self._checked_at = 0.0
+
+    @property
+    def fingerprint(self) -> str | None:
+        return self._snapshot.fingerprint if self._snapshot is not None else None
+
+    def snapshot(self, engine: Any) -> SchemaSnapshot:
+        with self._lock:
+            now = time.monotonic()
+            cached = self._snapshot
+            if cached is not None and now - self._checked_at < self.min_refresh_seconds:
+                record_cache_lookup("schema", hit=True)
+                return cached
+
+            try:
+                fingerprint = get_schema_fingerprint(engine)
+            except Exception as exc:
+                if cached is None:
+                    raise
+                logger.warning("Schema fingerprint check failed, serving cached schema: %s", exc)
+                self._checked_at = now
+                record_cache_lookup("schema", hit=True)
+                return cached
+
+            if cached is not None and fingerprint == cached.fingerprint:
+                self._checked_at = now
+                record_cache_lookup("schema", hit=True)
+                return cached
+
+            record_cache_lookup("schema", hit=False)
+            tables = get_schema_tables(engine)
+            if cached is not None:
+                logger.info("Schema changed (%s -> %s), reloaded.", cached.fingerprint, fingerprint)
+            rendered = render_schema(tables, self.encoding)
+            if self.encoding != "full":
+                logger.info(
+                    "Schema prompt: %d tables, ~%d tokens full, ~%d tokens %s.",
+                    len(tables),
+                    estimate_tokens(render_schema(tables)),
+                    estimate_tokens(rendered),
+                    self.encoding,
+                )
+            self._snapshot = SchemaSnapshot(
+                tables=tables,
+                rendered=rendered,
+                fingerprint=fingerprint,
+                encoding=self.encoding,
+            )
+            self._checked_at = now
+            return self._snapshot
+
+    def get(self, engine: Any) -> str:
+        return self.snapshot(engine).rendered
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._snapshot = None
+            self._checked_at = 0.0
+
+
+schema_cache = SchemaCache(
+    settings.SCHEMA_CACHE_MIN_REFRESH_SECONDS,
+    encoding=settings.SCHEMA_PROMPT_ENCODING,
+)
+
+
+def get_schema_snapshot(engine: Any) -> SchemaSnapshot:
+    return schema_cache.snapshot(engine)
+
+
+def get_cached_schema_info(engine: Any) -> str:
+    return schema_cache.get(engine)
+
+
+def schema_encoding_stats(tables: list[TableInfo]) -> dict[str, int]:
+    """Estimated prompt tokens for every encoding of ``tables``."""
+    return {encoding: estimate_tokens(render_schema(tables, encoding)) for encoding in SCHEMA_ENCODINGS}
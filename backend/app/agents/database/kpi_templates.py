@@ -0,0 +1,342 @@
+"""Curated, parameterized ClickHouse queries for the core KPIs.
+
+Most database questions ask for one KPI (ABW, ADG, SR, FCR, DOC, biomassa,
+size, productivity or a water-quality parameter) for a site or pond over a
+period. The planner's query plan carries a compact intent for those::
+
+    {"metric": "abw", "entity": {"site": "SUMA MARINA", "pond": "F1"},
+     "time_range": {"start": "2024-01-01", "end": "2024-01-31"},
+     "granularity": "week"}
+
+and ``render_kpi_sql`` turns it into a hand-written query, skipping the
+command and NL->SQL generation steps.
+
+The queries aggregate the fact table first and join names onto the small
+result. Sites and ponds are narrowed with ``IN`` subqueries on id columns
+and dates with plain range predicates on the raw date column (never wrapped
+in a function), so ClickHouse can prune on the tables' keys. A template is
+only used when every column it reads exists in the current schema snapshot.
+"""
+
+import datetime
+from dataclasses import dataclass
+
+from app.agents.database.introspect import TableInfo
+
+GRANULARITIES = ("latest", "day", "week", "month", "cycle")
+
+# Window applied when the intent gives no time range.
+DEFAULT_WINDOW_DAYS = 30
+MAX_WINDOW_DAYS = 366
+MAX_ROWS = 1000
+
+_BUCKETS = {
+    "day": "toDate({column})",
+    "week": "toStartOfWeek({column}, 1)",
+    "month": "toStartOfMonth({column})",
+}
+
+CULTIVATION_TABLE = "cultivation.cultivation"
+PONDS_TABLE = "cultivation.ponds"
+SITES_TABLE = "cultivation.sites"
+
+
+@dataclass(frozen=True)
+class KpiTemplate:
+    metric: str
+    label: str
+    # Fact table with dated rows; empty when the KPI only lives on the cycle.
+    table: str = ""
+    date_column: str = ""
+    # "cultivation_id" or "pond_id".
+    link: str = "cultivation_id"
+    # (alias, column) pairs read from the fact table.
+    columns: tuple[tuple[str, str], ...] = ()
+    aggregate: str = "avg"
+    soft_delete: bool = True
+    # (alias, column) pairs on cultivation.cultivation for "cycle" granularity.
+    cycle_columns: tuple[tuple[str, str], ...] = ()
+    # How a cycle column is rendered; ``{column}`` is the qualified column.
+    cycle_expression: str = "{column}"
+    granularities: tuple[str, ...] = ("latest", "day", "week", "month")
+
+    def required_columns(self, granularity: str) -> dict[str, set[str]]:
+        """Columns read by this template, per table (names only, not joins)."""
+        if granularity == "cycle" or not self.table:
+            return {CULTIVATION_TABLE: {"id", "pond_id", "status", "start_doc", "periode_siklus"}
+                    | {column for _, column in self.cycle_columns}}
+        return {self.table: {self.link, self.date_column} | {column for _, column in self.columns}}
+
+
+_SHRIMP = "cultivation.cultivation_shrimp"
+_FEED = "cultivation.cultivation_feed"
+_WATER = "transformed_cultivation.cultivation_water_report"
+_HARVEST = "transformed_cultivation.budidaya_panen_report_v2"
+
+
+def _water(metric: str, label: str, *columns: str) -> KpiTemplate:
+    return KpiTemplate(
+        metric=metric,
+        label=label,
+        table=_WATER,
+        date_column="report_date",
+        link="pond_id",
+        columns=tuple((column, column) for column in columns),
+        soft_delete=False,
+    )
+
+
+KPI_TEMPLATES: dict[str, KpiTemplate] = {
+    template.metric: template
+    for template in (
+        KpiTemplate(
+            metric="abw", label="ABW (gram)", table=_SHRIMP, date_column="tanggal",
+            columns=(("abw", "avg_body_weight"),), cycle_columns=(("abw", "abw"),),
+            granularities=GRANULARITIES,
+        ),
+        KpiTemplate(
+            metric="adg", label="ADG (gram/hari)", table=_SHRIMP, date_column="tanggal",
+            columns=(("adg", "avg_daily_growth"),), cycle_columns=(("adg", "adg"),),
+            granularities=GRANULARITIES,
+        ),
+        KpiTemplate(
+            metric="sr", label="SR (%)", table=_SHRIMP, date_column="tanggal",
+            columns=(("sr", "survival_rate"),), cycle_columns=(("sr", "sr"),),
+            granularities=GRANULARITIES,
+        ),
+        KpiTemplate(
+            metric="biomassa", label="Biomassa (kg)", table=_SHRIMP, date_column="tanggal",
+            columns=(("biomassa", "total_biomassa"),), cycle_columns=(("biomassa", "biomassa"),),
+            granularities=GRANULARITIES,
+        ),
+        KpiTemplate(
+            metric="size", label="Size (ekor/kg)", table=_SHRIMP, date_column="tanggal",
+            columns=(("size", "ukuran_udang"),),
+        ),
+        KpiTemplate(
+            metric="fcr", label="FCR", table=_FEED, date_column="tanggal",
+            columns=(("fcr", "fcr"), ("pakan_kumulatif", "pemberian_pakan_kumulative")),
+            aggregate="max", cycle_columns=(("fcr", "fcr"),),
+            granularities=GRANULARITIES,
+        ),
+        KpiTemplate(
+            metric="doc", label="DOC (hari)",
+            cycle_columns=(("doc", "start_doc"),),
+            cycle_expression="dateDiff('day', {column}, today())",
+            granularities=("latest",),
+        ),
+        KpiTemplate(
+            metric="productivity", label="Produktivitas (ton/ha)", table=_HARVEST,
+            date_column="report_date", link="pond_id",
+            columns=(("productivity", "productivity"), ("total_biomassa", "total_biomassa")),
+            aggregate="sum", soft_delete=False,
+        ),
+        _water("do", "DO (mg/L)", "do_subuh", "do_malam"),
+        _water("ph", "pH", "ph_pagi", "ph_sore"),
+        _water("salinitas", "Salinitas (ppt)", "salinitas"),
+        _water("suhu", "Suhu air (°C)", "suhu_air_pagi", "suhu_air_sore"),
+        _water("nh4", "Ammonium NH4 (mg/L)", "ammonium_nh4"),
+        _water("no2", "Nitrit NO2 (mg/L)", "nitrit_no2"),
+        _water("alkalinitas", "Alkalinitas", "total_alkalinitas"),
+        _water("kecerahan", "Kecerahan", "kecerahan"),
+        _water(
+            "water_quality", "Kualitas air",
+            "do_subuh", "do_malam", "ph_pagi", "ph_sore", "salinitas",
+            "suhu_air_pagi", "suhu_air_sore", "ammonium_nh4", "nitrit_no2",
+        ),
+    )
+}
+
+
+@dataclass
+class KpiIntent:
+    metric: str
+    site: str = ""
+    pond: str = ""
+    start: datetime.date | None = None
+    end: datetime.date | None = None
+    last_days: int | None = None
+    granularity: str = "latest"
+
+    @classmethod
+    def from_payload(cls, payload: object) -> "KpiIntent | None":
+        """Parse the planner's intent object; None when it names no registered KPI."""
+        if not isinstance(payload, dict):
+            return None
+        metric = str(payload.get("metric") or "").strip().lower()
+        if metric not in KPI_TEMPLATES:
+            return None
+        granularity = str(payload.get("granularity") or "latest").strip().lower()
+        if granularity not in KPI_TEMPLATES[metric].granularities:
+            return None
+
+        entity = payload.get("entity") if isinstance(payload.get("entity"), dict) else {}
+        intent = cls(
+            metric=metric,
+            site=str(entity.get("site") or "").strip(),
+            pond=str(entity.get("pond") or "").strip(),
+            granularity=granularity,
+        )
+
+        time_range = payload.get("time_range")
+        if isinstance(time_range, dict):
+            try:
+                if time_range.get("start"):
+                    intent.start = datetime.date.fromisoformat(str(time_range["start"]))
+                if time_range.get("end"):
+                    intent.end = datetime.date.fromisoformat(str(time_range["end"]))
+                if time_range.get("last_days") is not None:
+                    intent.last_days = int(time_range["last_days"])
+            except (TypeError, ValueError):
+                return None
+            if intent.start and intent.end and intent.start > intent.end:
+                return None
+            if intent.last_days is not None and not 0 < intent.last_days <= MAX_WINDOW_DAYS:
+                return None
+        elif time_range is not None:
+            return None
+        return intent
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def _date_filter(column: str, intent: KpiIntent) -> list[str]:
+    predicates = []
+    if intent.start:
+        predicates.append(f"{column} >= toDate({_quote(intent.start.isoformat())})")
+    if intent.end:
+        predicates.append(f"{column} < toDate({_quote(intent.end.isoformat())}) + 1")
+    if intent.last_days is not None:
+        predicates.append(f"{column} >= today() - {intent.last_days}")
+    if not predicates:
+        predicates.append(f"{column} >= today() - {DEFAULT_WINDOW_DAYS}")
+    return predicates
+
+
+def _pond_ids(intent: KpiIntent) -> str | None:
+    """Subquery selecting the ids of the ponds the intent names, or None for all ponds."""
+    if not intent.site and not intent.pond:
+        return None
+    conditions = ["deleted_by = 0"]
+    if intent.pond:
+        conditions.append(f"name = {_quote(intent.pond)}")
+    if intent.site:
+        conditions.append(
+            f"site_id IN (SELECT id FROM {SITES_TABLE} FINAL "
+            f"WHERE deleted_by = 0 AND name = {_quote(intent.site)})"
+        )
+    return f"SELECT id FROM {PONDS_TABLE} FINAL WHERE {' AND '.join(conditions)}"
+
+
+def _cultivation_ids(intent: KpiIntent, active_only: bool) -> str | None:
+    pond_ids = _pond_ids(intent)
+    if pond_ids is None and not active_only:
+        return None
+    conditions = ["deleted_by = 0"]
+    if active_only:
+        conditions.append("status = 1")
+    if pond_ids is not None:
+        conditions.append(f"pond_id IN ({pond_ids})")
+    return f"SELECT id FROM {CULTIVATION_TABLE} FINAL WHERE {' AND '.join(conditions)}"
+
+
+def _name_joins(link: str, source: str) -> str:
+    joins = []
+    if link == "cultivation_id":
+        joins.append(f"JOIN {CULTIVATION_TABLE} AS c FINAL ON c.id = {source}.cultivation_id AND c.deleted_by = 0")
+        pond_key = "c.pond_id"
+    else:
+        pond_key = f"{source}.pond_id"
+    joins.append(f"JOIN {PONDS_TABLE} AS p FINAL ON p.id = {pond_key} AND p.deleted_by = 0")
+    joins.append(f"JOIN {SITES_TABLE} AS s FINAL ON s.id = p.site_id AND s.deleted_by = 0")
+    return "\n".join(joins)
+
+
+def _render_cycle(template: KpiTemplate, intent: KpiIntent) -> str:
+    values = ", ".join(
+        f"{template.cycle_expression.format(column=f'c.{column}')} AS {alias}"
+        for alias, column in template.cycle_columns
+    )
+    conditions = ["c.deleted_by = 0"]
+    if intent.granularity == "latest":
+        conditions.append("c.status = 1")
+    pond_ids = _pond_ids(intent)
+    if pond_ids is not None:
+        conditions.append(f"c.pond_id IN ({pond_ids})")
+    if intent.start:
+        conditions.append(f"c.start_doc >= toDate({_quote(intent.start.isoformat())})")
+    if intent.end:
+        conditions.append(f"c.start_doc < toDate({_quote(intent.end.isoformat())}) + 1")
+    return (
+        f"SELECT s.name AS site, p.name AS kolam, c.periode_siklus, c.status, {values}\n"
+        f"FROM {CULTIVATION_TABLE} AS c FINAL\n"
+        f"JOIN {PONDS_TABLE} AS p FINAL ON p.id = c.pond_id AND p.deleted_by = 0\n"
+        f"JOIN {SITES_TABLE} AS s FINAL ON s.id = p.site_id AND s.deleted_by = 0\n"
+        f"WHERE {' AND '.join(conditions)}\n"
+        f"ORDER BY site, kolam, c.periode_siklus DESC\n"
+        f"LIMIT {MAX_ROWS}"
+    )
+
+
+def _render_facts(template: KpiTemplate, intent: KpiIntent) -> str:
+    date = f"t.{template.date_column}"
+    conditions = []
+    if template.soft_delete:
+        conditions.append("t.deleted_by = 0")
+    if template.link == "cultivation_id":
+        # "latest" reads the running cycles only.
+        ids = _cultivation_ids(intent, active_only=intent.granularity == "latest")
+    else:
+        ids = _pond_ids(intent)
+    if ids is not None:
+        conditions.append(f"t.{template.link} IN ({ids})")
+    conditions.extend(_date_filter(date, intent))
+
+    if intent.granularity == "latest":
+        period = f"max({date}) AS tanggal"
+        values = [f"argMax(t.{column}, {date}) AS {alias}" for alias, column in template.columns]
+        group_by = f"t.{template.link}"
+    else:
+        period = f"{_BUCKETS[intent.granularity].format(column=date)} AS periode"
+        values = [
+            f"round({template.aggregate}(t.{column}), 2) AS {alias}" for alias, column in template.columns
+        ]
+        group_by = f"t.{template.link}, periode"
+
+    inner = (
+        f"SELECT t.{template.link}, {period}, {', '.join(values)}\n"
+        f"    FROM {template.table} AS t FINAL\n"
+        f"    WHERE {' AND '.join(conditions)}\n"
+        f"    GROUP BY {group_by}"
+    )
+    outer_period = "k.tanggal" if intent.granularity == "latest" else "k.periode"
+    cycle = ", c.periode_siklus" if template.link == "cultivation_id" else ""
+    aliases = ", ".join(f"k.{alias}" for alias, _ in template.columns)
+    return (
+        f"SELECT s.name AS site, p.name AS kolam{cycle}, {outer_period}, {aliases}\n"
+        f"FROM (\n    {inner}\n) AS k\n"
+        f"{_name_joins(template.link, 'k')}\n"
+        f"ORDER BY site, kolam, {outer_period}\n"
+        f"LIMIT {MAX_ROWS}"
+    )
+
+
+def template_available(template: KpiTemplate, granularity: str, tables: list[TableInfo]) -> bool:
+    """True when every column the template reads exists in ``tables``."""
+    by_name = {table.full_name: set(table.column_names()) for table in tables}
+    return all(
+        table in by_name and columns <= by_name[table]
+        for table, columns in template.required_columns(granularity).items()
+    )
+
+
+def render_kpi_sql(intent: KpiIntent, tables: list[TableInfo] | None = None) -> str | None:
+    """SQL for ``intent``; None when the template reads columns missing from ``tables``."""
+    template = KPI_TEMPLATES[intent.metric]
+    if tables is not None and not template_available(template, intent.granularity, tables):
+        return None
+    if intent.granularity == "cycle" or not template.table:
+        return _render_cycle(template, intent)
+    return _render_facts(template, intent)
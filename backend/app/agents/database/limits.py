@@ -0,0 +1,155 @@
+"""Resource limits for agent-generated SQL.
+
+Every query the database agent runs carries ClickHouse settings that bound
+what one statement can cost: ``readonly=1``, ``max_execution_time``,
+``max_result_rows`` with ``result_overflow_mode=break`` (the result is cut
+short instead of failing), ``max_bytes_to_read`` and ``max_memory_usage``.
+Callers name themselves with ``query_profile_context`` ("report",
+"timeseries", ...) and ``DB_QUERY_LIMITS`` overrides the defaults per
+profile; its ``default_limit`` is the LIMIT ``sql_guard`` appends to queries
+without one, so an unbounded scan never streams millions of rows into Python.
+
+When the server stops a query on one of these limits the ClickHouse error is
+turned into ``QueryLimitExceeded``, whose ``to_prompt`` is a small JSON
+object the NL->SQL retry prompt can act on (aggregate, filter, narrow the
+date range) instead of a raw stack trace.
+"""
+
+import json
+import re
+from dataclasses import asdict, dataclass, replace
+
+from app.agents.database.columnar import columnar_requested
+from app.core.config import settings
+
+QUERY_PROFILE_KEY = "query_profile"
+DEFAULT_PROFILE = "database"
+
+# ClickHouse error code -> the limit that stopped the query.
+LIMIT_ERROR_CODES = {
+    158: "max_rows_to_read",
+    159: "max_execution_time",
+    241: "max_memory_usage",
+    307: "max_bytes_to_read",
+    396: "max_result_rows",
+}
+
+_LIMIT_HINTS = {
+    "max_rows_to_read": "Filter on the sort key columns (ids, dates) so fewer rows are scanned.",
+    "max_execution_time": "Narrow the date range or filter by site/pond before aggregating.",
+    "max_memory_usage": "Aggregate before joining and avoid GROUP BY on high-cardinality columns.",
+    "max_bytes_to_read": "Select only the needed columns and filter on the date column.",
+    "max_result_rows": "Aggregate the data or add a tighter LIMIT.",
+    "max_estimated_rows": "Filter on the date column and site/pond/cycle ids so fewer granules are read.",
+    "max_estimated_marks": "Filter on the date column and site/pond/cycle ids so fewer granules are read.",
+}
+
+_ERROR_CODE_RE = re.compile(r"\bCode:\s*(\d+)")
+
+
+@dataclass(frozen=True)
+class QueryLimits:
+    readonly: int = 1
+    max_execution_time: int = 30
+    max_result_rows: int = 10_000
+    max_bytes_to_read: int = 10_000_000_000
+    max_memory_usage: int = 4_000_000_000
+    # Appended as LIMIT when the query has none (0 disables injection).
+    default_limit: int = 1000
+    # Pre-flight caps on the EXPLAIN ESTIMATE of a query (0 disables).
+    max_estimated_rows: int = 0
+    max_estimated_marks: int = 0
+
+    def settings(self) -> dict:
+        query_settings = {
+            "readonly": self.readonly,
+            "max_execution_time": self.max_execution_time,
+            "max_result_rows": self.max_result_rows,
+            "result_overflow_mode": "break",
+            "max_bytes_to_read": self.max_bytes_to_read,
+            "max_memory_usage": self.max_memory_usage,
+        }
+        # 0 means "unlimited" to ClickHouse; leave those to the server profile.
+        return {key: value for key, value in query_settings.items() if value != 0 or key == "readonly"}
+
+
+class QueryLimitExceeded(Exception):
+    """A query stopped by one of the ``QueryLimits`` settings."""
+
+    def __init__(self, limit: str, value: int | None, detail: str = "", estimate: dict | None = None):
+        self.limit = limit
+        self.value = value
+        self.detail = detail
+        self.estimate = estimate
+        super().__init__(f"Query exceeded {limit}" + (f" ({value})" if value else ""))
+
+    def to_dict(self) -> dict:
+        payload = {
+            "error": "query_limit_exceeded",
+            "limit": self.limit,
+            "value": self.value,
+            "hint": _LIMIT_HINTS.get(self.limit, ""),
+        }
+        if self.estimate is not None:
+            payload["estimate"] = self.estimate
+        return payload
+
+    def to_prompt(self) -> str:
+        return json.dumps(self.to_dict())
+
+
+def query_profile_context(context: dict | None, profile: str) -> dict:
+    return {**(context or {}), QUERY_PROFILE_KEY: profile}
+
+
+def query_profile(context: dict | None) -> str:
+    return str((context or {}).get(QUERY_PROFILE_KEY) or DEFAULT_PROFILE)
+
+
+def limits_for(context: dict | None) -> QueryLimits:
+    """Defaults from settings, then the caller's ``DB_QUERY_LIMITS`` overrides."""
+    limits = QueryLimits(
+        max_execution_time=settings.DB_QUERY_MAX_EXECUTION_TIME,
+        max_result_rows=settings.DB_QUERY_MAX_RESULT_ROWS,
+        max_bytes_to_read=settings.DB_QUERY_MAX_BYTES_TO_READ,
+        max_memory_usage=settings.DB_QUERY_MAX_MEMORY_USAGE,
+        default_limit=settings.DB_QUERY_DEFAULT_LIMIT,
+        max_estimated_rows=settings.DB_QUERY_MAX_ESTIMATED_ROWS,
+        max_estimated_marks=settings.DB_QUERY_MAX_ESTIMATED_MARKS,
+    )
+    if columnar_requested(context):
+        # DataFrame consumers analyse whole series.
+        limits = replace(
+            limits,
+            max_result_rows=settings.COLUMNAR_MAX_ROWS,
+            default_limit=settings.COLUMNAR_MAX_ROWS,
+        )
+    overrides = settings.DB_QUERY_LIMITS.get(query_profile(context)) or {}
+    known = set(asdict(limits))
+    return replace(limits, **{key: int(value) for key, value in overrides.items() if key in known})
+
+
+def clickhouse_error_code(exc: Exception) -> int | None:
+    """The server error code in a ClickHouse exception message ("Code: 47. DB::Exception ...")."""
+    match = _ERROR_CODE_RE.search(str(exc))
+    return int(match.group(1)) if match else None
+
+
+def limit_exceeded(exc: Exception, limits: QueryLimits) -> QueryLimitExceeded | None:
+    """The ``QueryLimitExceeded`` behind a ClickHouse error, if a limit caused it."""
+    code = clickhouse_error_code(exc)
+    if code is None:
+        return None
+    limit = LIMIT_ERROR_CODES.get(code)
+    if limit is None:
+        return None
+    return QueryLimitExceeded(limit, getattr(limits, limit, None), str(exc)[:500])
+
+
+def truncation_notice(row_count: int) -> str:
+    """Structured note for a result cut short by ``max_result_rows`` or the injected LIMIT."""
+    return json.dumps({
+        "warning": "result_truncated",
+        "rows": row_count,
+        "hint": _LIMIT_HINTS["max_result_rows"],
+    })
@@ -0,0 +1,21 @@
+import time
+from typing import Optional
+
+from sqlmodel import Field, SQLModel
+
+
+class QuestionSqlCacheEntry(SQLModel, table=True):
+    __tablename__ = "db_question_sql_cache"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    question_key: str = Field(index=True, unique=True)
+    question: str
+    sql: str
+    # JSON: literal spans in ``sql`` filled from a new question's values.
+    slots: str = Field(default="[]")
+    # JSON: typed values of the question that produced ``sql``.
+    question_values: str = Field(default="[]")
+    schema_fingerprint: str = Field(index=True)
+    hit_count: int = Field(default=0)
+    created_at: float = Field(default_factory=time.time)
+    last_used_at: float = Field(default_factory=time.time)
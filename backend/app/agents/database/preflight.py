@@ -0,0 +1,103 @@
+"""EXPLAIN ESTIMATE pre-flight for generated SQL.
+
+Before an LLM-written query runs, ClickHouse plans it with
+``EXPLAIN ESTIMATE``. Planning resolves every table, column and function,
+so syntax errors and unknown identifiers come back in milliseconds without
+reading data, and the retry prompt gets the server's message. The estimate
+(parts, rows and marks to read per table) is recorded on the trace span and
+compared with ``QueryLimits.max_estimated_rows`` / ``max_estimated_marks``;
+a query over either cap is rejected with a structured
+``QueryLimitExceeded`` so the LLM narrows it before anything is scanned.
+
+Errors that say nothing about the query (EXPLAIN unsupported for a table
+engine, network trouble) only skip the pre-flight; the query then runs as
+before.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlmodel import text
+
+from app.agents.database.limits import QueryLimitExceeded, QueryLimits, clickhouse_error_code
+
+# ClickHouse error codes that mean the query itself is wrong.
+QUERY_ERROR_CODES = {
+    43: "ILLEGAL_TYPE_OF_ARGUMENT",
+    46: "UNKNOWN_FUNCTION",
+    47: "UNKNOWN_IDENTIFIER",
+    53: "TYPE_MISMATCH",
+    60: "UNKNOWN_TABLE",
+    62: "SYNTAX_ERROR",
+    81: "UNKNOWN_DATABASE",
+    184: "ILLEGAL_AGGREGATION",
+    215: "NOT_AN_AGGREGATE",
+    352: "AMBIGUOUS_COLUMN_NAME",
+}
+
+
+class PreflightError(ValueError):
+    """EXPLAIN rejected the query; the message is meant for the retry prompt."""
+
+    def __init__(self, code: int, message: str):
+        self.code = code
+        self.name = QUERY_ERROR_CODES.get(code, "")
+        super().__init__(f"EXPLAIN rejected the query ({self.name or code}): {message}")
+
+
+@dataclass
+class QueryEstimate:
+    parts: int = 0
+    rows: int = 0
+    marks: int = 0
+    # One entry per table: database, table, parts, rows, marks.
+    tables: list[dict] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {"parts": self.parts, "rows": self.rows, "marks": self.marks, "tables": self.tables}
+
+
+def explain_estimate(engine: Any, sql: str, timeout: int) -> QueryEstimate:
+    """Run ``EXPLAIN ESTIMATE``; query errors raise ``PreflightError``, others propagate."""
+    statement = text(f"EXPLAIN ESTIMATE {sql}").execution_options(
+        settings={"readonly": 1, "max_execution_time": timeout}
+    )
+    try:
+        with engine.connect() as conn:
+            result = conn.execute(statement)
+            columns = list(result.keys())
+            rows = [dict(zip(columns, row)) for row in result.fetchall()]
+    except Exception as exc:
+        code = clickhouse_error_code(exc)
+        if code in QUERY_ERROR_CODES:
+            raise PreflightError(code, str(exc)[:500]) from exc
+        raise
+
+    tables = [
+        {
+            "table": f"{row.get('database', '')}.{row.get('table', '')}",
+            "parts": int(row.get("parts") or 0),
+            "rows": int(row.get("rows") or 0),
+            "marks": int(row.get("marks") or 0),
+        }
+        for row in rows
+    ]
+    return QueryEstimate(
+        parts=sum(table["parts"] for table in tables),
+        rows=sum(table["rows"] for table in tables),
+        marks=sum(table["marks"] for table in tables),
+        tables=tables,
+    )
+
+
+def check_estimate(estimate: QueryEstimate, limits: QueryLimits) -> None:
+    """Raise ``QueryLimitExceeded`` when the estimate is over a pre-flight cap."""
+    for limit, estimated in (("max_estimated_rows", estimate.rows), ("max_estimated_marks", estimate.marks)):
+        cap = getattr(limits, limit)
+        if cap and estimated > cap:
+            raise QueryLimitExceeded(
+                limit,
+                cap,
+                f"estimated {estimated} > {cap}",
+                estimate=estimate.to_dict(),
+            )
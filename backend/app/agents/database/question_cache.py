@@ -0,0 +1,164 @@
+"""Persistent question -> SQL cache with learned templates.
+
+Operators repeat the same questions all day. Once a question has produced
+SQL that validated and executed successfully, its pattern (see
+``sql_templates``: words, with entity names, dates and numbers as typed
+placeholders) maps to that SQL and the literals that carried the question's
+values. The next question with the same pattern skips plan, command and
+NL->SQL generation: its own values are filled into the SQL locally and it
+runs directly. A repeat of the exact question is the zero-change case.
+
+Entries are tied to the schema fingerprint they were created under and are
+dropped when the ClickHouse schema changes.
+"""
+
+import json
+import logging
+import time
+
+from sqlmodel import Session, delete, func, select
+
+from app.agents.database.models import QuestionSqlCacheEntry
+from app.agents.database.sql_templates import (
+    ParsedQuestion,
+    fill_template,
+    induce_slots,
+    parse_question,
+    serialize_values,
+)
+from app.core.config import settings
+from app.core.database import app_engine
+from app.core.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+
+def canonicalize_question(question: str, entity_names: list[str] | None = None) -> str:
+    """Lowercased words with entity mentions replaced by their full names."""
+    return parse_question(question, entity_names).canonical
+
+
+def question_key(question: str, entity_names: list[str] | None = None) -> str:
+    return parse_question(question, entity_names).key
+
+
+def _entry_to_dict(entry: QuestionSqlCacheEntry) -> dict:
+    return {
+        "id": int(entry.id) if entry.id is not None else 0,
+        "question": entry.question,
+        "sql": entry.sql,
+        "slots": json.loads(entry.slots or "[]"),
+        "schema_fingerprint": entry.schema_fingerprint,
+        "hit_count": entry.hit_count,
+        "created_at": float(entry.created_at),
+        "last_used_at": float(entry.last_used_at),
+    }
+
+
+class QuestionSqlStore:
+    def __init__(self, engine=app_engine, max_entries: int | None = None):
+        self.engine = engine
+        self.max_entries = max_entries if max_entries is not None else settings.QUESTION_CACHE_MAX_ENTRIES
+
+    def lookup(self, parsed: ParsedQuestion, schema_fingerprint: str) -> str | None:
+        """SQL for ``parsed`` (template filled locally); entries from another schema are dropped."""
+        with Session(self.engine) as session:
+            entry = session.exec(
+                select(QuestionSqlCacheEntry).where(QuestionSqlCacheEntry.question_key == parsed.key)
+            ).first()
+            if entry is not None and entry.schema_fingerprint != schema_fingerprint:
+                self._purge_other_schemas(session, schema_fingerprint)
+                session.commit()
+                entry = None
+            sql = None
+            if entry is not None:
+                sql = fill_template(
+                    entry.sql,
+                    json.loads(entry.slots or "[]"),
+                    json.loads(entry.question_values or "[]"),
+                    parsed,
+                )
+            record_cache_lookup("question_sql", hit=sql is not None)
+            if sql is None:
+                return None
+            entry.hit_count += 1
+            entry.last_used_at = time.time()
+            session.add(entry)
+            session.commit()
+            return sql
+
+    def remember(self, parsed: ParsedQuestion, question: str, sql: str, schema_fingerprint: str) -> None:
+        now = time.time()
+        slots = json.dumps(induce_slots(sql, parsed))
+        values = json.dumps(serialize_values(parsed))
+        with Session(self.engine) as session:
+            entry = session.exec(
+                select(QuestionSqlCacheEntry).where(QuestionSqlCacheEntry.question_key == parsed.key)
+            ).first()
+            if entry is None:
+                entry = QuestionSqlCacheEntry(
+                    question_key=parsed.key,
+                    question=question,
+                    sql=sql,
+                    slots=slots,
+                    question_values=values,
+                    schema_fingerprint=schema_fingerprint,
+                    created_at=now,
+                    last_used_at=now,
+                )
+            else:
+                entry.question = question
+                entry.sql = sql
+                entry.slots = slots
+                entry.question_values = values
+                entry.schema_fingerprint = schema_fingerprint
+                entry.last_used_at = now
+            session.add(entry)
+            session.commit()
+            self._enforce_max_entries(session)
+
+    def forget(self, key: str) -> None:
+        with Session(self.engine) as session:
+            session.exec(delete(QuestionSqlCacheEntry).where(QuestionSqlCacheEntry.question_key == key))
+            session.commit()
+
+    def list_entries(self) -> list[dict]:
+        with Session(self.engine) as session:
+            entries = session.exec(
+                select(QuestionSqlCacheEntry).order_by(QuestionSqlCacheEntry.last_used_at.desc())
+            ).all()
+            return [_entry_to_dict(entry) for entry in entries]
+
+    def evict(self, entry_id: int) -> bool:
+        with Session(self.engine) as session:
+            result = session.exec(delete(QuestionSqlCacheEntry).where(QuestionSqlCacheEntry.id == entry_id))
+            session.commit()
+            return bool(result.rowcount)
+
+    def clear(self) -> int:
+        with Session(self.engine) as session:
+            result = session.exec(delete(QuestionSqlCacheEntry))
+            session.commit()
+            return result.rowcount or 0
+
+    @staticmethod
+    def _purge_other_schemas(session: Session, schema_fingerprint: str) -> None:
+        session.exec(
+            delete(QuestionSqlCacheEntry).where(QuestionSqlCacheEntry.schema_fingerprint != schema_fingerprint)
+        )
+
+    def _enforce_max_entries(self, session: Session) -> None:
+        count = session.exec(select(func.count()).select_from(QuestionSqlCacheEntry)).one()
+        excess = count - self.max_entries
+        if excess <= 0:
+            return
+        oldest = session.exec(
+            select(QuestionSqlCacheEntry.id)
+            .order_by(QuestionSqlCacheEntry.last_used_at.asc())
+            .limit(excess)
+        ).all()
+        session.exec(delete(QuestionSqlCacheEntry).where(QuestionSqlCacheEntry.id.in_(oldest)))
+        session.commit()
+
+
+question_sql_store = QuestionSqlStore()
@@ -0,0 +1,255 @@
+"""Query result cache in front of ``DatabaseAgent._execute_sql``.
+
+Dashboards and repeated questions run identical SQL. Results are kept in a
+size-bounded LRU keyed by normalized SQL (whitespace, keyword casing,
+comments and numeric literal spelling do not matter; literal values do).
+
+An entry expires after the smallest TTL of the tables it reads, and is
+dropped as soon as the ingestion watermark (max ``_ingestion_time`` /
+``_kafka_timestamp``) of any of those tables moves, so a cached answer is
+never staler than the CDC pipeline. Watermarks are re-read at most every
+``watermark_check_seconds`` with one query for all referenced tables.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass, replace
+from typing import Any
+
+from sqlmodel import text
+
+from app.agents.database.introspect import TableInfo
+from app.agents.database.schemas import QueryResult
+from app.core.config import settings
+from app.core.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# Watermark lookups are cheap max() scans; keep them from ever stalling a request.
+WATERMARK_QUERY_TIMEOUT = 5
+
+_TOKEN_RE = re.compile(
+    r"""
+      '(?:[^'\\]|\\.|'')*'          # string literal
+    | `[^`]*` | "[^"]*"             # quoted identifier
+    | --[^\n]* | /\*.*?\*/          # comment
+    | \d+(?:\.\d+)?(?:[eE][+-]?\d+)?  # number
+    | \w+
+    | \S
+    """,
+    re.DOTALL | re.VERBOSE,
+)
+
+_KEYWORDS = frozenset(
+    """
+    select distinct from where and or not in is null like ilike between as on using
+    join inner left right full outer cross array any all global asof semi anti
+    group by order having limit offset with totals rollup cube union except intersect
+    asc desc nulls first last case when then else end interval prewhere final sample
+    settings format exists cast
+    """.split()
+)
+
+_TABLE_PREFIXES = frozenset({"FROM", "JOIN"})
+
+
+def _normalize_number(token: str) -> str:
+    if "e" in token.lower():
+        return token.lower()
+    whole, dot, fraction = token.partition(".")
+    whole = whole.lstrip("0") or "0"
+    if dot:
+        fraction = fraction.rstrip("0") or "0"
+        return f"{whole}.{fraction}"
+    return whole
+
+
+def _tokens(sql: str) -> list[str]:
+    tokens = []
+    for token in _TOKEN_RE.findall(sql):
+        if token.startswith("--") or token.startswith("/*"):
+            continue
+        if token[0].isdigit():
+            token = _normalize_number(token)
+        elif token.lower() in _KEYWORDS:
+            token = token.upper()
+        tokens.append(token)
+    while tokens and tokens[-1] == ";":
+        tokens.pop()
+    return tokens
+
+
+def normalize_sql(sql: str) -> str:
+    """Canonical spelling of ``sql`` for cache keys; literal values are kept."""
+    return " ".join(_tokens(sql))
+
+
+def referenced_tables(sql: str, tables: list[TableInfo]) -> list[TableInfo]:
+    """Known tables named after FROM/JOIN (unqualified names match any database)."""
+    by_full_name = {table.full_name: table for table in tables}
+    by_name: dict[str, list[TableInfo]] = {}
+    for table in tables:
+        by_name.setdefault(table.name, []).append(table)
+
+    tokens = _tokens(sql)
+    found: dict[str, TableInfo] = {}
+    for index, token in enumerate(tokens[:-1]):
+        if token not in _TABLE_PREFIXES:
+            continue
+        parts = [tokens[index + 1].strip("`\"")]
+        if index + 3 < len(tokens) and tokens[index + 2] == ".":
+            parts.append(tokens[index + 3].strip("`\""))
+        if len(parts) == 2 and ".".join(parts) in by_full_name:
+            matches = [by_full_name[".".join(parts)]]
+        else:
+            matches = by_name.get(parts[0], [])
+        for table in matches:
+            found[table.full_name] = table
+    return list(found.values())
+
+
+@dataclass
+class _Entry:
+    result: QueryResult
+    expires_at: float
+    watermarks: dict[str, str]
+
+
+class ResultCache:
+    def __init__(
+        self,
+        max_entries: int,
+        max_rows: int,
+        default_ttl: float,
+        table_ttls: dict[str, float] | None = None,
+        watermark_check_seconds: float = 5.0,
+    ):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.default_ttl = default_ttl
+        self.table_ttls = table_ttls or {}
+        self.watermark_check_seconds = watermark_check_seconds
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[str, str], _Entry] = OrderedDict()
+        self._watermarks: dict[str, tuple[str, float]] = {}  # table -> (value, checked_at)
+
+    def ttl_for(self, tables: list[TableInfo]) -> float:
+        ttls = [self.table_ttls.get(table.full_name, self.default_ttl) for table in tables]
+        return min(ttls, default=self.default_ttl)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._watermarks.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    # -- watermarks ----------------------------------------------------------
+
+    def _current_watermarks(self, engine: Any, tables: list[TableInfo]) -> dict[str, str]:
+        now = time.monotonic()
+        with self._lock:
+            known = dict(self._watermarks)
+        stale = [
+            table for table in tables
+            if table.full_name not in known
+            or now - known[table.full_name][1] >= self.watermark_check_seconds
+        ]
+        if stale:
+            selects = ", ".join(
+                f"(SELECT toString(max(`{table.watermark_column}`)) "
+                f"FROM `{table.database}`.`{table.name}`) AS w{index}"
+                for index, table in enumerate(stale)
+            )
+            query = text(f"SELECT {selects}").execution_options(
+                settings={"readonly": 1, "max_execution_time": WATERMARK_QUERY_TIMEOUT}
+            )
+            with engine.connect() as conn:
+                row = conn.execute(query).one()
+            checked_at = time.monotonic()
+            with self._lock:
+                for table, value in zip(stale, row):
+                    self._watermarks[table.full_name] = (str(value), checked_at)
+                    known[table.full_name] = (str(value), checked_at)
+        return {table.full_name: known[table.full_name][0] for table in tables}
+
+    # -- lookup --------------------------------------------------------------
+
+    def has(self, sql: str, variant: str = "rows") -> bool:
+        """Whether an unexpired entry exists (watermarks are not re-checked)."""
+        with self._lock:
+            entry = self._entries.get((variant, normalize_sql(sql)))
+            return entry is not None and entry.expires_at > time.monotonic()
+
+    def execute(
+        self,
+        engine: Any,
+        sql: str,
+        tables: list[TableInfo],
+        run: Callable[[], QueryResult],
+        variant: str = "rows",
+        referenced: list[TableInfo] | None = None,
+    ) -> QueryResult:
+        """Return a cached result for ``sql`` or call ``run()`` and cache it.
+
+        ``referenced`` is the table list from the SQL guard's parse; without
+        it the tables are found by scanning FROM/JOIN tokens.
+        """
+        key = (variant, normalize_sql(sql))
+        if referenced is None:
+            referenced = referenced_tables(sql, tables)
+        try:
+            watermarks = self._current_watermarks(
+                engine, [table for table in referenced if table.watermark_column]
+            )
+        except Exception as exc:
+            # Without a watermark there is no freshness guarantee: bypass.
+            logger.warning("Result cache watermark check failed: %s", exc)
+            return run()
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            hit = entry is not None and entry.expires_at > now and entry.watermarks == watermarks
+            if hit:
+                self._entries.move_to_end(key)
+            elif entry is not None:
+                del self._entries[key]
+        record_cache_lookup("query_result", hit=hit)
+        if hit:
+            return self._copy(entry.result, sql)
+
+        result = run()
+        if result.row_count <= self.max_rows:
+            with self._lock:
+                # The caller gets ``result`` itself; the cache keeps its own copy.
+                self._entries[key] = _Entry(
+                    result=self._copy(result, result.sql),
+                    expires_at=time.monotonic() + self.ttl_for(referenced),
+                    watermarks=watermarks,
+                )
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return result
+
+    @staticmethod
+    def _copy(result: QueryResult, sql: str) -> QueryResult:
+        # Agents hand frames to generated pandas code, which may mutate them.
+        frame = result.frame.copy() if result.frame is not None else None
+        return replace(result, sql=sql, frame=frame)
+
+
+result_cache = ResultCache(
+    max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+    max_rows=settings.RESULT_CACHE_MAX_ROWS,
+    default_ttl=settings.RESULT_CACHE_TTL_SECONDS,
+    table_ttls=settings.RESULT_CACHE_TABLE_TTLS,
+    watermark_check_seconds=settings.RESULT_CACHE_WATERMARK_CHECK_SECONDS,
+)
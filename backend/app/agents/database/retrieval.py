@@ -0,0 +1,224 @@
+"""Relevant-table retrieval for the NL->SQL schema prompt.
+
+A BM25 index over table names, column names and column comments picks the
+top-k tables for a question; parent tables reachable through ``*_id`` join
+keys are added so the prompt can still reach sites/ponds/cultivation, and the
+join keys themselves are listed explicitly.
+"""
+
+import math
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+
+from app.agents.database.introspect import SchemaSnapshot, TableInfo, render_schema
+
+# Parent tables are followed at most this many hops (e.g. water_chemical ->
+# cultivation -> ponds -> sites).
+MAX_JOIN_DEPTH = 3
+
+# Table names and the question weigh more than individual columns/comments.
+TABLE_NAME_WEIGHT = 3
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Indonesian domain vocabulary -> the English words used in table/column names.
+_SYNONYMS = {
+    "kolam": ["pond"],
+    "tambak": ["site"],
+    "lokasi": ["site"],
+    "blok": ["block"],
+    "siklus": ["cultivation"],
+    "budidaya": ["cultivation"],
+    "pakan": ["feed"],
+    "panen": ["harvest"],
+    "benur": ["seed"],
+    "benih": ["seed"],
+    "tebar": ["seed"],
+    "udang": ["shrimp"],
+    "air": ["water"],
+    "kimia": ["chemical"],
+    "fisika": ["physic"],
+    "biologi": ["biology"],
+    "kesehatan": ["health"],
+    "obat": ["treatment"],
+    "perlakuan": ["treatment"],
+    "cuaca": ["weather", "bmkg"],
+    "harga": ["price"],
+    "energi": ["energy"],
+    "listrik": ["energy"],
+    "peralatan": ["equipment"],
+    "alat": ["equipment"],
+    "persiapan": ["preparation"],
+    "peringatan": ["alert"],
+    "alarm": ["alert"],
+    "nutrisi": ["nutrition"],
+    "suplemen": ["nutrition"],
+    "pasang": ["stormglass"],
+    "surut": ["stormglass"],
+    "pertumbuhan": ["shrimp", "abw", "adg"],
+    "sampling": ["shrimp"],
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# ClickHouse errors that mean the narrowed schema hid something the SQL needs.
+SCHEMA_MISS_ERROR = re.compile(
+    r"UNKNOWN_TABLE|UNKNOWN_IDENTIFIER|UNKNOWN_DATABASE|UNKNOWN_COLUMN|"
+    r"Unknown table|Unknown identifier|Missing columns|There is no column|"
+    r"Code: (?:47|60|81)\b",
+    re.IGNORECASE,
+)
+
+
+def tokenize(value: str) -> list[str]:
+    tokens = []
+    for token in _TOKEN_RE.findall(value.lower().replace("_", " ")):
+        if len(token) > 3 and token.endswith("s"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def expand_query(question: str) -> list[str]:
+    tokens = tokenize(question)
+    expanded = list(tokens)
+    for token in tokens:
+        expanded.extend(_SYNONYMS.get(token, []))
+    return expanded
+
+
+@dataclass
+class JoinKey:
+    child: str
+    column: str
+    parent: str
+
+    def render(self) -> str:
+        return f"{self.child}.{self.column} = {self.parent}.id"
+
+
+class TableRetriever:
+    """BM25 index over one schema snapshot."""
+
+    def __init__(self, tables: list[TableInfo]):
+        self.tables = tables
+        self._by_name = {table.full_name: table for table in tables}
+        self._documents = [self._document(table) for table in tables]
+        self._doc_lengths = [sum(doc.values()) for doc in self._documents]
+        self._avg_length = (sum(self._doc_lengths) / len(self._doc_lengths)) if tables else 0.0
+        document_frequency: Counter = Counter()
+        for doc in self._documents:
+            document_frequency.update(doc.keys())
+        total = len(tables)
+        self._idf = {
+            term: math.log(1 + (total - freq + 0.5) / (freq + 0.5))
+            for term, freq in document_frequency.items()
+        }
+        self._parents = self._infer_join_keys()
+
+    @staticmethod
+    def _document(table: TableInfo) -> Counter:
+        doc: Counter = Counter()
+        for token in tokenize(table.name):
+            doc[token] += TABLE_NAME_WEIGHT
+        for column in table.columns:
+            doc.update(tokenize(column.name))
+            if column.comment:
+                doc.update(tokenize(column.comment))
+        return doc
+
+    def _infer_join_keys(self) -> dict[str, list[JoinKey]]:
+        """Map ``<name>_id`` columns to a table called <name>, <name>s or <name>es."""
+        by_short_name: dict[tuple[str, str], str] = {
+            (table.database, table.name): table.full_name for table in self.tables
+        }
+        parents: dict[str, list[JoinKey]] = {}
+        for table in self.tables:
+            for column in table.columns:
+                if not column.name.endswith("_id"):
+                    continue
+                stem = column.name[:-3]
+                for candidate in (stem, f"{stem}s", f"{stem}es"):
+                    parent = by_short_name.get((table.database, candidate))
+                    if parent and parent != table.full_name:
+                        parents.setdefault(table.full_name, []).append(
+                            JoinKey(table.full_name, column.name, parent)
+                        )
+                        break
+        return parents
+
+    def score(self, question: str) -> list[tuple[float, TableInfo]]:
+        terms = expand_query(question)
+        scored = []
+        for table, doc, length in zip(self.tables, self._documents, self._doc_lengths):
+            value = 0.0
+            for term in terms:
+                frequency = doc.get(term)
+                if not frequency:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / (self._avg_length or 1))
+                value += self._idf[term] * frequency * (BM25_K1 + 1) / (frequency + norm)
+            if value > 0:
+                scored.append((value, table))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored
+
+    def select(self, question: str, top_k: int) -> tuple[list[TableInfo], list[JoinKey]]:
+        """Top-k tables plus their join-key ancestors, in schema order."""
+        chosen = {table.full_name for _, table in self.score(question)[:top_k]}
+        join_keys: list[JoinKey] = []
+        frontier = set(chosen)
+        for _ in range(MAX_JOIN_DEPTH):
+            next_frontier = set()
+            for name in frontier:
+                for key in self._parents.get(name, []):
+                    join_keys.append(key)
+                    if key.parent not in chosen:
+                        chosen.add(key.parent)
+                        next_frontier.add(key.parent)
+            frontier = next_frontier
+            if not frontier:
+                break
+        tables = [table for table in self.tables if table.full_name in chosen]
+        unique_keys = list({key.render(): key for key in join_keys}.values())
+        return tables, unique_keys
+
+
+def render_relevant_schema(
+    tables: list[TableInfo],
+    join_keys: list[JoinKey],
+    encoding: str = "full",
+) -> str:
+    schema = render_schema(tables, encoding)
+    if join_keys:
+        keys = "\n".join(f"  {key.render()}" for key in join_keys)
+        schema += f"\n\nJOIN KEYS:\n{keys}"
+    return schema
+
+
+# One index per schema fingerprint, rebuilt when the schema cache reloads.
+_retriever_lock = threading.Lock()
+_retriever: tuple[str, TableRetriever] | None = None
+
+
+def get_retriever(snapshot: SchemaSnapshot) -> TableRetriever:
+    global _retriever
+    with _retriever_lock:
+        if _retriever is None or _retriever[0] != snapshot.fingerprint:
+            _retriever = (snapshot.fingerprint, TableRetriever(snapshot.tables))
+        return _retriever[1]
+
+
+def relevant_schema(snapshot: SchemaSnapshot, question: str, top_k: int) -> tuple[str, list[TableInfo]]:
+    """Return (schema_text, tables); the full schema if nothing matches."""
+    tables, join_keys = get_retriever(snapshot).select(question, top_k)
+    if not tables:
+        return snapshot.rendered, snapshot.tables
+    return render_relevant_schema(tables, join_keys, snapshot.encoding), tables
+
+
+def is_schema_miss(error: str) -> bool:
+    return bool(SCHEMA_MISS_ERROR.search(error))
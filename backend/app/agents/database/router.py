@@ -1,8 +1,10 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from fastapi.responses import StreamingResponse
 
 from app.agents.database.api_schemas import QueryRequest, QueryResponse
 from app.agents.database.service import query, query_stream
+from app.core.cancellation import CancellationToken
+from app.core.streaming import disconnect_aware
 
 router = APIRouter(tags=["Database"], prefix="/v1/database")
 
@@ -13,8 +15,9 @@ async def query_endpoint(request: QueryRequest):
 
 
 @router.post("/query/stream")
-async def query_stream_endpoint(request: QueryRequest):
+async def query_stream_endpoint(request: QueryRequest, http_request: Request):
+    token = CancellationToken()
     return StreamingResponse(
-        query_stream(request),
+        disconnect_aware(http_request, query_stream(request, cancel_token=token), token),
         media_type="text/event-stream",
     )
@@ -0,0 +1,140 @@
+"""Compact schema encoding for the NL->SQL prompt.
+
+The verbose format repeats CDC housekeeping columns (``id``, ``created_at``,
+``deleted_at``, ...) in every table and spells out wrapper types such as
+``Nullable(LowCardinality(String))``. The compact format:
+
+- factors columns shared by most tables into one ``COMMON COLUMNS`` block,
+  and marks each table with ``[+common]`` (optionally ``-col`` for the few it
+  lacks);
+- abbreviates types (legend included in the output, so nothing is implicit);
+- joins comment-less columns onto one line and shortens long enum comments.
+"""
+
+import re
+
+# A (name, type) pair shared by at least this share of tables is "common".
+COMMON_COLUMN_MIN_SHARE = 0.5
+# Factoring only pays off across several tables.
+COMMON_COLUMN_MIN_TABLES = 3
+# A table missing more than this many common columns lists them inline.
+MAX_MISSING_COMMON = 2
+
+MAX_ENUM_ITEMS = 8
+MAX_COMMENT_CHARS = 120
+
+# Rough chars-per-token ratio for mixed English/Indonesian identifiers; used
+# only for reporting, never for truncation decisions.
+CHARS_PER_TOKEN = 4
+
+TYPE_LEGEND = (
+    "Types: T? = Nullable(T), LC(T) = LowCardinality(T), Str = String, FStr(N) = FixedString(N), "
+    "DT = DateTime, DT64 = DateTime64, D = Date, D32 = Date32, F = Float, I = Int, U = UInt, Dec = Decimal"
+)
+
+_TYPE_REWRITES = [
+    (re.compile(r"\bLowCardinality\("), "LC("),
+    (re.compile(r"\bFixedString\("), "FStr("),
+    (re.compile(r"\bString\b"), "Str"),
+    (re.compile(r"\bDateTime64\b"), "DT64"),
+    (re.compile(r"\bDateTime\b"), "DT"),
+    (re.compile(r"\bDate32\b"), "D32"),
+    (re.compile(r"\bDate\b"), "D"),
+    (re.compile(r"\bFloat(\d+)\b"), r"F\1"),
+    (re.compile(r"\bUInt(\d+)\b"), r"U\1"),
+    (re.compile(r"\bInt(\d+)\b"), r"I\1"),
+    (re.compile(r"\bDecimal(\d*)\("), r"Dec\1("),
+]
+
+_NULLABLE = re.compile(r"Nullable\(([^()]*(?:\([^()]*\))?[^()]*)\)")
+_ENUM_SEPARATOR = re.compile(r"\s*[,;|]\s*")
+_ENUM_ITEM = re.compile(r"([\w.-]+)\s*[=:]\s*([^=:]+)$")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def abbreviate_type(column_type: str) -> str:
+    abbreviated = column_type
+    # Unwrap Nullable(...) innermost-first into a trailing "?".
+    while True:
+        rewritten = _NULLABLE.sub(r"\1?", abbreviated)
+        if rewritten == abbreviated:
+            break
+        abbreviated = rewritten
+    for pattern, replacement in _TYPE_REWRITES:
+        abbreviated = pattern.sub(replacement, abbreviated)
+    return abbreviated.replace(", ", ",")
+
+
+def compact_comment(comment: str) -> str:
+    text = re.sub(r"\s+", " ", comment).strip()
+    segments = _ENUM_SEPARATOR.split(text)
+    matches = [_ENUM_ITEM.search(segment) for segment in segments]
+    if len(segments) >= 3 and all(matches):
+        # Enum-like ("Status: 1=aktif, 2=selesai, ..."): keep a compact value list.
+        head = segments[0][: matches[0].start()].strip(" :-")
+        pairs = [f"{m.group(1)}={m.group(2).strip()}" for m in matches[:MAX_ENUM_ITEMS]]
+        if len(matches) > MAX_ENUM_ITEMS:
+            pairs.append(f"…(+{len(matches) - MAX_ENUM_ITEMS})")
+        text = (f"{head}: " if head else "") + "|".join(pairs)
+    if len(text) > MAX_COMMENT_CHARS:
+        text = text[: MAX_COMMENT_CHARS - 1].rstrip() + "…"
+    return text
+
+
+def _common_columns(tables) -> list[tuple[str, str]]:
+    if len(tables) < COMMON_COLUMN_MIN_TABLES:
+        return []
+    counts: dict[tuple[str, str], int] = {}
+    order: list[tuple[str, str]] = []
+    for table in tables:
+        for column in table.columns:
+            key = (column.name, column.type)
+            if key not in counts:
+                counts[key] = 0
+                order.append(key)
+            counts[key] += 1
+    threshold = max(COMMON_COLUMN_MIN_TABLES, len(tables) * COMMON_COLUMN_MIN_SHARE)
+    return [key for key in order if counts[key] >= threshold]
+
+
+def render_compact(tables) -> str:
+    """Render ``TableInfo`` objects in the compact format."""
+    if not tables:
+        return "No tables found in the database."
+
+    common = _common_columns(tables)
+    common_set = set(common)
+    parts = [TYPE_LEGEND]
+    if common:
+        listed = ", ".join(f"{name} {abbreviate_type(col_type)}" for name, col_type in common)
+        parts.append(f"COMMON COLUMNS (in tables marked [+common]): {listed}")
+
+    for table in tables:
+        present = {(column.name, column.type) for column in table.columns}
+        missing = [name for name, col_type in common if (name, col_type) not in present]
+        factor = bool(common) and len(missing) <= MAX_MISSING_COMMON
+        marker = ""
+        if factor:
+            marker = " [+common" + "".join(f" -{name}" for name in missing) + "]"
+
+        plain: list[str] = []
+        commented: list[str] = []
+        for column in table.columns:
+            if factor and (column.name, column.type) in common_set:
+                continue
+            encoded = f"{column.name} {abbreviate_type(column.type)}"
+            if column.comment:
+                commented.append(f"  {encoded} -- {compact_comment(column.comment)}")
+            else:
+                plain.append(encoded)
+
+        lines = [f"TABLE {table.full_name}{marker}:"]
+        if plain:
+            lines.append("  " + ", ".join(plain))
+        lines.extend(commented)
+        parts.append("\n".join(lines))
+
+    return "\n\n".join(parts)
@@ -1,9 +1,71 @@
+import re
 from dataclasses import dataclass, field
+from decimal import Decimal
+
+import pandas as pd
+
+# Rows shown in the text rendering used for LLM prompts.
+MAX_TEXT_ROWS = 50
+
+_DATE_TYPE = re.compile(r"^(Nullable\()?(LowCardinality\()?(Date|Date32|DateTime|DateTime64)\b")
+_DECIMAL_TYPE = re.compile(r"^(Nullable\()?Decimal")
 
 
 @dataclass
 class QueryResult:
+    """Rows returned by ``DatabaseAgent``, with column types.
+
+    Downstream agents work on this directly; ``to_text`` is only for prompts.
+    A columnar fetch sets ``frame`` (all rows, pandas dtypes in ``types``);
+    ``rows`` is then only a preview of the first ``MAX_TEXT_ROWS``.
+    """
+
     columns: list[str]
     rows: list[list]
     row_count: int
     sql: str
+    types: list[str] = field(default_factory=list)
+    frame: pd.DataFrame | None = field(default=None, repr=False)
+    # True when the row cap cut the result short.
+    truncated: bool = False
+
+    def column_type(self, index: int) -> str:
+        return self.types[index] if index < len(self.types) else ""
+
+    def to_text(self, max_rows: int = MAX_TEXT_ROWS) -> str:
+        """Pipe-delimited table, truncated to ``max_rows``."""
+        if not self.rows:
+            return "(no rows returned)"
+        header = " | ".join(self.columns)
+        separator = "-+-".join("-" * len(c) for c in self.columns)
+        lines = [header, separator]
+        for row in self.rows[:max_rows]:
+            lines.append(" | ".join(str(v) for v in row))
+        return "\n".join(lines)
+
+    def string_rows(self, max_rows: int | None = None) -> list[list[str]]:
+        """Rows as display strings (``None`` becomes an empty string)."""
+        rows = self.rows if max_rows is None else self.rows[:max_rows]
+        return [["" if value is None else str(value) for value in row] for row in rows]
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """All rows as a DataFrame; Decimal columns become float, dates datetime64."""
+        if self.frame is not None:
+            return self.frame
+        df = pd.DataFrame(self.rows, columns=self.columns)
+        for index, column in enumerate(self.columns):
+            column_type = self.column_type(index)
+            series = df.iloc[:, index]
+            if _DECIMAL_TYPE.match(column_type) or (
+                not column_type and series.map(lambda v: isinstance(v, Decimal)).any()
+            ):
+                df.isetitem(index, pd.to_numeric(series.astype(float), errors="coerce"))
+            elif _DATE_TYPE.match(column_type):
+                df.isetitem(index, pd.to_datetime(series, errors="coerce"))
+        return df.infer_objects()
+
+
+def query_result_of(result) -> QueryResult | None:
+    """The typed rows carried by a successful ``DatabaseAgent`` ``AgentResult``."""
+    data = getattr(result, "data", None)
+    return data if isinstance(data, QueryResult) else None
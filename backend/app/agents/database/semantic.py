@@ -0,0 +1,434 @@
+"""Semantic metric layer: a small JSON query spec compiled to ClickHouse SQL.
+
+Instead of writing raw SQL against the full schema, the LLM picks named
+metrics and dimensions from the catalog below and returns a spec::
+
+    {"metrics": ["abw", "sr"], "dimensions": ["site", "pond"],
+     "filters": [{"field": "site", "op": "=", "value": "SUMA MARINA"},
+                 {"field": "sr", "op": "<", "value": 80}],
+     "grain": "week", "time_range": {"last_days": 30},
+     "order_by": [{"field": "sr", "direction": "asc"}], "limit": 20}
+
+``compile_spec`` turns it into one SELECT. Every metric belongs to a fact
+table; the join path to cultivation -> ponds -> sites is fixed per fact and
+only the joins the requested dimensions need are added. Site, pond and cycle
+status filters become ``IN`` subqueries on the fact's id column, dates are
+plain range predicates on the raw date column, and metric thresholds become
+HAVING clauses, so the output is consistent and index-friendly.
+"""
+
+import datetime
+from dataclasses import dataclass, field
+
+from app.agents.database.introspect import TableInfo
+
+DEFAULT_WINDOW_DAYS = 30
+MAX_WINDOW_DAYS = 366
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+GRAINS = {
+    "day": "toDate({column})",
+    "week": "toStartOfWeek({column}, 1)",
+    "month": "toStartOfMonth({column})",
+}
+_DIMENSION_OPS = frozenset({"=", "!=", "in"})
+_METRIC_OPS = frozenset({"=", "!=", ">", ">=", "<", "<="})
+
+# Context key set by the planner when its plan marks the question as a
+# metric query; the semantic layer is only tried for those.
+SEMANTIC_KEY = "semantic"
+
+CULTIVATION_TABLE = "cultivation.cultivation"
+PONDS_TABLE = "cultivation.ponds"
+SITES_TABLE = "cultivation.sites"
+
+
+def semantic_context(context: dict | None) -> dict:
+    return {**(context or {}), SEMANTIC_KEY: True}
+
+
+def semantic_requested(context: dict | None) -> bool:
+    return bool(context and context.get(SEMANTIC_KEY))
+
+
+class SemanticQueryError(ValueError):
+    """The spec cannot be compiled; the caller falls back to raw SQL generation."""
+
+
+@dataclass(frozen=True)
+class Fact:
+    name: str
+    table: str
+    date_column: str
+    # "cultivation_id", "pond_id", or "" for the cultivation table itself.
+    link: str
+    soft_delete: bool = True
+    # Facts without a natural time window (cycles) are not limited by default.
+    default_window: bool = True
+
+
+@dataclass(frozen=True)
+class Metric:
+    name: str
+    fact: str
+    aggregation: str  # avg, sum, max, min, count, uniq
+    column: str = ""
+    description: str = ""
+
+    def expression(self) -> str:
+        if self.aggregation == "count":
+            return "count()"
+        if self.aggregation == "uniq":
+            return f"uniqExact(t.{self.column})"
+        return f"round({self.aggregation}(t.{self.column}), 2)"
+
+
+@dataclass(frozen=True)
+class Dimension:
+    name: str
+    # Alias that must be joined in ("s", "p" or "c") and the column on it.
+    alias: str
+    column: str
+    description: str = ""
+
+
+FACTS: dict[str, Fact] = {
+    fact.name: fact
+    for fact in (
+        Fact("sampling", "cultivation.cultivation_shrimp", "tanggal", "cultivation_id"),
+        Fact("feed", "cultivation.cultivation_feed", "tanggal", "cultivation_id"),
+        Fact(
+            "water", "transformed_cultivation.cultivation_water_report", "report_date", "pond_id",
+            soft_delete=False,
+        ),
+        Fact(
+            "harvest", "transformed_cultivation.budidaya_panen_report_v2", "report_date", "pond_id",
+            soft_delete=False,
+        ),
+        Fact("cycle", CULTIVATION_TABLE, "start_doc", "", default_window=False),
+    )
+}
+
+METRICS: dict[str, Metric] = {
+    metric.name: metric
+    for metric in (
+        Metric("abw", "sampling", "avg", "avg_body_weight", "rata-rata berat udang (gram)"),
+        Metric("adg", "sampling", "avg", "avg_daily_growth", "pertumbuhan harian (gram/hari)"),
+        Metric("sr", "sampling", "avg", "survival_rate", "survival rate (%)"),
+        Metric("biomassa", "sampling", "avg", "total_biomassa", "biomassa sampling (kg)"),
+        Metric("size", "sampling", "avg", "ukuran_udang", "ukuran udang (ekor/kg)"),
+        Metric("sampling_count", "sampling", "count", description="jumlah sampling"),
+        Metric("fcr", "feed", "max", "fcr", "FCR"),
+        Metric("pakan_kumulatif", "feed", "max", "pemberian_pakan_kumulative", "pakan kumulatif (kg)"),
+        Metric("do_subuh", "water", "avg", "do_subuh", "DO subuh (mg/L)"),
+        Metric("do_malam", "water", "avg", "do_malam", "DO malam (mg/L)"),
+        Metric("ph_pagi", "water", "avg", "ph_pagi", "pH pagi"),
+        Metric("ph_sore", "water", "avg", "ph_sore", "pH sore"),
+        Metric("salinitas", "water", "avg", "salinitas", "salinitas (ppt)"),
+        Metric("suhu_air_pagi", "water", "avg", "suhu_air_pagi", "suhu air pagi (°C)"),
+        Metric("suhu_air_sore", "water", "avg", "suhu_air_sore", "suhu air sore (°C)"),
+        Metric("ammonium_nh4", "water", "avg", "ammonium_nh4", "ammonium NH4 (mg/L)"),
+        Metric("nitrit_no2", "water", "avg", "nitrit_no2", "nitrit NO2 (mg/L)"),
+        Metric("productivity", "harvest", "sum", "productivity", "produktivitas panen (ton/ha)"),
+        Metric("panen_biomassa", "harvest", "sum", "total_biomassa", "biomassa panen (kg)"),
+        Metric("cycle_count", "cycle", "count", description="jumlah siklus"),
+        Metric("pond_count", "cycle", "uniq", "pond_id", "jumlah kolam"),
+        Metric("populasi", "cycle", "sum", "total_populasi", "total populasi tebar (ekor)"),
+        Metric("cycle_abw", "cycle", "avg", "abw", "ABW ringkasan siklus (gram)"),
+        Metric("cycle_fcr", "cycle", "avg", "fcr", "FCR ringkasan siklus"),
+        Metric("cycle_sr", "cycle", "avg", "sr", "SR ringkasan siklus (%)"),
+    )
+}
+
+DIMENSIONS: dict[str, Dimension] = {
+    dimension.name: dimension
+    for dimension in (
+        Dimension("site", "s", "name", "nama site"),
+        Dimension("pond", "p", "name", "nama kolam"),
+        Dimension("cycle", "c", "periode_siklus", "periode siklus"),
+        Dimension("status", "c", "status", "status siklus (1=aktif, 2=selesai, 0=draft)"),
+    )
+}
+
+
+def render_catalog() -> str:
+    """Metric and dimension catalog for the spec prompt."""
+    lines = ["METRICS (name: description [source]):"]
+    for metric in METRICS.values():
+        lines.append(f"- {metric.name}: {metric.description} [{metric.fact}]")
+    lines.append("\nDIMENSIONS:")
+    for dimension in DIMENSIONS.values():
+        lines.append(f"- {dimension.name}: {dimension.description}")
+    lines.append(f"\nGRAINS (time dimension \"periode\"): {', '.join(GRAINS)}")
+    return "\n".join(lines)
+
+
+# ---------------------------------------------------------------------------
+# Spec
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class Filter:
+    field: str
+    op: str
+    value: object
+
+
+@dataclass
+class QuerySpec:
+    metrics: list[str]
+    dimensions: list[str] = field(default_factory=list)
+    filters: list[Filter] = field(default_factory=list)
+    grain: str = ""
+    start: datetime.date | None = None
+    end: datetime.date | None = None
+    last_days: int | None = None
+    order_by: list[tuple[str, str]] = field(default_factory=list)
+    limit: int = DEFAULT_LIMIT
+
+    @classmethod
+    def from_payload(cls, payload: object) -> "QuerySpec":
+        if not isinstance(payload, dict):
+            raise SemanticQueryError("Spec must be a JSON object.")
+        metrics = [str(name).strip().lower() for name in payload.get("metrics") or []]
+        if not metrics:
+            raise SemanticQueryError("Spec has no metrics.")
+        spec = cls(
+            metrics=metrics,
+            dimensions=[str(name).strip().lower() for name in payload.get("dimensions") or []],
+            grain=str(payload.get("grain") or "").strip().lower(),
+        )
+
+        for item in payload.get("filters") or []:
+            if not isinstance(item, dict) or "field" not in item:
+                raise SemanticQueryError(f"Invalid filter: {item!r}")
+            spec.filters.append(Filter(
+                field=str(item["field"]).strip().lower(),
+                op=str(item.get("op") or "=").strip().lower(),
+                value=item.get("value"),
+            ))
+
+        time_range = payload.get("time_range")
+        if time_range is not None:
+            if not isinstance(time_range, dict):
+                raise SemanticQueryError("time_range must be an object.")
+            try:
+                if time_range.get("start"):
+                    spec.start = datetime.date.fromisoformat(str(time_range["start"]))
+                if time_range.get("end"):
+                    spec.end = datetime.date.fromisoformat(str(time_range["end"]))
+                if time_range.get("last_days") is not None:
+                    spec.last_days = int(time_range["last_days"])
+            except (TypeError, ValueError) as exc:
+                raise SemanticQueryError(f"Invalid time_range: {exc}") from exc
+
+        for item in payload.get("order_by") or []:
+            if isinstance(item, str):
+                spec.order_by.append((item.strip().lower(), "asc"))
+            elif isinstance(item, dict) and item.get("field"):
+                direction = str(item.get("direction") or "asc").strip().lower()
+                spec.order_by.append((str(item["field"]).strip().lower(), direction))
+            else:
+                raise SemanticQueryError(f"Invalid order_by: {item!r}")
+
+        if payload.get("limit") is not None:
+            try:
+                spec.limit = int(payload["limit"])
+            except (TypeError, ValueError) as exc:
+                raise SemanticQueryError(f"Invalid limit: {exc}") from exc
+        return spec
+
+
+# ---------------------------------------------------------------------------
+# Compiler
+# ---------------------------------------------------------------------------
+
+
+def _quote(value: object) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def _number(value: object) -> str:
+    if isinstance(value, int) and not isinstance(value, bool):
+        return str(value)
+    try:
+        return repr(float(value))
+    except (TypeError, ValueError) as exc:
+        raise SemanticQueryError(f"Expected a number, got {value!r}.") from exc
+
+
+def _condition(column: str, op: str, value: object) -> str:
+    if op == "in":
+        values = value if isinstance(value, list) else [value]
+        if not values:
+            raise SemanticQueryError(f"Empty IN list for {column}.")
+        return f"{column} IN ({', '.join(_quote(item) for item in values)})"
+    return f"{column} {op} {_quote(value)}"
+
+
+def _validate(spec: QuerySpec) -> Fact:
+    unknown = [name for name in spec.metrics if name not in METRICS]
+    if unknown:
+        raise SemanticQueryError(f"Unknown metrics: {', '.join(unknown)}")
+    facts = {METRICS[name].fact for name in spec.metrics}
+    if len(facts) > 1:
+        raise SemanticQueryError(f"Metrics come from different sources: {', '.join(sorted(facts))}")
+    fact = FACTS[facts.pop()]
+
+    for name in spec.dimensions:
+        if name not in DIMENSIONS:
+            raise SemanticQueryError(f"Unknown dimension: {name}")
+        if DIMENSIONS[name].alias == "c" and fact.link == "pond_id":
+            raise SemanticQueryError(f"Dimension {name} is not available for {fact.name} metrics.")
+    if spec.grain and spec.grain not in GRAINS:
+        raise SemanticQueryError(f"Unknown grain: {spec.grain}")
+    if spec.start and spec.end and spec.start > spec.end:
+        raise SemanticQueryError("time_range start is after end.")
+    if spec.last_days is not None and not 0 < spec.last_days <= MAX_WINDOW_DAYS:
+        raise SemanticQueryError(f"last_days must be between 1 and {MAX_WINDOW_DAYS}.")
+    if not 0 < spec.limit <= MAX_LIMIT:
+        raise SemanticQueryError(f"limit must be between 1 and {MAX_LIMIT}.")
+
+    for item in spec.filters:
+        if item.field in METRICS:
+            if item.field not in spec.metrics:
+                raise SemanticQueryError(f"Filter on metric {item.field} that is not selected.")
+            if item.op not in _METRIC_OPS:
+                raise SemanticQueryError(f"Unsupported operator for metric filter: {item.op}")
+        elif item.field in DIMENSIONS:
+            if item.op not in _DIMENSION_OPS:
+                raise SemanticQueryError(f"Unsupported operator for dimension filter: {item.op}")
+            if DIMENSIONS[item.field].alias == "c" and fact.link == "pond_id":
+                raise SemanticQueryError(f"Filter {item.field} is not available for {fact.name} metrics.")
+        else:
+            raise SemanticQueryError(f"Unknown filter field: {item.field}")
+
+    selected = set(spec.metrics) | set(spec.dimensions) | ({"periode"} if spec.grain else set())
+    for name, direction in spec.order_by:
+        if name not in selected:
+            raise SemanticQueryError(f"order_by field {name} is not selected.")
+        if direction not in ("asc", "desc"):
+            raise SemanticQueryError(f"Invalid order direction: {direction}")
+    return fact
+
+
+def required_columns(spec: QuerySpec) -> dict[str, set[str]]:
+    """Fact-table columns the compiled query reads (joins are not included)."""
+    fact = FACTS[METRICS[spec.metrics[0]].fact]
+    columns = {fact.date_column} | {METRICS[name].column for name in spec.metrics if METRICS[name].column}
+    columns.add(fact.link or "pond_id")
+    if not fact.link:
+        columns |= {DIMENSIONS[name].column for name in spec.dimensions if DIMENSIONS[name].alias == "c"}
+    return {fact.table: columns}
+
+
+def _id_filters(spec: QuerySpec, fact: Fact) -> list[str]:
+    """Site/pond/status filters as IN subqueries on the fact's own key columns."""
+    by_alias: dict[str, list[str]] = {"s": [], "p": [], "c": []}
+    for item in spec.filters:
+        dimension = DIMENSIONS.get(item.field)
+        if dimension is not None:
+            by_alias[dimension.alias].append(_condition(dimension.column, item.op, item.value))
+
+    pond_conditions = list(by_alias["p"])
+    if by_alias["s"]:
+        pond_conditions.append(
+            f"site_id IN (SELECT id FROM {SITES_TABLE} FINAL "
+            f"WHERE deleted_by = 0 AND {' AND '.join(by_alias['s'])})"
+        )
+    pond_ids = None
+    if pond_conditions:
+        pond_ids = f"SELECT id FROM {PONDS_TABLE} FINAL WHERE deleted_by = 0 AND {' AND '.join(pond_conditions)}"
+
+    if fact.link == "pond_id":
+        return [f"t.pond_id IN ({pond_ids})"] if pond_ids else []
+    if not fact.link:
+        conditions = [f"t.{condition}" for condition in by_alias["c"]]
+        if pond_ids:
+            conditions.append(f"t.pond_id IN ({pond_ids})")
+        return conditions
+    cycle_conditions = list(by_alias["c"])
+    if pond_ids:
+        cycle_conditions.append(f"pond_id IN ({pond_ids})")
+    if not cycle_conditions:
+        return []
+    return [
+        f"t.cultivation_id IN (SELECT id FROM {CULTIVATION_TABLE} FINAL "
+        f"WHERE deleted_by = 0 AND {' AND '.join(cycle_conditions)})"
+    ]
+
+
+def _joins(spec: QuerySpec, fact: Fact) -> tuple[list[str], dict[str, str]]:
+    """JOIN clauses for the requested dimensions and the alias each dimension reads."""
+    needed = {DIMENSIONS[name].alias for name in spec.dimensions}
+    if "s" in needed:
+        needed.add("p")
+    aliases = {"s": "s", "p": "p", "c": "c" if fact.link else "t"}
+    joins = []
+    if fact.link == "cultivation_id" and ("c" in needed or "p" in needed):
+        joins.append(f"JOIN {CULTIVATION_TABLE} AS c FINAL ON c.id = t.cultivation_id AND c.deleted_by = 0")
+    if "p" in needed:
+        pond_key = "c.pond_id" if fact.link == "cultivation_id" else "t.pond_id"
+        joins.append(f"JOIN {PONDS_TABLE} AS p FINAL ON p.id = {pond_key} AND p.deleted_by = 0")
+    if "s" in needed:
+        joins.append(f"JOIN {SITES_TABLE} AS s FINAL ON s.id = p.site_id AND s.deleted_by = 0")
+    return joins, aliases
+
+
+def compile_spec(spec: QuerySpec, tables: list[TableInfo] | None = None) -> str:
+    """One ClickHouse SELECT for ``spec``; raises ``SemanticQueryError`` if it cannot be built."""
+    fact = _validate(spec)
+    if tables is not None:
+        by_name = {table.full_name: set(table.column_names()) for table in tables}
+        for table, columns in required_columns(spec).items():
+            missing = columns - by_name.get(table, set())
+            if missing:
+                raise SemanticQueryError(f"Columns not in schema: {table}.{', '.join(sorted(missing))}")
+
+    joins, aliases = _joins(spec, fact)
+    date = f"t.{fact.date_column}"
+
+    select: list[str] = []
+    group_by: list[str] = []
+    for name in spec.dimensions:
+        dimension = DIMENSIONS[name]
+        select.append(f"{aliases[dimension.alias]}.{dimension.column} AS {name}")
+        group_by.append(name)
+    if spec.grain:
+        select.append(f"{GRAINS[spec.grain].format(column=date)} AS periode")
+        group_by.append("periode")
+    select.extend(f"{METRICS[name].expression()} AS {name}" for name in spec.metrics)
+
+    where = ["t.deleted_by = 0"] if fact.soft_delete else []
+    where.extend(_id_filters(spec, fact))
+    if spec.start:
+        where.append(f"{date} >= toDate({_quote(spec.start.isoformat())})")
+    if spec.end:
+        where.append(f"{date} < toDate({_quote(spec.end.isoformat())}) + 1")
+    if spec.last_days is not None:
+        where.append(f"{date} >= today() - {spec.last_days}")
+    elif not spec.start and not spec.end and fact.default_window:
+        where.append(f"{date} >= today() - {DEFAULT_WINDOW_DAYS}")
+
+    having = [
+        f"{item.field} {item.op} {_number(item.value)}" for item in spec.filters if item.field in METRICS
+    ]
+    order_by = [f"{name} {direction.upper()}" for name, direction in spec.order_by] or group_by
+
+    parts = [f"SELECT {', '.join(select)}", f"FROM {fact.table} AS t FINAL", *joins]
+    if where:
+        parts.append(f"WHERE {' AND '.join(where)}")
+    if group_by:
+        parts.append(f"GROUP BY {', '.join(group_by)}")
+    if having:
+        parts.append(f"HAVING {' AND '.join(having)}")
+    if order_by:
+        parts.append(f"ORDER BY {', '.join(order_by)}")
+    parts.append(f"LIMIT {spec.limit}")
+    return "\n".join(parts)
@@ -3,6 +3,7 @@ from collections.abc import Generator
 
 from app.agents.database import create_database_agent
 from app.agents.database.api_schemas import QueryRequest, QueryResponse
+from app.core.cancellation import CancellationToken, OperationCancelled, cancellable
 from app.core.llm import create_llm
 
 
@@ -18,20 +19,27 @@ def query(request: QueryRequest) -> QueryResponse:
     )
 
 
-def query_stream(request: QueryRequest) -> Generator[str, None, None]:
+def query_stream(
+    request: QueryRequest,
+    cancel_token: CancellationToken | None = None,
+) -> Generator[str, None, None]:
     from app.agents.planner.streaming import parse_think_tags
     from app.modules.admin.service import resolve_prompt
 
     llm = create_llm(config_group="llm_database")
     agent = create_database_agent(llm=llm)
+    context = {"cancel_token": cancel_token} if cancel_token else None
 
     # Stream step-by-step thinking from DatabaseAgent.
     db_result = None
-    for event in agent.execute_stream(request.question):
-        if event.get("type") == "_result":
-            db_result = event["data"]
-        else:
-            yield f"data: {json.dumps(event)}\n\n"
+    try:
+        for event in agent.execute_stream(request.question, context=context):
+            if event.get("type") == "_result":
+                db_result = event["data"]
+            else:
+                yield f"data: {json.dumps(event)}\n\n"
+    except OperationCancelled:
+        return
 
     if db_result is None:
         yield f"data: {json.dumps({'type': 'content', 'content': 'Error: Database agent returned no result.'})}\n\n"
@@ -46,8 +54,11 @@ def query_stream(request: QueryRequest) -> Generator[str, None, None]:
             results=db_result.output,
         )},
     ]
-    chunks = llm.generate_stream(messages=messages)
-    for event in parse_think_tags(chunks):
-        yield f"data: {json.dumps(event)}\n\n"
+    chunks = cancellable(llm.generate_stream(messages=messages), context)
+    try:
+        for event in parse_think_tags(chunks):
+            yield f"data: {json.dumps(event)}\n\n"
+    except OperationCancelled:
+        return
 
     yield f"data: {json.dumps({'type': 'done'})}\n\n"
@@ -0,0 +1,419 @@
+"""AST guard for agent SQL (ClickHouse dialect, parsed with sqlglot).
+
+A keyword regex rejected legitimate queries (a column called ``update``)
+and could not tell a second statement or a ``url()`` table function apart
+from a SELECT. Queries are parsed instead, and a query passes only when:
+
+- it is exactly one statement and that statement is a SELECT / UNION;
+- no node below it writes or changes anything (DDL, DML, SET, SELECT INTO,
+  commands), reads through an external table function, or overrides the
+  resource limits from ``limits.py`` in its SETTINGS clause.
+
+The parse also yields the known tables the query reads, which the result
+cache uses for TTLs and watermarks, and allows a few rewrites that need no
+LLM round-trip:
+
+- ``FINAL`` on Replacing/Collapsing MergeTree tables (the CDC tables fed
+  by the ingestion pipeline), so updated rows are not counted twice; views
+  and other engines reject FINAL;
+- ``deleted_by = 0`` for tables with a soft-delete column, unless the query
+  already mentions ``deleted_by`` for that table;
+- a top-level ``LIMIT`` when the query has none (UNION and ``LIMIT ... BY``
+  queries are wrapped in a subquery first).
+
+Rewrites are spliced into the original text at token positions instead of
+regenerating the whole query: sqlglot's generator turns ClickHouse functions
+into their generic spelling (``toStartOfMonth(d)`` -> ``dateTrunc('MONTH',
+d)``, ``if()`` -> ``CASE``). The spliced text must parse back to the
+rewritten tree; when it does not, the tree is regenerated as before.
+"""
+
+import logging
+from dataclasses import dataclass, field
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.dialects.dialect import Dialect
+from sqlglot.errors import ParseError
+from sqlglot.tokens import Token, TokenType
+
+from app.agents.database.introspect import TableInfo
+from app.agents.database.limits import QueryLimits
+
+logger = logging.getLogger(__name__)
+
+DIALECT = "clickhouse"
+
+SOFT_DELETE_COLUMN = "deleted_by"
+
+# Table functions that only generate data; everything else (url, s3, file,
+# remote, mysql, ...) reaches outside the warehouse.
+ALLOWED_TABLE_FUNCTIONS = frozenset({"numbers", "numbers_mt", "zeros", "zeros_mt"})
+
+_WRITE_NODES = tuple(
+    getattr(exp, name)
+    for name in (
+        "DDL", "DML", "Command", "Set", "Into", "Create", "Drop", "Alter",
+        "TruncateTable", "Insert", "Update", "Delete", "Merge", "Grant", "Revoke",
+    )
+    if hasattr(exp, name)
+)
+_LIMIT_SETTINGS = frozenset(QueryLimits().settings())
+
+# Engines whose rows are merged away in the background, including the
+# Replicated*/Shared* variants and VersionedCollapsingMergeTree.
+_FINAL_ENGINE_SUFFIXES = ("ReplacingMergeTree", "CollapsingMergeTree")
+
+# Tokens that end a FROM ... WHERE section of a SELECT at its own nesting level.
+_CLAUSE_ENDS = frozenset({
+    TokenType.GROUP_BY, TokenType.HAVING, TokenType.WINDOW, TokenType.QUALIFY, TokenType.ORDER_BY,
+    TokenType.LIMIT, TokenType.OFFSET, TokenType.SETTINGS, TokenType.FORMAT,
+    TokenType.UNION, TokenType.EXCEPT, TokenType.INTERSECT, TokenType.SEMICOLON,
+})
+# Top-level clauses a new LIMIT has to precede.
+_AFTER_LIMIT = frozenset({TokenType.OFFSET, TokenType.SETTINGS, TokenType.FORMAT})
+_JOIN_MODIFIERS = frozenset({
+    TokenType.LEFT, TokenType.RIGHT, TokenType.INNER, TokenType.FULL, TokenType.CROSS, TokenType.OUTER,
+    TokenType.GLOBAL, TokenType.ANY, TokenType.ALL, TokenType.ASOF, TokenType.SEMI, TokenType.ANTI,
+    TokenType.ARRAY, TokenType.NATURAL,
+})
+
+
+class SqlGuardError(ValueError):
+    """The query is not a single read-only SELECT the agent may run."""
+
+
+@dataclass
+class GuardedQuery:
+    sql: str
+    # Known tables the query reads.
+    tables: list[TableInfo] = field(default_factory=list)
+    # Tables that are not in the schema snapshot, as written.
+    unknown_tables: list[str] = field(default_factory=list)
+    rewrites: list[str] = field(default_factory=list)
+    limit_injected: bool = False
+
+
+@dataclass
+class _AddedCondition:
+    """Soft-delete conditions appended to one WHERE (or JOIN ... ON) clause."""
+
+    # End offset of the table (or its alias) the clause is found from.
+    anchor: int | None
+    on: bool
+    # Whether the existing condition was parenthesized before ``AND``.
+    wrapped: bool
+    conditions: list[str] = field(default_factory=list)
+
+
+def _parse(sql: str) -> exp.Expression:
+    try:
+        statements = [statement for statement in sqlglot.parse(sql, read=DIALECT) if statement is not None]
+    except ParseError as exc:
+        raise SqlGuardError(f"Could not parse the query as ClickHouse SQL: {str(exc).splitlines()[0]}") from exc
+    if len(statements) != 1:
+        raise SqlGuardError("Only a single statement is allowed.")
+    tree = statements[0]
+    if not isinstance(tree, exp.Query):
+        raise SqlGuardError("Only SELECT queries are allowed.")
+    return tree
+
+
+def _check_read_only(tree: exp.Expression) -> None:
+    for node in tree.walk():
+        if isinstance(node, _WRITE_NODES):
+            raise SqlGuardError(f"{type(node).__name__.upper()} is not allowed in a read-only query.")
+        if isinstance(node, exp.Table) and isinstance(node.this, exp.Func):
+            name = node.this.name if isinstance(node.this, exp.Anonymous) else node.this.sql_name()
+            if name.lower() not in ALLOWED_TABLE_FUNCTIONS:
+                raise SqlGuardError(f"Table function {name}() is not allowed.")
+        if isinstance(node, exp.Query):
+            for setting in node.args.get("settings") or []:
+                if isinstance(setting, exp.EQ) and setting.this.name.lower() in _LIMIT_SETTINGS:
+                    raise SqlGuardError(f"SETTINGS may not override {setting.this.name}.")
+
+
+class TableLookup:
+    def __init__(self, tables: list[TableInfo]):
+        self.by_full_name = {table.full_name: table for table in tables}
+        self.by_name: dict[str, list[TableInfo]] = {}
+        for table in tables:
+            self.by_name.setdefault(table.name, []).append(table)
+
+    def get(self, node: exp.Table) -> TableInfo | None:
+        if node.db:
+            return self.by_full_name.get(f"{node.db}.{node.name}")
+        matches = self.by_name.get(node.name, [])
+        return matches[0] if len(matches) == 1 else None
+
+
+def source_tables(tree: exp.Expression) -> list[exp.Table]:
+    """Physical tables in FROM / JOIN positions (CTE names and table functions excluded)."""
+    cte_names = {cte.alias_or_name for cte in tree.find_all(exp.CTE)}
+    sources = []
+    for node in tree.find_all(exp.Table):
+        parent = node.parent.parent if isinstance(node.parent, exp.Final) else node.parent
+        if not isinstance(parent, (exp.From, exp.Join)) or not isinstance(node.this, exp.Identifier):
+            continue
+        if not node.db and node.name in cte_names:
+            continue
+        sources.append(node)
+    return sources
+
+
+def needs_final(info: TableInfo) -> bool:
+    return info.engine.endswith(_FINAL_ENGINE_SUFFIXES)
+
+
+def _add_final(source: exp.Table) -> None:
+    source.replace(exp.Final(this=source.copy()))
+
+
+def _mentions_soft_delete(select: exp.Select, qualifier: str) -> bool:
+    for column in select.find_all(exp.Column):
+        if column.name != SOFT_DELETE_COLUMN or column.find_ancestor(exp.Select) is not select:
+            continue
+        if not column.table or column.table == qualifier:
+            return True
+    return False
+
+
+def _soft_delete_condition(source: exp.Table) -> exp.Expression:
+    return exp.column(SOFT_DELETE_COLUMN, table=source.alias_or_name).eq(0)
+
+
+def _and(condition: exp.Expression, extra: exp.Expression) -> tuple[exp.Expression, bool]:
+    """``condition AND extra``, parenthesizing ``condition`` unless it binds at least as tight as AND."""
+    wrapped = not isinstance(condition, (exp.And, exp.Predicate, exp.Paren, exp.Column))
+    left = exp.Paren(this=condition.copy()) if wrapped else condition.copy()
+    return exp.And(this=left, expression=extra), wrapped
+
+
+def _add_soft_delete(source: exp.Table, container: exp.Expression) -> tuple[exp.Expression, bool] | None:
+    """Filter deleted rows of ``source``; None when the filter cannot be placed safely.
+
+    Returns the Select (WHERE) or Join (ON) that got the condition and
+    whether its existing condition had to be parenthesized.
+    """
+    select = container.find_ancestor(exp.Select)
+    if select is None:
+        return None
+    qualifier = source.alias_or_name
+    if _mentions_soft_delete(select, qualifier):
+        return None
+    condition = _soft_delete_condition(source)
+    if isinstance(container, exp.Join):
+        side = (container.side or "").upper()
+        if side in ("RIGHT", "FULL") or (container.kind or "").upper() == "ARRAY":
+            return None
+        if container.args.get("on") is not None:
+            combined, wrapped = _and(container.args["on"], condition)
+            container.set("on", combined)
+            return container, wrapped
+        if side or container.args.get("using"):
+            return None
+    where = select.args.get("where")
+    if where is None:
+        select.set("where", exp.Where(this=condition))
+        return select, False
+    combined, wrapped = _and(where.this, condition)
+    where.set("this", combined)
+    return select, wrapped
+
+
+def _has_row_limit(tree: exp.Expression) -> bool:
+    limit = tree.args.get("limit")
+    # ``LIMIT n BY col`` caps rows per group, not the result.
+    return isinstance(limit, exp.Limit) and not limit.expressions
+
+
+def _with_limit(tree: exp.Expression, limit: int) -> exp.Expression:
+    if isinstance(tree, exp.Select) and tree.args.get("limit") is None:
+        tree.set("limit", exp.Limit(expression=exp.Literal.number(limit)))
+        return tree
+    return exp.select("*").from_(tree.subquery()).limit(limit)
+
+
+def _source_end(source: exp.Table) -> int | None:
+    """Offset of the last character of ``source``'s alias, or of its name."""
+    alias = source.args.get("alias")
+    identifier = alias.this if alias is not None and isinstance(alias.this, exp.Identifier) else source.this
+    return identifier.meta.get("end")
+
+
+def _starts_join(tokens: list[Token], index: int) -> bool:
+    while index < len(tokens) and tokens[index].token_type in _JOIN_MODIFIERS:
+        index += 1
+    return index < len(tokens) and tokens[index].token_type == TokenType.JOIN
+
+
+def _clause_span(
+    tokens: list[Token], depths: list[int], index: int, on: bool
+) -> tuple[int | None, int] | None:
+    """Locate the WHERE (or, for a join, ON) clause of the table at token ``index``.
+
+    Returns the index of the WHERE/ON keyword (None when the SELECT has no
+    WHERE) and of the last token of the clause, or of the FROM section when
+    there is no WHERE. None when the clause cannot be found.
+    """
+    depth = depths[index]
+    keyword = None
+    last = index
+    for position in range(index + 1, len(tokens)):
+        token_type = tokens[position].token_type
+        if depths[position] < depth:
+            break
+        if depths[position] == depth:
+            if token_type in _CLAUSE_ENDS:
+                break
+            if on and keyword is None and token_type == TokenType.ON:
+                keyword = position
+            elif on and keyword is not None and (
+                token_type in (TokenType.WHERE, TokenType.PREWHERE, TokenType.COMMA)
+                or _starts_join(tokens, position)
+            ):
+                break
+            elif not on and token_type == TokenType.WHERE:
+                keyword = position
+        last = position
+    if (on and keyword is None) or (keyword is not None and last == keyword):
+        return None
+    return keyword, last
+
+
+def _splice(
+    sql: str,
+    finals: list[int | None],
+    conditions: list[_AddedCondition],
+    limit: int,
+    wrap_limit: bool,
+) -> str | None:
+    """Apply the rewrites to the original text; None when a position is unknown."""
+    if None in finals:
+        return None
+    tokens = Dialect.get_or_raise(DIALECT).tokenize(sql)
+    by_end = {token.end: index for index, token in enumerate(tokens)}
+    depths = []
+    depth = 0
+    for token in tokens:
+        if token.token_type == TokenType.R_PAREN:
+            depth -= 1
+        depths.append(depth)
+        if token.token_type == TokenType.L_PAREN:
+            depth += 1
+
+    # (offset, order among inserts at the same offset, text)
+    inserts: list[tuple[int, int, str]] = [(end + 1, 0, " FINAL") for end in finals]
+    for added in conditions:
+        index = by_end.get(added.anchor)
+        span = _clause_span(tokens, depths, index, added.on) if index is not None else None
+        if span is None:
+            return None
+        keyword, last = span
+        end = tokens[last].end + 1
+        text = " AND ".join(added.conditions)
+        if keyword is None:
+            inserts.append((end, 3, f" WHERE {text}"))
+            continue
+        if added.wrapped:
+            inserts.append((tokens[keyword + 1].start, 1, "("))
+            inserts.append((end, 1, ")"))
+        inserts.append((end, 2 if added.on else 3, f" AND {text}"))
+    if limit and not wrap_limit:
+        before = next(
+            (token.start for token, depth in zip(tokens, depths) if depth == 0 and token.token_type in _AFTER_LIMIT),
+            None,
+        )
+        if before is None:
+            inserts.append((tokens[-1].end + 1, 4, f" LIMIT {limit}"))
+        else:
+            inserts.append((before, 4, f"LIMIT {limit} "))
+
+    pieces = []
+    cursor = 0
+    for offset, _, text in sorted(inserts, key=lambda insert: insert[:2]):
+        pieces.append(sql[cursor:offset])
+        pieces.append(text)
+        cursor = offset
+    pieces.append(sql[cursor:])
+    spliced = "".join(pieces)
+    return f"SELECT * FROM ({spliced}) LIMIT {limit}" if limit and wrap_limit else spliced
+
+
+def _render(tree: exp.Expression, spliced: str | None) -> str:
+    if spliced is not None:
+        try:
+            if _parse(spliced) == tree:
+                return spliced
+        except SqlGuardError:
+            pass
+    logger.debug("SQL guard could not splice its rewrites into the query text; regenerating it")
+    return tree.sql(dialect=DIALECT)
+
+
+def guard_sql(
+    sql: str,
+    tables: list[TableInfo] | None = None,
+    default_limit: int = 0,
+    auto_final: bool = True,
+    soft_delete: bool = True,
+) -> GuardedQuery:
+    """Validate ``sql`` and return it with the safe rewrites applied.
+
+    Raises ``SqlGuardError`` when the query is not a single read-only SELECT.
+    The original text is kept when nothing needs rewriting, and otherwise
+    only gets the rewrites spliced in.
+    """
+    sql = sql.strip().rstrip(";").rstrip()
+    tree = _parse(sql)
+    _check_read_only(tree)
+
+    lookup = TableLookup(tables or [])
+    known: dict[str, TableInfo] = {}
+    unknown: list[str] = []
+    rewrites: list[str] = []
+    # Text positions of the rewrites, for splicing them into ``sql``.
+    finals: list[int | None] = []
+    conditions: dict[int, _AddedCondition] = {}
+    for source in source_tables(tree):
+        info = lookup.get(source)
+        if info is None:
+            written = f"{source.db}.{source.name}" if source.db else source.name
+            if written not in unknown:
+                unknown.append(written)
+            continue
+        known[info.full_name] = info
+        container = source.parent.parent if isinstance(source.parent, exp.Final) else source.parent
+        anchor = _source_end(source)
+        if auto_final and needs_final(info) and not isinstance(source.parent, exp.Final):
+            _add_final(source)
+            rewrites.append(f"FINAL {info.full_name}")
+            finals.append(anchor)
+        target = None
+        if soft_delete and SOFT_DELETE_COLUMN in info.column_names():
+            target = _add_soft_delete(source, container)
+        if target is not None:
+            node, wrapped = target
+            rewrites.append(f"{SOFT_DELETE_COLUMN} = 0 {info.full_name}")
+            added = conditions.setdefault(id(node), _AddedCondition(anchor, isinstance(node, exp.Join), wrapped))
+            added.conditions.append(_soft_delete_condition(source).sql(dialect=DIALECT))
+
+    limit_injected = default_limit > 0 and not _has_row_limit(tree)
+    wrap_limit = False
+    if limit_injected:
+        wrap_limit = not (isinstance(tree, exp.Select) and tree.args.get("limit") is None)
+        tree = _with_limit(tree, default_limit)
+        rewrites.append(f"LIMIT {default_limit}")
+
+    rewritten = sql
+    if rewrites:
+        limit = default_limit if limit_injected else 0
+        rewritten = _render(tree, _splice(sql, finals, list(conditions.values()), limit, wrap_limit))
+        logger.debug("SQL guard rewrites: %s", ", ".join(rewrites))
+    return GuardedQuery(
+        sql=rewritten,
+        tables=list(known.values()),
+        unknown_tables=unknown,
+        rewrites=rewrites,
+        limit_injected=limit_injected,
+    )
@@ -0,0 +1,262 @@
+"""Deterministic repair of mechanical ClickHouse errors.
+
+Many failed attempts need no new generation: a column spelled with a
+different case or underscores (``avgBodyWeight`` for ``avg_body_weight``),
+a table without its database prefix, a String column compared with a date,
+or a projection missing from GROUP BY. The ClickHouse error code picks an
+error class, and the query is fixed on its AST using the cached schema:
+
+- ``unknown_column``: identifiers that are not schema columns or aliases are
+  mapped to the one column of the referenced tables with the same letters
+  and digits (case and ``_`` ignored);
+- ``unknown_table``: table names are qualified with their database (or
+  mapped to the one known table with the same letters and digits);
+- ``type_mismatch``: a String column compared with a Date/DateTime value is
+  parsed with ``parseDateTimeBestEffortOrNull`` (``toDate`` around it for
+  Date comparisons);
+- ``not_aggregate``: non-aggregated projections are added to GROUP BY.
+
+``repair_sql`` returns None when no fix applies; the agent then falls back
+to an LLM retry with the original error.
+"""
+
+import re
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ParseError
+
+from app.agents.database.introspect import TableInfo
+from app.agents.database.limits import clickhouse_error_code
+from app.agents.database.sql_guard import DIALECT, TableLookup, source_tables
+
+# ClickHouse error code -> error class with a local fix.
+ERROR_CLASSES = {
+    16: "unknown_column",  # NO_SUCH_COLUMN_IN_TABLE
+    47: "unknown_column",  # UNKNOWN_IDENTIFIER
+    60: "unknown_table",  # UNKNOWN_TABLE
+    81: "unknown_table",  # UNKNOWN_DATABASE
+    43: "type_mismatch",  # ILLEGAL_TYPE_OF_ARGUMENT
+    53: "type_mismatch",  # TYPE_MISMATCH
+    386: "type_mismatch",  # NO_COMMON_TYPE
+    215: "not_aggregate",  # NOT_AN_AGGREGATE
+}
+
+_DATE_TYPE_RE = re.compile(r"^(?:Nullable\()?(?:LowCardinality\()?(Date32|Date|DateTime64|DateTime)\b")
+_STRING_TYPE_RE = re.compile(r"^(?:Nullable\()?(?:LowCardinality\()?(?:Nullable\()?(String|FixedString)\b")
+_DATE_FUNCTIONS = re.compile(
+    r"^(today|yesterday|todate|todate32|tostartof\w+|tomonday|subtract\w+|add\w+|makedate|date)$"
+)
+_DATETIME_FUNCTIONS = re.compile(r"^(now|now64|todatetime|todatetime64|parsedatetime\w*|makedatetime)$")
+_COMPARISONS = (exp.EQ, exp.NEQ, exp.GT, exp.GTE, exp.LT, exp.LTE)
+
+
+@dataclass
+class SqlRepair:
+    sql: str
+    error_class: str
+    fixes: list[str] = field(default_factory=list)
+
+
+def classify_error(error: Exception) -> str | None:
+    code = getattr(error, "code", None) or clickhouse_error_code(error)
+    return ERROR_CLASSES.get(code) if isinstance(code, int) else None
+
+
+def _key(name: str) -> str:
+    return re.sub(r"[^0-9a-z]", "", name.lower())
+
+
+class _Scope:
+    """Referenced tables of a query, by qualifier."""
+
+    def __init__(self, tree: exp.Expression, tables: list[TableInfo]):
+        lookup = TableLookup(tables)
+        self.by_qualifier: dict[str, TableInfo] = {}
+        for source in source_tables(tree):
+            info = lookup.get(source)
+            if info is not None:
+                self.by_qualifier[source.alias_or_name] = info
+                self.by_qualifier.setdefault(source.name, info)
+        self.tables = list({info.full_name: info for info in self.by_qualifier.values()}.values())
+
+    def candidates(self, column: exp.Column) -> list[TableInfo]:
+        if column.table:
+            info = self.by_qualifier.get(column.table)
+            return [info] if info is not None else []
+        return self.tables
+
+    def column_type(self, column: exp.Column) -> str:
+        types = {
+            info_column.type
+            for info in self.candidates(column)
+            for info_column in info.columns
+            if info_column.name == column.name
+        }
+        return types.pop() if len(types) == 1 else ""
+
+
+# ---------------------------------------------------------------------------
+# Fixes — each edits the tree in place and returns descriptions of the edits
+# ---------------------------------------------------------------------------
+
+
+def _fix_unknown_columns(tree: exp.Expression, tables: list[TableInfo]) -> list[str]:
+    scope = _Scope(tree, tables)
+    defined = {alias.alias for alias in tree.find_all(exp.Alias)}
+    defined |= {cte.alias_or_name for cte in tree.find_all(exp.CTE)}
+    fixes = []
+    for column in list(tree.find_all(exp.Column)):
+        name = column.name
+        candidates = scope.candidates(column)
+        if not name or not candidates or name in defined:
+            continue
+        if any(name in info.column_names() for info in candidates):
+            continue
+        matches = {
+            real
+            for info in candidates
+            for real in info.column_names()
+            if _key(real) == _key(name)
+        }
+        if len(matches) != 1:
+            continue
+        real = matches.pop()
+        column.set("this", exp.to_identifier(real))
+        if f"{name} -> {real}" not in fixes:
+            fixes.append(f"{name} -> {real}")
+    return fixes
+
+
+def _fix_unknown_tables(tree: exp.Expression, tables: list[TableInfo]) -> list[str]:
+    lookup = TableLookup(tables)
+    by_key: dict[str, list[TableInfo]] = {}
+    for info in tables:
+        by_key.setdefault(_key(info.name), []).append(info)
+    fixes = []
+    for source in source_tables(tree):
+        if lookup.get(source) is not None and source.db:
+            continue
+        info = lookup.get(source)
+        if info is None:
+            matches = by_key.get(_key(source.name), [])
+            if len(matches) != 1:
+                continue
+            info = matches[0]
+        written = f"{source.db}.{source.name}" if source.db else source.name
+        source.set("db", exp.to_identifier(info.database))
+        source.set("this", exp.to_identifier(info.name))
+        fixes.append(f"{written} -> {info.full_name}")
+    return fixes
+
+
+def _function_name(node: exp.Expression) -> str:
+    if isinstance(node, exp.Anonymous):
+        return str(node.name).lower()
+    return ""
+
+
+def _temporal_kind(node: exp.Expression, scope: _Scope) -> str:
+    """"date", "datetime" or "" for an expression on the other side of a comparison."""
+    if isinstance(node, exp.Paren):
+        return _temporal_kind(node.this, scope)
+    if isinstance(node, exp.Column):
+        match = _DATE_TYPE_RE.match(scope.column_type(node))
+        if match is None:
+            return ""
+        return "datetime" if match.group(1).startswith("DateTime") else "date"
+    if isinstance(node, (exp.Add, exp.Sub)):
+        return _temporal_kind(node.this, scope)
+    if isinstance(node, exp.Cast):
+        target = node.to.sql(dialect=DIALECT).lower()
+        return "datetime" if "datetime" in target else "date" if target.startswith("date") else ""
+    if isinstance(node, (exp.CurrentTimestamp, exp.TimestampTrunc)):
+        return "datetime"
+    if isinstance(node, (exp.CurrentDate, exp.DateTrunc, exp.DateAdd, exp.DateSub, exp.TsOrDsToDate)):
+        return "date"
+    name = _function_name(node)
+    if _DATETIME_FUNCTIONS.match(name):
+        return "datetime"
+    if _DATE_FUNCTIONS.match(name):
+        return "date"
+    return ""
+
+
+def _parsed_date(column: exp.Column, kind: str) -> exp.Expression:
+    parsed = exp.Anonymous(this="parseDateTimeBestEffortOrNull", expressions=[column.copy()])
+    return parsed if kind == "datetime" else exp.Anonymous(this="toDate", expressions=[parsed])
+
+
+def _fix_date_casts(tree: exp.Expression, tables: list[TableInfo]) -> list[str]:
+    scope = _Scope(tree, tables)
+    fixes = []
+    comparisons = [node for node in tree.find_all(*_COMPARISONS, exp.Between)]
+    for comparison in comparisons:
+        if isinstance(comparison, exp.Between):
+            column, others = comparison.this, [comparison.args.get("low"), comparison.args.get("high")]
+        else:
+            column, others = comparison.this, [comparison.expression]
+            if not isinstance(column, exp.Column):
+                column, others = comparison.expression, [comparison.this]
+        if not isinstance(column, exp.Column) or not _STRING_TYPE_RE.match(scope.column_type(column)):
+            continue
+        kinds = {_temporal_kind(other, scope) for other in others if other is not None} - {""}
+        if not kinds:
+            continue
+        kind = "datetime" if "datetime" in kinds else "date"
+        column.replace(_parsed_date(column, kind))
+        fixes.append(f"{column.sql(dialect=DIALECT)} as {'DateTime' if kind == 'datetime' else 'Date'}")
+    return fixes
+
+
+def _is_aggregate(node: exp.Expression) -> bool:
+    return node.find(exp.AggFunc) is not None or node.find(exp.Window) is not None
+
+
+def _fix_group_by(tree: exp.Expression, tables: list[TableInfo]) -> list[str]:
+    fixes = []
+    for select in tree.find_all(exp.Select):
+        projections = [node for node in select.expressions if not isinstance(node, exp.Star)]
+        if not any(_is_aggregate(node) for node in projections):
+            continue
+        group = select.args.get("group")
+        grouped = {node.sql(dialect=DIALECT) for node in (group.expressions if group else [])}
+        missing = []
+        for node in projections:
+            inner = node.unalias()
+            if _is_aggregate(inner) or isinstance(inner, exp.Literal) or not inner.find(exp.Column):
+                continue
+            key = node.alias if isinstance(node, exp.Alias) else inner.sql(dialect=DIALECT)
+            if key in grouped or inner.sql(dialect=DIALECT) in grouped:
+                continue
+            missing.append(exp.column(node.alias) if isinstance(node, exp.Alias) else inner.copy())
+            grouped.add(key)
+        if missing:
+            select.group_by(*missing, copy=False)
+            fixes.extend(f"GROUP BY {node.sql(dialect=DIALECT)}" for node in missing)
+    return fixes
+
+
+_FIXES: dict[str, Callable[[exp.Expression, list[TableInfo]], list[str]]] = {
+    "unknown_column": _fix_unknown_columns,
+    "unknown_table": _fix_unknown_tables,
+    "type_mismatch": _fix_date_casts,
+    "not_aggregate": _fix_group_by,
+}
+
+
+def repair_sql(sql: str, error: Exception, tables: list[TableInfo]) -> SqlRepair | None:
+    """Locally fixed ``sql`` for a known error class, or None."""
+    error_class = classify_error(error)
+    if error_class is None:
+        return None
+    try:
+        tree = sqlglot.parse_one(sql, read=DIALECT)
+    except ParseError:
+        return None
+    fixes = _FIXES[error_class](tree, tables)
+    if not fixes:
+        return None
+    return SqlRepair(sql=tree.sql(dialect=DIALECT), error_class=error_class, fixes=fixes)
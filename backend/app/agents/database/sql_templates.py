@@ -0,0 +1,294 @@
+"""Parameterized SQL templates learned from successful runs.
+
+A question is parsed into words plus typed values: entity mentions
+(canonicalized to the one known name they match), absolute dates and
+numbers. Its *pattern* is the word sequence with each value replaced by a
+``{entity}``, ``{date}`` or ``{number}`` placeholder.
+
+After a successful run, every SQL literal that carries one of the
+question's values becomes a slot (character offsets in the SQL plus how the
+value was written: ``%`` wrappers, letter case, a time suffix on dates).
+A later question with the same pattern gets its own values spliced into
+those slots locally, with no LLM call. Values that did not become slots are
+fixed: the new question must repeat them exactly, otherwise the template
+does not apply.
+"""
+
+import datetime
+import hashlib
+import re
+from dataclasses import dataclass, field
+
+# Single words shorter than this never stand in for a longer entity name.
+MIN_PARTIAL_ENTITY_CHARS = 4
+
+_MONTHS = {
+    "jan": 1, "januari": 1, "january": 1,
+    "feb": 2, "februari": 2, "february": 2,
+    "mar": 3, "maret": 3, "march": 3,
+    "apr": 4, "april": 4,
+    "mei": 5, "may": 5,
+    "jun": 6, "juni": 6, "june": 6,
+    "jul": 7, "juli": 7, "july": 7,
+    "agu": 8, "agt": 8, "agustus": 8, "aug": 8, "august": 8,
+    "sep": 9, "sept": 9, "september": 9,
+    "okt": 10, "oktober": 10, "oct": 10, "october": 10,
+    "nov": 11, "november": 11,
+    "des": 12, "desember": 12, "dec": 12, "december": 12,
+}
+_MONTH_NAMES = "|".join(sorted(_MONTHS, key=len, reverse=True))
+
+_QUESTION_TOKEN_RE = re.compile(
+    r"(?P<iso>\b\d{4}-\d{1,2}-\d{1,2}\b)"
+    r"|(?P<dmy>\b\d{1,2}[/-]\d{1,2}[/-]\d{4}\b)"
+    rf"|(?P<named>\b\d{{1,2}}\s+(?:{_MONTH_NAMES})\s+\d{{4}}\b)"
+    r"|(?P<number>\b\d+(?:[.,]\d+)?\b(?![a-z]))"
+    r"|(?P<word>[0-9a-z]+)"
+)
+
+_SQL_LITERAL_RE = re.compile(
+    r"""
+      (?P<string>'(?:[^'\\]|\\.|'')*')
+    | `[^`]*` | "[^"]*"
+    | --[^\n]* | /\*.*?\*/
+    | (?P<number>\d+(?:\.\d+)?)
+    | \w+
+    """,
+    re.DOTALL | re.VERBOSE,
+)
+
+# Numbers are only slotted where they read as a threshold or a limit.
+_NUMBER_CONTEXT_RE = re.compile(r"(?:>=|<=|<>|!=|=|<|>|\bLIMIT|\bBETWEEN|\bAND)\s*$", re.IGNORECASE)
+_DATE_SUFFIX_RE = re.compile(r"^[ T]?[0-9:.]*$")
+
+
+def _parse_date(kind: str, text: str) -> str | None:
+    try:
+        if kind == "iso":
+            year, month, day = (int(part) for part in text.split("-"))
+        elif kind == "dmy":
+            day, month, year = (int(part) for part in re.split(r"[/-]", text))
+        else:
+            day_text, month_text, year_text = text.split()
+            day, month, year = int(day_text), _MONTHS[month_text], int(year_text)
+        return datetime.date(year, month, day).isoformat()
+    except (KeyError, ValueError):
+        return None
+
+
+@dataclass
+class QuestionToken:
+    kind: str  # "word", "entity", "date" or "number"
+    value: str
+
+    def pattern(self) -> str:
+        return self.value if self.kind == "word" else "{" + self.kind + "}"
+
+    def display(self) -> str:
+        return f"<{self.value.lower()}>" if self.kind == "entity" else self.value
+
+
+@dataclass
+class ParsedQuestion:
+    tokens: list[QuestionToken] = field(default_factory=list)
+
+    @property
+    def pattern(self) -> str:
+        return " ".join(token.pattern() for token in self.tokens)
+
+    @property
+    def canonical(self) -> str:
+        return " ".join(token.display() for token in self.tokens)
+
+    @property
+    def values(self) -> list[QuestionToken]:
+        return [token for token in self.tokens if token.kind != "word"]
+
+    @property
+    def key(self) -> str:
+        return hashlib.sha256(self.pattern.encode("utf-8")).hexdigest()
+
+
+def _raw_tokens(question: str) -> list[QuestionToken]:
+    tokens = []
+    for match in _QUESTION_TOKEN_RE.finditer(question.lower()):
+        kind = match.lastgroup
+        text = match.group()
+        if kind in ("iso", "dmy", "named"):
+            date = _parse_date(kind, text)
+            if date is not None:
+                tokens.append(QuestionToken("date", date))
+            else:
+                tokens.extend(QuestionToken("word", word) for word in re.findall(r"[0-9a-z]+", text))
+        elif kind == "number":
+            tokens.append(QuestionToken("number", text.replace(",", ".")))
+        else:
+            tokens.append(QuestionToken("word", text))
+    return tokens
+
+
+def _resolve_entities(tokens: list[QuestionToken], entity_names: list[str]) -> list[QuestionToken]:
+    """Replace runs of words that appear in exactly one entity name (longest run wins)."""
+    entities = [(re.findall(r"[0-9a-z]+", name.lower()), name) for name in entity_names]
+    entities = [(words, name) for words, name in entities if words]
+    if not entities:
+        return tokens
+    longest = max(len(words) for words, _ in entities)
+    # Short names ("A1" for a pond) only match when written in full.
+    full_names = [words for words, _ in entities]
+
+    def owners(run: list[str]) -> list[str]:
+        size = len(run)
+        return [
+            name for words, name in entities
+            if any(words[i:i + size] == run for i in range(len(words) - size + 1))
+        ]
+
+    resolved: list[QuestionToken] = []
+    index = 0
+    while index < len(tokens):
+        for size in range(min(longest, len(tokens) - index), 0, -1):
+            window = tokens[index:index + size]
+            if any(token.kind not in ("word", "number") for token in window):
+                continue
+            run = [token.value for token in window]
+            if size == 1 and len(run[0]) < MIN_PARTIAL_ENTITY_CHARS and run not in full_names:
+                continue
+            matched = owners(run)
+            if len(matched) == 1:
+                resolved.append(QuestionToken("entity", matched[0]))
+                index += size
+                break
+        else:
+            resolved.append(tokens[index])
+            index += 1
+    return resolved
+
+
+def parse_question(question: str, entity_names: list[str] | None = None) -> ParsedQuestion:
+    return ParsedQuestion(_resolve_entities(_raw_tokens(question), entity_names or []))
+
+
+# ---------------------------------------------------------------------------
+# Slot induction and filling
+# ---------------------------------------------------------------------------
+
+
+def _letter_case(written: str, value: str) -> str:
+    if written == value:
+        return "canonical"
+    if written == value.upper():
+        return "upper"
+    if written == value.lower():
+        return "lower"
+    return ""
+
+
+def _string_slot(inner: str, token: QuestionToken) -> dict | None:
+    """Slot fields if the string literal body ``inner`` carries ``token``."""
+    position = inner.lower().find(token.value.lower())
+    if position < 0:
+        return None
+    prefix = inner[:position]
+    suffix = inner[position + len(token.value):]
+    written = inner[position:position + len(token.value)]
+    if token.kind == "entity":
+        case = _letter_case(written, token.value)
+        if not case or prefix.strip("%") or suffix.strip("%"):
+            return None
+        return {"prefix": prefix, "suffix": suffix, "case": case}
+    if token.kind == "date":
+        if prefix or not _DATE_SUFFIX_RE.match(suffix):
+            return None
+        return {"prefix": "", "suffix": suffix, "case": "canonical"}
+    return None
+
+
+def induce_slots(sql: str, parsed: ParsedQuestion) -> list[dict]:
+    """Find the SQL literals that carry the question's values."""
+    values = parsed.values
+    slots: list[dict] = []
+    number_positions: dict[str, list[int]] = {}
+    for position, token in enumerate(values):
+        if token.kind == "number":
+            number_positions.setdefault(token.value, []).append(position)
+
+    number_literals: dict[str, list[re.Match]] = {}
+    for match in _SQL_LITERAL_RE.finditer(sql):
+        if match.group("string") is not None:
+            inner = match.group("string")[1:-1]
+            for position, token in enumerate(values):
+                fields = _string_slot(inner, token)
+                if fields is not None:
+                    slots.append({
+                        "value": position,
+                        "kind": token.kind,
+                        "start": match.start() + 1,
+                        "end": match.end() - 1,
+                        **fields,
+                    })
+                    break
+        elif match.group("number") is not None:
+            if _NUMBER_CONTEXT_RE.search(sql[: match.start()]):
+                literal = match.group("number")
+                key = str(float(literal))
+                number_literals.setdefault(key, []).append(match)
+
+    # A number is slotted only when it is unambiguous on both sides.
+    for text, positions in number_positions.items():
+        matches = number_literals.get(str(float(text)), [])
+        if len(positions) == 1 and len(matches) == 1:
+            match = matches[0]
+            slots.append({
+                "value": positions[0],
+                "kind": "number",
+                "start": match.start(),
+                "end": match.end(),
+                "prefix": "",
+                "suffix": "",
+                "case": "canonical",
+            })
+    slots.sort(key=lambda slot: slot["start"])
+    return slots
+
+
+def _render_value(slot: dict, token: QuestionToken) -> str:
+    value = token.value
+    if slot["case"] == "upper":
+        value = value.upper()
+    elif slot["case"] == "lower":
+        value = value.lower()
+    if slot["kind"] in ("entity", "date"):
+        value = value.replace("\\", "\\\\").replace("'", "\\'")
+    return f"{slot['prefix']}{value}{slot['suffix']}"
+
+
+def fill_template(
+    sql: str,
+    slots: list[dict],
+    stored_values: list[dict],
+    parsed: ParsedQuestion,
+) -> str | None:
+    """SQL for ``parsed`` from a template, or None if a fixed value differs."""
+    values = parsed.values
+    if len(values) != len(stored_values):
+        return None
+    slotted = {slot["value"] for slot in slots}
+    for position, (token, stored) in enumerate(zip(values, stored_values)):
+        if token.kind != stored["kind"]:
+            return None
+        if position not in slotted and token.value != stored["value"]:
+            return None
+
+    parts: list[str] = []
+    cursor = 0
+    for slot in slots:
+        parts.append(sql[cursor:slot["start"]])
+        parts.append(_render_value(slot, values[slot["value"]]))
+        cursor = slot["end"]
+    parts.append(sql[cursor:])
+    return "".join(parts)
+
+
+def serialize_values(parsed: ParsedQuestion) -> list[dict]:
+    return [{"kind": token.kind, "value": token.value} for token in parsed.values]
@@ -1,8 +1,10 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from fastapi.responses import StreamingResponse
 
 from app.agents.memory.api_schemas import MemoryRequest, MemoryResponse
 from app.agents.memory.service import execute_memory, execute_memory_stream
+from app.core.cancellation import CancellationToken
+from app.core.streaming import disconnect_aware
 
 router = APIRouter(tags=["Memory"], prefix="/v1/memory")
 
@@ -13,8 +15,9 @@ async def execute_memory_endpoint(request: MemoryRequest):
 
 
 @router.post("/execute/stream")
-async def execute_memory_stream_endpoint(request: MemoryRequest):
+async def execute_memory_stream_endpoint(request: MemoryRequest, http_request: Request):
+    token = CancellationToken()
     return StreamingResponse(
-        execute_memory_stream(request),
+        disconnect_aware(http_request, execute_memory_stream(request, cancel_token=token), token),
         media_type="text/event-stream",
     )
@@ -3,6 +3,7 @@ from collections.abc import Generator
 
 from app.agents.memory import create_memory_agent
 from app.agents.memory.api_schemas import MemoryRequest, MemoryResponse
+from app.core.cancellation import CancellationToken, OperationCancelled
 
 
 def execute_memory(request: MemoryRequest) -> MemoryResponse:
@@ -21,8 +22,12 @@ def execute_memory(request: MemoryRequest) -> MemoryResponse:
     return MemoryResponse(status=status, summary=summary, count=count)
 
 
-def execute_memory_stream(request: MemoryRequest) -> Generator[str, None, None]:
+def execute_memory_stream(
+    request: MemoryRequest,
+    cancel_token: CancellationToken | None = None,
+) -> Generator[str, None, None]:
     agent = create_memory_agent()
+    context = {"cancel_token": cancel_token} if cancel_token else None
     payload = {
         "action": request.action,
         "user_id": request.user_id,
@@ -31,11 +36,14 @@ def execute_memory_stream(request: MemoryRequest) -> Generator[str, None, None]:
         "messages": [m.model_dump() for m in request.messages],
     }
     memory_result = None
-    for event in agent.execute_stream(json.dumps(payload, ensure_ascii=True)):
-        if event.get("type") == "_result":
-            memory_result = event["data"]
-        else:
-            yield f"data: {json.dumps(event)}\n\n"
+    try:
+        for event in agent.execute_stream(json.dumps(payload, ensure_ascii=True), context=context):
+            if event.get("type") == "_result":
+                memory_result = event["data"]
+            else:
+                yield f"data: {json.dumps(event)}\n\n"
+    except OperationCancelled:
+        return
 
     if memory_result is None:
         yield f"data: {json.dumps({'type': 'content', 'content': 'Error: Memory agent returned no result.'})}\n\n"
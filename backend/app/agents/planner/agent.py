@@ -3,15 +3,20 @@ import logging
 import re
 from collections.abc import Generator
 
-from sqlmodel import text
-
 from app.agents.alert.agent import AlertAgent
 from app.agents.base import AgentResult, BaseAgent
 from app.agents.browser.agent import BrowserAgent
 from app.agents.chart.agent import ChartAgent
 from app.agents.compare.agent import CompareAgent
 from app.agents.database.agent import DatabaseAgent
+from app.agents.database.entity_catalog import get_entity_catalog
+from app.agents.database.introspect import get_schema_snapshot
+from app.agents.database.kpi_templates import KpiIntent, render_kpi_sql
+from app.agents.database.question_cache import question_sql_store
+from app.agents.database.semantic import semantic_context
+from app.agents.database.sql_templates import ParsedQuestion, parse_question
 from app.agents.report.agent import ReportAgent
+from app.agents.planner.dag import run_task_graph
 from app.agents.planner.schemas import (
     ALERT_ROUTE,
     BROWSER_ROUTE,
@@ -19,21 +24,38 @@ from app.agents.planner.schemas import (
     COMPARE_ROUTE,
     DATABASE_ROUTE,
     GENERAL_ROUTE,
+    MULTI_ROUTE,
     REPORT_ROUTE,
     TIMESERIES_ROUTE,
     VECTOR_ROUTE,
+    PlanTask,
     RoutingDecision,
+    TaskGraph,
 )
 from app.agents.timeseries.agent import TimeSeriesAgent
 from app.agents.vector.agent import VectorAgent
 from app.agents.planner.streaming import parse_think_tags
+from app.agents.planner.time_expressions import ResolvedTime, resolve_time_expressions
+from app.core.cancellation import cancellable, check_cancelled, get_cancel_token
+from app.core.config import settings
 from app.core.database import clickhouse_engine
+from app.core.deadline import check_deadline, is_budget_tight, is_expired, llm_config
 from app.core.llm.base import BaseLLM
-from app.core.llm.schemas import GenerateConfig
+from app.core.metrics import PLANNER_REFLECTIONS, PLANNER_ROUTES
+from app.core.timing import Stopwatch, TimedStream, timing_event, timings_enabled
+from app.core.tracing import span
 from app.modules.admin.service import resolve_config, resolve_prompt
 
 logger = logging.getLogger(__name__)
 
+# Max characters of a dependency's output passed into a downstream branch.
+MAX_DEPENDENCY_CONTEXT_CHARS = 4000
+
+# Routes answered from farm data: relative dates in their input are resolved locally.
+TIME_RESOLVED_ROUTES = frozenset({
+    DATABASE_ROUTE, TIMESERIES_ROUTE, COMPARE_ROUTE, CHART_ROUTE, REPORT_ROUTE, ALERT_ROUTE, MULTI_ROUTE,
+})
+
 # ---------------------------------------------------------------------------
 # Domain cheatsheet — condensed reference injected into routing & command prompts
 # so the planner knows what data exists without needing the full SQL schema.
@@ -87,39 +109,26 @@ class PlannerAgent(BaseAgent):
         self.alert_agent = alert_agent
 
     # ------------------------------------------------------------------
-    # Entity resolution — fetch real site names from ClickHouse so the
-    # routing LLM can map user input to exact names.
+    # Entity resolution — match site/pond mentions against the cached
+    # entity catalog so the routing LLM can use exact names.
     # ------------------------------------------------------------------
 
     @staticmethod
-    def _fetch_entity_context() -> str:
-        """Fetch active site names directly from ClickHouse (no LLM call)."""
+    def _resolve_entities(user_message: str) -> tuple[list[str], str]:
+        """Return (entity names for the question cache, prompt context for the entities mentioned).
+
+        The names are every active site plus the ponds mentioned in the message.
+        """
         try:
-            with clickhouse_engine.connect() as conn:
-                rows = conn.execute(
-                    text(
-                        "SELECT DISTINCT name "
-                        "FROM cultivation.sites AS s FINAL "
-                        "WHERE s.deleted_by = 0 AND s.status = 1 "
-                        "ORDER BY name"
-                    )
-                ).fetchall()
-            site_names = [str(row[0]) for row in rows if row[0]]
-            if not site_names:
-                return ""
-            return (
-                "SITE AKTIF DI DATABASE:\n"
-                + ", ".join(site_names)
-                + "\n\n"
-                "Jika user menyebut nama site secara parsial atau tidak tepat, "
-                "cocokkan ke nama LENGKAP dari daftar di atas.\n"
-                "Contoh: user bilang 'teluk tomini' → gunakan 'ARONA TELUK TOMINI'.\n"
-                "Contoh: user bilang 'suma' → gunakan 'SUMA MARINA'.\n"
-                "SELALU gunakan nama site PERSIS dari daftar di atas di routed_input."
-            )
+            catalog = get_entity_catalog(clickhouse_engine)
         except Exception as exc:
-            logger.warning("Failed to fetch entity context: %s", exc)
-            return ""
+            logger.warning("Failed to load entity catalog: %s", exc)
+            return [], ""
+        with span("planner.entities") as current:
+            matches = catalog.resolve(user_message)
+            current.set(sites=len(matches.sites), ponds=len(matches.ponds))
+        pond_names = [pond.name for pond in matches.ponds]
+        return list(dict.fromkeys([*catalog.site_names, *pond_names])), matches.render()
 
     def _build_db_plan_messages(self, user_message: str) -> list[dict[str, str]]:
         return [
@@ -167,6 +176,25 @@ class PlannerAgent(BaseAgent):
             )},
         ]
 
+    def _build_dag_plan_messages(self, user_message: str, entity_context: str = "") -> list[dict[str, str]]:
+        system_content = resolve_prompt("dag_plan_system")
+        if entity_context:
+            system_content += "\n\n" + entity_context
+        system_content += "\n\n" + DOMAIN_CONTEXT
+        return [
+            {"role": "system", "content": system_content},
+            {"role": "user", "content": resolve_prompt("dag_plan_user").format(message=user_message)},
+        ]
+
+    def _build_dag_synthesis_messages(self, question: str, branch_output: str) -> list[dict[str, str]]:
+        return [
+            {"role": "system", "content": resolve_prompt("dag_synthesis_system")},
+            {"role": "user", "content": resolve_prompt("dag_synthesis_user").format(
+                question=question,
+                results=branch_output,
+            )},
+        ]
+
     def _build_db_command_messages(self, user_message: str, entity_context: str = "") -> list[dict[str, str]]:
         system_content = resolve_prompt("db_command_system")
         if entity_context:
@@ -286,27 +314,297 @@ class PlannerAgent(BaseAgent):
         output = db_result.output or ""
         return isinstance(output, str) and output.strip().startswith("Error:")
 
-    def _route_message(self, user_message: str, entity_context: str = "") -> RoutingDecision:
-        messages = self._build_routing_messages(user_message, entity_context=entity_context)
-        config = GenerateConfig(temperature=0)
-        response = self.llm.generate(messages=messages, config=config)
+    def _route_message(
+        self,
+        user_message: str,
+        entity_context: str = "",
+        context: dict | None = None,
+    ) -> tuple[RoutingDecision, dict | None]:
+        with span("planner.route") as current:
+            messages = self._build_routing_messages(user_message, entity_context=entity_context)
+            config = llm_config(context, temperature=0, prompt_slug="routing_system")
+            response = self.llm.generate(messages=messages, config=config)
 
-        raw = self._strip_json_fence(response.text)
+            raw = self._strip_json_fence(response.text)
 
-        try:
-            parsed = json.loads(raw)
-            return RoutingDecision.from_payload(parsed, fallback_input=user_message)
-        except (json.JSONDecodeError, KeyError) as e:
-            logger.warning("Failed to parse route decision, defaulting to general: %s", e)
-            return RoutingDecision(
-                target_agent=GENERAL_ROUTE,
-                reasoning="Failed to parse routing decision, defaulting to general.",
-                routed_input=user_message,
+            try:
+                parsed = json.loads(raw)
+                decision = RoutingDecision.from_payload(parsed, fallback_input=user_message)
+            except (json.JSONDecodeError, KeyError) as e:
+                logger.warning("Failed to parse route decision, defaulting to general: %s", e)
+                decision = RoutingDecision(
+                    target_agent=GENERAL_ROUTE,
+                    reasoning="Failed to parse routing decision, defaulting to general.",
+                    routed_input=user_message,
+                )
+            current.set(target_agent=decision.target_agent)
+            PLANNER_ROUTES.labels(route=decision.target_agent).inc()
+            return decision, response.usage
+
+    @staticmethod
+    def _resolve_time_expressions(decision: RoutingDecision) -> list[ResolvedTime]:
+        """Replace relative dates in the routed input of data routes with absolute ranges."""
+        if decision.target_agent not in TIME_RESOLVED_ROUTES:
+            return []
+        with span("planner.time_expressions") as current:
+            routed_input, resolved = resolve_time_expressions(decision.routed_input)
+            decision.routed_input = routed_input
+            current.set(resolved=len(resolved))
+            return resolved
+
+    # ------------------------------------------------------------------
+    # Database route steps (shared by execute and execute_stream)
+    # ------------------------------------------------------------------
+
+    def _plan_db_query(
+        self, routed_input: str, context: dict | None = None
+    ) -> tuple[str, dict | None, KpiIntent | None, bool]:
+        """Return (plan_summary, usage, kpi_intent, metric_query); an empty summary if planning fails.
+
+        ``kpi_intent`` is set when the plan maps the question onto a curated
+        KPI template (the plan's optional "kpi" object). ``metric_query`` is
+        the plan's "metric_query" flag; only those questions try the
+        semantic metric layer.
+        """
+        with span("planner.plan") as current:
+            try:
+                plan_messages = self._build_db_plan_messages(routed_input)
+                plan_config = llm_config(context, temperature=0, prompt_slug="db_plan_system")
+                plan_response = self.llm.generate(messages=plan_messages, config=plan_config)
+                plan_payload = self._parse_json(plan_response.text)
+                plan_summary = self._format_plan_summary(plan_payload)
+                if not plan_summary:
+                    plan_summary = self._strip_think_tags(plan_response.text)
+                kpi_intent = KpiIntent.from_payload((plan_payload or {}).get("kpi"))
+                metric_query = (plan_payload or {}).get("metric_query") is True
+                current.set(kpi=kpi_intent.metric if kpi_intent else "", metric_query=metric_query)
+                return plan_summary, plan_response.usage, kpi_intent, metric_query
+            except Exception as exc:
+                logger.warning("Failed to build plan: %s", exc)
+                return "", None, None, False
+
+    @staticmethod
+    def _kpi_template_sql(intent: KpiIntent | None) -> str | None:
+        """Curated SQL for ``intent``, or None when no template applies to the current schema."""
+        if intent is None or not settings.KPI_TEMPLATES_ENABLED:
+            return None
+        with span("planner.kpi_template", metric=intent.metric, granularity=intent.granularity) as current:
+            try:
+                tables = get_schema_snapshot(clickhouse_engine).tables
+                sql = render_kpi_sql(intent, tables)
+            except Exception as exc:
+                logger.warning("KPI template rendering failed: %s", exc)
+                return None
+            current.set(used=sql is not None)
+            return sql
+
+    def _build_db_instruction(
+        self,
+        routed_input: str,
+        plan_summary: str,
+        entity_context: str = "",
+        context: dict | None = None,
+    ) -> tuple[str, dict]:
+        with span("planner.command"):
+            command_input = routed_input
+            if plan_summary:
+                command_input = f"{routed_input}\n\nRencana:\n{plan_summary}"
+            command_messages = self._build_db_command_messages(command_input, entity_context=entity_context)
+            command_config = llm_config(context, temperature=0, prompt_slug="db_command_system")
+            command_response = self.llm.generate(messages=command_messages, config=command_config)
+            return self._strip_think_tags(command_response.text), command_response.usage
+
+    def _reflect_db_instruction(
+        self,
+        question: str,
+        plan_summary: str,
+        instruction: str,
+        db_result: AgentResult,
+        context: dict | None = None,
+    ) -> tuple[str, dict]:
+        PLANNER_REFLECTIONS.inc()
+        with span("planner.reflection"):
+            error_msg = db_result.metadata.get("error") or db_result.output
+            reflection_messages = self._build_db_reflection_messages(
+                question=question,
+                plan=plan_summary,
+                instruction=instruction,
+                error=str(error_msg),
             )
+            reflection_config = llm_config(context, temperature=0, prompt_slug="db_reflection_system")
+            reflection_response = self.llm.generate(
+                messages=reflection_messages,
+                config=reflection_config,
+            )
+            return self._strip_think_tags(reflection_response.text), reflection_response.usage
+
+    @staticmethod
+    def _question_cache_text(user_message: str) -> str:
+        """The user's message with relative dates resolved.
+
+        The routed input is rewritten by the routing LLM and varies between
+        runs, so templates are keyed on what the user actually typed.
+        """
+        return resolve_time_expressions(user_message)[0]
+
+    @staticmethod
+    def _lookup_question_sql(question: str, entity_names: list[str]) -> tuple[ParsedQuestion | None, str | None]:
+        """Return (parsed question, SQL from a cached template or None); (None, None) when disabled."""
+        if not settings.QUESTION_CACHE_ENABLED:
+            return None, None
+        with span("planner.question_cache") as current:
+            try:
+                parsed = parse_question(question, entity_names)
+                fingerprint = get_schema_snapshot(clickhouse_engine).fingerprint
+                sql = question_sql_store.lookup(parsed, fingerprint)
+            except Exception as exc:
+                logger.warning("Question cache lookup failed: %s", exc)
+                return None, None
+            current.set(hit=sql is not None, pattern=parsed.pattern)
+            return parsed, sql
+
+    def _remember_question_sql(self, parsed: ParsedQuestion | None, question: str, db_result: AgentResult) -> None:
+        """Learn a template from SQL that executed successfully and returned rows."""
+        sql = db_result.metadata.get("sql")
+        if parsed is None or not sql or self._should_reflect(db_result) or not db_result.metadata.get("row_count"):
+            return
+        try:
+            fingerprint = get_schema_snapshot(clickhouse_engine).fingerprint
+            question_sql_store.remember(parsed, question, sql, fingerprint)
+        except Exception as exc:
+            logger.warning("Failed to store question SQL: %s", exc)
+
+    @staticmethod
+    def _forget_question_sql(parsed: ParsedQuestion | None) -> None:
+        if parsed is None:
+            return
+        try:
+            question_sql_store.forget(parsed.key)
+        except Exception as exc:
+            logger.warning("Failed to evict question SQL: %s", exc)
+
+    # ------------------------------------------------------------------
+    # Multi-agent mode — plan a small task graph and run independent
+    # branches concurrently, then merge everything in one synthesis step.
+    # ------------------------------------------------------------------
+
+    def _plan_task_graph(
+        self,
+        decision: RoutingDecision,
+        entity_context: str = "",
+        context: dict | None = None,
+    ) -> TaskGraph:
+        messages = self._build_dag_plan_messages(decision.routed_input, entity_context=entity_context)
+        config = llm_config(context, temperature=0, prompt_slug="dag_plan_system")
+        with span("planner.dag_plan") as current:
+            try:
+                response = self.llm.generate(messages=messages, config=config)
+                payload = self._parse_json(self._strip_think_tags(response.text))
+                if payload is None:
+                    raise ValueError("Task graph is not valid JSON")
+                graph = TaskGraph.from_payload(payload)
+            except Exception as exc:
+                logger.warning("Failed to build task graph, falling back to database task: %s", exc)
+                graph = TaskGraph(
+                    tasks=[PlanTask(id="t1", agent=DATABASE_ROUTE, input=decision.routed_input)],
+                    reasoning="Fallback: single database task.",
+                )
+            current.set(tasks=len(graph.tasks))
+            return graph
+
+    def _branch_agent(self, agent: str) -> BaseAgent | None:
+        return {
+            DATABASE_ROUTE: self.database_agent,
+            BROWSER_ROUTE: self.browser_agent,
+            TIMESERIES_ROUTE: self.timeseries_agent,
+            COMPARE_ROUTE: self.compare_agent,
+            ALERT_ROUTE: self.alert_agent,
+        }.get(agent)
+
+    @staticmethod
+    def _build_branch_input(task: PlanTask, dep_results: dict[str, AgentResult]) -> str:
+        if not dep_results:
+            return task.input
+        parts = [task.input, "", "Hasil task sebelumnya:"]
+        for dep_id, dep_result in dep_results.items():
+            output = (dep_result.output or "").strip()
+            if len(output) > MAX_DEPENDENCY_CONTEXT_CHARS:
+                output = output[:MAX_DEPENDENCY_CONTEXT_CHARS] + "\n...(dipotong)"
+            parts.append(f"[{dep_id}]\n{output}")
+        return "\n".join(parts)
+
+    def _run_branch_stream(
+        self,
+        task: PlanTask,
+        dep_results: dict[str, AgentResult],
+        context: dict | None = None,
+    ) -> Generator[dict, None, None]:
+        """Run one graph node; thinking is forwarded, content is collected."""
+        agent = self._branch_agent(task.agent)
+        if agent is None or not self._is_agent_enabled(task.agent):
+            yield {
+                "type": "_result",
+                "data": AgentResult(
+                    output=f"Error: Agent '{task.agent}' is not available.",
+                    metadata={"agent": task.agent, "error": "not available"},
+                ),
+            }
+            return
+
+        check_cancelled(context)
+        check_deadline(context, f"branch {task.id}")
+        yield {"type": "thinking", "content": f"[{task.id}] {task.agent}: {task.input}\n"}
+
+        branch_input = self._build_branch_input(task, dep_results)
+        content_parts: list[str] = []
+        result = None
+        for event in agent.execute_stream(branch_input, context=context):
+            event_type = event.get("type")
+            if event_type == "_result":
+                result = event["data"]
+            elif event_type == "content":
+                content_parts.append(str(event.get("content", "")))
+            else:
+                yield event
+
+        output = result.output if result is not None and result.output else "".join(content_parts)
+        metadata = dict(result.metadata) if result is not None else {}
+        metadata.setdefault("agent", task.agent)
+        yield {"type": "thinking", "content": f"[{task.id}] selesai.\n"}
+        yield {"type": "_result", "data": AgentResult(output=output, metadata=metadata)}
+
+    @staticmethod
+    def _format_branch_results(graph: TaskGraph, results: dict[str, AgentResult]) -> str:
+        sections: list[str] = []
+        for task in graph.tasks:
+            result = results.get(task.id)
+            output = (result.output if result else "") or "(tidak ada hasil)"
+            sections.append(f"### {task.id} ({task.agent}): {task.input}\n{output}")
+        return "\n\n".join(sections)
+
+    @staticmethod
+    def _format_graph_summary(graph: TaskGraph) -> str:
+        lines = []
+        for task in graph.tasks:
+            deps = f" (setelah {', '.join(task.depends_on)})" if task.depends_on else ""
+            lines.append(f"- {task.id} [{task.agent}]{deps}: {task.input}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _stream_answer(chunks, context: dict | None = None) -> Generator[dict, None, None]:
+        """Stream the final answer; with timings on, follow it with a synthesis event."""
+        if not timings_enabled(context):
+            yield from parse_think_tags(chunks)
+            return
+        timed_chunks = TimedStream(chunks)
+        yield from parse_think_tags(iter(timed_chunks))
+        yield timed_chunks.timing_event("synthesis")
 
     def execute(self, input_text: str, context: dict | None = None, history: list[dict] | None = None) -> AgentResult:
-        entity_context = self._fetch_entity_context()
-        decision = self._route_message(input_text, entity_context=entity_context)
+        entity_names, entity_context = self._resolve_entities(input_text)
+        check_cancelled(context)
+        check_deadline(context, "routing")
+        decision, _ = self._route_message(input_text, entity_context=entity_context, context=context)
         if not self._is_agent_enabled(decision.target_agent):
             return AgentResult(
                 output=self._disabled_agent_message(decision.target_agent),
@@ -316,58 +614,123 @@ class PlannerAgent(BaseAgent):
                     "disabled": True,
                 },
             )
+        time_ranges = self._resolve_time_expressions(decision)
+
+        if decision.target_agent == MULTI_ROUTE:
+            graph = self._plan_task_graph(decision, entity_context=entity_context, context=context)
+            branch_results: dict[str, AgentResult] = {}
+            for event in run_task_graph(
+                graph,
+                lambda task, deps: self._run_branch_stream(task, deps, context=context),
+                cancel_token=get_cancel_token(context),
+            ):
+                if event.get("type") == "_result":
+                    branch_results = event["data"]
+
+            messages = self._build_dag_synthesis_messages(
+                question=input_text,
+                branch_output=self._format_branch_results(graph, branch_results),
+            )
+            response = self.llm.generate(messages=messages, config=llm_config(context, prompt_slug="dag_synthesis_system"))
+            return AgentResult(
+                output=response.text,
+                metadata={
+                    "agent": decision.target_agent,
+                    "routing_reasoning": decision.reasoning,
+                    "tasks": [
+                        {
+                            "id": task.id,
+                            "agent": task.agent,
+                            "input": task.input,
+                            "depends_on": task.depends_on,
+                            "error": branch_results[task.id].metadata.get("error")
+                            if task.id in branch_results else None,
+                        }
+                        for task in graph.tasks
+                    ],
+                    "usage": response.usage,
+                },
+            )
 
         if decision.target_agent == DATABASE_ROUTE:
             plan_summary = ""
             plan_usage = None
-            try:
-                plan_messages = self._build_db_plan_messages(decision.routed_input)
-                plan_config = GenerateConfig(temperature=0)
-                plan_response = self.llm.generate(messages=plan_messages, config=plan_config)
-                plan_usage = plan_response.usage
-                plan_payload = self._parse_json(plan_response.text)
-                plan_summary = self._format_plan_summary(plan_payload)
-                if not plan_summary:
-                    plan_summary = self._strip_think_tags(plan_response.text)
-            except Exception as exc:
-                logger.warning("Failed to build plan: %s", exc)
+            metric_query = False
+            instruction_usage = None
+            reflection_usage = None
+            db_instruction = decision.routed_input
+            db_result = None
+            cache_question = self._question_cache_text(input_text)
+            cached_question, cached_sql = self._lookup_question_sql(cache_question, entity_names)
+            if cached_sql:
+                db_result = self.database_agent.execute_sql(cached_sql, context=context)
+                if self._should_reflect(db_result):
+                    self._forget_question_sql(cached_question)
+                    db_result = None
 
-            command_input = decision.routed_input
-            if plan_summary:
-                command_input = f"{decision.routed_input}\n\nRencana:\n{plan_summary}"
-            command_messages = self._build_db_command_messages(command_input, entity_context=entity_context)
-            command_config = GenerateConfig(temperature=0)
-            command_response = self.llm.generate(messages=command_messages, config=command_config)
-            db_instruction = self._strip_think_tags(command_response.text)
+            if db_result is None:
+                # Under a tight budget the plan step is skipped; the command
+                # prompt works from the routed input alone.
+                kpi_intent = None
+                if not is_budget_tight(context):
+                    plan_summary, plan_usage, kpi_intent, metric_query = self._plan_db_query(
+                        decision.routed_input, context=context
+                    )
 
-            db_result = self.database_agent.execute(db_instruction)
+                kpi_sql = self._kpi_template_sql(kpi_intent)
+                if kpi_sql:
+                    db_result = self.database_agent.execute_sql(kpi_sql, context=context, source="kpi_template")
+                    if self._should_reflect(db_result):
+                        db_result = None
+                    else:
+                        db_instruction = f"KPI template: {kpi_intent.metric} ({kpi_intent.granularity})"
 
-            reflection_usage = None
-            if self._should_reflect(db_result):
-                error_msg = db_result.metadata.get("error") or db_result.output
-                reflection_messages = self._build_db_reflection_messages(
-                    question=input_text,
-                    plan=plan_summary,
-                    instruction=db_instruction,
-                    error=str(error_msg),
+            if db_result is None:
+                check_cancelled(context)
+                check_deadline(context, "db_command")
+                db_instruction, instruction_usage = self._build_db_instruction(
+                    decision.routed_input,
+                    plan_summary,
+                    entity_context=entity_context,
+                    context=context,
                 )
-                reflection_config = GenerateConfig(temperature=0)
-                reflection_response = self.llm.generate(
-                    messages=reflection_messages,
-                    config=reflection_config,
+
+                # The reflection re-run below gets the plain context: the
+                # semantic spec already had its chance on the first run.
+                db_result = self.database_agent.execute(
+                    db_instruction, context=semantic_context(context) if metric_query else context
+                )
+
+                if self._should_reflect(db_result) and not is_budget_tight(context):
+                    reflected_instruction, reflection_usage = self._reflect_db_instruction(
+                        input_text, plan_summary, db_instruction, db_result, context=context
+                    )
+                    if reflected_instruction and reflected_instruction != db_instruction:
+                        db_instruction = reflected_instruction
+                        db_result = self.database_agent.execute(db_instruction, context=context)
+
+            if db_result.metadata.get("sql_source") != "question_cache":
+                self._remember_question_sql(cached_question, cache_question, db_result)
+
+            if is_expired(context):
+                # No budget left to synthesize; return the raw result instead.
+                return AgentResult(
+                    output=db_result.output,
+                    metadata={
+                        "agent": decision.target_agent,
+                        "routing_reasoning": decision.reasoning,
+                        "db_instruction": db_instruction,
+                        **db_result.metadata,
+                        "deadline_exceeded": True,
+                    },
                 )
-                reflection_usage = reflection_response.usage
-                reflected_instruction = self._strip_think_tags(reflection_response.text)
-                if reflected_instruction and reflected_instruction != db_instruction:
-                    db_instruction = reflected_instruction
-                    db_result = self.database_agent.execute(db_instruction)
 
             # Synthesize the result into natural language
             messages = self._build_synthesis_messages(
                 question=input_text,
                 database_output=db_result.output,
             )
-            response = self.llm.generate(messages=messages)
+            response = self.llm.generate(messages=messages, config=llm_config(context, prompt_slug="synthesis_system"))
             return AgentResult(
                 output=response.text,
                 metadata={
@@ -376,8 +739,9 @@ class PlannerAgent(BaseAgent):
                     "plan": plan_summary,
                     "plan_usage": plan_usage,
                     "db_instruction": db_instruction,
-                    "instruction_usage": command_response.usage,
+                    "instruction_usage": instruction_usage,
                     "reflection_usage": reflection_usage,
+                    "time_ranges": [item.to_dict() for item in time_ranges],
                     **db_result.metadata,
                     "usage": response.usage,
                 },
@@ -385,7 +749,7 @@ class PlannerAgent(BaseAgent):
 
         if decision.target_agent == VECTOR_ROUTE:
             command_messages = self._build_vector_command_messages(decision.routed_input)
-            command_config = GenerateConfig(temperature=0)
+            command_config = llm_config(context, temperature=0, prompt_slug="vector_command_system")
             command_response = self.llm.generate(messages=command_messages, config=command_config)
             payload = self._parse_json(command_response.text)
             if not payload or payload.get("error"):
@@ -500,7 +864,7 @@ class PlannerAgent(BaseAgent):
             history=history,
             memory_summary=memory_summary,
         )
-        response = self.llm.generate(messages=messages)
+        response = self.llm.generate(messages=messages, config=llm_config(context, prompt_slug="general_system"))
         return AgentResult(
             output=response.text,
             metadata={
@@ -511,8 +875,14 @@ class PlannerAgent(BaseAgent):
         )
 
     def execute_stream(self, input_text: str, context: dict | None = None, history: list[dict] | None = None) -> Generator[dict, None, None]:
-        entity_context = self._fetch_entity_context()
-        decision = self._route_message(input_text, entity_context=entity_context)
+        entity_names, entity_context = self._resolve_entities(input_text)
+        check_cancelled(context)
+        check_deadline(context, "routing")
+        timed = timings_enabled(context)
+        stopwatch = Stopwatch()
+        decision, usage = self._route_message(input_text, entity_context=entity_context, context=context)
+        if timed:
+            yield timing_event("routing", stopwatch.elapsed_ms(), usage, target_agent=decision.target_agent)
 
         # Emit routing decision as thinking
         yield {
@@ -526,87 +896,167 @@ class PlannerAgent(BaseAgent):
         if not self._is_agent_enabled(decision.target_agent):
             yield {"type": "content", "content": self._disabled_agent_message(decision.target_agent)}
             return
-
-        if decision.target_agent == DATABASE_ROUTE:
-            plan_summary = ""
-            yield {"type": "thinking", "content": "Menyusun rencana query...\n"}
-            try:
-                plan_messages = self._build_db_plan_messages(decision.routed_input)
-                plan_config = GenerateConfig(temperature=0)
-                plan_response = self.llm.generate(messages=plan_messages, config=plan_config)
-                plan_payload = self._parse_json(plan_response.text)
-                plan_summary = self._format_plan_summary(plan_payload)
-                if not plan_summary:
-                    plan_summary = self._strip_think_tags(plan_response.text)
-            except Exception as exc:
-                logger.warning("Failed to build plan: %s", exc)
-
-            if plan_summary:
-                yield {
-                    "type": "thinking",
-                    "content": f"Rencana query\n{plan_summary}\n\n",
-                }
-
-            command_input = decision.routed_input
-            if plan_summary:
-                command_input = f"{decision.routed_input}\n\nRencana:\n{plan_summary}"
-            command_messages = self._build_db_command_messages(command_input, entity_context=entity_context)
-            command_config = GenerateConfig(temperature=0)
-            command_response = self.llm.generate(messages=command_messages, config=command_config)
-            db_instruction = self._strip_think_tags(command_response.text)
-
+        time_ranges = self._resolve_time_expressions(decision)
+        if time_ranges:
+            resolved = "\n".join(f"- {item.expression} → {item.render()}" for item in time_ranges)
+            yield {"type": "thinking", "content": f"Rentang waktu\n{resolved}\n\n"}
+
+        if decision.target_agent == MULTI_ROUTE:
+            yield {"type": "thinking", "content": "Menyusun rencana multi-agent...\n"}
+            stopwatch = Stopwatch()
+            graph = self._plan_task_graph(decision, entity_context=entity_context, context=context)
+            if timed:
+                yield timing_event("dag_plan", stopwatch.elapsed_ms(), tasks=len(graph.tasks))
             yield {
                 "type": "thinking",
-                "content": (
-                    "Instruksi ke Database Agent\n"
-                    f"Instruksi: {db_instruction}\n\n"
-                ),
+                "content": f"Rencana task\n{self._format_graph_summary(graph)}\n\n",
             }
 
-            # Stream step-by-step thinking from DatabaseAgent
-            db_result = None
-            for event in self.database_agent.execute_stream(db_instruction):
+            branch_results: dict[str, AgentResult] = {}
+            for event in run_task_graph(
+                graph,
+                lambda task, deps: self._run_branch_stream(task, deps, context=context),
+                cancel_token=get_cancel_token(context),
+            ):
                 if event.get("type") == "_result":
-                    db_result = event["data"]
+                    branch_results = event["data"]
                 else:
                     yield event
 
+            yield {"type": "thinking", "content": "Menggabungkan hasil semua task...\n"}
+            messages = self._build_dag_synthesis_messages(
+                question=input_text,
+                branch_output=self._format_branch_results(graph, branch_results),
+            )
+            chunks = cancellable(
+                self.llm.generate_stream(messages=messages, config=llm_config(context, prompt_slug="dag_synthesis_system")),
+                context,
+            )
+            yield from self._stream_answer(chunks, context)
+            return
+
+        if decision.target_agent == DATABASE_ROUTE:
+            plan_summary = ""
+            metric_query = False
+            db_result = None
+            cache_question = self._question_cache_text(input_text)
+            cached_question, cached_sql = self._lookup_question_sql(cache_question, entity_names)
+            if cached_sql:
+                yield {"type": "thinking", "content": "Pola pertanyaan dikenali, memakai template query tersimpan.\n"}
+                for event in self.database_agent.execute_sql_stream(cached_sql, context=context):
+                    if event.get("type") == "_result":
+                        db_result = event["data"]
+                    else:
+                        yield event
+                if db_result is None or self._should_reflect(db_result):
+                    self._forget_question_sql(cached_question)
+                    db_result = None
+
             if db_result is None:
-                yield {"type": "content", "content": "Error: Database agent returned no result."}
-                return
+                kpi_intent = None
+                if is_budget_tight(context):
+                    yield {"type": "thinking", "content": "Sisa waktu terbatas, langkah rencana dilewati.\n"}
+                else:
+                    yield {"type": "thinking", "content": "Menyusun rencana query...\n"}
+                    stopwatch = Stopwatch()
+                    plan_summary, usage, kpi_intent, metric_query = self._plan_db_query(
+                        decision.routed_input, context=context
+                    )
+                    if timed:
+                        yield timing_event("plan", stopwatch.elapsed_ms(), usage)
 
-            if self._should_reflect(db_result):
-                error_msg = db_result.metadata.get("error") or db_result.output
-                yield {"type": "thinking", "content": "Refleksi selektif: memperbaiki instruksi...\n"}
-                reflection_messages = self._build_db_reflection_messages(
-                    question=input_text,
-                    plan=plan_summary,
-                    instruction=db_instruction,
-                    error=str(error_msg),
-                )
-                reflection_config = GenerateConfig(temperature=0)
-                reflection_response = self.llm.generate(
-                    messages=reflection_messages,
-                    config=reflection_config,
-                )
-                reflected_instruction = self._strip_think_tags(reflection_response.text)
-                if reflected_instruction and reflected_instruction != db_instruction:
-                    db_instruction = reflected_instruction
+                if plan_summary:
                     yield {
                         "type": "thinking",
-                        "content": f"Instruksi hasil refleksi: {db_instruction}\n\n",
+                        "content": f"Rencana query\n{plan_summary}\n\n",
                     }
 
-                    db_result = None
-                    for event in self.database_agent.execute_stream(db_instruction):
+                kpi_sql = self._kpi_template_sql(kpi_intent)
+                if kpi_sql:
+                    yield {
+                        "type": "thinking",
+                        "content": f"Pertanyaan cocok dengan template KPI: {kpi_intent.metric} ({kpi_intent.granularity}).\n",
+                    }
+                    for event in self.database_agent.execute_sql_stream(kpi_sql, context=context, source="kpi_template"):
                         if event.get("type") == "_result":
                             db_result = event["data"]
                         else:
                             yield event
+                    if db_result is not None and self._should_reflect(db_result):
+                        yield {"type": "thinking", "content": "Template KPI gagal, beralih ke pembuatan query.\n"}
+                        db_result = None
 
-                    if db_result is None:
-                        yield {"type": "content", "content": "Error: Database agent returned no result."}
-                        return
+            if db_result is None:
+                check_cancelled(context)
+                check_deadline(context, "db_command")
+                stopwatch = Stopwatch()
+                db_instruction, usage = self._build_db_instruction(
+                    decision.routed_input,
+                    plan_summary,
+                    entity_context=entity_context,
+                    context=context,
+                )
+                if timed:
+                    yield timing_event("command", stopwatch.elapsed_ms(), usage)
+
+                yield {
+                    "type": "thinking",
+                    "content": (
+                        "Instruksi ke Database Agent\n"
+                        f"Instruksi: {db_instruction}\n\n"
+                    ),
+                }
+
+                # Stream step-by-step thinking from DatabaseAgent
+                # The reflection re-run below gets the plain context: the
+                # semantic spec already had its chance on the first run.
+                db_result = None
+                first_context = semantic_context(context) if metric_query else context
+                for event in self.database_agent.execute_stream(db_instruction, context=first_context):
+                    if event.get("type") == "_result":
+                        db_result = event["data"]
+                    else:
+                        yield event
+
+                if db_result is None:
+                    yield {"type": "content", "content": "Error: Database agent returned no result."}
+                    return
+
+                if self._should_reflect(db_result) and is_budget_tight(context):
+                    yield {"type": "thinking", "content": "Sisa waktu terbatas, refleksi dilewati.\n"}
+                elif self._should_reflect(db_result):
+                    yield {"type": "thinking", "content": "Refleksi selektif: memperbaiki instruksi...\n"}
+                    stopwatch = Stopwatch()
+                    reflected_instruction, usage = self._reflect_db_instruction(
+                        input_text, plan_summary, db_instruction, db_result, context=context
+                    )
+                    if timed:
+                        yield timing_event("reflection", stopwatch.elapsed_ms(), usage)
+                    if reflected_instruction and reflected_instruction != db_instruction:
+                        db_instruction = reflected_instruction
+                        yield {
+                            "type": "thinking",
+                            "content": f"Instruksi hasil refleksi: {db_instruction}\n\n",
+                        }
+
+                        db_result = None
+                        for event in self.database_agent.execute_stream(db_instruction, context=context):
+                            if event.get("type") == "_result":
+                                db_result = event["data"]
+                            else:
+                                yield event
+
+                        if db_result is None:
+                            yield {"type": "content", "content": "Error: Database agent returned no result."}
+                            return
+
+            if db_result.metadata.get("sql_source") != "question_cache":
+                self._remember_question_sql(cached_question, cache_question, db_result)
+
+            if is_expired(context):
+                yield {"type": "thinking", "content": "Batas waktu habis, menampilkan hasil query langsung.\n"}
+                yield {"type": "content", "content": db_result.output}
+                return
 
             yield {"type": "thinking", "content": "Menyusun jawaban akhir...\n"}
 
@@ -615,15 +1065,18 @@ class PlannerAgent(BaseAgent):
                 question=input_text,
                 database_output=db_result.output,
             )
-            chunks = self.llm.generate_stream(messages=messages)
-            yield from parse_think_tags(chunks)
+            chunks = cancellable(
+                self.llm.generate_stream(messages=messages, config=llm_config(context, prompt_slug="synthesis_system")),
+                context,
+            )
+            yield from self._stream_answer(chunks, context)
 
             return
 
         if decision.target_agent == VECTOR_ROUTE:
             yield {"type": "thinking", "content": "Menyusun instruksi vector...\n"}
             command_messages = self._build_vector_command_messages(decision.routed_input)
-            command_config = GenerateConfig(temperature=0)
+            command_config = llm_config(context, temperature=0, prompt_slug="vector_command_system")
             command_response = self.llm.generate(messages=command_messages, config=command_config)
             payload = self._parse_json(command_response.text)
             if not payload or payload.get("error"):
@@ -743,5 +1196,8 @@ class PlannerAgent(BaseAgent):
             history=history,
             memory_summary=memory_summary,
         )
-        chunks = self.llm.generate_stream(messages=messages)
-        yield from parse_think_tags(chunks)
+        chunks = cancellable(
+            self.llm.generate_stream(messages=messages, config=llm_config(context, prompt_slug="general_system")),
+            context,
+        )
+        yield from self._stream_answer(chunks, context)
@@ -0,0 +1,114 @@
+import contextvars
+import logging
+import queue
+from collections.abc import Callable, Generator
+from concurrent.futures import ThreadPoolExecutor
+
+from app.agents.base import AgentResult
+from app.agents.planner.schemas import PlanTask, TaskGraph
+from app.core.cancellation import CancellationToken, OperationCancelled
+from app.core.metrics import DAG_BRANCHES_RUNNING
+from app.core.profiling import attach_thread
+from app.core.tracing import Trace, activate_trace, fork_trace, span
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_BRANCHES = 4
+
+# Sentinel pushed by a branch worker once its stream is exhausted.
+_BRANCH_DONE = object()
+
+BranchRunner = Callable[[PlanTask, dict[str, AgentResult]], Generator[dict, None, None]]
+
+
+def run_task_graph(
+    graph: TaskGraph,
+    run_task: BranchRunner,
+    max_workers: int = MAX_CONCURRENT_BRANCHES,
+    cancel_token: CancellationToken | None = None,
+) -> Generator[dict, None, None]:
+    """Execute a task graph, running independent branches concurrently.
+
+    ``run_task(task, dep_results)`` is a stream generator for a single branch
+    (same event shape as ``BaseAgent.execute_stream``). Its events are
+    forwarded as they arrive, tagged with ``"branch": task_id`` so interleaved
+    branches can be told apart. A task starts as soon as all of its
+    dependencies have finished.
+
+    A branch that raises ``OperationCancelled`` cancels the whole graph. When
+    the graph stops before every branch finished (cancelled, failed or
+    closed by the consumer), ``cancel_token`` is cancelled so branches that
+    are still running stop at their next checkpoint.
+
+    Yields a final ``{"type": "_result", "data": {task_id: AgentResult}}``.
+    """
+    events: queue.Queue = queue.Queue()
+    results: dict[str, AgentResult] = {}
+    done: set[str] = set()
+    started: set[str] = set()
+    running = 0
+
+    def _worker(
+        task: PlanTask,
+        dep_results: dict[str, AgentResult],
+        branch_trace: Trace | None,
+    ) -> None:
+        activate_trace(branch_trace)
+        DAG_BRANCHES_RUNNING.inc()
+        result = None
+        try:
+            with attach_thread(), span("planner.branch", task_id=task.id, agent=task.agent):
+                for event in run_task(task, dep_results):
+                    if event.get("type") == "_result":
+                        result = event["data"]
+                        continue
+                    events.put((task.id, event))
+        except OperationCancelled as exc:
+            events.put((task.id, exc))
+            raise
+        except Exception as exc:
+            logger.warning("Branch %s (%s) failed: %s", task.id, task.agent, exc)
+            result = AgentResult(
+                output=f"Task failed: {exc}",
+                metadata={"agent": task.agent, "error": str(exc)},
+            )
+        finally:
+            DAG_BRANCHES_RUNNING.dec()
+        events.put((task.id, (_BRANCH_DONE, result)))
+
+    executor = ThreadPoolExecutor(
+        max_workers=max(1, min(max_workers, len(graph.tasks))),
+        thread_name_prefix="dag-branch",
+    )
+    try:
+        while len(done) < len(graph.tasks):
+            for task in graph.ready(done, started):
+                dep_results = {dep: results[dep] for dep in task.depends_on}
+                # Each branch gets its own copy of the request context.
+                ctx = contextvars.copy_context()
+                executor.submit(ctx.run, _worker, task, dep_results, fork_trace())
+                started.add(task.id)
+                running += 1
+
+            if running == 0:
+                # Unreachable for a validated (acyclic) graph.
+                break
+
+            task_id, event = events.get()
+            if isinstance(event, OperationCancelled):
+                raise event
+            if isinstance(event, tuple) and event and event[0] is _BRANCH_DONE:
+                results[task_id] = event[1] or AgentResult(
+                    output="", metadata={"agent": graph.get(task_id).agent}
+                )
+                done.add(task_id)
+                running -= 1
+                continue
+
+            yield {**event, "branch": task_id}
+    finally:
+        if cancel_token is not None and len(done) < len(graph.tasks):
+            cancel_token.cancel("task graph stopped")
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    yield {"type": "_result", "data": results}
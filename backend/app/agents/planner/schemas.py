@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 DATABASE_ROUTE = "database"
 GENERAL_ROUTE = "general"
@@ -9,6 +9,7 @@ TIMESERIES_ROUTE = "timeseries"
 REPORT_ROUTE = "report"
 COMPARE_ROUTE = "compare"
 ALERT_ROUTE = "alert"
+MULTI_ROUTE = "multi"
 VALID_ROUTE_TARGETS = {
     DATABASE_ROUTE,
     GENERAL_ROUTE,
@@ -19,8 +20,19 @@ VALID_ROUTE_TARGETS = {
     REPORT_ROUTE,
     COMPARE_ROUTE,
     ALERT_ROUTE,
+    MULTI_ROUTE,
 }
 
+# Agents that may appear as nodes of a multi-agent task graph.
+TASK_GRAPH_AGENTS = {
+    DATABASE_ROUTE,
+    BROWSER_ROUTE,
+    TIMESERIES_ROUTE,
+    COMPARE_ROUTE,
+    ALERT_ROUTE,
+}
+MAX_GRAPH_TASKS = 5
+
 
 @dataclass
 class RoutingDecision:
@@ -55,5 +67,92 @@ class RoutingDecision:
         return self.routed_input
 
 
+@dataclass
+class PlanTask:
+    id: str
+    agent: str
+    input: str
+    depends_on: list[str] = field(default_factory=list)
+
+
+@dataclass
+class TaskGraph:
+    tasks: list[PlanTask]
+    reasoning: str = ""
+
+    @classmethod
+    def from_payload(cls, payload: dict) -> "TaskGraph":
+        """Build a validated graph from the planner JSON.
+
+        Unknown agents, duplicate ids and empty inputs are dropped, dangling
+        dependencies are ignored, and a cycle raises ``ValueError``.
+        """
+        raw_tasks = payload.get("tasks")
+        if not isinstance(raw_tasks, list):
+            raise ValueError("Task graph payload has no 'tasks' list")
+
+        tasks: list[PlanTask] = []
+        seen: set[str] = set()
+        for index, raw in enumerate(raw_tasks):
+            if not isinstance(raw, dict):
+                continue
+            agent = str(raw.get("agent", "")).strip().lower()
+            task_input = str(raw.get("input", "")).strip()
+            task_id = str(raw.get("id") or f"t{index + 1}").strip()
+            if agent not in TASK_GRAPH_AGENTS or not task_input or task_id in seen:
+                continue
+            deps = raw.get("depends_on") or []
+            if not isinstance(deps, list):
+                deps = [deps]
+            tasks.append(
+                PlanTask(
+                    id=task_id,
+                    agent=agent,
+                    input=task_input,
+                    depends_on=[str(dep).strip() for dep in deps],
+                )
+            )
+            seen.add(task_id)
+            if len(tasks) >= MAX_GRAPH_TASKS:
+                break
+
+        if not tasks:
+            raise ValueError("Task graph has no valid tasks")
+
+        for task in tasks:
+            task.depends_on = [
+                dep for dep in dict.fromkeys(task.depends_on)
+                if dep in seen and dep != task.id
+            ]
+
+        graph = cls(tasks=tasks, reasoning=str(payload.get("reasoning", "")).strip())
+        graph._check_acyclic()
+        return graph
+
+    def _check_acyclic(self) -> None:
+        done: set[str] = set()
+        while len(done) < len(self.tasks):
+            ready = [
+                task.id for task in self.tasks
+                if task.id not in done and all(dep in done for dep in task.depends_on)
+            ]
+            if not ready:
+                raise ValueError("Task graph contains a dependency cycle")
+            done.update(ready)
+
+    def get(self, task_id: str) -> PlanTask:
+        for task in self.tasks:
+            if task.id == task_id:
+                return task
+        raise KeyError(task_id)
+
+    def ready(self, done: set[str], started: set[str]) -> list[PlanTask]:
+        """Tasks not yet started whose dependencies have all completed."""
+        return [
+            task for task in self.tasks
+            if task.id not in started and all(dep in done for dep in task.depends_on)
+        ]
+
+
 # Backward-compatible alias for existing imports.
 PlannerDecision = RoutingDecision
@@ -0,0 +1,181 @@
+"""Deterministic resolver for relative time expressions (Indonesian and English).
+
+Questions say "minggu lalu", "bulan ini", "30 hari terakhir", "kemarin",
+"last week". Before a question reaches the database pipeline every such
+expression is replaced by the absolute range it means today, in the
+configured timezone ("2024-05-06 sampai 2024-05-12"), so:
+
+- plan, command and NL->SQL prompts receive concrete dates instead of asking
+  the LLM to do calendar arithmetic;
+- the question cache sees typed dates, so "ABW minggu lalu" asked next week
+  maps to the same template with new values.
+
+Weeks start on Monday (``toStartOfWeek(x, 1)``). "N hari terakhir" is the N
+days ending today. "Siklus ini" and its variants are normalized to
+"siklus aktif" (the running cultivation cycle), which has no date range.
+"""
+
+import datetime
+import re
+from dataclasses import dataclass
+from zoneinfo import ZoneInfo
+
+from app.core.config import settings
+
+_NUMBER_WORDS = {
+    "satu": 1, "dua": 2, "tiga": 3, "empat": 4, "lima": 5, "enam": 6,
+    "tujuh": 7, "delapan": 8, "sembilan": 9, "sepuluh": 10,
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+_UNITS = {
+    "hari": "day", "day": "day", "days": "day",
+    "minggu": "week", "pekan": "week", "week": "week", "weeks": "week",
+    "bulan": "month", "month": "month", "months": "month",
+}
+_COUNT = r"(?P<c{index}>\d{{1,3}}|" + "|".join(_NUMBER_WORDS) + r")"
+_UNIT = r"(?P<u{index}>" + "|".join(sorted(_UNITS, key=len, reverse=True)) + r")"
+
+# (kind, pattern); earlier entries win at the same position, so longer
+# phrases come first ("kemarin lusa" before "kemarin").
+_PATTERNS: list[tuple[str, str]] = [
+    ("last_n", r"(?:dalam\s+)?{count}\s+{unit}\s+(?:terakhir|belakangan)"),
+    ("last_n", r"(?:in\s+the\s+)?(?:last|past)\s+{count}\s+{unit}"),
+    ("n_ago", r"{count}\s+{unit}\s+(?:yang\s+)?(?:lalu|ago)"),
+    ("day_before_yesterday", r"kemarin\s+lusa|day\s+before\s+yesterday"),
+    ("today", r"hari\s+ini|today"),
+    ("this_week", r"(?:minggu|pekan)\s+(?:ini|sekarang)|this\s+week"),
+    ("last_week", r"(?:minggu|pekan)\s+(?:lalu|kemarin)|last\s+week"),
+    ("this_month", r"bulan\s+(?:ini|sekarang)|this\s+month"),
+    ("last_month", r"bulan\s+(?:lalu|kemarin)|last\s+month"),
+    ("this_year", r"tahun\s+(?:ini|sekarang)|this\s+year"),
+    ("last_year", r"tahun\s+(?:lalu|kemarin)|last\s+year"),
+    ("yesterday", r"kemarin|yesterday"),
+    ("current_cycle", r"siklus\s+(?:ini|sekarang|berjalan|saat\s+ini)|(?:this|current)\s+cycle"),
+]
+_EXPRESSION_RE = re.compile(
+    "|".join(
+        rf"(?P<k{index}>\b(?:{pattern.format(count=_COUNT, unit=_UNIT).format(index=index)})\b)"
+        for index, (_, pattern) in enumerate(_PATTERNS)
+    ),
+    re.IGNORECASE,
+)
+
+CURRENT_CYCLE_TEXT = "siklus aktif"
+
+
+@dataclass
+class ResolvedTime:
+    expression: str
+    kind: str  # "range" or "cycle"
+    start: datetime.date | None = None
+    end: datetime.date | None = None
+
+    def render(self) -> str:
+        if self.kind == "cycle":
+            return CURRENT_CYCLE_TEXT
+        if self.start == self.end:
+            return f"tanggal {self.start.isoformat()}"
+        return f"{self.start.isoformat()} sampai {self.end.isoformat()}"
+
+    def to_dict(self) -> dict:
+        return {
+            "expression": self.expression,
+            "kind": self.kind,
+            "start": self.start.isoformat() if self.start else None,
+            "end": self.end.isoformat() if self.end else None,
+        }
+
+
+def today() -> datetime.date:
+    """Current date in ``settings.TIME_ZONE`` (the process timezone when unset)."""
+    if settings.TIME_ZONE:
+        return datetime.datetime.now(ZoneInfo(settings.TIME_ZONE)).date()
+    return datetime.datetime.now().astimezone().date()
+
+
+def _shift_months(day: datetime.date, months: int) -> datetime.date:
+    month_index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(month_index, 12)
+    month += 1
+    next_month = datetime.date(year + month // 12, month % 12 + 1, 1)
+    last_day = (next_month - datetime.timedelta(days=1)).day
+    return datetime.date(year, month, min(day.day, last_day))
+
+
+def _count(text: str) -> int:
+    lowered = text.lower()
+    return _NUMBER_WORDS[lowered] if lowered in _NUMBER_WORDS else int(lowered)
+
+
+def _n_back(current: datetime.date, count: int, unit: str) -> datetime.date:
+    if unit == "day":
+        return current - datetime.timedelta(days=count)
+    if unit == "week":
+        return current - datetime.timedelta(weeks=count)
+    return _shift_months(current, -count)
+
+
+def _resolve(match: re.Match, current: datetime.date) -> ResolvedTime | None:
+    kind = _PATTERNS[int(match.lastgroup[1:])][0]
+    expression = match.group()
+    day = datetime.timedelta(days=1)
+    week_start = current - datetime.timedelta(days=current.weekday())
+    month_start = current.replace(day=1)
+
+    if kind == "current_cycle":
+        return ResolvedTime(expression, "cycle")
+    if kind in ("last_n", "n_ago"):
+        index = match.lastgroup[1:]
+        count = _count(match.group(f"c{index}"))
+        unit = _UNITS[match.group(f"u{index}").lower()]
+        if count <= 0:
+            return None
+        if kind == "last_n":
+            start, end = _n_back(current, count, unit) + day, current
+        elif unit == "day":
+            start = end = current - datetime.timedelta(days=count)
+        else:
+            # "2 minggu lalu" is the whole week/month it points into.
+            anchor = _n_back(current, count, unit)
+            if unit == "week":
+                start = anchor - datetime.timedelta(days=anchor.weekday())
+                end = start + datetime.timedelta(days=6)
+            else:
+                start = anchor.replace(day=1)
+                end = _shift_months(start, 1) - day
+        return ResolvedTime(expression, "range", start, end)
+
+    ranges = {
+        "today": (current, current),
+        "yesterday": (current - day, current - day),
+        "day_before_yesterday": (current - 2 * day, current - 2 * day),
+        "this_week": (week_start, current),
+        "last_week": (week_start - datetime.timedelta(days=7), week_start - day),
+        "this_month": (month_start, current),
+        "last_month": (_shift_months(month_start, -1), month_start - day),
+        "this_year": (current.replace(month=1, day=1), current),
+        "last_year": (datetime.date(current.year - 1, 1, 1), datetime.date(current.year - 1, 12, 31)),
+    }
+    start, end = ranges[kind]
+    return ResolvedTime(expression, "range", start, end)
+
+
+def resolve_time_expressions(
+    text: str, current: datetime.date | None = None
+) -> tuple[str, list[ResolvedTime]]:
+    """Return ``text`` with relative expressions replaced, and what each resolved to."""
+    current = current or today()
+    resolved: list[ResolvedTime] = []
+    parts: list[str] = []
+    cursor = 0
+    for match in _EXPRESSION_RE.finditer(text):
+        item = _resolve(match, current)
+        if item is None:
+            continue
+        parts.append(text[cursor:match.start()])
+        parts.append(item.render())
+        cursor = match.end()
+        resolved.append(item)
+    parts.append(text[cursor:])
+    return "".join(parts), resolved
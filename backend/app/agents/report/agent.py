@@ -6,8 +6,11 @@ from typing import Any
 
 from app.agents.base import AgentResult, BaseAgent
 from app.agents.database import DatabaseAgent
+from app.agents.database.limits import query_profile_context
+from app.agents.database.schemas import query_result_of
 from app.core.llm.base import BaseLLM
 from app.core.llm.schemas import GenerateConfig
+from app.core.tracing import span
 from app.modules.admin.service import resolve_prompt
 
 logger = logging.getLogger(__name__)
@@ -74,28 +77,6 @@ class ReportAgent(BaseAgent):
         payload.setdefault("period", "")
         return payload
 
-    @staticmethod
-    def _parse_table(output: str) -> tuple[list[str], list[list[str]]]:
-        if "(no rows returned)" in output:
-            return [], []
-        parts = output.split("\n\n")
-        if len(parts) < 2:
-            return [], []
-        table_block = parts[-1].strip()
-        if not table_block or table_block.startswith("Error:"):
-            return [], []
-        lines = [line for line in table_block.splitlines() if line.strip()]
-        if len(lines) < 2:
-            return [], []
-        columns = [c.strip() for c in lines[0].split(" | ")]
-        rows: list[list[str]] = []
-        for line in lines[2:]:
-            row = [c.strip() for c in line.split(" | ")]
-            if len(row) != len(columns):
-                continue
-            rows.append(row)
-        return columns, rows
-
     @staticmethod
     def _table_to_markdown(columns: list[str], rows: list[list[str]]) -> str:
         if not columns:
@@ -107,13 +88,19 @@ class ReportAgent(BaseAgent):
             body_lines.append("| " + " | ".join(row) + " |")
         return "\n".join([header, sep] + body_lines)
 
-    def _run_section(self, idx: int, section: dict[str, Any]) -> tuple[int, dict[str, Any]]:
+    def _run_section(
+        self,
+        idx: int,
+        section: dict[str, Any],
+        context: dict | None = None,
+    ) -> tuple[int, dict[str, Any]]:
         title = str(section.get("title") or f"Bagian {idx + 1}")
         instruction = str(section.get("instruction") or "").strip()
         if not instruction:
             return idx, {"title": title, "error": GENERIC_SECTION_ERROR}
         try:
-            db_result = self.database_agent.execute(instruction)
+            with span("report.section", section=idx, title=title):
+                db_result = self.database_agent.execute(instruction, context=query_profile_context(context, "report"))
         except Exception as exc:  # pragma: no cover - defensive
             return idx, {
                 "title": title,
@@ -128,13 +115,13 @@ class ReportAgent(BaseAgent):
                 "error": GENERIC_SECTION_ERROR,
             }
 
-        columns, rows = self._parse_table(db_result.output)
+        table = query_result_of(db_result)
         return idx, {
             "title": title,
             "instruction": instruction,
-            "columns": columns,
-            "rows": rows[:MAX_ROWS],
-            "row_count": len(rows),
+            "columns": table.columns if table else [],
+            "rows": table.string_rows(MAX_ROWS) if table else [],
+            "row_count": table.row_count if table else 0,
         }
 
     def _fallback_report(self, plan: dict[str, Any], sections: list[dict[str, Any]]) -> dict[str, Any]:
@@ -201,7 +188,7 @@ class ReportAgent(BaseAgent):
 
         section_results: list[dict[str, Any]] = []
         for idx, section in enumerate(plan_sections):
-            _, payload = self._run_section(idx, section)
+            _, payload = self._run_section(idx, section, context=context)
             section_results.append(payload)
 
         report_payload = self._attach_query(
@@ -238,7 +225,7 @@ class ReportAgent(BaseAgent):
         for idx, section in enumerate(plan_sections):
             title = str(section.get("title") or f"Bagian {idx + 1}")
             yield {"type": "thinking", "content": f"Mengambil data: {title}\n"}
-            _, payload = self._run_section(idx, section)
+            _, payload = self._run_section(idx, section, context=context)
             section_results.append(payload)
             if payload.get("error"):
                 yield {"type": "thinking", "content": f"Gagal: {title}\n"}
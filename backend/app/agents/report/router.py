@@ -1,4 +1,4 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from fastapi.responses import StreamingResponse
 
 from app.agents.report.api_schemas import ReportPdfRequest, ReportRequest, ReportResponse
@@ -7,6 +7,8 @@ from app.agents.report.service import (
     generate_report_pdf,
     generate_report_stream,
 )
+from app.core.cancellation import CancellationToken
+from app.core.streaming import disconnect_aware
 
 router = APIRouter(tags=["Report"], prefix="/v1/report")
 
@@ -22,8 +24,9 @@ async def generate_report_pdf_endpoint(request: ReportPdfRequest):
 
 
 @router.post("/generate/stream")
-async def generate_report_stream_endpoint(request: ReportRequest):
+async def generate_report_stream_endpoint(request: ReportRequest, http_request: Request):
+    token = CancellationToken()
     return StreamingResponse(
-        generate_report_stream(request),
+        disconnect_aware(http_request, generate_report_stream(request, cancel_token=token), token),
         media_type="text/event-stream",
     )
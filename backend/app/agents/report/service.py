@@ -6,6 +6,7 @@ from collections.abc import Generator
 from app.agents.report import create_report_agent
 from app.agents.report.api_schemas import ReportPdfRequest, ReportRequest, ReportResponse
 from app.agents.report.pdf import build_report_pdf
+from app.core.cancellation import CancellationToken, OperationCancelled
 
 
 def _parse_report_output(raw: str) -> tuple[dict | None, str | None]:
@@ -73,14 +74,21 @@ def generate_report_pdf(request: ReportPdfRequest) -> ReportResponse:
     return ReportResponse(status=status, report=report, error=error)
 
 
-def generate_report_stream(request: ReportRequest) -> Generator[str, None, None]:
+def generate_report_stream(
+    request: ReportRequest,
+    cancel_token: CancellationToken | None = None,
+) -> Generator[str, None, None]:
     agent = create_report_agent()
+    context = {"cancel_token": cancel_token} if cancel_token else None
     report_result = None
-    for event in agent.execute_stream(request.query):
-        if event.get("type") == "_result":
-            report_result = event["data"]
-        else:
-            yield f"data: {json.dumps(event)}\n\n"
+    try:
+        for event in agent.execute_stream(request.query, context=context):
+            if event.get("type") == "_result":
+                report_result = event["data"]
+            else:
+                yield f"data: {json.dumps(event)}\n\n"
+    except OperationCancelled:
+        return
 
     if report_result is None:
         yield f"data: {json.dumps({'type': 'content', 'content': 'Error: Report agent returned no result.'})}\n\n"
@@ -8,7 +8,11 @@ import pandas as pd
 
 from app.agents.base import AgentResult, BaseAgent
 from app.agents.database.agent import DatabaseAgent
+from app.agents.database.columnar import columnar_context
+from app.agents.database.limits import query_profile_context
+from app.agents.database.schemas import query_result_of
 from app.agents.timeseries.executor import execute_code
+from app.core.cancellation import check_cancelled, get_cancel_token
 from app.agents.timeseries.schemas import CodeGenResult
 from app.core.llm.base import BaseLLM
 from app.core.llm.schemas import GenerateConfig
@@ -41,45 +45,6 @@ class TimeSeriesAgent(BaseAgent):
         cleaned = re.sub(r"<think>.*?</think>", "", raw_text, flags=re.DOTALL)
         return cleaned.strip()
 
-    @staticmethod
-    def _parse_table(output: str) -> tuple[list[str], list[list[str]]]:
-        """Parse the formatted table output from DatabaseAgent into columns + rows."""
-        if "(no rows returned)" in output:
-            return [], []
-        parts = output.split("\n\n")
-        if len(parts) < 2:
-            return [], []
-        table_block = parts[-1].strip()
-        if not table_block or table_block.startswith("Error:"):
-            return [], []
-        lines = [line for line in table_block.splitlines() if line.strip()]
-        if len(lines) < 2:
-            return [], []
-        columns = [c.strip() for c in lines[0].split(" | ")]
-        rows: list[list[str]] = []
-        for line in lines[2:]:
-            row = [c.strip() for c in line.split(" | ")]
-            if len(row) != len(columns):
-                continue
-            rows.append(row)
-        return columns, rows
-
-    @staticmethod
-    def _to_dataframe(columns: list[str], rows: list[list[str]]) -> pd.DataFrame:
-        """Convert parsed table data into a pandas DataFrame with numeric coercion."""
-        df = pd.DataFrame(rows, columns=columns)
-        for col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="ignore")
-            # Try parsing date columns
-            if df[col].dtype == object:
-                try:
-                    parsed = pd.to_datetime(df[col], infer_datetime_format=True, errors="coerce")
-                    if parsed.notna().sum() > len(df) * 0.5:
-                        df[col] = parsed
-                except Exception:
-                    pass
-        return df
-
     @staticmethod
     def _df_summary(df: pd.DataFrame, max_sample_rows: int = 5) -> str:
         """Build a concise description of the DataFrame for the codegen prompt."""
@@ -186,21 +151,23 @@ class TimeSeriesAgent(BaseAgent):
         db_instruction = self._strip_think_tags(command_response.text)
 
         # Step 2: Fetch data via DatabaseAgent
-        db_result = self.database_agent.execute(db_instruction)
+        db_result = self.database_agent.execute(
+            db_instruction, context=query_profile_context(columnar_context(context), "timeseries")
+        )
         if db_result.metadata.get("error") or str(db_result.output).startswith("Error:"):
             return AgentResult(
                 output=f"Error: {db_result.output}",
                 metadata={"error": db_result.output, "db_instruction": db_instruction},
             )
 
-        # Step 3: Parse into DataFrame
-        columns, rows = self._parse_table(db_result.output)
-        if not columns or not rows:
+        # Step 3: Build the DataFrame from the typed result
+        table = query_result_of(db_result)
+        if table is None or not table.rows:
             return AgentResult(
                 output="Error: No data returned from database for analysis.",
                 metadata={"error": "no data", "db_instruction": db_instruction},
             )
-        df = self._to_dataframe(columns, rows)
+        df = table.to_dataframe()
 
         # Step 4-5: Generate code & execute
         code, exec_result = self._generate_and_execute_code(question, df)
@@ -229,8 +196,9 @@ class TimeSeriesAgent(BaseAgent):
                 "code": code,
                 "computation_result": exec_result.get("result"),
                 "stdout": exec_result.get("stdout", ""),
-                "columns": columns,
-                "row_count": len(rows),
+                "columns": table.columns,
+                "row_count": table.row_count,
+                "truncated": table.truncated,
             },
         )
 
@@ -258,7 +226,9 @@ class TimeSeriesAgent(BaseAgent):
         # Step 2: Fetch data
         yield {"type": "thinking", "content": "Menarik data dari database...\n"}
         db_result = None
-        for event in self.database_agent.execute_stream(db_instruction):
+        for event in self.database_agent.execute_stream(
+            db_instruction, context=query_profile_context(columnar_context(context), "timeseries")
+        ):
             if event.get("type") == "_result":
                 db_result = event["data"]
             else:
@@ -272,17 +242,22 @@ class TimeSeriesAgent(BaseAgent):
             yield {"type": "content", "content": f"Error: {db_result.output}"}
             return
 
-        # Step 3: Parse into DataFrame
-        columns, rows = self._parse_table(db_result.output)
-        if not columns or not rows:
+        # Step 3: Build the DataFrame from the typed result
+        table = query_result_of(db_result)
+        if table is None or not table.rows:
             yield {"type": "content", "content": "Error: No data returned from database for analysis."}
             return
 
-        df = self._to_dataframe(columns, rows)
+        df = table.to_dataframe()
         yield {
             "type": "thinking",
-            "content": f"Data tersedia: {len(rows)} baris, {len(columns)} kolom.\n\n",
+            "content": f"Data tersedia: {table.row_count} baris, {len(table.columns)} kolom.\n\n",
         }
+        if table.truncated:
+            yield {
+                "type": "thinking",
+                "content": f"Catatan: data dibatasi {table.row_count} baris pertama.\n\n",
+            }
 
         # Step 4-5: Generate code & execute (with retry)
         yield {"type": "thinking", "content": "Menghasilkan kode analisis...\n"}
@@ -295,6 +270,7 @@ class TimeSeriesAgent(BaseAgent):
         last_code = ""
 
         for attempt in range(1, MAX_CODEGEN_RETRIES + 2):
+            check_cancelled(context)
             if attempt > 1:
                 yield {
                     "type": "thinking",
@@ -306,7 +282,9 @@ class TimeSeriesAgent(BaseAgent):
             last_code = raw_code
 
             yield {"type": "thinking", "content": f"Menjalankan kode analisis...\n"}
-            current_result = execute_code(raw_code, {"df": df})
+            current_result = execute_code(
+                raw_code, {"df": df}, cancel_token=get_cancel_token(context)
+            )
 
             if "error" not in current_result:
                 exec_result = current_result
@@ -348,8 +326,9 @@ class TimeSeriesAgent(BaseAgent):
                 "code": last_code,
                 "computation_result": exec_result.get("result"),
                 "stdout": exec_result.get("stdout", ""),
-                "columns": columns,
-                "row_count": len(rows),
+                "columns": table.columns,
+                "row_count": table.row_count,
+                "truncated": table.truncated,
             },
         )
         yield {"type": "_result", "data": result}
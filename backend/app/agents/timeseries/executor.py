@@ -1,15 +1,21 @@
 """Safe sandbox for executing LLM-generated Python/pandas code."""
 
+import ctypes
 import io
 import math
 import datetime
 import statistics
 import threading
+import time
 from typing import Any
 
 import numpy as np
 import pandas as pd
 
+from app.core.cancellation import CancellationToken
+from app.core.metrics import SANDBOX_DURATION
+from app.core.tracing import span
+
 ALLOWED_MODULES = {
     "pd": pd,
     "np": np,
@@ -61,6 +67,28 @@ _SAFE_BUILTINS = {
 }
 
 EXECUTION_TIMEOUT = 5  # seconds
+_CANCEL_POLL_INTERVAL = 0.1  # seconds
+
+
+class SandboxAborted(BaseException):
+    """Injected into a sandbox thread to stop it (timeout or cancellation).
+
+    Derives from BaseException so generated code cannot swallow it with a
+    plain ``except Exception``.
+    """
+
+
+def _abort_thread(thread: threading.Thread) -> None:
+    """Raise SandboxAborted asynchronously inside ``thread``.
+
+    Takes effect at the next bytecode boundary; a long-running C call
+    (e.g. a single huge pandas operation) finishes first.
+    """
+    if thread.ident is None:
+        return
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(
+        ctypes.c_ulong(thread.ident), ctypes.py_object(SandboxAborted)
+    )
 
 
 def _check_forbidden(code: str) -> str | None:
@@ -72,17 +100,36 @@ def _check_forbidden(code: str) -> str | None:
     return None
 
 
-def execute_code(code: str, dataframes: dict[str, pd.DataFrame]) -> dict[str, Any]:
+def execute_code(
+    code: str,
+    dataframes: dict[str, pd.DataFrame],
+    cancel_token: CancellationToken | None = None,
+) -> dict[str, Any]:
     """Execute generated code in a sandboxed environment.
 
     Args:
         code: Python source code to execute. Must set a `result` variable.
         dataframes: Dict of name -> DataFrame to inject into the namespace.
+        cancel_token: Optional request token; cancelling it aborts the run.
 
     Returns:
         On success: {"result": <value>, "stdout": <captured print output>}
         On failure: {"error": <error message>}
     """
+    started = time.perf_counter()
+    with span("sandbox.execute", code_chars=len(code)) as current:
+        outcome = _execute_code(code, dataframes, cancel_token)
+        status = "error" if "error" in outcome else "ok"
+        SANDBOX_DURATION.labels(outcome=status).observe(time.perf_counter() - started)
+        current.set(outcome=status, error=outcome.get("error"))
+        return outcome
+
+
+def _execute_code(
+    code: str,
+    dataframes: dict[str, pd.DataFrame],
+    cancel_token: CancellationToken | None,
+) -> dict[str, Any]:
     # Check for forbidden patterns
     violation = _check_forbidden(code)
     if violation:
@@ -112,14 +159,24 @@ def execute_code(code: str, dataframes: dict[str, pd.DataFrame]) -> dict[str, An
                 "result": result_val,
                 "stdout": stdout_capture.getvalue(),
             })
+        except SandboxAborted:
+            return
         except Exception as e:
             exec_error.append(f"{type(e).__name__}: {e}")
 
     thread = threading.Thread(target=_run, daemon=True)
     thread.start()
-    thread.join(timeout=EXECUTION_TIMEOUT)
+
+    waited = 0.0
+    while thread.is_alive() and waited < EXECUTION_TIMEOUT:
+        if cancel_token is not None and cancel_token.cancelled:
+            _abort_thread(thread)
+            return {"error": "Execution cancelled."}
+        thread.join(timeout=_CANCEL_POLL_INTERVAL)
+        waited += _CANCEL_POLL_INTERVAL
 
     if thread.is_alive():
+        _abort_thread(thread)
         return {"error": f"Execution timed out after {EXECUTION_TIMEOUT} seconds."}
 
     if exec_error:
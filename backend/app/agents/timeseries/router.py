@@ -1,8 +1,10 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from fastapi.responses import StreamingResponse
 
 from app.agents.timeseries.api_schemas import AnalyzeRequest, AnalyzeResponse
 from app.agents.timeseries.service import analyze, analyze_stream
+from app.core.cancellation import CancellationToken
+from app.core.streaming import disconnect_aware
 
 router = APIRouter(tags=["TimeSeries"], prefix="/v1/timeseries")
 
@@ -13,8 +15,9 @@ async def analyze_endpoint(request: AnalyzeRequest):
 
 
 @router.post("/analyze/stream")
-async def analyze_stream_endpoint(request: AnalyzeRequest):
+async def analyze_stream_endpoint(request: AnalyzeRequest, http_request: Request):
+    token = CancellationToken()
     return StreamingResponse(
-        analyze_stream(request),
+        disconnect_aware(http_request, analyze_stream(request, cancel_token=token), token),
         media_type="text/event-stream",
     )
@@ -3,6 +3,7 @@ from collections.abc import Generator
 
 from app.agents.timeseries import create_timeseries_agent
 from app.agents.timeseries.api_schemas import AnalyzeRequest, AnalyzeResponse
+from app.core.cancellation import CancellationToken, OperationCancelled
 
 
 def analyze(request: AnalyzeRequest) -> AnalyzeResponse:
@@ -17,12 +18,19 @@ def analyze(request: AnalyzeRequest) -> AnalyzeResponse:
     )
 
 
-def analyze_stream(request: AnalyzeRequest) -> Generator[str, None, None]:
+def analyze_stream(
+    request: AnalyzeRequest,
+    cancel_token: CancellationToken | None = None,
+) -> Generator[str, None, None]:
     agent = create_timeseries_agent()
-
-    for event in agent.execute_stream(request.question):
-        if event.get("type") == "_result":
-            continue  # internal marker, don't send to client
-        yield f"data: {json.dumps(event)}\n\n"
+    context = {"cancel_token": cancel_token} if cancel_token else None
+
+    try:
+        for event in agent.execute_stream(request.question, context=context):
+            if event.get("type") == "_result":
+                continue  # internal marker, don't send to client
+            yield f"data: {json.dumps(event)}\n\n"
+    except OperationCancelled:
+        return
 
     yield f"data: {json.dumps({'type': 'done'})}\n\n"
@@ -0,0 +1,111 @@
+import logging
+import threading
+from collections.abc import Callable, Generator, Iterator
+from typing import TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class OperationCancelled(Exception):
+    """Raised at a checkpoint once the request's token has been cancelled."""
+
+
+class CancellationToken:
+    """Thread-safe cancellation flag shared by everything serving one request.
+
+    Long-running operations register a callback (close a stream, kill a
+    query, abort a sandbox) that fires once when ``cancel()`` is called;
+    step boundaries call ``raise_if_cancelled()``.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: dict[int, Callable[[], None]] = {}
+        self._next_id = 0
+        self.reason = ""
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks = list(self._callbacks.values())
+            self._callbacks.clear()
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as exc:
+                logger.warning("Cancellation callback failed: %s", exc)
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise OperationCancelled(self.reason or "cancelled")
+
+    def register(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Run ``callback`` on cancel; returns a function that unregisters it.
+
+        If the token is already cancelled the callback runs immediately.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                callback_id = self._next_id
+                self._next_id += 1
+                self._callbacks[callback_id] = callback
+
+                def _unregister() -> None:
+                    with self._lock:
+                        self._callbacks.pop(callback_id, None)
+
+                return _unregister
+
+        callback()
+        return lambda: None
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._event.wait(timeout)
+
+
+# ---------------------------------------------------------------------------
+# Context helpers — the token travels in the agent ``context`` dict under the
+# "cancel_token" key; every helper is a no-op when no token is set.
+# ---------------------------------------------------------------------------
+
+
+def get_cancel_token(context: dict | None) -> CancellationToken | None:
+    if not context:
+        return None
+    token = context.get("cancel_token")
+    return token if isinstance(token, CancellationToken) else None
+
+
+def check_cancelled(context: dict | None) -> None:
+    token = get_cancel_token(context)
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def cancellable(items: Iterator[T], context: dict | None) -> Generator[T, None, None]:
+    """Re-yield ``items`` but stop (and close the source) once cancelled.
+
+    Closing the source generator runs its ``finally`` blocks, which is how
+    LLM provider streams release their HTTP connection.
+    """
+    token = get_cancel_token(context)
+    try:
+        for item in items:
+            if token is not None:
+                token.raise_if_cancelled()
+            yield item
+    finally:
+        close = getattr(items, "close", None)
+        if close is not None:
+            close()
@@ -17,6 +17,99 @@ class Settings(BaseSettings):
     XAI_API_KEY: str = ""
     ANTHROPIC_API_KEY: str = ""
 
+    # Request budget (seconds) for a single chat request; clients may ask for
+    # a different budget up to CHAT_REQUEST_TIMEOUT_MAX.
+    CHAT_REQUEST_TIMEOUT: float = 120.0
+    CHAT_REQUEST_TIMEOUT_MAX: float = 600.0
+
+    # Tracing — TRACING_EXPORTER is "", "jsonl" or "otlp".
+    TRACING_EXPORTER: str = ""
+    TRACING_JSONL_PATH: str = "traces/spans.jsonl"
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    TRACING_SERVICE_NAME: str = "agentic-chatbot"
+
+    # Profiling — requests are profiled only when they carry X-Profile and an
+    # X-Admin-Token matching PROFILING_ADMIN_TOKEN (empty disables profiling).
+    PROFILING_ADMIN_TOKEN: str = ""
+    PROFILING_DIR: str = "profiles"
+    PROFILING_INTERVAL_MS: float = 5.0
+    PROFILING_MAX_ARTIFACTS: int = 50
+
+    # Database agent — the rendered ClickHouse schema is re-checked (one cheap
+    # system.tables query) at most once per interval.
+    SCHEMA_CACHE_MIN_REFRESH_SECONDS: float = 60.0
+    # Only the top-k BM25-matched tables (plus join parents) go into the
+    # NL->SQL prompt; 0 always sends the full schema.
+    SCHEMA_RETRIEVAL_TOP_K: int = 8
+    # Schema prompt format: "full" (one line per column) or "compact"
+    # (shared columns factored out, abbreviated types).
+    SCHEMA_PROMPT_ENCODING: str = "compact"
+    # Column value statistics (distinct values, min/max, row counts) refreshed
+    # in the background and added to the NL->SQL prompt.
+    COLUMN_STATS_ENABLED: bool = True
+    COLUMN_STATS_REFRESH_SECONDS: float = 3600.0
+    COLUMN_STATS_MAX_DISTINCT: int = 20
+    COLUMN_STATS_MAX_TABLES: int = 8
+    # Row cap for columnar (DataFrame) fetches used by timeseries/compare.
+    COLUMNAR_MAX_ROWS: int = 100_000
+    # Query result cache keyed by normalized SQL. Entries expire after the
+    # smallest TTL of the tables they read (per-table overrides as JSON, e.g.
+    # {"cultivation.water_chemical": 60}) or when a table's CDC ingestion
+    # watermark advances; watermarks are re-read at most every N seconds.
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_MAX_ENTRIES: int = 256
+    RESULT_CACHE_MAX_ROWS: int = 10_000
+    RESULT_CACHE_TTL_SECONDS: float = 300.0
+    RESULT_CACHE_TABLE_TTLS: dict[str, float] = {}
+    RESULT_CACHE_WATERMARK_CHECK_SECONDS: float = 5.0
+    # Persistent question -> validated SQL cache (skips plan/command/NL->SQL
+    # for repeated questions); least recently used entries beyond the cap go.
+    QUESTION_CACHE_ENABLED: bool = True
+    QUESTION_CACHE_MAX_ENTRIES: int = 500
+    # Curated KPI queries chosen from the plan's "kpi" intent (skip command
+    # and NL->SQL generation).
+    KPI_TEMPLATES_ENABLED: bool = True
+    # Ask the LLM for a metric/dimension spec compiled to SQL before falling
+    # back to raw NL->SQL generation. Only tried on the first run of questions
+    # the plan flags as "metric_query" (never on reflection re-runs).
+    SEMANTIC_LAYER_ENABLED: bool = True
+    # Timezone used to resolve "kemarin", "minggu lalu", ... to dates
+    # (empty = the server's local timezone).
+    TIME_ZONE: str = ""
+    # In-memory site/pond/cycle catalog used to resolve entity mentions locally.
+    ENTITY_CATALOG_REFRESH_SECONDS: float = 300.0
+    # Per-query limits for agent SQL (bytes for the byte/memory caps; 0 leaves
+    # a limit to the ClickHouse user profile). A LIMIT is appended to queries
+    # without one. DB_QUERY_LIMITS overrides them per calling agent as JSON,
+    # e.g. {"report": {"max_execution_time": 60, "default_limit": 200}}.
+    DB_QUERY_MAX_EXECUTION_TIME: int = 30
+    DB_QUERY_MAX_RESULT_ROWS: int = 10_000
+    DB_QUERY_MAX_BYTES_TO_READ: int = 10_000_000_000
+    DB_QUERY_MAX_MEMORY_USAGE: int = 4_000_000_000
+    DB_QUERY_DEFAULT_LIMIT: int = 1000
+    DB_QUERY_LIMITS: dict[str, dict[str, int]] = {}
+    # Generated SQL is first checked with EXPLAIN ESTIMATE: query errors come
+    # back without reading data, and queries estimated to read more rows or
+    # marks than these caps are rejected (0 disables a cap; DB_QUERY_LIMITS
+    # overrides them per agent as max_estimated_rows / max_estimated_marks).
+    SQL_PREFLIGHT_ENABLED: bool = True
+    SQL_PREFLIGHT_TIMEOUT: int = 5
+    DB_QUERY_MAX_ESTIMATED_ROWS: int = 500_000_000
+    DB_QUERY_MAX_ESTIMATED_MARKS: int = 0
+    # Rewrites applied by the SQL guard: FINAL on CDC (ReplacingMergeTree)
+    # tables and deleted_by = 0 on soft-delete tables the query left out.
+    SQL_GUARD_AUTO_FINAL: bool = True
+    SQL_GUARD_SOFT_DELETE: bool = True
+    # The first NL->SQL attempt generates this many candidates concurrently
+    # (one temperature each, cycling) and runs the first one that passes the
+    # guard and pre-flight; 1 keeps the sequential loop. Costs N x tokens.
+    SQL_CANDIDATES: int = 1
+    SQL_CANDIDATE_TEMPERATURES: list[float] = [0.0, 0.4, 0.8]
+    # Mechanical errors (column case/underscores, missing database prefix,
+    # String vs Date comparison, column missing from GROUP BY) are fixed on
+    # the AST from the cached schema and re-run before asking the LLM again.
+    SQL_LOCAL_REPAIR_ENABLED: bool = True
+
     # Vector DB
     VECTORDB_PROVIDER: str = "memory"
     VECTORDB_URL: str = ""
@@ -2,9 +2,12 @@ from collections.abc import Generator
 import logging
 import time
 
+from sqlalchemy import event
 from sqlmodel import SQLModel, Session, create_engine, text
 
 from app.core.config import settings
+from app.core.metrics import DB_QUERY_DURATION, DB_QUERY_ROWS, POSTGRES_SESSION_DURATION
+from app.core.tracing import finish_span, start_span
 
 logger = logging.getLogger(__name__)
 DB_STARTUP_MAX_ATTEMPTS = 30
@@ -15,6 +18,70 @@ app_database_url = settings.app_database_url
 
 app_engine = create_engine(app_database_url)
 
+# Statements longer than this are truncated in span attributes.
+MAX_TRACED_STATEMENT_CHARS = 2000
+
+
+def _instrument_engine(engine, system: str) -> None:
+    """Record every statement executed on ``engine`` as a tracing span and metrics."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+        context._trace_span = start_span(
+            f"{system}.query",
+            db_system=system,
+            statement=str(statement)[:MAX_TRACED_STATEMENT_CHARS],
+        )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        _observe_duration(context, "ok")
+        rowcount = getattr(cursor, "rowcount", -1)
+        has_rows = isinstance(rowcount, int) and rowcount >= 0
+        if has_rows:
+            DB_QUERY_ROWS.labels(system=system).observe(rowcount)
+        current = getattr(context, "_trace_span", None)
+        if current is None:
+            return
+        if has_rows:
+            current.set(rows=rowcount)
+        finish_span(current)
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        _observe_duration(exception_context.execution_context, "error")
+        current = getattr(exception_context.execution_context, "_trace_span", None)
+        finish_span(current, error=exception_context.original_exception)
+
+    def _observe_duration(context, outcome: str) -> None:
+        started = getattr(context, "_query_started", None)
+        if started is None:
+            return
+        context._query_started = None
+        DB_QUERY_DURATION.labels(system=system, outcome=outcome).observe(
+            time.perf_counter() - started
+        )
+
+
+def _instrument_pool_sessions(engine) -> None:
+    """Time how long each pooled connection is held (one ORM session's work)."""
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out_at"] = time.perf_counter()
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        started = connection_record.info.pop("checked_out_at", None)
+        if started is not None:
+            POSTGRES_SESSION_DURATION.observe(time.perf_counter() - started)
+
+
+_instrument_engine(clickhouse_engine, "clickhouse")
+_instrument_engine(app_engine, "postgres")
+_instrument_pool_sessions(app_engine)
+
 
 def _safe_url(value) -> str:
     return value.render_as_string(hide_password=True)
@@ -99,6 +166,7 @@ def init_app_database() -> None:
         ConversationMessage,
     )
     from app.agents.memory.models import AgentMemory
+    from app.agents.database.models import QuestionSqlCacheEntry
 
     _ = (
         AdminConfig,
@@ -107,6 +175,7 @@ def init_app_database() -> None:
         ConversationMessage,
         ConversationHistory,
         AgentMemory,
+        QuestionSqlCacheEntry,
     )
     SQLModel.metadata.create_all(app_engine)
     logger.info("Application tables are ready on %s", _safe_url(app_engine.url))
@@ -0,0 +1,115 @@
+import math
+import time
+from dataclasses import dataclass
+
+from app.core.llm.schemas import GenerateConfig
+
+# Below this many seconds left, agents drop optional steps (plan, reflection).
+TIGHT_BUDGET_SECONDS = 20.0
+
+# Rough cost of one NL->SQL attempt (LLM call + query), used to scale retries.
+SECONDS_PER_SQL_ATTEMPT = 10.0
+
+# Never hand a provider or ClickHouse less than this, so a nearly exhausted
+# budget still fails with a clean timeout instead of an invalid setting.
+MIN_STEP_TIMEOUT_SECONDS = 1.0
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the request budget is spent before a step could start."""
+
+    def __init__(self, step: str = ""):
+        self.step = step
+        message = "Request deadline exceeded"
+        if step:
+            message += f" before step '{step}'"
+        super().__init__(message)
+
+
+@dataclass
+class Deadline:
+    """Absolute, monotonic end time for one chat request."""
+
+    expires_at: float
+    budget: float
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        return cls(expires_at=time.monotonic() + seconds, budget=seconds)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def is_tight(self, threshold: float = TIGHT_BUDGET_SECONDS) -> bool:
+        return self.remaining() < threshold
+
+    def check(self, step: str = "") -> None:
+        if self.expired:
+            raise DeadlineExceeded(step)
+
+    def step_timeout(self) -> float:
+        return max(MIN_STEP_TIMEOUT_SECONDS, self.remaining())
+
+
+# ---------------------------------------------------------------------------
+# Context helpers — the deadline travels in the agent ``context`` dict under
+# the "deadline" key; every helper is a no-op when no deadline is set.
+# ---------------------------------------------------------------------------
+
+
+def get_deadline(context: dict | None) -> Deadline | None:
+    if not context:
+        return None
+    deadline = context.get("deadline")
+    return deadline if isinstance(deadline, Deadline) else None
+
+
+def check_deadline(context: dict | None, step: str = "") -> None:
+    deadline = get_deadline(context)
+    if deadline is not None:
+        deadline.check(step)
+
+
+def is_expired(context: dict | None) -> bool:
+    deadline = get_deadline(context)
+    return deadline is not None and deadline.expired
+
+
+def is_budget_tight(context: dict | None, threshold: float = TIGHT_BUDGET_SECONDS) -> bool:
+    deadline = get_deadline(context)
+    return deadline is not None and deadline.is_tight(threshold)
+
+
+def budget_attempts(
+    context: dict | None,
+    max_attempts: int,
+    seconds_per_attempt: float = SECONDS_PER_SQL_ATTEMPT,
+) -> int:
+    """Scale a retry count down to what the remaining budget can afford (min 1)."""
+    deadline = get_deadline(context)
+    if deadline is None:
+        return max_attempts
+    affordable = int(deadline.remaining() // seconds_per_attempt)
+    return max(1, min(max_attempts, affordable))
+
+
+def llm_config(context: dict | None, **kwargs) -> GenerateConfig:
+    """GenerateConfig whose request timeout is the remaining budget."""
+    config = GenerateConfig(**kwargs)
+    deadline = get_deadline(context)
+    if deadline is not None:
+        timeout = deadline.step_timeout()
+        config.timeout = timeout if config.timeout is None else min(config.timeout, timeout)
+    return config
+
+
+def clickhouse_settings(context: dict | None) -> dict:
+    """Per-query ClickHouse settings bounded by the remaining budget."""
+    deadline = get_deadline(context)
+    if deadline is None:
+        return {}
+    return {"max_execution_time": max(1, math.ceil(deadline.step_timeout()))}
@@ -0,0 +1,104 @@
+import time
+from collections.abc import Generator
+
+from app.core.llm.base import BaseLLM
+from app.core.llm.schemas import GenerateConfig, LLMResponse
+from app.core.metrics import (
+    LLM_ERRORS,
+    LLM_REQUEST_DURATION,
+    LLM_TIME_TO_FIRST_TOKEN,
+    LLM_TOKENS,
+    label,
+)
+from app.core.tracing import finish_span, span, start_span
+
+
+class InstrumentedLLM(BaseLLM):
+    """Wraps a provider so every call is recorded as a tracing span and metrics."""
+
+    def __init__(self, inner: BaseLLM, provider: str, model: str):
+        self.inner = inner
+        self.provider = provider
+        self.model = model
+
+    def _attributes(self, config: GenerateConfig) -> dict:
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "prompt_slug": config.prompt_slug,
+            "temperature": config.temperature,
+        }
+
+    def _labels(self, config: GenerateConfig) -> dict:
+        return {
+            "provider": label(self.provider),
+            "model": label(self.model),
+            "prompt_slug": label(config.prompt_slug),
+        }
+
+    def _observe_tokens(self, labels: dict, usage: dict) -> None:
+        for kind in ("prompt", "completion"):
+            value = usage.get(f"{kind}_tokens")
+            if isinstance(value, int):
+                LLM_TOKENS.labels(**labels, kind=kind).observe(value)
+
+    def generate(self, messages: list[dict], config: GenerateConfig | None = None) -> LLMResponse:
+        config = config or GenerateConfig()
+        labels = self._labels(config)
+        started = time.perf_counter()
+        with span("llm.generate", **self._attributes(config)) as current:
+            try:
+                response = self.inner.generate(messages=messages, config=config)
+            except Exception:
+                LLM_ERRORS.labels(**labels).inc()
+                raise
+            finally:
+                LLM_REQUEST_DURATION.labels(**labels, mode="generate").observe(
+                    time.perf_counter() - started
+                )
+            usage = response.usage or {}
+            self._observe_tokens(labels, usage)
+            current.set(
+                prompt_tokens=usage.get("prompt_tokens"),
+                completion_tokens=usage.get("completion_tokens"),
+                total_tokens=usage.get("total_tokens"),
+            )
+            return response
+
+    def generate_stream(
+        self,
+        messages: list[dict],
+        config: GenerateConfig | None = None,
+    ) -> Generator[str, None, None]:
+        config = config or GenerateConfig()
+        labels = self._labels(config)
+        current = start_span("llm.generate_stream", **self._attributes(config))
+        started = time.perf_counter()
+        chunk_count = 0
+        char_count = 0
+        error: BaseException | None = None
+        stream = self.inner.generate_stream(messages=messages, config=config)
+        try:
+            for chunk in stream:
+                if chunk_count == 0:
+                    ttft = time.perf_counter() - started
+                    LLM_TIME_TO_FIRST_TOKEN.labels(**labels).observe(ttft)
+                    if current is not None:
+                        current.set(ttft_ms=round(ttft * 1000, 3))
+                chunk_count += 1
+                char_count += len(chunk)
+                yield chunk
+        except GeneratorExit:
+            raise
+        except BaseException as exc:
+            error = exc
+            LLM_ERRORS.labels(**labels).inc()
+            raise
+        finally:
+            stream.close()
+            LLM_REQUEST_DURATION.labels(**labels, mode="stream").observe(
+                time.perf_counter() - started
+            )
+            if current is not None:
+                current.set(chunks=chunk_count, completion_chars=char_count)
+            finish_span(current, error=error)
@@ -38,6 +38,8 @@ class AnthropicProvider(BaseLLM):
         }
         if config.stop is not None:
             params["stop_sequences"] = config.stop
+        if config.timeout is not None:
+            params["timeout"] = config.timeout
         return params
 
     def generate(self, messages: list[dict], config: GenerateConfig | None = None) -> LLMResponse:
@@ -81,8 +83,13 @@ class AnthropicProvider(BaseLLM):
             stream=True,
             **self._build_params(config),
         )
-        for event in stream:
-            if event.type == "content_block_delta":
-                text = getattr(event.delta, "text", "")
-                if text:
-                    yield text
+        # Closing the generator early (e.g. on cancellation) releases the
+        # HTTP connection instead of draining the rest of the completion.
+        try:
+            for event in stream:
+                if event.type == "content_block_delta":
+                    text = getattr(event.delta, "text", "")
+                    if text:
+                        yield text
+        finally:
+            stream.close()
@@ -41,6 +41,12 @@ class GoogleProvider(BaseLLM):
             params["stop_sequences"] = config.stop
         return genai.types.GenerationConfig(**params)
 
+    @staticmethod
+    def _request_options(config: GenerateConfig) -> dict:
+        if config.timeout is None:
+            return {}
+        return {"timeout": config.timeout}
+
     def generate(self, messages: list[dict], config: GenerateConfig | None = None) -> LLMResponse:
         config = config or GenerateConfig()
         system_instruction, history = self._split_messages(messages)
@@ -48,6 +54,7 @@ class GoogleProvider(BaseLLM):
         response = model.generate_content(
             history or "",
             generation_config=self._build_config(config),
+            request_options=self._request_options(config),
         )
         text = getattr(response, "text", "") or ""
         return LLMResponse(text=text, usage={})
@@ -63,9 +70,17 @@ class GoogleProvider(BaseLLM):
         stream = model.generate_content(
             history or "",
             generation_config=self._build_config(config),
+            request_options=self._request_options(config),
             stream=True,
         )
-        for chunk in stream:
-            text = getattr(chunk, "text", "")
-            if text:
-                yield text
+        chunks = iter(stream)
+        try:
+            for chunk in chunks:
+                text = getattr(chunk, "text", "")
+                if text:
+                    yield text
+        finally:
+            # Stop the underlying response iterator when closed early.
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
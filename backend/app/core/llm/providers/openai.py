@@ -35,6 +35,8 @@ class OpenAICompatibleProvider(BaseLLM):
             params["max_tokens"] = config.max_tokens
         if config.stop is not None:
             params["stop"] = config.stop
+        if config.timeout is not None:
+            params["timeout"] = config.timeout
         return params
 
     def generate(self, messages: list[dict], config: GenerateConfig | None = None) -> LLMResponse:
@@ -59,10 +61,15 @@ class OpenAICompatibleProvider(BaseLLM):
             **self._build_params(messages, config),
             stream=True,
         )
-        for chunk in stream:
-            delta = chunk.choices[0].delta.content
-            if delta:
-                yield delta
+        # Closing the generator early (e.g. on cancellation) releases the
+        # HTTP connection instead of draining the rest of the completion.
+        try:
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        finally:
+            stream.close()
 
 
 class OpenAIProvider(OpenAICompatibleProvider):
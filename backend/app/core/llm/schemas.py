@@ -6,6 +6,9 @@ class GenerateConfig(BaseModel):
     max_tokens: int | None = None
     top_p: float = 1.0
     stop: list[str] | None = None
+    timeout: float | None = None
+    # Prompt slug of the request, for tracing/metrics only (not sent to providers).
+    prompt_slug: str | None = None
 
 
 class LLMResponse(BaseModel):
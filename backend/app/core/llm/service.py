@@ -2,6 +2,7 @@ from typing import Dict, Tuple
 
 from app.core.config import settings
 from app.core.llm.base import BaseLLM
+from app.core.llm.instrumented import InstrumentedLLM
 from app.core.llm.providers.anthropic import AnthropicProvider
 from app.core.llm.providers.google import GoogleProvider
 from app.core.llm.providers.xai import XaiProvider
@@ -191,8 +192,12 @@ def create_llm(
 
     llm_class = LLM_REGISTRY[provider]
 
-    instance = llm_class(
-        api_key=api_key,
+    instance = InstrumentedLLM(
+        llm_class(
+            api_key=api_key,
+            model=model,
+        ),
+        provider=provider,
         model=model,
     )
 
@@ -1,7 +1,12 @@
 import logging
 
+from app.core.tracing import RequestIdFilter
+
+
 def setup_logging():
     logging.basicConfig(
         level=logging.INFO,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    )
\ No newline at end of file
+        format="%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s",
+    )
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(RequestIdFilter())
@@ -0,0 +1,145 @@
+"""Prometheus metrics.
+
+All collectors live on the default registry and are exposed at ``/metrics``
+(see ``app.middleware.metrics``). Label values are kept to small, bounded
+sets — route templates, prompt slugs, agent names — never raw paths or SQL.
+"""
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Seconds; covers quick lookups up to long report/LLM runs.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+ROW_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000, 1000000)
+ATTEMPT_BUCKETS = (1, 2, 3, 4, 5)
+
+# ---------------------------------------------------------------------------
+# HTTP
+# ---------------------------------------------------------------------------
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency, including the full SSE body for streaming routes.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served.",
+)
+SSE_STREAMS_ACTIVE = Gauge(
+    "sse_streams_active",
+    "SSE streams currently open.",
+)
+
+# ---------------------------------------------------------------------------
+# Agents
+# ---------------------------------------------------------------------------
+
+PLANNER_ROUTES = Counter(
+    "planner_route_total",
+    "Routing decisions made by the planner.",
+    ["route"],
+)
+PLANNER_REFLECTIONS = Counter(
+    "planner_reflection_total",
+    "Database reflection passes (a failed query re-instructed by the planner).",
+)
+DAG_BRANCHES_RUNNING = Gauge(
+    "planner_dag_branches_running",
+    "Task-graph branches currently executing.",
+)
+DATABASE_AGENT_RUNS = Histogram(
+    "database_agent_attempts",
+    "NL->SQL attempts per DatabaseAgent run.",
+    ["outcome"],
+    buckets=ATTEMPT_BUCKETS,
+)
+
+# ---------------------------------------------------------------------------
+# LLM
+# ---------------------------------------------------------------------------
+
+LLM_REQUEST_DURATION = Histogram(
+    "llm_request_duration_seconds",
+    "LLM call latency (full response).",
+    ["provider", "model", "prompt_slug", "mode"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "llm_time_to_first_token_seconds",
+    "Time until the first streamed chunk.",
+    ["provider", "model", "prompt_slug"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_TOKENS = Histogram(
+    "llm_tokens",
+    "Tokens per LLM call, by kind (prompt or completion).",
+    ["provider", "model", "prompt_slug", "kind"],
+    buckets=TOKEN_BUCKETS,
+)
+LLM_ERRORS = Counter(
+    "llm_errors_total",
+    "LLM calls that raised.",
+    ["provider", "model", "prompt_slug"],
+)
+
+# ---------------------------------------------------------------------------
+# Databases, sandbox, web
+# ---------------------------------------------------------------------------
+
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Statement latency per database system.",
+    ["system", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_QUERY_ROWS = Histogram(
+    "db_query_rows",
+    "Rows returned per statement.",
+    ["system"],
+    buckets=ROW_BUCKETS,
+)
+POSTGRES_SESSION_DURATION = Histogram(
+    "postgres_session_duration_seconds",
+    "Lifetime of an application database session.",
+    buckets=LATENCY_BUCKETS,
+)
+SANDBOX_DURATION = Histogram(
+    "sandbox_execution_seconds",
+    "Sandboxed analysis code execution time.",
+    ["outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+WEB_FETCH_DURATION = Histogram(
+    "web_fetch_duration_seconds",
+    "Browser agent page fetch latency.",
+    ["outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+
+# ---------------------------------------------------------------------------
+# Caches — every cache reports lookups here so hit ratios share one query:
+#   sum by (cache) (rate(cache_requests_total{result="hit"}[5m]))
+#     / sum by (cache) (rate(cache_requests_total[5m]))
+# ---------------------------------------------------------------------------
+
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by cache name and result.",
+    ["cache", "result"],
+)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def label(value: object) -> str:
+    """Normalize an optional label value."""
+    text = str(value).strip() if value is not None else ""
+    return text or "unknown"
+
+
+def render_latest() -> tuple[bytes, str]:
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,290 @@
+"""On-demand sampling profiler for single requests.
+
+An admin sends ``X-Profile: 1`` (or ``?profile=1``) together with
+``X-Admin-Token`` on a profiled endpoint. The request then runs with a
+``ProfileSession``: a background thread samples the stacks of the threads
+currently doing that request's work, and the result is stored as a
+speedscope JSON file readable from ``/v1/admin/profiles/{id}``.
+
+Work hops threads (event loop, SSE threadpool steps, DAG branches), so code
+that moves work to another thread calls ``attach_thread()`` there. Without
+an active session that is a single context-variable lookup and nothing is
+sampled.
+"""
+
+import hmac
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, TypeVar
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PROFILE_HEADER = "x-profile"
+ADMIN_TOKEN_HEADER = "x-admin-token"
+PROFILE_ID_HEADER = "x-profile-id"
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+# Deep recursion (pandas, SQLAlchemy) is cut here to bound sample size.
+MAX_STACK_DEPTH = 200
+
+_VALID_PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+_current_session: ContextVar["ProfileSession | None"] = ContextVar("profile_session", default=None)
+
+
+class ProfileSession:
+    """Samples the attached threads every ``interval`` seconds until stopped."""
+
+    def __init__(self, name: str, interval: float):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.interval = interval
+        self._threads: dict[int, int] = {}  # thread id -> attach depth
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler: threading.Thread | None = None
+        self._frames: dict[tuple[str, str, int], int] = {}
+        self._samples: dict[int, list[tuple[list[int], float]]] = {}
+        self.started_at = 0.0
+        self.ended_at = 0.0
+
+    # -- thread attachment ---------------------------------------------------
+
+    def attach(self, thread_id: int) -> None:
+        with self._lock:
+            self._threads[thread_id] = self._threads.get(thread_id, 0) + 1
+
+    def detach(self, thread_id: int) -> None:
+        with self._lock:
+            depth = self._threads.get(thread_id, 0) - 1
+            if depth > 0:
+                self._threads[thread_id] = depth
+            else:
+                self._threads.pop(thread_id, None)
+
+    # -- sampling ------------------------------------------------------------
+
+    def start(self) -> None:
+        self.started_at = time.perf_counter()
+        self._sampler = threading.Thread(
+            target=self._run, name=f"profiler-{self.id[:8]}", daemon=True
+        )
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join(timeout=1.0)
+        self.ended_at = time.perf_counter()
+
+    def _frame_index(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self._frames.get(key)
+        if index is None:
+            index = len(self._frames)
+            self._frames[key] = index
+        return index
+
+    def _run(self) -> None:
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight_ms = (now - last) * 1000
+            last = now
+            with self._lock:
+                thread_ids = list(self._threads)
+            if not thread_ids:
+                continue
+            frames = sys._current_frames()
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                stack: list[int] = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(self._frame_index(frame.f_code))
+                    frame = frame.f_back
+                if stack:
+                    stack.reverse()
+                    self._samples.setdefault(thread_id, []).append((stack, weight_ms))
+
+    # -- export --------------------------------------------------------------
+
+    def to_speedscope(self) -> dict[str, Any]:
+        frames = [
+            {"name": name, "file": filename, "line": line}
+            for (name, filename, line) in self._frames
+        ]
+        duration_ms = max(0.0, (self.ended_at - self.started_at) * 1000)
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        profiles = []
+        for thread_id, samples in self._samples.items():
+            profiles.append(
+                {
+                    "type": "sampled",
+                    "name": thread_names.get(thread_id, f"thread-{thread_id}"),
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": round(duration_ms, 3),
+                    "samples": [stack for stack, _ in samples],
+                    "weights": [round(weight, 3) for _, weight in samples],
+                }
+            )
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": self.name,
+            "exporter": "agentic-chatbot",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Request gate
+# ---------------------------------------------------------------------------
+
+
+def is_admin_token(value: str | None) -> bool:
+    expected = settings.PROFILING_ADMIN_TOKEN
+    if not expected or not value:
+        return False
+    return hmac.compare_digest(value.encode("utf-8"), expected.encode("utf-8"))
+
+
+def is_profiling_requested(headers: dict[str, str], query_string: str) -> bool:
+    """True when the request asks for a profile and carries the admin token."""
+    flag = headers.get(PROFILE_HEADER, "").strip().lower()
+    if flag not in {"1", "true", "yes"} and not re.search(r"(?:^|&)profile=(?:1|true)(?:&|$)", query_string):
+        return False
+    return is_admin_token(headers.get(ADMIN_TOKEN_HEADER))
+
+
+# ---------------------------------------------------------------------------
+# Context helpers
+# ---------------------------------------------------------------------------
+
+
+def start_session(name: str):
+    """Start sampling and bind the session; returns ``(session, reset_token)``."""
+    session = ProfileSession(name, interval=settings.PROFILING_INTERVAL_MS / 1000)
+    session.start()
+    return session, _current_session.set(session)
+
+
+def end_session(session: ProfileSession, reset_token) -> None:
+    session.stop()
+    _current_session.reset(reset_token)
+
+
+def get_session() -> ProfileSession | None:
+    return _current_session.get()
+
+
+@contextmanager
+def attach_thread(session: ProfileSession | None = None) -> Iterator[None]:
+    """Include the current thread in ``session`` (default: the active one)."""
+    session = session or _current_session.get()
+    if session is None:
+        yield
+        return
+    thread_id = threading.get_ident()
+    session.attach(thread_id)
+    try:
+        yield
+    finally:
+        session.detach(thread_id)
+
+
+def profiled_steps(items: Iterator[T], session: ProfileSession) -> Iterator[T]:
+    """Attach whichever worker thread runs each ``next()`` of a sync generator."""
+    try:
+        while True:
+            with attach_thread(session):
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+            yield item
+    finally:
+        close = getattr(items, "close", None)
+        if close is not None:
+            close()
+
+
+# ---------------------------------------------------------------------------
+# Artifact store
+# ---------------------------------------------------------------------------
+
+
+def _profile_path(profile_id: str) -> str:
+    return os.path.join(settings.PROFILING_DIR, f"{profile_id}.speedscope.json")
+
+
+def save_profile(session: ProfileSession) -> str:
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    path = _profile_path(session.id)
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(session.to_speedscope(), handle)
+    _prune_profiles()
+    logger.info("Saved profile %s (%s)", session.id, session.name)
+    return path
+
+
+def _prune_profiles() -> None:
+    try:
+        entries = [
+            os.path.join(settings.PROFILING_DIR, name)
+            for name in os.listdir(settings.PROFILING_DIR)
+            if name.endswith(".speedscope.json")
+        ]
+    except FileNotFoundError:
+        return
+    entries.sort(key=os.path.getmtime, reverse=True)
+    for path in entries[settings.PROFILING_MAX_ARTIFACTS:]:
+        try:
+            os.remove(path)
+        except OSError as exc:
+            logger.warning("Failed to remove old profile %s: %s", path, exc)
+
+
+def load_profile(profile_id: str) -> dict | None:
+    if not _VALID_PROFILE_ID.match(profile_id):
+        return None
+    try:
+        with open(_profile_path(profile_id), encoding="utf-8") as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return None
+
+
+def list_profiles() -> list[dict]:
+    try:
+        names = os.listdir(settings.PROFILING_DIR)
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in names:
+        if not name.endswith(".speedscope.json"):
+            continue
+        path = os.path.join(settings.PROFILING_DIR, name)
+        profiles.append(
+            {
+                "id": name.removesuffix(".speedscope.json"),
+                "created_at": os.path.getmtime(path),
+                "size_bytes": os.path.getsize(path),
+            }
+        )
+    profiles.sort(key=lambda item: item["created_at"], reverse=True)
+    return profiles
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+from collections.abc import AsyncGenerator, Iterator
+
+import anyio
+from fastapi import Request
+from starlette.concurrency import iterate_in_threadpool
+
+from app.core.cancellation import CancellationToken
+from app.core.metrics import SSE_STREAMS_ACTIVE
+from app.core.profiling import get_session, profiled_steps
+
+logger = logging.getLogger(__name__)
+
+DISCONNECT_POLL_INTERVAL = 0.5  # seconds
+
+
+async def disconnect_aware(
+    request: Request,
+    events: Iterator[str],
+    token: CancellationToken | None = None,
+    poll_interval: float = DISCONNECT_POLL_INTERVAL,
+) -> AsyncGenerator[str, None]:
+    """Serve a blocking SSE generator and cancel ``token`` when the client leaves.
+
+    The generator runs step by step in the threadpool. A watcher polls
+    ``request.is_disconnected()`` so a disconnect is noticed even while a
+    step is blocked (LLM call, ClickHouse query); the token's callbacks
+    then abort that step. On exit the generator is closed so its cleanup
+    runs.
+    """
+    token = token or CancellationToken()
+    session = get_session()
+    if session is not None:
+        events = profiled_steps(events, session)
+
+    async def _watch() -> None:
+        while not token.cancelled:
+            if await request.is_disconnected():
+                logger.info("Client disconnected from %s, cancelling", request.url.path)
+                token.cancel("client disconnected")
+                return
+            await asyncio.sleep(poll_interval)
+
+    watcher = asyncio.ensure_future(_watch())
+    SSE_STREAMS_ACTIVE.inc()
+    try:
+        async for chunk in iterate_in_threadpool(events):
+            if token.cancelled:
+                break
+            yield chunk
+    finally:
+        SSE_STREAMS_ACTIVE.dec()
+        watcher.cancel()
+        token.cancel("stream closed")
+        close = getattr(events, "close", None)
+        if close is not None:
+            with anyio.CancelScope(shield=True):
+                try:
+                    await anyio.to_thread.run_sync(close)
+                except Exception as exc:
+                    logger.debug("Failed to close SSE generator: %s", exc)
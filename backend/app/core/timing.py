@@ -0,0 +1,74 @@
+"""Optional ``timing`` events for the SSE stream.
+
+A client opts in per request (``ChatRequest.timings``); the flag travels in
+the agent ``context`` dict under the "timings" key. Agents then yield one
+``{"type": "timing", "step": ..., "duration_ms": ...}`` event after each
+pipeline step, with token counts when the step made an LLM call.
+"""
+
+import time
+from collections.abc import Iterator
+from typing import Any
+
+
+def timings_enabled(context: dict | None) -> bool:
+    return bool(context and context.get("timings"))
+
+
+def timing_event(
+    step: str,
+    duration_ms: float,
+    usage: dict | None = None,
+    **attributes: Any,
+) -> dict:
+    event: dict[str, Any] = {
+        "type": "timing",
+        "step": step,
+        "duration_ms": round(duration_ms, 3),
+    }
+    for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        value = (usage or {}).get(key)
+        if value is not None:
+            event[key] = value
+    event.update({key: value for key, value in attributes.items() if value is not None})
+    return event
+
+
+class Stopwatch:
+    def __init__(self):
+        self.started = time.perf_counter()
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+
+class TimedStream:
+    """Re-yield LLM stream chunks while recording time to first chunk and total."""
+
+    def __init__(self, chunks: Iterator[str]):
+        self._chunks = chunks
+        self._stopwatch = Stopwatch()
+        self.ttft_ms: float | None = None
+        self.total_ms = 0.0
+        self.chunk_count = 0
+        self.char_count = 0
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            for chunk in self._chunks:
+                if self.ttft_ms is None:
+                    self.ttft_ms = self._stopwatch.elapsed_ms()
+                self.chunk_count += 1
+                self.char_count += len(chunk)
+                yield chunk
+        finally:
+            self.total_ms = self._stopwatch.elapsed_ms()
+
+    def timing_event(self, step: str) -> dict:
+        return timing_event(
+            step,
+            self.total_ms,
+            ttft_ms=round(self.ttft_ms, 3) if self.ttft_ms is not None else None,
+            chunks=self.chunk_count,
+            completion_chars=self.char_count,
+        )
@@ -0,0 +1,343 @@
+"""Lightweight request tracing.
+
+One ``Trace`` per HTTP request lives in a context variable. Spans are kept on
+the trace object (not in context variables) because SSE generators resume on
+different threadpool workers between yields; a per-trace stack keeps the
+parent/child relationship intact across those hops. Concurrent branches work
+on a ``fork()`` of the trace that shares the span list but has its own stack.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_current_trace: ContextVar["Trace | None"] = ContextVar("current_trace", default=None)
+
+
+def _new_id(length: int) -> str:
+    return uuid.uuid4().hex[:length]
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start_ns: int
+    end_ns: int | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    status: str = "ok"
+    error: str | None = None
+
+    def set(self, **attributes: Any) -> None:
+        for key, value in attributes.items():
+            if value is not None:
+                self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1_000_000
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "status": self.status,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Returned by ``span()`` outside of a trace so call sites stay unconditional."""
+
+    attributes: dict[str, Any] = {}
+    duration_ms = 0.0
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    def __init__(
+        self,
+        request_id: str,
+        trace_id: str | None = None,
+        *,
+        _spans: list[Span] | None = None,
+        _lock: "threading.Lock | None" = None,
+        _root_parent: Span | None = None,
+    ):
+        self.request_id = request_id
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.spans: list[Span] = _spans if _spans is not None else []
+        self._lock = _lock or threading.Lock()
+        self._stack: list[Span] = []
+        self._root_parent = _root_parent
+
+    @property
+    def current_span(self) -> Span | None:
+        if self._stack:
+            return self._stack[-1]
+        return self._root_parent
+
+    def start_span(self, name: str, **attributes: Any) -> Span:
+        parent = self.current_span
+        span = Span(
+            name=name,
+            trace_id=self.trace_id,
+            span_id=_new_id(16),
+            parent_id=parent.span_id if parent else None,
+            start_ns=time.time_ns(),
+        )
+        span.set(**attributes)
+        with self._lock:
+            self.spans.append(span)
+        self._stack.append(span)
+        return span
+
+    def end_span(self, span: Span, error: BaseException | None = None) -> None:
+        span.end_ns = time.time_ns()
+        if error is not None:
+            span.status = "error"
+            span.error = f"{type(error).__name__}: {error}"
+        if span in self._stack:
+            # Pop the span and anything left open above it.
+            del self._stack[self._stack.index(span):]
+
+    def fork(self) -> "Trace":
+        """Child view for a concurrent branch, parented at the current span."""
+        return Trace(
+            self.request_id,
+            self.trace_id,
+            _spans=self.spans,
+            _lock=self._lock,
+            _root_parent=self.current_span,
+        )
+
+    def finished_spans(self) -> list[Span]:
+        with self._lock:
+            return [span for span in self.spans if span.end_ns is not None]
+
+
+# ---------------------------------------------------------------------------
+# Context helpers
+# ---------------------------------------------------------------------------
+
+
+def start_trace(request_id: str | None = None):
+    """Activate a new trace; returns ``(trace, reset_token)``."""
+    trace = Trace(request_id or uuid.uuid4().hex)
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(reset_token) -> None:
+    _current_trace.reset(reset_token)
+
+
+def activate_trace(trace: "Trace | None") -> None:
+    """Bind ``trace`` in the current context (used by worker threads)."""
+    _current_trace.set(trace)
+
+
+def get_trace() -> Trace | None:
+    return _current_trace.get()
+
+
+def fork_trace() -> Trace | None:
+    trace = _current_trace.get()
+    return trace.fork() if trace is not None else None
+
+
+def current_request_id() -> str | None:
+    trace = _current_trace.get()
+    return trace.request_id if trace is not None else None
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span | _NoopSpan]:
+    trace = _current_trace.get()
+    if trace is None:
+        yield NOOP_SPAN
+        return
+    current = trace.start_span(name, **attributes)
+    try:
+        yield current
+    except BaseException as exc:
+        if isinstance(exc, GeneratorExit):
+            trace.end_span(current)
+        else:
+            trace.end_span(current, error=exc)
+        raise
+    else:
+        trace.end_span(current)
+
+
+def start_span(name: str, **attributes: Any) -> Span | None:
+    """Open a span without a ``with`` block (paired with ``finish_span``)."""
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    return trace.start_span(name, **attributes)
+
+
+def finish_span(current: Span | None, error: BaseException | None = None) -> None:
+    trace = _current_trace.get()
+    if current is None or trace is None:
+        return
+    trace.end_span(current, error=error)
+
+
+# ---------------------------------------------------------------------------
+# Exporters
+# ---------------------------------------------------------------------------
+
+
+class JsonlExporter:
+    """Append one JSON line per span to a local file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace) -> None:
+        spans = trace.finished_spans()
+        if not spans:
+            return
+        lines = []
+        for item in spans:
+            record = item.to_dict()
+            record["request_id"] = trace.request_id
+            lines.append(json.dumps(record, ensure_ascii=True, default=str))
+        directory = os.path.dirname(self.path)
+        with self._lock:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as handle:
+                handle.write("\n".join(lines) + "\n")
+
+
+class OtlpHttpExporter:
+    """Send spans to an OTLP/HTTP collector using the JSON encoding."""
+
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    @staticmethod
+    def _attribute(key: str, value: Any) -> dict[str, Any]:
+        if isinstance(value, bool):
+            encoded = {"boolValue": value}
+        elif isinstance(value, int):
+            encoded = {"intValue": str(value)}
+        elif isinstance(value, float):
+            encoded = {"doubleValue": value}
+        else:
+            encoded = {"stringValue": str(value)}
+        return {"key": key, "value": encoded}
+
+    def _payload(self, trace: Trace) -> dict[str, Any]:
+        spans = []
+        for item in trace.finished_spans():
+            attributes = {"request_id": trace.request_id, **item.attributes}
+            encoded = {
+                "traceId": item.trace_id,
+                "spanId": item.span_id,
+                "name": item.name,
+                "kind": 1,
+                "startTimeUnixNano": str(item.start_ns),
+                "endTimeUnixNano": str(item.end_ns),
+                "attributes": [self._attribute(k, v) for k, v in attributes.items()],
+                "status": {"code": 2, "message": item.error or ""} if item.status == "error" else {"code": 1},
+            }
+            if item.parent_id:
+                encoded["parentSpanId"] = item.parent_id
+            spans.append(encoded)
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [self._attribute("service.name", self.service_name)],
+                    },
+                    "scopeSpans": [{"scope": {"name": "app.core.tracing"}, "spans": spans}],
+                }
+            ]
+        }
+
+    def _send(self, payload: dict[str, Any]) -> None:
+        try:
+            httpx.post(self.endpoint, json=payload, timeout=self.timeout)
+        except Exception as exc:
+            logger.warning("Failed to export trace to %s: %s", self.endpoint, exc)
+
+    def export(self, trace: Trace) -> None:
+        payload = self._payload(trace)
+        if not payload["resourceSpans"][0]["scopeSpans"][0]["spans"]:
+            return
+        # Never make the request wait for the collector.
+        threading.Thread(target=self._send, args=(payload,), daemon=True).start()
+
+
+_exporter: JsonlExporter | OtlpHttpExporter | None = None
+_exporter_loaded = False
+
+
+def get_exporter() -> JsonlExporter | OtlpHttpExporter | None:
+    global _exporter, _exporter_loaded
+    if _exporter_loaded:
+        return _exporter
+    kind = settings.TRACING_EXPORTER.strip().lower()
+    if kind == "jsonl":
+        _exporter = JsonlExporter(settings.TRACING_JSONL_PATH)
+    elif kind == "otlp":
+        _exporter = OtlpHttpExporter(settings.TRACING_OTLP_ENDPOINT, settings.TRACING_SERVICE_NAME)
+    elif kind:
+        logger.warning("Unknown TRACING_EXPORTER '%s'; spans will not be exported.", kind)
+    _exporter_loaded = True
+    return _exporter
+
+
+def export_trace(trace: Trace) -> None:
+    exporter = get_exporter()
+    if exporter is None:
+        return
+    try:
+        exporter.export(trace)
+    except Exception as exc:
+        logger.warning("Failed to export trace %s: %s", trace.request_id, exc)
+
+
+# ---------------------------------------------------------------------------
+# Logging — attach the request id to every record emitted inside a request.
+# ---------------------------------------------------------------------------
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = current_request_id() or "-"
+        return True
@@ -11,6 +11,9 @@ from app.agents.timeseries.router import router as timeseries_router
 from app.core.database import close_app_database, init_app_database
 from app.core.logging import setup_logging
 from app.middleware.cors import setup_cors
+from app.middleware.metrics import setup_metrics
+from app.middleware.profiling import setup_profiling
+from app.middleware.tracing import setup_tracing
 from app.modules.admin.router import router as admin_router
 from app.modules.chatbot.router import router as chatbot_router
 
@@ -29,6 +32,9 @@ async def lifespan(_app: FastAPI):
 app = FastAPI(title="M Agent API", lifespan=lifespan)
 
 setup_cors(app)
+setup_tracing(app)
+setup_metrics(app)
+setup_profiling(app)
 
 app.include_router(chatbot_router)
 app.include_router(database_router)
@@ -0,0 +1,50 @@
+import time
+
+from fastapi import FastAPI, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT, render_latest
+
+METRICS_PATH = "/metrics"
+
+
+class MetricsMiddleware:
+    """Record latency per route template (not raw path, to bound cardinality)."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope.get("path") == METRICS_PATH:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message.get("status", status)
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUEST_DURATION.labels(
+                method=scope.get("method", ""),
+                route=route,
+                status=str(status),
+            ).observe(time.perf_counter() - started)
+
+
+def setup_metrics(app: FastAPI) -> None:
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get(METRICS_PATH, include_in_schema=False)
+    async def metrics() -> Response:
+        payload, content_type = render_latest()
+        return Response(content=payload, media_type=content_type)
@@ -0,0 +1,75 @@
+import threading
+
+from fastapi import FastAPI
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.profiling import (
+    PROFILE_ID_HEADER,
+    end_session,
+    is_profiling_requested,
+    save_profile,
+    start_session,
+)
+
+# Endpoints that may be profiled on request (chat, report, chart, alert).
+PROFILED_PATH_PREFIXES = (
+    "/v1/chatbot/chat",
+    "/v1/report/",
+    "/v1/chart/",
+    "/v1/alert/",
+)
+
+
+class ProfilingMiddleware:
+    """Run an admin-flagged request under the sampling profiler.
+
+    The event loop thread is sampled until the response starts (that is where
+    non-streaming endpoints do their work); SSE bodies attach their worker
+    threads through ``disconnect_aware``. Requests without the flag pass
+    straight through.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope.get("path", "").startswith(PROFILED_PATH_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        headers = {
+            key.decode("latin-1").lower(): value.decode("latin-1")
+            for key, value in scope.get("headers", [])
+        }
+        query_string = scope.get("query_string", b"").decode("latin-1")
+        if not is_profiling_requested(headers, query_string):
+            await self.app(scope, receive, send)
+            return
+
+        session, reset_token = start_session(f"{scope.get('method')} {scope.get('path')}")
+        loop_thread = threading.get_ident()
+        loop_attached = True
+        session.attach(loop_thread)
+
+        async def send_with_profile_id(message: Message) -> None:
+            nonlocal loop_attached
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((PROFILE_ID_HEADER.encode("latin-1"), session.id.encode("latin-1")))
+                message["headers"] = headers
+                if loop_attached:
+                    session.detach(loop_thread)
+                    loop_attached = False
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            if loop_attached:
+                session.detach(loop_thread)
+            end_session(session, reset_token)
+            save_profile(session)
+
+
+def setup_profiling(app: FastAPI) -> None:
+    app.add_middleware(ProfilingMiddleware)
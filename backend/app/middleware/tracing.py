@@ -0,0 +1,64 @@
+import re
+
+from fastapi import FastAPI
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.tracing import end_trace, export_trace, start_trace
+
+REQUEST_ID_HEADER = "x-request-id"
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class TracingMiddleware:
+    """Open a trace per HTTP request and echo its id as ``X-Request-ID``.
+
+    Plain ASGI (not BaseHTTPMiddleware) so the trace context stays visible to
+    streaming responses, and the root span covers the full SSE body.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = ""
+        for key, value in scope.get("headers", []):
+            if key.decode("latin-1").lower() == REQUEST_ID_HEADER:
+                incoming = value.decode("latin-1").strip()
+                break
+        request_id = incoming if _VALID_REQUEST_ID.match(incoming) else None
+
+        trace, reset_token = start_trace(request_id)
+        root = trace.start_span(
+            "http.request",
+            method=scope.get("method"),
+            path=scope.get("path"),
+        )
+
+        async def send_with_request_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                root.set(status_code=message.get("status"))
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", trace.request_id.encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        error: BaseException | None = None
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            route = scope.get("route")
+            root.set(route=getattr(route, "path", None))
+            trace.end_span(root, error=error)
+            export_trace(trace)
+            end_trace(reset_token)
+
+
+def setup_tracing(app: FastAPI) -> None:
+    app.add_middleware(TracingMiddleware)
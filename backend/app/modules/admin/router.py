@@ -1,7 +1,9 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException
 from pydantic import BaseModel
 
+from app.agents.database.question_cache import question_sql_store
 from app.core.llm.service import list_llm_options
+from app.core.profiling import is_admin_token, list_profiles, load_profile
 from app.modules.admin.service import (
     list_configs,
     list_prompts,
@@ -58,3 +60,41 @@ async def put_prompt(slug: str, request: UpdatePromptRequest):
     if not ok:
         raise HTTPException(status_code=404, detail="Prompt not found")
     return {"status": "updated"}
+
+
+def _require_admin_token(token: str | None) -> None:
+    if not is_admin_token(token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+@router.get("/profiles")
+async def get_profiles(x_admin_token: str | None = Header(default=None)):
+    _require_admin_token(x_admin_token)
+    return list_profiles()
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, x_admin_token: str | None = Header(default=None)):
+    _require_admin_token(x_admin_token)
+    profile = load_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+
+# The question cache is managed like configs and prompts (no profiling token).
+@router.get("/sql-cache")
+async def get_sql_cache():
+    return question_sql_store.list_entries()
+
+
+@router.delete("/sql-cache")
+async def clear_sql_cache():
+    return {"status": "cleared", "deleted": question_sql_store.clear()}
+
+
+@router.delete("/sql-cache/{entry_id}")
+async def evict_sql_cache_entry(entry_id: int):
+    if not question_sql_store.evict(entry_id):
+        raise HTTPException(status_code=404, detail="Cache entry not found")
+    return {"status": "evicted"}
@@ -32,6 +32,7 @@ DEFAULT_CONFIGS: dict[str, str] = {
     "config:agents:report": "true",
     "config:agents:compare": "true",
     "config:agents:alert": "true",
+    "config:agents:multi": "true",
     "config:app_db:url": str(settings.app_database_url),
 }
 
@@ -74,11 +75,17 @@ DEFAULT_PROMPTS: list[dict[str, str]] = [
             "  alarms against safe thresholds and recommends corrective actions.\n"
             "  Examples: cek alert kolam, ada masalah apa di site X, status kesehatan kolam,\n"
             "  peringatan kualitas air, kolam mana yang perlu perhatian, risk check.\n"
+            '- "multi": Requests that clearly need MORE THAN ONE of the agents above working together,\n'
+            "  e.g. platform data plus internet references, or data from several independent queries\n"
+            "  that must be combined into one answer.\n"
+            "  Examples: bandingkan SR tambak A dan B lalu cari referensi SR ideal di internet,\n"
+            "  cek kualitas air kolam F1 dan cari standar DO dari literatur.\n"
             '- "general": Conceptual or advisory questions that can be answered without querying data.\n'
             "  Examples: explain FCR, SOP discussion, general best practices, definitions.\n\n"
             "Rules:\n"
             '- Return JSON with exactly 3 keys: "agent", "reasoning", "routed_input".\n'
-            '- "agent" must be "database", "vector", "browser", "chart", "timeseries", "report", "compare", "alert", or "general".\n'
+            '- "agent" must be "database", "vector", "browser", "chart", "timeseries", "report", "compare", "alert", "multi", or "general".\n'
+            '- Prefer a single agent; use "multi" only when one agent cannot answer the request alone.\n'
             '- "reasoning" must be short and concrete.\n'
             '- "routed_input" is a clarified version of user intent for the chosen agent.\n'
             '- IMPORTANT: "routed_input" MUST preserve ALL proper nouns exactly as the user wrote them —\n'
@@ -475,6 +482,78 @@ DEFAULT_PROMPTS: list[dict[str, str]] = [
         ),
         "variables": "question,results",
     },
+    {
+        "slug": "dag_plan_system",
+        "agent": "planner",
+        "name": "DAG Plan System",
+        "description": "Splits a multi-agent request into a small dependency graph of agent tasks.",
+        "content": (
+            "You are Agent M's task planner.\n"
+            "Split the user request into a small graph of tasks, each handled by ONE agent.\n\n"
+            "Available agents:\n"
+            '- "database": retrieve platform data. Input is an imperative data instruction\n'
+            '  (e.g., "Ambil SR siklus aktif tambak A").\n'
+            '- "compare": statistical comparison between ponds, sites, cycles, or periods.\n'
+            '- "timeseries": trend, forecasting, or anomaly analysis over time.\n'
+            '- "alert": threshold/risk checks for ponds or sites.\n'
+            '- "browser": look up references or facts on the public internet.\n\n'
+            "Rules:\n"
+            '- Return JSON with keys "reasoning" (string) and "tasks" (list).\n'
+            '- Each task has "id" (short string like "t1"), "agent", "input" (self-contained instruction),\n'
+            '  and "depends_on" (list of task ids whose output this task needs, usually empty).\n'
+            "- Use at most 5 tasks. Independent tasks must NOT depend on each other so they can run in parallel.\n"
+            "- Only add a dependency when a task truly needs another task's output.\n"
+            "- Preserve site names, pond names, and cycle numbers exactly as the user wrote them.\n"
+            "- Do not return markdown or code fences."
+        ),
+        "variables": "",
+    },
+    {
+        "slug": "dag_plan_user",
+        "agent": "planner",
+        "name": "DAG Plan User",
+        "description": "User prompt template for multi-agent task planning.",
+        "content": (
+            "User request:\n"
+            "{message}\n\n"
+            'Return JSON with "reasoning" and "tasks" only.'
+        ),
+        "variables": "message",
+    },
+    {
+        "slug": "dag_synthesis_system",
+        "agent": "planner",
+        "name": "DAG Synthesis System",
+        "description": "Merges the outputs of parallel agent tasks into one answer.",
+        "content": (
+            "You are Agent M, an AI assistant for Maxmar's shrimp-farm management operations.\n"
+            "You will receive a user question and the outputs of several agent tasks\n"
+            "(database results, comparisons, analyses, internet references).\n\n"
+            "Rules:\n"
+            "- Think inside <think>...</think>, then provide final answer outside tags.\n"
+            "- Combine all task outputs into ONE coherent answer to the original question.\n"
+            "- Do not invent data that is not present in the task outputs.\n"
+            "- Clearly separate platform data from internet references and cite reference URLs when available.\n"
+            "- If a task failed or returned no data, say so briefly and continue with what is available.\n"
+            "- Use concise operational language in Indonesian unless user asks another language.\n"
+            "- Do not include meta text such as task ids, agent names, or step labels in the final answer."
+        ),
+        "variables": "",
+    },
+    {
+        "slug": "dag_synthesis_user",
+        "agent": "planner",
+        "name": "DAG Synthesis User",
+        "description": "User prompt template for multi-agent synthesis.",
+        "content": (
+            "Original question:\n"
+            "{question}\n\n"
+            "Task outputs:\n"
+            "{results}\n\n"
+            "Answer as Agent M from Maxmar for shrimp-farm management."
+        ),
+        "variables": "question,results",
+    },
     {
         "slug": "general_system",
         "agent": "planner",
@@ -502,7 +581,19 @@ DEFAULT_PROMPTS: list[dict[str, str]] = [
             "Given a user question, produce a short plan for retrieving the data in ClickHouse.\n\n"
             "Rules:\n"
             '- Return JSON with keys: "steps" (list), "tables" (list), "filters" (list),\n'
-            '  "time_range" (string or null), "risk" (low|medium|high), "notes" (string).\n'
+            '  "time_range" (string or null), "risk" (low|medium|high), "notes" (string),\n'
+            '  "kpi" (object or null), "metric_query" (true|false).\n'
+            '- "kpi": fill ONLY when the question asks for one KPI for all sites, one site or one pond:\n'
+            '  {"metric": ..., "entity": {"site": string or null, "pond": string or null},\n'
+            '   "time_range": {"start": "YYYY-MM-DD", "end": "YYYY-MM-DD"} or {"last_days": int} or null,\n'
+            '   "granularity": "latest"|"day"|"week"|"month"|"cycle"}.\n'
+            "  metric: abw, adg, sr, biomassa, size, fcr, doc, productivity, do, ph, salinitas, suhu,\n"
+            "  nh4, no2, alkalinitas, kecerahan, water_quality (all water parameters).\n"
+            '  granularity "latest" = current value per pond, "cycle" = per cultivation cycle summary.\n'
+            "  Copy site/pond names exactly as written in the question. Otherwise set \"kpi\" to null.\n"
+            '- "metric_query": true ONLY when the question asks for catalog metrics (abw, adg, sr, biomassa,\n'
+            "  fcr, water quality, ...) aggregated per site, pond, cycle or time period; false for lists,\n"
+            "  lookups, raw rows or anything else.\n"
             "- Keep it concise.\n"
             "- Do not include SQL.\n"
             "- Do not include markdown or code fences."
@@ -569,7 +660,7 @@ DEFAULT_PROMPTS: list[dict[str, str]] = [
             "- Output only the instruction text.\n"
             "- Use imperative verbs (e.g., \"Ambil\", \"Tampilkan\").\n"
             "- Request time-ordered data with date columns (tanggal, report_date, start_doc, etc.).\n"
-            "- Request enough rows for meaningful analysis (use higher LIMIT, e.g., 200-500).\n"
+            "- Request the full time range needed; do not ask for a small LIMIT (up to 100000 rows are analyzed).\n"
             "- Include relevant numeric columns for the analysis (ABW, FCR, SR, DO, pH, etc.).\n"
             "- Do not include explanations, markdown, or code fences.\n"
             "- Do not include <think> tags."
@@ -704,7 +795,7 @@ DEFAULT_PROMPTS: list[dict[str, str]] = [
             "- Use imperative verbs (e.g., \"Ambil\", \"Tampilkan\").\n"
             "- Include a grouping column (pond name, site name, cycle number, etc.) so subjects can be compared.\n"
             "- Include relevant KPI columns (ABW, FCR, SR, ADG, biomassa, DO, pH, etc.).\n"
-            "- Request enough rows for all comparison subjects (use LIMIT 200-500).\n"
+            "- Request all rows for the comparison subjects; do not ask for a small LIMIT (up to 100000 rows are analyzed).\n"
             "- If comparing over time, include date columns.\n"
             "- Do not include explanations, markdown, or code fences.\n"
             "- Do not include <think> tags."
@@ -1138,6 +1229,46 @@ DEFAULT_PROMPTS: list[dict[str, str]] = [
         ),
         "variables": "question",
     },
+    {
+        "slug": "semantic_query_system",
+        "agent": "database",
+        "name": "Semantic Query System",
+        "description": "Maps a question onto the semantic metric layer as a JSON query spec.",
+        "content": (
+            "You are Agent M's metric planner for Maxmar's shrimp-farm platform.\n"
+            "Express the request as a query spec over the metric catalog below. The spec is\n"
+            "compiled to ClickHouse SQL; do not write SQL.\n\n"
+            "{catalog}\n\n"
+            "Spec format (JSON):\n"
+            '{{"metrics": [metric names], "dimensions": [dimension names],\n'
+            ' "filters": [{{"field": dimension or selected metric, "op": "=", "value": ...}}],\n'
+            ' "grain": "day"|"week"|"month"|null,\n'
+            ' "time_range": {{"start": "YYYY-MM-DD", "end": "YYYY-MM-DD"}} or {{"last_days": int}} or null,\n'
+            ' "order_by": [{{"field": ..., "direction": "asc"|"desc"}}], "limit": int}}\n\n'
+            "Rules:\n"
+            "- All metrics in one spec must share the same [source].\n"
+            "- Dimension filters use op =, != or in (value is a list for in); metric filters use\n"
+            "  =, !=, >, >=, <, <= with a number.\n"
+            "- Use site and pond names exactly as written in the request.\n"
+            "- Without a time_range the last 30 days are used (cycle metrics are not limited).\n"
+            "- If the request needs anything outside the catalog (other tables, raw rows, text\n"
+            '  columns, joins across sources), return {{"unsupported": true}}.\n'
+            "- Return JSON only. No markdown, no code fences, no explanation."
+        ),
+        "variables": "catalog",
+    },
+    {
+        "slug": "semantic_query_user",
+        "agent": "database",
+        "name": "Semantic Query User",
+        "description": "User prompt template for semantic query specs.",
+        "content": (
+            "Request:\n"
+            "{question}\n\n"
+            "Return the JSON spec only."
+        ),
+        "variables": "question",
+    },
     {
         "slug": "nl_to_sql_retry",
         "agent": "database",
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import StreamingResponse
 
 from app.modules.chatbot.schemas import (
@@ -23,6 +23,8 @@ from app.modules.chatbot.service import (
     save_messages,
     update_conversation_title,
 )
+from app.core.cancellation import CancellationToken
+from app.core.streaming import disconnect_aware
 
 router = APIRouter(tags=["Chatbot"], prefix="/v1/chatbot")
 
@@ -33,9 +35,10 @@ async def chat_endpoint(request: ChatRequest):
 
 
 @router.post("/chat/stream")
-async def chat_stream_endpoint(request: ChatRequest):
+async def chat_stream_endpoint(request: ChatRequest, http_request: Request):
+    token = CancellationToken()
     return StreamingResponse(
-        chat_stream(request),
+        disconnect_aware(http_request, chat_stream(request, cancel_token=token), token),
         media_type="text/event-stream",
     )
 
@@ -13,6 +13,9 @@ class ChatRequest(BaseModel):
     history: list[HistoryMessage] = Field(default_factory=list)
     user_id: Optional[str] = None
     conversation_id: Optional[str] = None
+    timeout_seconds: Optional[float] = Field(default=None, gt=0)
+    # Emit "timing" SSE events with per-step durations and token counts.
+    timings: bool = False
 
 
 class ChatResponse(BaseModel):
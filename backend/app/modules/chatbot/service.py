@@ -4,14 +4,36 @@ from collections.abc import Generator
 from app.agents.memory import create_memory_agent
 from app.agents.memory.store import get_memory_summary
 from app.agents.planner import create_planner_agent
+from app.core.cancellation import CancellationToken, OperationCancelled
+from app.core.config import settings
+from app.core.deadline import Deadline, DeadlineExceeded
+from app.core.timing import Stopwatch, timing_event
+from app.core.tracing import current_request_id
 from app.modules.chatbot.repository import ChatRepository
 from app.modules.chatbot.schemas import ChatRequest, ChatResponse
 
 
+DEADLINE_EXCEEDED_MESSAGE = (
+    "Maaf, permintaan ini melebihi batas waktu pemrosesan. "
+    "Coba persempit pertanyaan (misalnya site, kolam, atau periode tertentu)."
+)
+
+
 def _build_history(request: ChatRequest) -> list[dict]:
     return [{"role": m.role, "content": m.content} for m in request.history]
 
 
+def _sse(event: dict, request_id: str | None = None) -> str:
+    if request_id:
+        event = {**event, "request_id": request_id}
+    return f"data: {json.dumps(event)}\n\n"
+
+
+def _build_deadline(request: ChatRequest) -> Deadline:
+    budget = request.timeout_seconds or settings.CHAT_REQUEST_TIMEOUT
+    return Deadline.after(min(budget, settings.CHAT_REQUEST_TIMEOUT_MAX))
+
+
 def chat(request: ChatRequest) -> ChatResponse:
     planner = create_planner_agent()
     history = _build_history(request)
@@ -27,8 +49,16 @@ def chat(request: ChatRequest) -> ChatResponse:
         "user_id": request.user_id,
         "conversation_id": request.conversation_id,
         "memory_summary": memory_summary,
+        "deadline": _build_deadline(request),
     }
-    result = planner.execute(request.message, history=history, context=context)
+    try:
+        result = planner.execute(request.message, history=history, context=context)
+    except DeadlineExceeded as exc:
+        return ChatResponse(
+            status="timeout",
+            response=DEADLINE_EXCEEDED_MESSAGE,
+            usage={"deadline_exceeded": True, "step": exc.step},
+        )
 
     if request.user_id:
         try:
@@ -55,7 +85,10 @@ def chat(request: ChatRequest) -> ChatResponse:
     )
 
 
-def chat_stream(request: ChatRequest) -> Generator[str, None, None]:
+def chat_stream(
+    request: ChatRequest,
+    cancel_token: CancellationToken | None = None,
+) -> Generator[str, None, None]:
     planner = create_planner_agent()
     history = _build_history(request)
     memory_summary = None
@@ -70,15 +103,32 @@ def chat_stream(request: ChatRequest) -> Generator[str, None, None]:
         "user_id": request.user_id,
         "conversation_id": request.conversation_id,
         "memory_summary": memory_summary,
+        "deadline": _build_deadline(request),
+        "cancel_token": cancel_token,
+        "timings": request.timings,
     }
     full_content = ""
-
-    for event in planner.execute_stream(request.message, history=history, context=context):
-        if event.get("type") == "content":
-            full_content += event.get("content", "")
-        yield f"data: {json.dumps(event)}\n\n"
-
-    yield f"data: {json.dumps({'type': 'done'})}\n\n"
+    request_id = current_request_id()
+    stopwatch = Stopwatch()
+
+    try:
+        for event in planner.execute_stream(request.message, history=history, context=context):
+            if event.get("type") == "content":
+                full_content += event.get("content", "")
+            yield _sse(event, request_id)
+    except DeadlineExceeded:
+        yield _sse({"type": "content", "content": DEADLINE_EXCEEDED_MESSAGE}, request_id)
+    except OperationCancelled:
+        # Client is gone: nobody reads the rest of the stream, and a partial
+        # answer must not be summarized into memory.
+        return
+
+    if request.timings:
+        yield _sse(timing_event("total", stopwatch.elapsed_ms()), request_id)
+    yield _sse({"type": "done"}, request_id)
+
+    if cancel_token is not None and cancel_token.cancelled:
+        return
 
     if request.user_id and full_content:
         try:
@@ -0,0 +1,57 @@
+import time
+
+from app.agents.database.agent import DatabaseAgent
+from app.agents.database.candidates import SqlCandidate, candidate_temperatures, race_candidates
+from app.agents.database.schemas import QueryResult
+from app.agents.database.sql_guard import GuardedQuery
+from app.core.config import settings
+
+
+def test_temperatures_cycle(monkeypatch):
+    monkeypatch.setattr(settings, "SQL_CANDIDATE_TEMPERATURES", [0.0, 0.5])
+
+    assert candidate_temperatures(3) == [0.0, 0.5, 0.0]
+
+
+def test_candidates_arrive_in_completion_order_and_failures_are_kept():
+    delays = {0: 0.2, 1: 0.0, 2: 0.1}
+
+    def build(index, temperature):
+        time.sleep(delays[index])
+        if index == 2:
+            raise RuntimeError("provider timeout")
+        return SqlCandidate(index, temperature, sql="SELECT 1", query=GuardedQuery("SELECT 1"))
+
+    candidates = list(race_candidates(3, build))
+
+    assert [candidate.index for candidate in candidates] == [1, 2, 0]
+    assert [candidate.valid for candidate in candidates] == [True, False, True]
+    assert candidates[1].error == "provider timeout"
+
+
+def test_failed_candidate_is_repaired_before_it_counts_as_failed():
+    agent = DatabaseAgent(llm=None)
+    agent._build_candidate = lambda messages, context, index, temperature: SqlCandidate(
+        index, temperature, sql="SELECT pondId FROM ponds", query=GuardedQuery("SELECT pondId FROM ponds")
+    )
+
+    def execute(query, context=None):
+        raise RuntimeError("Code: 47. Unknown identifier pondId")
+
+    def repair(query, error, context=None):
+        yield {"type": "thinking", "content": "repair\n"}
+        fixed = GuardedQuery("SELECT pond_id FROM ponds")
+        return fixed, QueryResult(columns=["pond_id"], rows=[[1]], row_count=1, sql=fixed.sql), ["pondId -> pond_id"]
+
+    agent._execute_sql = execute
+    agent._repair_stream = repair
+    stream = agent._candidates_stream([], None, 1)
+    try:
+        while True:
+            next(stream)
+    except StopIteration as stop:
+        result, failed = stop.value
+
+    assert failed == []
+    assert result.metadata["sql"] == "SELECT pond_id FROM ponds"
+    assert result.metadata["repairs"] == ["pondId -> pond_id"]
@@ -0,0 +1,77 @@
+import datetime
+from contextlib import contextmanager
+
+from app.agents.database.column_stats import ColumnStatsStore, collect_table_stats
+from app.agents.database.introspect import ColumnInfo, TableInfo
+
+TABLE = TableInfo(
+    "cultivation",
+    "cultivation",
+    [
+        ColumnInfo("id", "UInt64"),
+        ColumnInfo("pond_id", "UInt64"),
+        ColumnInfo("status", "Int32"),
+        ColumnInfo("periode_siklus", "Nullable(LowCardinality(String))"),
+        ColumnInfo("start_date", "Nullable(Date)"),
+        ColumnInfo("description", "Nullable(String)"),
+        ColumnInfo("deleted_at", "Nullable(DateTime64(3))"),
+        ColumnInfo("deleted_by", "UInt64"),
+    ],
+)
+
+
+class _FakeEngine:
+    def __init__(self, row):
+        self.row = row
+        self.statements = []
+
+    @contextmanager
+    def connect(self):
+        engine = self
+
+        class _Result:
+            def mappings(self):
+                return self
+
+            def one(self):
+                return engine.row
+
+        class _Conn:
+            def execute(self, statement):
+                engine.statements.append(str(statement))
+                return _Result()
+
+        yield _Conn()
+
+
+def test_collects_values_ranges_and_renders_snippet():
+    engine = _FakeEngine(
+        {
+            "row_count": 120,
+            "c0_distinct": 3, "c0_values": [2, 1, 3], "c0_min": 1, "c0_max": 3,
+            "c1_distinct": 2, "c1_values": ["Siklus 2", "Siklus 1"],
+            "c2_min": datetime.date(2024, 1, 5), "c2_max": datetime.date(2025, 6, 30),
+        }
+    )
+
+    stats = collect_table_stats(engine, TABLE, max_distinct=20)
+
+    statement = engine.statements[0]
+    assert "pond_id" not in statement and "description" not in statement
+    assert "WHERE `deleted_by` = 0" in statement
+    assert "deleted_at" not in statement
+    assert stats.render() == (
+        "cultivation.cultivation: ~120 rows; status: 1|2|3; "
+        "periode_siklus: 'Siklus 1'|'Siklus 2'; start_date: 2024-01-05 .. 2025-06-30"
+    )
+
+
+def test_snippet_is_empty_until_collected():
+    store = ColumnStatsStore(refresh_seconds=3600, max_distinct=20)
+    assert store.snippet([TABLE]) == ""
+
+    engine = _FakeEngine({"row_count": 5, "c0_distinct": 50, "c0_values": [], "c0_min": 1, "c0_max": 99,
+                          "c1_distinct": 99, "c1_values": [], "c2_min": None, "c2_max": None})
+    store.refresh(engine, [TABLE])
+
+    assert store.snippet([TABLE]).endswith("cultivation.cultivation: ~5 rows; status: 1 .. 99")
@@ -0,0 +1,51 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pandas as pd
+
+from app.agents.database.columnar import columnar_context, columnar_requested, fetch_columnar
+
+
+class _FakeClient:
+    def __init__(self, frame):
+        self.frame = frame
+        self.settings = None
+
+    def query_df(self, sql, settings=None):
+        self.settings = settings
+        return self.frame
+
+
+class _FakeEngine:
+    def __init__(self, client):
+        self.client = client
+
+    @contextmanager
+    def connect(self):
+        yield SimpleNamespace(connection=SimpleNamespace(dbapi_connection=SimpleNamespace(client=self.client)))
+
+
+def test_fetch_columnar_keeps_frame_and_caps_rows():
+    frame = pd.DataFrame(
+        {
+            "report_date": pd.date_range("2024-01-01", periods=120, freq="D"),
+            "do": [5.5] * 119 + [float("nan")],
+        }
+    )
+    client = _FakeClient(frame)
+
+    result = fetch_columnar(_FakeEngine(client), "SELECT report_date, do FROM t", {"max_execution_time": 5}, max_rows=100)
+
+    assert client.settings == {"max_result_rows": 100, "result_overflow_mode": "break", "max_execution_time": 5}
+    assert result.row_count == 100 and result.truncated
+    assert len(result.rows) == 50
+    assert result.to_dataframe() is result.frame
+    assert result.types[1] == "float64"
+    assert str(result.frame["report_date"].dtype).startswith("datetime64")
+
+
+def test_columnar_context_does_not_mutate_caller_context():
+    context = {"user_id": "u1"}
+
+    assert columnar_requested(columnar_context(context))
+    assert not columnar_requested(context)
@@ -0,0 +1,87 @@
+import time
+
+from app.agents.database.entity_catalog import (
+    CatalogSnapshot,
+    Cultivation,
+    EntityCatalog,
+    Pond,
+    Site,
+    edit_ratio,
+)
+
+CATALOG = CatalogSnapshot(
+    sites=[Site(1, "ARONA TELUK TOMINI"), Site(2, "SUMA MARINA"), Site(3, "TELUK BONE")],
+    ponds=[Pond(10, "F1", 1), Pond(11, "F1", 2), Pond(12, "A 3", 2)],
+    cultivations=[Cultivation(100, 11, 4)],
+)
+
+
+def _site_names(question):
+    return [site.name for site in CATALOG.resolve(question).sites]
+
+
+def test_edit_ratio():
+    assert edit_ratio("tomini", "tomini") == 1.0
+    assert edit_ratio("tomni", "tomini") > 0.8
+    assert edit_ratio("suma", "bone") < 0.5
+
+
+def test_resolves_partial_and_misspelled_site_names():
+    assert _site_names("ABW di teluk tomni minggu ini") == ["ARONA TELUK TOMINI"]
+    assert _site_names("FCR suma") == ["SUMA MARINA"]
+    assert set(_site_names("kolam di teluk")) == {"ARONA TELUK TOMINI", "TELUK BONE"}
+    assert _site_names("harga pakan di tambak") == []
+
+
+def test_exact_mention_drops_weaker_matches():
+    assert _site_names("SR TELUK BONE") == ["TELUK BONE"]
+
+
+def test_ponds_match_exactly_and_prefer_matched_sites():
+    matches = CATALOG.resolve("DO kolam f1 di suma marina")
+
+    assert [pond.id for pond in matches.ponds] == [11]
+    assert matches.cultivations[11].periode_siklus == 4
+    assert "siklus aktif periode 4 (cultivation_id 100)" in matches.render()
+    assert [pond.id for pond in CATALOG.resolve("kolam F1").ponds] == [10, 11]
+    assert [pond.id for pond in CATALOG.resolve("kolam a3").ponds] == [12]
+
+
+def test_render_is_empty_without_mentions():
+    assert CATALOG.resolve("harga udang hari ini").render() == ""
+
+
+def test_catalog_loads_once_and_serves_cached_snapshot(monkeypatch):
+    loads = []
+
+    def fake_load(engine):
+        loads.append(engine)
+        return CATALOG
+
+    monkeypatch.setattr("app.agents.database.entity_catalog.load_catalog", fake_load)
+    catalog = EntityCatalog(refresh_seconds=3600)
+
+    assert catalog.snapshot("engine") is CATALOG
+    assert catalog.snapshot("engine") is CATALOG
+    assert loads == ["engine"]
+
+
+def test_separate_mentions_of_two_sites_are_both_kept():
+    assert set(_site_names("bandingkan suma dengan teluk bone")) == {"SUMA MARINA", "TELUK BONE"}
+
+
+def test_site_matching_stays_fast_with_many_sites():
+    syllables = ["ka", "ma", "ra", "to", "su", "bi", "lu", "ne", "pa", "wi", "de", "go"]
+    names = {
+        f"{syllables[i % 12]}{syllables[i // 12 % 12]}{syllables[i // 7 % 12]} "
+        f"{syllables[i // 3 % 12]}{syllables[i % 5]}{syllables[i // 11 % 12]} {i}"
+        for i in range(400)
+    }
+    sites = [Site(index, name.upper()) for index, name in enumerate(sorted(names))]
+    catalog = CatalogSnapshot(sites=[*sites, Site(999, "ARONA TELUK TOMINI")])
+
+    started = time.perf_counter()
+    for _ in range(5):
+        assert [site.name for site, _ in catalog.match_sites("ABW di teluk tomni minggu ini")] == ["ARONA TELUK TOMINI"]
+        assert catalog.match_sites(f"FCR {sites[7].name.lower()} bulan lalu")[0][0] == sites[7]
+    assert time.perf_counter() - started < 0.5
@@ -0,0 +1,66 @@
+from app.agents.database import introspect
+from app.agents.database.introspect import SchemaCache, TableInfo
+
+
+def test_schema_reloads_only_when_fingerprint_changes(monkeypatch):
+    fingerprint = {"value": "1:a"}
+    loads = []
+
+    monkeypatch.setattr(introspect, "get_schema_fingerprint", lambda engine: fingerprint["value"])
+    monkeypatch.setattr(
+        introspect,
+        "get_schema_tables",
+        lambda engine: loads.append(fingerprint["value"])
+        or [TableInfo("cultivation", f"t_{fingerprint['value'][0]}")],
+    )
+
+    cache = SchemaCache(min_refresh_seconds=0)
+    assert cache.get(None) == "TABLE cultivation.t_1:\n"
+    assert cache.get(None) == "TABLE cultivation.t_1:\n"
+    assert loads == ["1:a"]
+
+    fingerprint["value"] = "2:b"
+    assert cache.get(None) == "TABLE cultivation.t_2:\n"
+    assert loads == ["1:a", "2:b"]
+
+
+def test_schema_skips_fingerprint_within_refresh_interval(monkeypatch):
+    checks = []
+    monkeypatch.setattr(introspect, "get_schema_fingerprint", lambda engine: checks.append(1) or "x")
+    monkeypatch.setattr(introspect, "get_schema_tables", lambda engine: [])
+
+    cache = SchemaCache(min_refresh_seconds=3600)
+    cache.get(None)
+    cache.get(None)
+
+    assert len(checks) == 1
+
+
+def test_schema_tables_hide_cdc_columns_but_keep_watermark():
+    rows = [
+        ("cultivation", "ponds", "id", "UInt64", "", "ReplacingMergeTree"),
+        ("cultivation", "ponds", "_kafka_timestamp", "DateTime64(3)", "", "ReplacingMergeTree"),
+        ("cultivation", "ponds", "_ingestion_time", "DateTime", "", "ReplacingMergeTree"),
+        ("cultivation", "sites", "id", "UInt64", "", "View"),
+    ]
+
+    class _Engine:
+        def connect(self):
+            from contextlib import nullcontext
+
+            class _Conn:
+                def execute(self, query):
+                    class _Result:
+                        def fetchall(self):
+                            return rows
+
+                    return _Result()
+
+            return nullcontext(_Conn())
+
+    ponds, sites = introspect.get_schema_tables(_Engine())
+
+    assert ponds.column_names() == ["id"]
+    assert ponds.watermark_column == "_ingestion_time"
+    assert sites.watermark_column == ""
+    assert (ponds.engine, sites.engine) == ("ReplacingMergeTree", "View")
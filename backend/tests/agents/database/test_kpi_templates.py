@@ -0,0 +1,60 @@
+from app.agents.database.introspect import ColumnInfo, TableInfo
+from app.agents.database.kpi_templates import KPI_TEMPLATES, KpiIntent, render_kpi_sql
+
+
+def _table(full_name, *columns):
+    database, name = full_name.split(".")
+    return TableInfo(database, name, [ColumnInfo(column, "String") for column in columns])
+
+
+SHRIMP = _table(
+    "cultivation.cultivation_shrimp",
+    "id", "cultivation_id", "tanggal", "avg_body_weight", "avg_daily_growth", "survival_rate",
+)
+
+
+def test_intent_rejects_unknown_metric_and_granularity():
+    assert KpiIntent.from_payload(None) is None
+    assert KpiIntent.from_payload({"metric": "omzet"}) is None
+    assert KpiIntent.from_payload({"metric": "doc", "granularity": "week"}) is None
+    assert KpiIntent.from_payload({"metric": "abw", "time_range": {"start": "2024-02-01", "end": "2024-01-01"}}) is None
+
+
+def test_series_filters_ids_and_raw_date_column():
+    intent = KpiIntent.from_payload({
+        "metric": "ABW",
+        "entity": {"site": "SUMA MARINA", "pond": "F'1"},
+        "time_range": {"start": "2024-01-01", "end": "2024-01-31"},
+        "granularity": "week",
+    })
+
+    sql = render_kpi_sql(intent, [SHRIMP])
+
+    assert "FROM cultivation.cultivation_shrimp AS t FINAL" in sql
+    assert "t.cultivation_id IN (SELECT id FROM cultivation.cultivation FINAL" in sql
+    assert "name = 'F\\'1'" in sql and "name = 'SUMA MARINA'" in sql
+    assert "t.tanggal >= toDate('2024-01-01') AND t.tanggal < toDate('2024-01-31') + 1" in sql
+    assert "toStartOfWeek(t.tanggal, 1) AS periode" in sql
+    assert "status = 1" not in sql
+
+
+def test_latest_reads_running_cycles_within_default_window():
+    sql = render_kpi_sql(KpiIntent.from_payload({"metric": "sr"}), [SHRIMP])
+
+    assert "argMax(t.survival_rate, t.tanggal) AS sr" in sql
+    assert "WHERE deleted_by = 0 AND status = 1)" in sql
+    assert "t.tanggal >= today() - 30" in sql
+
+
+def test_template_needs_its_columns_in_schema():
+    intent = KpiIntent.from_payload({"metric": "size"})
+
+    assert render_kpi_sql(intent, [SHRIMP]) is None
+    assert render_kpi_sql(intent) is not None
+
+
+def test_every_template_renders_each_granularity():
+    for template in KPI_TEMPLATES.values():
+        for granularity in template.granularities:
+            sql = render_kpi_sql(KpiIntent(metric=template.metric, granularity=granularity, last_days=7))
+            assert sql.startswith("SELECT ") and sql.endswith("LIMIT 1000")
@@ -0,0 +1,31 @@
+import json
+
+from app.agents.database.columnar import columnar_context
+from app.agents.database.limits import QueryLimits, limit_exceeded, limits_for, query_profile_context
+from app.core.config import settings
+
+
+def test_settings_are_read_only_and_break_on_overflow():
+    query_settings = QueryLimits(max_bytes_to_read=0).settings()
+
+    assert query_settings["readonly"] == 1
+    assert query_settings["result_overflow_mode"] == "break"
+    assert "max_bytes_to_read" not in query_settings
+
+
+def test_limits_per_agent_profile(monkeypatch):
+    monkeypatch.setattr(settings, "DB_QUERY_LIMITS", {"report": {"max_execution_time": 90, "bogus": 1}})
+
+    assert limits_for(query_profile_context(None, "report")).max_execution_time == 90
+    assert limits_for(None).max_execution_time == settings.DB_QUERY_MAX_EXECUTION_TIME
+    assert limits_for(columnar_context(None)).max_result_rows == settings.COLUMNAR_MAX_ROWS
+
+
+def test_limit_errors_become_structured():
+    limits = QueryLimits(max_memory_usage=1000)
+    error = limit_exceeded(Exception("Code: 241. DB::Exception: Memory limit (for query) exceeded"), limits)
+
+    payload = json.loads(error.to_prompt())
+    assert payload["error"] == "query_limit_exceeded"
+    assert payload["limit"] == "max_memory_usage" and payload["value"] == 1000
+    assert limit_exceeded(Exception("Code: 47. DB::Exception: Unknown identifier"), limits) is None
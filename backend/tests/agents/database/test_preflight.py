@@ -0,0 +1,60 @@
+from contextlib import nullcontext
+
+import pytest
+
+from app.agents.database.limits import QueryLimitExceeded, QueryLimits
+from app.agents.database.preflight import PreflightError, check_estimate, explain_estimate
+
+
+class _Engine:
+    def __init__(self, rows=None, error=None):
+        self.rows = rows or []
+        self.error = error
+        self.statements = []
+
+    def connect(self):
+        engine = self
+
+        class _Conn:
+            def execute(self, statement):
+                engine.statements.append(str(statement))
+                if engine.error is not None:
+                    raise engine.error
+
+                class _Result:
+                    def keys(self):
+                        return ["database", "table", "parts", "rows", "marks"]
+
+                    def fetchall(self):
+                        return engine.rows
+
+                return _Result()
+
+        return nullcontext(_Conn())
+
+
+def test_estimate_sums_tables():
+    engine = _Engine(rows=[("cultivation", "ponds", 2, 900, 3), ("cultivation", "sites", 1, 40, 1)])
+
+    estimate = explain_estimate(engine, "SELECT 1", timeout=5)
+
+    assert engine.statements == ["EXPLAIN ESTIMATE SELECT 1"]
+    assert (estimate.parts, estimate.rows, estimate.marks) == (3, 940, 4)
+    assert estimate.tables[0] == {"table": "cultivation.ponds", "parts": 2, "rows": 900, "marks": 3}
+
+
+def test_query_errors_are_reported_and_others_propagate():
+    with pytest.raises(PreflightError, match="UNKNOWN_IDENTIFIER"):
+        explain_estimate(_Engine(error=Exception("Code: 47. DB::Exception: Unknown identifier: abw")), "SELECT abw", 5)
+    with pytest.raises(ConnectionError):
+        explain_estimate(_Engine(error=ConnectionError("refused")), "SELECT 1", 5)
+
+
+def test_estimate_over_cap_is_a_structured_limit_error():
+    estimate = explain_estimate(_Engine(rows=[("cultivation", "feed", 40, 5_000_000, 620)]), "SELECT 1", 5)
+
+    check_estimate(estimate, QueryLimits(max_estimated_rows=10_000_000))
+    with pytest.raises(QueryLimitExceeded) as raised:
+        check_estimate(estimate, QueryLimits(max_estimated_marks=500))
+    assert raised.value.to_dict()["limit"] == "max_estimated_marks"
+    assert raised.value.to_dict()["estimate"]["rows"] == 5_000_000
@@ -0,0 +1,57 @@
+from sqlmodel import SQLModel, create_engine
+
+from app.agents.database.models import QuestionSqlCacheEntry
+from app.agents.database.question_cache import QuestionSqlStore, canonicalize_question, question_key
+from app.agents.database.sql_templates import parse_question
+
+SITES = ["ARONA TELUK TOMINI", "SUMA MARINA", "TELUK BAHARI"]
+
+
+def _store(max_entries=10):
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine, tables=[QuestionSqlCacheEntry.__table__])
+    return QuestionSqlStore(engine=engine, max_entries=max_entries)
+
+
+def test_canonicalize_question_resolves_partial_entity_names():
+    assert canonicalize_question("DO terbaru di Teluk Tomini?", SITES) == "do terbaru di <arona teluk tomini>"
+    assert canonicalize_question("do terbaru di suma", SITES) == "do terbaru di <suma marina>"
+    # "teluk" alone is ambiguous and stays a plain word.
+    assert canonicalize_question("SR teluk", SITES) == "sr teluk"
+    assert question_key("DO terbaru  kolam A1, Suma Marina", SITES) == question_key("do terbaru kolam a1 suma", SITES)
+
+
+def test_lookup_hits_until_schema_changes():
+    store = _store()
+    parsed = parse_question("SR siklus aktif")
+    store.remember(parsed, "SR siklus aktif", "SELECT 1", "fp-1")
+
+    assert store.lookup(parsed, "fp-1") == "SELECT 1"
+    assert store.list_entries()[0]["hit_count"] == 1
+    assert store.lookup(parsed, "fp-2") is None
+    assert store.list_entries() == []
+
+
+def test_max_entries_and_eviction():
+    store = _store(max_entries=2)
+    for word in ("satu", "dua", "tiga"):
+        store.remember(parse_question(f"q {word}"), f"q {word}", "SELECT 1", "fp")
+
+    entries = store.list_entries()
+    assert [entry["question"] for entry in entries] == ["q tiga", "q dua"]
+    assert store.evict(entries[0]["id"])
+    assert not store.evict(entries[0]["id"])
+    assert store.clear() == 1
+
+
+def test_template_fills_new_entity_and_date_locally():
+    store = _store()
+    sql = (
+        "SELECT avg(do) FROM cultivation.water_physic w JOIN cultivation.sites s ON s.id = w.site_id "
+        "WHERE s.name = 'SUMA MARINA' AND w.report_date >= '2024-03-01' LIMIT 10"
+    )
+    store.remember(parse_question("DO di Suma sejak 1 Maret 2024", SITES), "q", sql, "fp")
+
+    filled = store.lookup(parse_question("DO di teluk bahari sejak 2024-04-15", SITES), "fp")
+
+    assert filled == sql.replace("SUMA MARINA", "TELUK BAHARI").replace("2024-03-01", "2024-04-15")
@@ -0,0 +1,124 @@
+from contextlib import contextmanager
+
+import pandas as pd
+
+from app.agents.database.agent import DatabaseAgent
+from app.agents.database.introspect import ColumnInfo, TableInfo
+from app.agents.database.limits import query_profile_context
+from app.agents.database.result_cache import ResultCache, normalize_sql, referenced_tables
+from app.agents.database.schemas import QueryResult
+from app.core.config import settings
+
+PONDS = TableInfo("cultivation", "ponds", [ColumnInfo("name", "String")], watermark_column="_ingestion_time")
+SITES = TableInfo("cultivation", "sites", [ColumnInfo("name", "String")])
+
+
+class _WatermarkEngine:
+    def __init__(self):
+        self.value = "2024-01-01 00:00:00"
+        self.queries = 0
+
+    @contextmanager
+    def connect(self):
+        engine = self
+
+        class _Conn:
+            def execute(self, query):
+                engine.queries += 1
+
+                class _Result:
+                    def one(self):
+                        return (engine.value,)
+
+                return _Result()
+
+        yield _Conn()
+
+
+def _runner(calls):
+    def run():
+        calls.append(1)
+        return QueryResult(columns=["n"], rows=[[len(calls)]], row_count=1, sql="")
+
+    return run
+
+
+def test_normalize_sql_ignores_formatting_but_keeps_values():
+    a = normalize_sql("select name\n  from cultivation.ponds -- list\nwhere area = 1.50 limit 050;")
+    b = normalize_sql("SELECT name FROM cultivation.ponds WHERE area = 1.5 LIMIT 50")
+
+    assert a == b
+    assert normalize_sql("SELECT 1 WHERE s = 'A'") != normalize_sql("SELECT 1 WHERE s = 'a'")
+
+
+def test_referenced_tables_resolves_qualified_and_bare_names():
+    sql = "SELECT * FROM `cultivation`.`ponds` p JOIN sites s ON s.id = p.site_id"
+
+    assert {t.full_name for t in referenced_tables(sql, [PONDS, SITES])} == {
+        "cultivation.ponds",
+        "cultivation.sites",
+    }
+
+
+def test_hit_until_watermark_advances():
+    engine = _WatermarkEngine()
+    cache = ResultCache(max_entries=10, max_rows=100, default_ttl=300, watermark_check_seconds=0)
+    calls = []
+
+    first = cache.execute(engine, "SELECT name FROM cultivation.ponds", [PONDS], _runner(calls))
+    second = cache.execute(engine, "select name  from cultivation.ponds;", [PONDS], _runner(calls))
+    assert len(calls) == 1
+    assert second.rows == first.rows
+    assert second.sql == "select name  from cultivation.ponds;"
+
+    engine.value = "2024-01-01 00:05:00"
+    cache.execute(engine, "SELECT name FROM cultivation.ponds", [PONDS], _runner(calls))
+    assert len(calls) == 2
+
+
+def test_table_ttl_and_lru_bound():
+    engine = _WatermarkEngine()
+    cache = ResultCache(
+        max_entries=1,
+        max_rows=100,
+        default_ttl=300,
+        table_ttls={"cultivation.sites": 0},
+    )
+    calls = []
+
+    cache.execute(engine, "SELECT name FROM sites", [SITES], _runner(calls))
+    cache.execute(engine, "SELECT name FROM sites", [SITES], _runner(calls))
+    assert len(calls) == 2  # zero TTL never hits
+    assert engine.queries == 0  # no watermark column, TTL only
+
+    cache.execute(engine, "SELECT 1", [], _runner(calls))
+    cache.execute(engine, "SELECT 2", [], _runner(calls))
+    cache.execute(engine, "SELECT 1", [], _runner(calls))
+    assert len(calls) == 5
+    assert len(cache) == 1
+
+
+def test_cached_frames_are_copied():
+    cache = ResultCache(max_entries=10, max_rows=100, default_ttl=300)
+
+    def run():
+        frame = pd.DataFrame({"n": [1, 2]})
+        return QueryResult(columns=["n"], rows=[[1], [2]], row_count=2, sql="", frame=frame)
+
+    # Sandbox code may mutate the frame it gets, on a miss as well as a hit.
+    miss = cache.execute(None, "SELECT n FROM t", [], run, variant="columnar")
+    miss.to_dataframe()["n"] = -1
+    hit = cache.execute(None, "SELECT n FROM t", [], run, variant="columnar")
+    assert hit.to_dataframe()["n"].tolist() == [1, 2]
+
+    hit.to_dataframe()["n"] = 0
+    again = cache.execute(None, "SELECT n FROM t", [], run, variant="columnar")
+    assert again.to_dataframe()["n"].tolist() == [1, 2]
+
+
+def test_cache_variant_separates_row_caps(monkeypatch):
+    monkeypatch.setattr(settings, "DB_QUERY_LIMITS", {"report": {"max_result_rows": 50}})
+
+    report = DatabaseAgent._cache_variant(query_profile_context(None, "report"))
+    assert report == "rows:50"
+    assert DatabaseAgent._cache_variant(None) != report
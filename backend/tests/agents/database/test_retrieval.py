@@ -0,0 +1,41 @@
+from app.agents.database.introspect import ColumnInfo, TableInfo
+from app.agents.database.retrieval import TableRetriever, is_schema_miss, render_relevant_schema
+
+
+def _table(name: str, *columns: str) -> TableInfo:
+    return TableInfo("cultivation", name, [ColumnInfo(column, "String") for column in columns])
+
+
+TABLES = [
+    _table("sites", "id", "name"),
+    _table("ponds", "id", "site_id", "name", "size"),
+    _table("cultivation", "id", "pond_id", "periode_siklus", "status", "abw", "sr"),
+    _table("cultivation_water_chemical", "id", "cultivation_id", "tanggal", "ph", "do", "salinitas"),
+    _table("cultivation_feed", "id", "cultivation_id", "tanggal", "pemberian_pakan_kumulative"),
+    _table("energy", "id", "site_id", "konsumsi_energi", "date"),
+    _table("bmkg", "id", "suhu", "kelembaban"),
+]
+
+
+def test_selects_matching_tables_with_join_parents():
+    retriever = TableRetriever(TABLES)
+
+    tables, join_keys = retriever.select("ph dan salinitas air kolam A", top_k=1)
+
+    names = [table.name for table in tables]
+    assert names == ["sites", "ponds", "cultivation", "cultivation_water_chemical"]
+    rendered = render_relevant_schema(tables, join_keys)
+    assert "cultivation.cultivation_water_chemical.cultivation_id = cultivation.cultivation.id" in rendered
+    assert "cultivation.ponds.site_id = cultivation.sites.id" in rendered
+    assert "energy" not in rendered
+
+
+def test_indonesian_terms_are_expanded_and_schema_misses_detected():
+    retriever = TableRetriever(TABLES)
+
+    top = retriever.score("total pakan siklus terakhir")[0][1]
+
+    assert top.name == "cultivation_feed"
+    assert is_schema_miss("Code: 47. DB::Exception: Missing columns: 'ph_value'")
+    assert is_schema_miss("Code: 60. DB::Exception: Table cultivation.foo does not exist. (UNKNOWN_TABLE)")
+    assert not is_schema_miss("Code: 241. DB::Exception: Memory limit exceeded")
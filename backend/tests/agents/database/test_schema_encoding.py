@@ -0,0 +1,51 @@
+import re
+
+from app.agents.database.introspect import ColumnInfo, TableInfo, render_schema, schema_encoding_stats
+from app.agents.database.schema_encoding import _TYPE_REWRITES, TYPE_LEGEND, abbreviate_type, compact_comment
+
+HOUSEKEEPING = [
+    ColumnInfo("id", "UInt64"),
+    ColumnInfo("created_at", "DateTime64(3)"),
+    ColumnInfo("updated_at", "Nullable(DateTime64(3))"),
+    ColumnInfo("deleted_at", "Nullable(DateTime64(3))", "soft delete"),
+]
+
+
+def _table(name: str, *columns: ColumnInfo, housekeeping=HOUSEKEEPING) -> TableInfo:
+    return TableInfo("cultivation", name, [*housekeeping, *columns])
+
+
+def test_compact_encoding_factors_common_columns_and_is_smaller():
+    tables = [
+        _table("sites", ColumnInfo("name", "Nullable(LowCardinality(String))")),
+        _table("ponds", ColumnInfo("site_id", "UInt64"), ColumnInfo("size", "Nullable(Float64)")),
+        _table(
+            "cultivation",
+            ColumnInfo("pond_id", "UInt64"),
+            ColumnInfo("status", "Int32", "Status: 1=aktif, 2=selesai, 3=batal"),
+        ),
+        _table("bmkg", ColumnInfo("suhu", "Float64"), housekeeping=HOUSEKEEPING[:2]),
+    ]
+
+    compact = render_schema(tables, "compact")
+
+    assert "COMMON COLUMNS (in tables marked [+common]): id U64, created_at DT64(3), " in compact
+    assert "TABLE cultivation.sites [+common]:\n  name LC(Str)?" in compact
+    assert "TABLE cultivation.bmkg [+common -updated_at -deleted_at]:\n  suhu F64" in compact
+    assert "status I32 -- Status: 1=aktif|2=selesai|3=batal" in compact
+    stats = schema_encoding_stats(tables)
+    assert stats["compact"] < stats["full"]
+
+
+def test_type_and_comment_abbreviations():
+    assert abbreviate_type("Nullable(Decimal(10, 2))") == "Dec(10,2)?"
+    assert abbreviate_type("Array(Nullable(Int32))") == "Array(I32?)"
+    assert compact_comment("tanggal   sampling") == "tanggal sampling"
+
+
+def test_every_type_abbreviation_is_in_the_legend():
+    entries = TYPE_LEGEND.split(": ", 1)[1].split(", ")
+    legend = {re.sub(r"\(\w\)$", "", entry.split(" = ")[0]) for entry in entries}
+    for _, replacement in _TYPE_REWRITES:
+        abbreviation = re.sub(r"\\\d|\($", "", replacement)
+        assert abbreviation in legend, abbreviation
@@ -0,0 +1,49 @@
+import datetime
+from decimal import Decimal
+
+from app.agents.base import AgentResult
+from app.agents.database.schemas import QueryResult, query_result_of
+
+
+def _result(rows):
+    return QueryResult(
+        columns=["site", "sample_date", "abw"],
+        rows=rows,
+        row_count=len(rows),
+        sql="SELECT site, sample_date, abw FROM t",
+        types=["String", "Date", "Nullable(Decimal(10, 3))"],
+    )
+
+
+def test_to_dataframe_keeps_types_and_all_rows():
+    rows = [
+        ["A | B", datetime.date(2024, 1, d % 28 + 1), Decimal("1.125") if d % 7 else None]
+        for d in range(120)
+    ]
+    df = _result(rows).to_dataframe()
+
+    assert len(df) == 120
+    assert df["site"].iloc[0] == "A | B"
+    assert str(df["sample_date"].dtype).startswith("datetime64")
+    assert df["abw"].dtype == "float64"
+    assert df["abw"].iloc[1] == 1.125
+    assert df["abw"].isna().sum() == 18
+
+
+def test_to_text_truncates_for_prompts():
+    result = _result([["A", datetime.date(2024, 1, 1), Decimal("2.5")]] * 60)
+
+    lines = result.to_text(max_rows=50).splitlines()
+
+    assert lines[0] == "site | sample_date | abw"
+    assert len(lines) == 52
+    assert _result([]).to_text() == "(no rows returned)"
+
+
+def test_string_rows_and_query_result_of():
+    result = _result([["A", None, Decimal("2.5")]])
+
+    assert result.string_rows() == [["A", "", "2.5"]]
+    assert query_result_of(AgentResult(output="...", data=result)) is result
+    assert query_result_of(AgentResult(output="Error: failed")) is None
+
@@ -0,0 +1,98 @@
+import pytest
+
+from app.agents.database.agent import DatabaseAgent
+from app.agents.database.columnar import columnar_context
+from app.agents.database.introspect import ColumnInfo, TableInfo
+from app.agents.database.limits import query_profile_context
+from app.agents.database.semantic import QuerySpec, SemanticQueryError, compile_spec, semantic_context
+from app.core.config import settings
+
+
+def _compile(payload, tables=None):
+    return compile_spec(QuerySpec.from_payload(payload), tables)
+
+
+def test_compiles_dimensions_filters_and_grain():
+    sql = _compile({
+        "metrics": ["abw", "sr"],
+        "dimensions": ["site", "pond"],
+        "filters": [
+            {"field": "site", "op": "=", "value": "SUMA MARINA"},
+            {"field": "status", "op": "=", "value": 1},
+            {"field": "sr", "op": "<", "value": 80},
+        ],
+        "grain": "week",
+        "time_range": {"start": "2024-01-01", "end": "2024-01-31"},
+        "order_by": [{"field": "sr", "direction": "asc"}],
+        "limit": 20,
+    })
+
+    assert sql == (
+        "SELECT s.name AS site, p.name AS pond, toStartOfWeek(t.tanggal, 1) AS periode, "
+        "round(avg(t.avg_body_weight), 2) AS abw, round(avg(t.survival_rate), 2) AS sr\n"
+        "FROM cultivation.cultivation_shrimp AS t FINAL\n"
+        "JOIN cultivation.cultivation AS c FINAL ON c.id = t.cultivation_id AND c.deleted_by = 0\n"
+        "JOIN cultivation.ponds AS p FINAL ON p.id = c.pond_id AND p.deleted_by = 0\n"
+        "JOIN cultivation.sites AS s FINAL ON s.id = p.site_id AND s.deleted_by = 0\n"
+        "WHERE t.deleted_by = 0 AND t.cultivation_id IN (SELECT id FROM cultivation.cultivation FINAL "
+        "WHERE deleted_by = 0 AND status = 1 AND pond_id IN (SELECT id FROM cultivation.ponds FINAL "
+        "WHERE deleted_by = 0 AND site_id IN (SELECT id FROM cultivation.sites FINAL "
+        "WHERE deleted_by = 0 AND name = 'SUMA MARINA'))) "
+        "AND t.tanggal >= toDate('2024-01-01') AND t.tanggal < toDate('2024-01-31') + 1\n"
+        "GROUP BY site, pond, periode\n"
+        "HAVING sr < 80\n"
+        "ORDER BY sr ASC\n"
+        "LIMIT 20"
+    )
+
+
+def test_cycle_metrics_read_cultivation_directly_without_window():
+    sql = _compile({
+        "metrics": ["cycle_count"],
+        "dimensions": ["site", "status"],
+        "filters": [{"field": "pond", "op": "in", "value": ["F1", "F2"]}],
+    })
+
+    assert "FROM cultivation.cultivation AS t FINAL" in sql
+    assert "JOIN cultivation.ponds AS p FINAL ON p.id = t.pond_id" in sql
+    assert "t.status AS status" in sql
+    assert "t.pond_id IN (SELECT id FROM cultivation.ponds FINAL WHERE deleted_by = 0 AND name IN ('F1', 'F2'))" in sql
+    assert "today()" not in sql
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"metrics": []},
+        {"metrics": ["omzet"]},
+        {"metrics": ["abw", "do_subuh"]},
+        {"metrics": ["do_subuh"], "dimensions": ["cycle"]},
+        {"metrics": ["abw"], "filters": [{"field": "fcr", "op": ">", "value": 1}]},
+        {"metrics": ["abw"], "filters": [{"field": "site", "op": "like", "value": "%a%"}]},
+        {"metrics": ["abw"], "order_by": ["pond"]},
+        {"metrics": ["abw"], "limit": 100000},
+    ],
+)
+def test_rejects_specs_outside_the_catalog(payload):
+    with pytest.raises(SemanticQueryError):
+        _compile(payload)
+
+
+def test_rejects_columns_missing_from_schema():
+    water = TableInfo(
+        "transformed_cultivation", "cultivation_water_report",
+        [ColumnInfo(name, "Float64") for name in ("pond_id", "report_date", "do_subuh")],
+    )
+
+    assert "do_subuh" in _compile({"metrics": ["do_subuh"]}, [water])
+    with pytest.raises(SemanticQueryError, match="ph_pagi"):
+        _compile({"metrics": ["ph_pagi"]}, [water])
+
+
+def test_semantic_layer_runs_only_for_planned_metric_queries(monkeypatch):
+    monkeypatch.setattr(settings, "SEMANTIC_LAYER_ENABLED", True)
+
+    assert DatabaseAgent._semantic_layer_applies(semantic_context(None))
+    assert not DatabaseAgent._semantic_layer_applies(None)
+    assert not DatabaseAgent._semantic_layer_applies(semantic_context(columnar_context(None)))
+    assert not DatabaseAgent._semantic_layer_applies(semantic_context(query_profile_context(None, "report")))
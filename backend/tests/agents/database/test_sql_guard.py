@@ -0,0 +1,126 @@
+import pytest
+
+from app.agents.database.introspect import ColumnInfo, TableInfo
+from app.agents.database.sql_guard import SqlGuardError, guard_sql
+
+
+def _table(database, name, columns, engine="MergeTree"):
+    columns = [ColumnInfo(column, "UInt64") for column in columns]
+    return TableInfo(database, name, columns, "_ingestion_time", engine=engine)
+
+
+PONDS = _table("cultivation", "ponds", ["id", "site_id", "name", "deleted_by"], "ReplacingMergeTree")
+SITES = _table("cultivation", "sites", ["id", "name", "deleted_by"], "ReplicatedReplacingMergeTree")
+WATER = _table("transformed_cultivation", "cultivation_water_report", ["pond_id", "do_subuh"])
+SUMMARY = _table("transformed_cultivation", "pond_summary", ["pond_id", "deleted_by"], "View")
+TABLES = [PONDS, SITES, WATER, SUMMARY]
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT 1; DROP TABLE cultivation.ponds",
+        "INSERT INTO cultivation.ponds SELECT * FROM cultivation.ponds",
+        "SELECT id INTO backup FROM cultivation.ponds",
+        "SELECT * FROM url('http://example.com/data.csv', 'CSV')",
+        "SELECT id FROM cultivation.ponds SETTINGS readonly = 0",
+        "SYSTEM DROP DNS CACHE",
+        "SELECT FROM WHERE",
+    ],
+)
+def test_rejects_anything_but_one_read_only_select(sql):
+    with pytest.raises(SqlGuardError):
+        guard_sql(sql, TABLES)
+
+
+def test_keyword_named_columns_are_allowed_and_untouched_sql_is_kept():
+    sql = "SELECT p.update, x AS create_count FROM cultivation.ponds AS p FINAL WHERE p.deleted_by = 0 LIMIT 5;"
+
+    guarded = guard_sql(sql, TABLES, default_limit=100)
+
+    assert guarded.sql == sql.rstrip(";")
+    assert guarded.rewrites == []
+    assert [table.full_name for table in guarded.tables] == ["cultivation.ponds"]
+
+
+def test_adds_final_soft_delete_filters_and_limit():
+    guarded = guard_sql(
+        "SELECT p.name, s.name FROM cultivation.ponds AS p "
+        "LEFT JOIN cultivation.sites AS s ON s.id = p.site_id WHERE p.site_id = 3",
+        TABLES,
+        default_limit=100,
+    )
+
+    assert guarded.sql == (
+        "SELECT p.name, s.name FROM cultivation.ponds AS p FINAL "
+        "LEFT JOIN cultivation.sites AS s FINAL ON s.id = p.site_id AND s.deleted_by = 0 "
+        "WHERE p.site_id = 3 AND p.deleted_by = 0 LIMIT 100"
+    )
+    assert guarded.limit_injected
+    assert {table.full_name for table in guarded.tables} == {"cultivation.ponds", "cultivation.sites"}
+
+
+def test_explicit_soft_delete_condition_and_non_cdc_tables_are_respected():
+    guarded = guard_sql(
+        "SELECT name FROM cultivation.ponds FINAL WHERE deleted_by != 0 "
+        "UNION ALL SELECT toString(pond_id) FROM transformed_cultivation.cultivation_water_report",
+        TABLES,
+        default_limit=10,
+    )
+
+    assert guarded.sql == (
+        "SELECT * FROM (SELECT name FROM cultivation.ponds FINAL WHERE deleted_by != 0 "
+        "UNION ALL SELECT toString(pond_id) FROM transformed_cultivation.cultivation_water_report) LIMIT 10"
+    )
+
+
+def test_cte_names_are_not_tables():
+    guarded = guard_sql("WITH recent AS (SELECT 1 AS id) SELECT id FROM recent JOIN lake USING (id)", TABLES)
+
+    assert guarded.tables == []
+    assert guarded.unknown_tables == ["lake"]
+
+
+def test_final_only_for_replacing_and_collapsing_engines():
+    guarded = guard_sql(
+        "SELECT s.pond_id FROM transformed_cultivation.pond_summary AS s "
+        "JOIN transformed_cultivation.cultivation_water_report AS w ON w.pond_id = s.pond_id",
+        TABLES,
+    )
+
+    assert "FINAL" not in guarded.sql
+    assert guarded.rewrites == ["deleted_by = 0 transformed_cultivation.pond_summary"]
+
+
+def test_rewrites_keep_clickhouse_functions_as_written():
+    guarded = guard_sql(
+        "SELECT toStartOfMonth(c.created_at) AS month, toMonday(c.created_at) AS week,\n"
+        "       if(s.name = '', 'n/a', s.name) AS site, dateDiff('day', c.created_at, now()) AS age\n"
+        "FROM cultivation.ponds c JOIN cultivation.sites s ON s.id = c.site_id\n"
+        "WHERE c.id = 1 OR c.id = 2 -- two ponds\n"
+        "SETTINGS max_threads = 2",
+        TABLES,
+        default_limit=100,
+    )
+
+    assert guarded.sql == (
+        "SELECT toStartOfMonth(c.created_at) AS month, toMonday(c.created_at) AS week,\n"
+        "       if(s.name = '', 'n/a', s.name) AS site, dateDiff('day', c.created_at, now()) AS age\n"
+        "FROM cultivation.ponds c FINAL JOIN cultivation.sites s FINAL ON s.id = c.site_id AND s.deleted_by = 0\n"
+        "WHERE (c.id = 1 OR c.id = 2) AND c.deleted_by = 0 -- two ponds\n"
+        "LIMIT 100 SETTINGS max_threads = 2"
+    )
+
+
+def test_limit_wrap_keeps_clickhouse_functions_as_written():
+    guarded = guard_sql(
+        "SELECT toStartOfMonth(d) AS m, pond_id FROM transformed_cultivation.cultivation_water_report "
+        "ORDER BY m LIMIT 1 BY pond_id",
+        TABLES,
+        default_limit=50,
+    )
+
+    assert guarded.sql == (
+        "SELECT * FROM (SELECT toStartOfMonth(d) AS m, pond_id FROM transformed_cultivation.cultivation_water_report "
+        "ORDER BY m LIMIT 1 BY pond_id) LIMIT 50"
+    )
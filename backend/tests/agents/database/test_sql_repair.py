@@ -0,0 +1,65 @@
+from app.agents.database.introspect import ColumnInfo, TableInfo
+from app.agents.database.limits import QueryLimitExceeded
+from app.agents.database.preflight import PreflightError
+from app.agents.database.sql_repair import classify_error, repair_sql
+
+TABLES = [
+    TableInfo(
+        "aquaculture",
+        "cultivation",
+        [
+            ColumnInfo("pond_id", "UInt64"),
+            ColumnInfo("avg_body_weight", "Float64"),
+            ColumnInfo("sampling_date", "Nullable(String)"),
+            ColumnInfo("created_at", "DateTime"),
+        ],
+    ),
+    TableInfo("aquaculture", "ponds", [ColumnInfo("id", "UInt64"), ColumnInfo("name", "String")]),
+]
+
+
+def _error(code: int) -> Exception:
+    return Exception(f"Code: {code}. DB::Exception: test")
+
+
+def test_classify_error_codes():
+    assert classify_error(_error(47)) == "unknown_column"
+    assert classify_error(PreflightError(215, "x")) == "not_aggregate"
+    assert classify_error(_error(62)) is None
+    assert classify_error(QueryLimitExceeded("max_memory_usage", 1000)) is None
+
+
+def test_unknown_column_maps_case_and_underscores():
+    repair = repair_sql(
+        "SELECT c.pondId, avg(c.AvgBodyWeight) AS abw FROM cultivation AS c GROUP BY c.pondId ORDER BY abw",
+        _error(47),
+        TABLES,
+    )
+
+    assert repair.sql == (
+        "SELECT c.pond_id, avg(c.avg_body_weight) AS abw FROM cultivation AS c GROUP BY c.pond_id ORDER BY abw"
+    )
+    assert repair.fixes == ["pondId -> pond_id", "AvgBodyWeight -> avg_body_weight"]
+    assert repair_sql("SELECT weight FROM cultivation", _error(47), TABLES) is None
+
+
+def test_unknown_table_gets_database_prefix():
+    repair = repair_sql("SELECT count() FROM Cultivation", _error(60), TABLES)
+
+    assert repair.sql == "SELECT count() FROM aquaculture.cultivation"
+
+
+def test_string_compared_with_date_is_parsed():
+    repair = repair_sql("SELECT count() FROM cultivation WHERE sampling_date >= today()", _error(53), TABLES)
+
+    assert "toDate(parseDateTimeBestEffortOrNull(sampling_date)) >= today()" in repair.sql
+    repair = repair_sql("SELECT count() FROM cultivation WHERE sampling_date < created_at", _error(386), TABLES)
+    assert "parseDateTimeBestEffortOrNull(sampling_date) < created_at" in repair.sql
+
+
+def test_projection_missing_from_group_by_is_added():
+    repair = repair_sql(
+        "SELECT name, toDate(created_at) AS day, count() FROM cultivation GROUP BY name", _error(215), TABLES
+    )
+
+    assert repair.sql.endswith("GROUP BY name, day")
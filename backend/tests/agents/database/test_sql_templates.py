@@ -0,0 +1,51 @@
+from app.agents.database.sql_templates import fill_template, induce_slots, parse_question, serialize_values
+
+SITES = ["ARONA TELUK TOMINI", "SUMA MARINA"]
+
+
+def _learn(question, sql):
+    parsed = parse_question(question, SITES)
+    return parsed, induce_slots(sql, parsed), serialize_values(parsed)
+
+
+def test_parse_question_types_values():
+    parsed = parse_question("Kolam dengan DO < 4,5 di Teluk Tomini tanggal 05/01/2024", SITES)
+
+    assert parsed.pattern == "kolam dengan do {number} di {entity} tanggal {date}"
+    assert [token.value for token in parsed.values] == ["4.5", "ARONA TELUK TOMINI", "2024-01-05"]
+
+
+def test_slots_keep_wildcards_case_and_time_suffix():
+    sql = (
+        "SELECT * FROM t WHERE lower(site) LIKE '%suma marina%' "
+        "AND ts >= '2024-01-05 00:00:00' AND do < 4.5 AND status = 1"
+    )
+    _, slots, values = _learn("DO < 4.5 di suma sejak 5 jan 2024", sql)
+
+    filled = fill_template(sql, slots, values, parse_question("DO < 3 di teluk tomini sejak 2024-02-10", SITES))
+
+    assert filled == (
+        "SELECT * FROM t WHERE lower(site) LIKE '%arona teluk tomini%' "
+        "AND ts >= '2024-02-10 00:00:00' AND do < 3 AND status = 1"
+    )
+
+
+def test_values_missing_from_sql_are_fixed():
+    sql = "SELECT * FROM ponds WHERE name = 'A3'"
+    _, slots, values = _learn("kolam 3 di suma", sql)
+
+    assert slots == []
+    assert fill_template(sql, slots, values, parse_question("kolam 3 di suma", SITES)) == sql
+    assert fill_template(sql, slots, values, parse_question("kolam 4 di suma", SITES)) is None
+
+
+def test_short_pond_names_are_entities_when_written_in_full():
+    ponds = [*SITES, "A1", "B2"]
+    sql = "SELECT avg(do) FROM t WHERE pond = 'A1' AND site = 'SUMA MARINA'"
+    parsed = parse_question("DO kolam a1 di suma", ponds)
+
+    assert parsed.pattern == "do kolam {entity} di {entity}"
+    filled = fill_template(
+        sql, induce_slots(sql, parsed), serialize_values(parsed), parse_question("DO kolam b2 di suma", ponds)
+    )
+    assert filled == "SELECT avg(do) FROM t WHERE pond = 'B2' AND site = 'SUMA MARINA'"
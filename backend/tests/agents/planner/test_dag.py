@@ -0,0 +1,101 @@
+import threading
+
+import pytest
+
+from app.agents.base import AgentResult
+from app.agents.planner.dag import run_task_graph
+from app.agents.planner.schemas import MAX_GRAPH_TASKS, TaskGraph
+from app.core.cancellation import CancellationToken, OperationCancelled
+
+
+def test_task_graph_drops_invalid_tasks_and_dangling_dependencies():
+    graph = TaskGraph.from_payload(
+        {
+            "tasks": [
+                {"id": "t1", "agent": "database", "input": "Ambil SR tambak A"},
+                {"id": "t2", "agent": "chart", "input": "Buat chart"},
+                {"id": "t3", "agent": "browser", "input": "Cari SR ideal", "depends_on": ["t9"]},
+            ]
+        }
+    )
+
+    assert [task.id for task in graph.tasks] == ["t1", "t3"]
+    assert graph.get("t3").depends_on == []
+
+
+def test_task_graph_rejects_cycles():
+    with pytest.raises(ValueError):
+        TaskGraph.from_payload(
+            {
+                "tasks": [
+                    {"id": "a", "agent": "database", "input": "x", "depends_on": ["b"]},
+                    {"id": "b", "agent": "database", "input": "y", "depends_on": ["a"]},
+                ]
+            }
+        )
+
+
+def test_task_graph_caps_task_count():
+    tasks = [{"id": f"t{i}", "agent": "browser", "input": str(i)} for i in range(10)]
+    graph = TaskGraph.from_payload({"tasks": tasks})
+    assert len(graph.tasks) == MAX_GRAPH_TASKS
+
+
+def test_run_task_graph_runs_independent_branches_concurrently_and_respects_deps():
+    graph = TaskGraph.from_payload(
+        {
+            "tasks": [
+                {"id": "a", "agent": "database", "input": "A"},
+                {"id": "b", "agent": "browser", "input": "B"},
+                {"id": "c", "agent": "compare", "input": "C", "depends_on": ["a", "b"]},
+            ]
+        }
+    )
+    barrier = threading.Barrier(2, timeout=5)
+
+    def run_task(task, dep_results):
+        if task.id in {"a", "b"}:
+            # Both independent branches must be running at the same time.
+            barrier.wait()
+        yield {"type": "thinking", "content": task.id}
+        joined = "+".join(sorted(result.output for result in dep_results.values()))
+        yield {"type": "_result", "data": AgentResult(output=joined or task.input, metadata={})}
+
+    events = list(run_task_graph(graph, run_task))
+
+    thinking = [event for event in events if event["type"] == "thinking"]
+    assert {event["branch"] for event in thinking} == {"a", "b", "c"}
+    assert thinking[-1]["branch"] == "c"
+
+    results = events[-1]["data"]
+    assert results["c"].output == "A+B"
+
+
+def test_run_task_graph_propagates_cancellation_and_stops_running_branches():
+    graph = TaskGraph.from_payload(
+        {
+            "tasks": [
+                {"id": "a", "agent": "database", "input": "A"},
+                {"id": "b", "agent": "browser", "input": "B"},
+            ]
+        }
+    )
+    token = CancellationToken()
+    running, stopped = threading.Event(), threading.Event()
+
+    def run_task(task, dep_results):
+        if task.id == "a":
+            running.wait(timeout=5)
+            raise OperationCancelled("client disconnected")
+        # "b" keeps running until the request token is cancelled.
+        running.set()
+        token.wait(timeout=5)
+        stopped.set()
+        token.raise_if_cancelled()
+        yield {"type": "_result", "data": AgentResult(output=task.input, metadata={})}
+
+    with pytest.raises(OperationCancelled):
+        list(run_task_graph(graph, run_task, cancel_token=token))
+
+    assert token.cancelled
+    assert stopped.wait(timeout=5)
@@ -0,0 +1,46 @@
+import datetime
+
+import pytest
+
+from app.agents.database.sql_templates import parse_question
+from app.agents.planner.time_expressions import resolve_time_expressions
+
+# A Wednesday.
+TODAY = datetime.date(2024, 5, 15)
+
+
+@pytest.mark.parametrize(
+    ("question", "expected"),
+    [
+        ("ABW minggu lalu", "ABW 2024-05-06 sampai 2024-05-12"),
+        ("FCR bulan ini", "FCR 2024-05-01 sampai 2024-05-15"),
+        ("DO 30 hari terakhir", "DO 2024-04-16 sampai 2024-05-15"),
+        ("pH kemarin", "pH tanggal 2024-05-14"),
+        ("panen kemarin lusa", "panen tanggal 2024-05-13"),
+        ("SR last month", "SR 2024-04-01 sampai 2024-04-30"),
+        ("feed 3 days ago", "feed tanggal 2024-05-12"),
+        ("biomassa 2 bulan lalu", "biomassa 2024-03-01 sampai 2024-03-31"),
+        ("ABW dalam tiga minggu terakhir", "ABW 2024-04-25 sampai 2024-05-15"),
+        ("FCR siklus ini kolam F1", "FCR siklus aktif kolam F1"),
+        ("harga udang", "harga udang"),
+    ],
+)
+def test_resolves_relative_expressions(question, expected):
+    assert resolve_time_expressions(question, TODAY)[0] == expected
+
+
+def test_reports_structured_ranges():
+    _, resolved = resolve_time_expressions("hari ini vs minggu lalu", TODAY)
+
+    assert [item.to_dict() for item in resolved] == [
+        {"expression": "hari ini", "kind": "range", "start": "2024-05-15", "end": "2024-05-15"},
+        {"expression": "minggu lalu", "kind": "range", "start": "2024-05-06", "end": "2024-05-12"},
+    ]
+
+
+def test_same_question_on_different_days_shares_cache_key():
+    monday, _ = resolve_time_expressions("ABW minggu lalu", datetime.date(2024, 5, 13))
+    next_monday, _ = resolve_time_expressions("ABW minggu lalu", datetime.date(2024, 5, 20))
+
+    assert monday != next_monday
+    assert parse_question(monday).key == parse_question(next_monday).key
@@ -0,0 +1,56 @@
+import threading
+import time
+
+import pytest
+
+from app.agents.timeseries.executor import execute_code
+from app.core.cancellation import CancellationToken, OperationCancelled, cancellable
+
+
+def test_cancel_runs_registered_callbacks_once():
+    token = CancellationToken()
+    calls = []
+    token.register(lambda: calls.append("kill"))
+    unregister = token.register(lambda: calls.append("removed"))
+    unregister()
+
+    token.cancel("client disconnected")
+    token.cancel("again")
+
+    assert calls == ["kill"]
+    assert token.reason == "client disconnected"
+    with pytest.raises(OperationCancelled):
+        token.raise_if_cancelled()
+
+
+def test_cancellable_stops_and_closes_source():
+    token = CancellationToken()
+    closed = []
+
+    def chunks():
+        try:
+            for index in range(100):
+                yield str(index)
+        finally:
+            closed.append(True)
+
+    received = []
+    with pytest.raises(OperationCancelled):
+        for chunk in cancellable(chunks(), {"cancel_token": token}):
+            received.append(chunk)
+            if len(received) == 3:
+                token.cancel()
+
+    assert received == ["0", "1", "2"]
+    assert closed == [True]
+
+
+def test_cancel_aborts_sandbox_execution():
+    token = CancellationToken()
+    threading.Timer(0.2, token.cancel).start()
+
+    started = time.monotonic()
+    result = execute_code("while True:\n    pass\n", {}, cancel_token=token)
+
+    assert result == {"error": "Execution cancelled."}
+    assert time.monotonic() - started < 2
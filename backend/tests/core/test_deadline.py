@@ -0,0 +1,44 @@
+import pytest
+
+from app.core.deadline import (
+    Deadline,
+    DeadlineExceeded,
+    budget_attempts,
+    check_deadline,
+    clickhouse_settings,
+    is_budget_tight,
+    llm_config,
+)
+
+
+def test_helpers_are_noops_without_deadline():
+    check_deadline(None, "routing")
+    assert budget_attempts({}, 3) == 3
+    assert llm_config({}, temperature=0).timeout is None
+    assert clickhouse_settings(None) == {}
+    assert not is_budget_tight({})
+
+
+def test_remaining_budget_becomes_llm_and_clickhouse_timeout():
+    context = {"deadline": Deadline.after(42.5)}
+
+    config = llm_config(context, temperature=0)
+    assert config.temperature == 0
+    assert 40 < config.timeout <= 42.5
+    assert clickhouse_settings(context) == {"max_execution_time": 43}
+
+
+def test_tight_budget_reduces_retries():
+    context = {"deadline": Deadline.after(15)}
+
+    assert is_budget_tight(context)
+    assert budget_attempts(context, 3, seconds_per_attempt=10) == 1
+
+
+def test_expired_deadline_raises_with_step():
+    context = {"deadline": Deadline.after(-1)}
+
+    with pytest.raises(DeadlineExceeded) as exc_info:
+        check_deadline(context, "db_command")
+    assert exc_info.value.step == "db_command"
+    assert budget_attempts(context, 3) == 1
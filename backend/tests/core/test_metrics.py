@@ -0,0 +1,41 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.metrics import CACHE_REQUESTS, HTTP_REQUEST_DURATION, record_cache_lookup
+from app.middleware.metrics import setup_metrics
+
+
+def test_middleware_labels_by_route_template_and_exposes_metrics():
+    app = FastAPI()
+    setup_metrics(app)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: str):
+        return {"id": item_id}
+
+    before = HTTP_REQUEST_DURATION.labels(method="GET", route="/items/{item_id}", status="200")
+    sum_before = before._sum.get()
+
+    with TestClient(app) as client:
+        client.get("/items/a")
+        client.get("/items/b")
+        response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert "http_request_duration_seconds_bucket" in response.text
+    assert 'route="/items/{item_id}"' in response.text
+    assert 'route="/items/a"' not in response.text
+    assert before._sum.get() > sum_before
+
+
+def test_cache_lookups_are_counted_by_result():
+    hits = CACHE_REQUESTS.labels(cache="test", result="hit")
+    misses = CACHE_REQUESTS.labels(cache="test", result="miss")
+    hit_start, miss_start = hits._value.get(), misses._value.get()
+
+    record_cache_lookup("test", hit=True)
+    record_cache_lookup("test", hit=True)
+    record_cache_lookup("test", hit=False)
+
+    assert hits._value.get() - hit_start == 2
+    assert misses._value.get() - miss_start == 1
@@ -0,0 +1,56 @@
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.profiling import load_profile
+from app.middleware.profiling import setup_profiling
+
+
+def _busy(seconds: float) -> int:
+    total = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        total += 1
+    return total
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    setup_profiling(app)
+
+    @app.post("/v1/report/generate")
+    async def generate():
+        return {"n": _busy(0.1)}
+
+    return app
+
+
+def test_flagged_request_with_admin_token_stores_speedscope_profile(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILING_ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(settings, "PROFILING_DIR", str(tmp_path))
+
+    with TestClient(_app()) as client:
+        response = client.post(
+            "/v1/report/generate",
+            headers={"X-Profile": "1", "X-Admin-Token": "secret"},
+        )
+
+    profile = load_profile(response.headers["x-profile-id"])
+    assert profile["profiles"]
+    frame_names = {frame["name"] for frame in profile["shared"]["frames"]}
+    assert "_busy" in frame_names
+
+
+def test_profiling_requires_admin_token(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILING_ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(settings, "PROFILING_DIR", str(tmp_path))
+
+    with TestClient(_app()) as client:
+        wrong = client.post("/v1/report/generate", headers={"X-Profile": "1", "X-Admin-Token": "nope"})
+        unflagged = client.post("/v1/report/generate")
+
+    assert "x-profile-id" not in wrong.headers
+    assert "x-profile-id" not in unflagged.headers
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,35 @@
+from app.agents.planner.agent import PlannerAgent
+from app.core.timing import timing_event, timings_enabled
+
+
+def test_timing_event_carries_duration_and_token_counts():
+    event = timing_event(
+        "plan",
+        12.34567,
+        {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120},
+        attempt=None,
+    )
+
+    assert event == {
+        "type": "timing",
+        "step": "plan",
+        "duration_ms": 12.346,
+        "prompt_tokens": 100,
+        "completion_tokens": 20,
+        "total_tokens": 120,
+    }
+    assert not timings_enabled(None)
+    assert timings_enabled({"timings": True})
+
+
+def test_answer_stream_ends_with_synthesis_timing_only_when_enabled():
+    plain = list(PlannerAgent._stream_answer(iter(["Hal", "o"]), {}))
+    timed = list(PlannerAgent._stream_answer(iter(["Hal", "o"]), {"timings": True}))
+
+    assert all(event["type"] != "timing" for event in plain)
+    assert "".join(e["content"] for e in timed if e["type"] == "content") == "Halo"
+    synthesis = timed[-1]
+    assert synthesis["step"] == "synthesis"
+    assert synthesis["chunks"] == 2
+    assert synthesis["ttft_ms"] <= synthesis["duration_ms"]
+
@@ -0,0 +1,63 @@
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.tracing import JsonlExporter, end_trace, fork_trace, span, start_trace
+from app.middleware.tracing import setup_tracing
+
+
+def test_spans_nest_and_fork_for_branches():
+    trace, token = start_trace("req-1")
+    try:
+        with span("planner.route", prompt_slug="routing_system") as route:
+            branch = fork_trace()
+            with span("llm.generate") as llm_span:
+                llm_span.set(total_tokens=42)
+        branch_span = branch.start_span("planner.branch")
+        branch.end_span(branch_span)
+    finally:
+        end_trace(token)
+
+    by_name = {item.name: item for item in trace.spans}
+    assert by_name["llm.generate"].parent_id == route.span_id
+    assert by_name["llm.generate"].attributes["total_tokens"] == 42
+    assert by_name["planner.branch"].parent_id == route.span_id
+    assert all(item.end_ns is not None for item in trace.spans)
+
+
+def test_span_records_errors_and_is_noop_without_trace(tmp_path):
+    with span("outside") as noop:
+        noop.set(rows=1)
+
+    trace, token = start_trace("req-2")
+    try:
+        try:
+            with span("clickhouse.query"):
+                raise RuntimeError("boom")
+        except RuntimeError:
+            pass
+    finally:
+        end_trace(token)
+
+    path = tmp_path / "spans.jsonl"
+    JsonlExporter(str(path)).export(trace)
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert records[0]["status"] == "error"
+    assert records[0]["request_id"] == "req-2"
+
+
+def test_middleware_echoes_request_id():
+    app = FastAPI()
+    setup_tracing(app)
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    with TestClient(app) as client:
+        response = client.get("/ping", headers={"X-Request-ID": "abc-123"})
+        generated = client.get("/ping")
+
+    assert response.headers["x-request-id"] == "abc-123"
+    assert generated.headers["x-request-id"]